@@ -42,6 +42,11 @@ MLDSA65_PUBLIC_KEY_SIZE = 1952
 # Salt для PBKDF2 (должен совпадать с iOS)
 KEM_KEY_SALT = b"MONTANA_KEM_KEY_V1"
 
+# Кэш ML-KEM-768 пар в памяти процесса: sha256(ключ) → (secret_key, public_key)
+# montana init шифрует ключ и сразу расшифровывает его для регистрации —
+# второй раз 600K итераций PBKDF2 и keygen не нужны. На диск не пишется.
+_KEYPAIR_CACHE = {}
+
 
 def check_dependencies() -> bool:
     """Проверка зависимостей"""
@@ -97,6 +102,30 @@ def keypair_from_seed(seed: bytes) -> Optional[Tuple[bytes, bytes]]:
         return None
 
 
+def derive_keypair(cognitive_key: str) -> Optional[Tuple[bytes, bytes]]:
+    """
+    ML-KEM-768 пара из когнитивного ключа (PBKDF2 600K + keygen), с кэшем.
+
+    Returns:
+        (secret_key, public_key) или None при ошибке
+    """
+    normalized = " ".join(cognitive_key.lower().split())
+    tag = hashlib.sha256(KEM_KEY_SALT + normalized.encode("utf-8")).digest()
+    if tag in _KEYPAIR_CACHE:
+        return _KEYPAIR_CACHE[tag]
+
+    seed = pbkdf2_derive(cognitive_key, KEM_KEY_SALT, 600_000, KEYPAIR_SEED_SIZE)
+    keys = keypair_from_seed(seed)
+    if keys:
+        _KEYPAIR_CACHE[tag] = keys
+    return keys
+
+
+def forget_keypairs():
+    """Очистить кэш пар (после выхода из команды, которой он был нужен)"""
+    _KEYPAIR_CACHE.clear()
+
+
 def encapsulate(public_key: bytes, seed: Optional[bytes] = None) -> Optional[Tuple[bytes, bytes]]:
     """
     Инкапсуляция для получения shared secret.
@@ -209,11 +238,8 @@ def encrypt_private_key(private_key: bytes, cognitive_key: str) -> Optional[byte
         print(f"[MLKEM768] Invalid private key size: {len(private_key)}")
         return None
 
-    # 1. Деривация seed из когнитивного ключа (600K итераций)
-    seed = pbkdf2_derive(cognitive_key, KEM_KEY_SALT, 600_000, KEYPAIR_SEED_SIZE)
-
-    # 2. Генерация ML-KEM-768 keypair детерминированно
-    keys = keypair_from_seed(seed)
+    # 1-2. Seed из когнитивного ключа (600K итераций) → ML-KEM-768 keypair
+    keys = derive_keypair(cognitive_key)
     if not keys:
         return None
     secret_key, public_key = keys
@@ -257,11 +283,8 @@ def decrypt_private_key(encrypted_data: bytes, cognitive_key: str) -> Optional[b
         print(f"[MLKEM768] Encrypted data too small: {len(encrypted_data)}, expected >= {min_size}")
         return None
 
-    # 1. Деривация seed из когнитивного ключа (600K итераций)
-    seed = pbkdf2_derive(cognitive_key, KEM_KEY_SALT, 600_000, KEYPAIR_SEED_SIZE)
-
-    # 2. Генерация ML-KEM-768 keypair детерминированно
-    keys = keypair_from_seed(seed)
+    # 1-2. Seed из когнитивного ключа (600K итераций) → ML-KEM-768 keypair
+    keys = derive_keypair(cognitive_key)
     if not keys:
         return None
     secret_key, public_key = keys
@@ -0,0 +1,412 @@
+#!/usr/bin/env python3
+"""
+Montana Key Agent — локальный агент ключей (как ssh-agent)
+
+Когнитивный ключ вводится один раз: агент расшифровывает ML-DSA-65 ключ
+(PBKDF2 600K + ML-KEM-768) и держит его в памяти до истечения TTL.
+Команды montana подписывают через Unix-сокет, не трогая KDF.
+
+Протокол: JSON-строки по сокету, соединение можно держать открытым.
+    {"op": "status", "wait": bool}   → {"ok": true, "address", "state", "expires_in"}
+    {"op": "sign", "data": "<hex>"}  → {"ok": true, "signature": "<hex>"}
+    {"op": "lock"}                   → ключ забыт, агент завершается
+
+Защита: сокет 0600 в ~/.montana, на Linux проверяется uid клиента.
+"""
+
+import functools
+import json
+import os
+import socket
+import socketserver
+import struct
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Optional
+
+# ML-DSA-65
+try:
+    from dilithium_py.ml_dsa import ML_DSA_65
+    HAS_DILITHIUM = True
+except ImportError:
+    HAS_DILITHIUM = False
+
+# Конфигурация
+MONTANA_DIR = Path.home() / ".montana"
+AGENT_SOCKET = Path(os.environ.get("MONTANA_AGENT_SOCK", MONTANA_DIR / "agent.sock"))
+
+AGENT_TTL = 3600           # Ключ живёт в памяти не дольше часа
+UNLOCK_TIMEOUT = 120       # Столько клиент ждёт фоновую расшифровку
+MAX_REQUEST = 1 << 20      # Строка запроса больше 1 MB — ошибка протокола
+CLOSE_GRACE = 2            # Агент без ключа живёт ещё 2 с и завершается
+
+STATE_UNLOCKING = "unlocking"
+STATE_READY = "ready"
+STATE_FAILED = "failed"
+
+
+class AgentError(Exception):
+    """Агент недоступен или отказал в подписи"""
+    pass
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# АГЕНТ
+# ═══════════════════════════════════════════════════════════════════════════════
+
+class KeyAgent:
+    """
+    Ключ в памяти с TTL.
+
+    Расшифровка идёт в фоновом потоке: сокет слушает сразу, запросы
+    подписи ждут окончания unlock (или получают ошибку, если он не удался).
+    """
+
+    def __init__(self, address: str, ttl: int = AGENT_TTL,
+                 sign: Optional[Callable[[bytes, bytes], bytes]] = None,
+                 clock: Callable[[], float] = time.time):
+        self.address = address
+        self.ttl = ttl
+        self._sign = sign or (lambda key, data: ML_DSA_65.sign(key, data))
+        self._clock = clock
+
+        self._key = None
+        self._error = None
+        self._expires_at = None
+        self._closed_at = None
+        self._unlocked = threading.Event()
+        self._lock = threading.Lock()
+        self.stats = {"signatures": 0, "rejected": 0}
+
+    # ─── Разблокировка ───
+
+    def unlock(self, loader: Callable[[], Optional[bytes]]):
+        """Синхронная разблокировка: loader возвращает ключ или None"""
+        try:
+            key = loader()
+            error = None if key else "wrong cognitive key"
+        except Exception as e:
+            key, error = None, str(e)
+
+        with self._lock:
+            self._key = key
+            self._error = error
+            self._expires_at = self._clock() + self.ttl if key else None
+            self._closed_at = None if key else self._clock()
+        self._unlocked.set()
+
+    def unlock_async(self, loader: Callable[[], Optional[bytes]]) -> threading.Thread:
+        """Разблокировка в фоне: PBKDF2 и ML-KEM не держат сокет"""
+        thread = threading.Thread(target=self.unlock, args=(loader,), daemon=True)
+        thread.start()
+        return thread
+
+    def lock(self, reason: str = "locked"):
+        """Забыть ключ"""
+        with self._lock:
+            if self._key is not None or not self._unlocked.is_set():
+                self._error = reason
+            self._key = None
+            self._expires_at = None
+            self._closed_at = self._closed_at or self._clock()
+        self._unlocked.set()
+
+    # ─── Состояние ───
+
+    @property
+    def state(self) -> str:
+        if not self._unlocked.is_set():
+            return STATE_UNLOCKING
+        return STATE_READY if self._key else STATE_FAILED
+
+    @property
+    def expired(self) -> bool:
+        """Ключа нет и не будет: TTL истёк, lock или неудачная разблокировка"""
+        if self._expires_at is not None and self._clock() >= self._expires_at:
+            self.lock("expired")
+        return self._unlocked.is_set() and self._key is None
+
+    def closed_for(self) -> float:
+        """Сколько секунд агент уже без ключа"""
+        return self._clock() - self._closed_at if self.expired else 0.0
+
+    def status(self, wait: float = 0) -> dict:
+        self._unlocked.wait(wait)
+        expired = self.expired
+        return {
+            "ok": True,
+            "address": self.address,
+            "state": self.state,
+            "error": self._error if expired else None,
+            "expires_in": max(0, int(self._expires_at - self._clock())) if self._expires_at else 0
+        }
+
+    # ─── Подпись ───
+
+    def sign(self, data: bytes, wait: float = UNLOCK_TIMEOUT) -> bytes:
+        if not self._unlocked.wait(wait):
+            raise AgentError("key is still unlocking")
+        if self.expired:
+            self.stats["rejected"] += 1
+            raise AgentError(self._error or "locked")
+
+        # ML-DSA-65 из dilithium-py не гарантирует потокобезопасность
+        with self._lock:
+            key = self._key
+            if key is None:
+                raise AgentError("locked")
+            signature = self._sign(key, data)
+        self.stats["signatures"] += 1
+        return signature
+
+    def handle(self, request: dict) -> dict:
+        """Один запрос протокола → ответ"""
+        op = request.get("op")
+        try:
+            if op == "status":
+                # wait: montana agent start ждёт конца расшифровки одним запросом
+                return self.status(UNLOCK_TIMEOUT if request.get("wait") else 0)
+            if op == "sign":
+                data = bytes.fromhex(request.get("data", ""))
+                return {"ok": True, "signature": self.sign(data).hex()}
+            if op == "lock":
+                self.lock()
+                return {"ok": True}
+            return {"ok": False, "error": f"unknown op: {op}"}
+        except (AgentError, ValueError) as e:
+            return {"ok": False, "error": str(e)}
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# СЕРВЕР
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def _peer_uid(sock: socket.socket) -> Optional[int]:
+    """uid процесса на другом конце сокета (Linux SO_PEERCRED)"""
+    if not hasattr(socket, "SO_PEERCRED"):
+        return None
+    creds = sock.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i"))
+    return struct.unpack("3i", creds)[1]
+
+
+class _AgentHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        uid = _peer_uid(self.connection)
+        if uid is not None and uid != os.getuid():
+            return
+
+        agent = self.server.agent
+        while True:
+            line = self.rfile.readline(MAX_REQUEST)
+            if not line:
+                return
+            try:
+                response = agent.handle(json.loads(line))
+            except (json.JSONDecodeError, AttributeError):
+                response = {"ok": False, "error": "bad request"}
+            self.wfile.write(json.dumps(response).encode() + b"\n")
+            self.wfile.flush()
+
+
+class AgentServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Unix-сокет агента; завершается сам, когда ключ истёк или забыт"""
+
+    daemon_threads = True
+
+    def __init__(self, path: Path, agent: KeyAgent):
+        self.agent = agent
+        self.path = Path(path)
+        if self.path.exists():
+            self.path.unlink()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        # Сокет создаётся сразу с правами 0600
+        umask = os.umask(0o177)
+        try:
+            super().__init__(str(self.path), _AgentHandler)
+        finally:
+            os.umask(umask)
+
+    def service_actions(self):
+        # Пауза, чтобы ждущие клиенты успели получить ответ об ошибке
+        if self.agent.closed_for() >= CLOSE_GRACE:
+            threading.Thread(target=self.shutdown, daemon=True).start()
+
+    def server_close(self):
+        super().server_close()
+        try:
+            self.path.unlink()
+        except FileNotFoundError:
+            pass
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# КЛИЕНТ
+# ═══════════════════════════════════════════════════════════════════════════════
+
+class AgentClient:
+    """Постоянное соединение с агентом: одна подпись — одна строка туда и обратно"""
+
+    def __init__(self, path: Path = None, timeout: float = UNLOCK_TIMEOUT + 10):
+        self.path = Path(path or AGENT_SOCKET)
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.settimeout(timeout)
+        try:
+            self._sock.connect(str(self.path))
+        except OSError as e:
+            self._sock.close()
+            raise AgentError(f"agent not running: {e}")
+        self._file = self._sock.makefile("rwb")
+
+    def call(self, request: dict) -> dict:
+        try:
+            self._file.write(json.dumps(request).encode() + b"\n")
+            self._file.flush()
+            line = self._file.readline(MAX_REQUEST)
+        except OSError as e:
+            raise AgentError(f"agent connection lost: {e}")
+        if not line:
+            raise AgentError("agent closed connection")
+        response = json.loads(line)
+        if not response.get("ok"):
+            raise AgentError(response.get("error", "agent error"))
+        return response
+
+    def status(self, wait: bool = False) -> dict:
+        return self.call({"op": "status", "wait": wait})
+
+    def sign(self, data: bytes) -> bytes:
+        return bytes.fromhex(self.call({"op": "sign", "data": data.hex()})["signature"])
+
+    def lock(self):
+        self.call({"op": "lock"})
+
+    def close(self):
+        self._file.close()
+        self._sock.close()
+
+
+def connect_agent(address: str, path: Path = None) -> Optional[AgentClient]:
+    """
+    Агент для данного адреса или None.
+
+    Агент другого кошелька или с забытым ключом не используется:
+    вызывающий код спросит когнитивный ключ как обычно.
+    """
+    path = Path(path or AGENT_SOCKET)
+    if not path.exists():
+        return None
+    try:
+        client = AgentClient(path)
+        status = client.status()
+    except (AgentError, OSError, ValueError):
+        return None
+    if status.get("address") != address or status.get("state") == STATE_FAILED:
+        client.close()
+        return None
+    return client
+
+
+def load_key(keys_dir: Path, cognitive_key: str) -> Optional[bytes]:
+    """Расшифровать ключ из keys_dir (та же логика, что в montana_cli)"""
+    enc_path = Path(keys_dir) / "private.key.enc"
+    if enc_path.exists():
+        from mlkem768 import decrypt_private_key, forget_keypairs
+        try:
+            return decrypt_private_key(enc_path.read_bytes(), cognitive_key)
+        finally:
+            # Агенту нужен только ML-DSA ключ, пара ML-KEM в памяти лишняя
+            forget_keypairs()
+
+    plain_path = Path(keys_dir) / "private.key"
+    if plain_path.exists():
+        return plain_path.read_bytes()
+    return None
+
+
+def serve(address: str, keys_dir: Path, cognitive_key: str,
+          path: Path = None, ttl: int = AGENT_TTL):
+    """Запустить агент: сокет слушает сразу, ключ расшифровывается в фоне"""
+    agent = KeyAgent(address, ttl=ttl)
+    server = AgentServer(path or AGENT_SOCKET, agent)
+    # Ключ связывается сразу: фоновый поток не читает удалённую локальную
+    agent.unlock_async(functools.partial(load_key, keys_dir, cognitive_key))
+    del cognitive_key
+    try:
+        server.serve_forever(poll_interval=0.5)
+    finally:
+        server.server_close()
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# БЕНЧМАРК
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def benchmark(signatures: int = 2000):
+    """
+    Цена подписи: KDF на каждую команду против агента по сокету.
+
+    Без dilithium-py подпись заменяется HMAC — так видна чистая цена
+    сокета; сама ML-DSA-65 подпись добавляется в обоих случаях одинаково.
+    """
+    import hashlib
+    import hmac
+    import tempfile
+
+    start = time.perf_counter()
+    hashlib.pbkdf2_hmac("sha256", b"cognitive key", b"MONTANA_KEM_KEY_V1", 600_000, dklen=48)
+    kdf = time.perf_counter() - start
+    print(f"PBKDF2 600K (на каждую команду без агента): {kdf * 1000:.0f} ms")
+
+    if HAS_DILITHIUM:
+        _, private_key = ML_DSA_65.keygen()
+        sign = None
+    else:
+        private_key = os.urandom(32)
+        sign = lambda key, data: hmac.new(key, data, hashlib.sha256).digest()
+
+    agent = KeyAgent("mt" + "0" * 40, sign=sign)
+    agent.unlock(lambda: private_key)
+    with tempfile.TemporaryDirectory() as root:
+        server = AgentServer(Path(root) / "agent.sock", agent)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        client = AgentClient(server.path)
+
+        start = time.perf_counter()
+        for n in range(signatures):
+            client.sign(b"TRANSFER:%d" % n)
+        elapsed = time.perf_counter() - start
+
+        client.close()
+        server.shutdown()
+        server.server_close()
+
+    label = "ML-DSA-65" if HAS_DILITHIUM else "HMAC (dilithium-py не установлен)"
+    print(f"Агент, {label}: {signatures / elapsed:.0f} подписей/с, "
+          f"{elapsed / signatures * 1000:.3f} ms на подпись")
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# CLI
+# ═══════════════════════════════════════════════════════════════════════════════
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["--benchmark"]:
+        benchmark()
+        sys.exit(0)
+
+    # montana agent start запускает: montana_agent.py <address> <keys_dir> <ttl>
+    # Когнитивный ключ приходит строкой через stdin, не через argv
+    if len(sys.argv) != 4:
+        print("Usage: montana_agent.py <address> <keys_dir> <ttl>  (cognitive key on stdin)")
+        sys.exit(2)
+    if not HAS_DILITHIUM:
+        print("Установи dilithium-py: pip install dilithium-py")
+        sys.exit(1)
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    serve(sys.argv[1], Path(sys.argv[2]), sys.stdin.readline().rstrip("\n"), ttl=int(sys.argv[3]))
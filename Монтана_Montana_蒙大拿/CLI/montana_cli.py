@@ -10,15 +10,19 @@ Usage:
     montana restore       # Восстановить из когнитивного ключа
     montana balance       # Показать баланс
     montana send <addr> <amount>  # Перевод
+    montana send-batch <file>     # Пакетный перевод из CSV/JSONL
     montana status        # Статус сервиса
     montana presence      # Запустить сервис присутствия
+    montana agent start   # Разблокировать ключ на время (как ssh-agent)
 """
 
 import click
 import os
 import sys
+import csv
 import json
 import hashlib
+import hmac
 import getpass
 import time
 from pathlib import Path
@@ -39,6 +43,8 @@ except ImportError:
     print("Предупреждение: ML-KEM-768 недоступен. Ключи будут храниться без шифрования.")
     print("Установи: pip install kyber-py cryptography")
 
+from montana_agent import AGENT_SOCKET, AGENT_TTL, AgentError, connect_agent
+
 try:
     import requests
 except ImportError:
@@ -53,6 +59,13 @@ API_URL = "https://1394793-cy33234.tw1.ru"
 
 VERSION = "1.5.0"  # ML-KEM-768 integration
 
+# Присутствие: старый протокол — каждые 30 с; пачки — как скажет сервер
+PRESENCE_SYNC_INTERVAL = 30
+PRESENCE_MAX_SECONDS = 3600
+
+# Пакетный перевод: строк в одной подписанной пачке (сервер принимает до 1000)
+BATCH_TRANSFER_SIZE = 500
+
 
 @click.group()
 @click.version_option(version=VERSION, prog_name="montana")
@@ -188,15 +201,19 @@ def send(to_address, amount):
     if not click.confirm("Подтвердить?"):
         return
 
-    # Загружаем приватный ключ (требует когнитивный ключ если зашифрован)
-    private_key = load_private_key()
-    if not private_key:
+    # Агент ключей или приватный ключ (требует когнитивный ключ если зашифрован)
+    sign = get_signer(from_address)
+    if not sign:
         click.echo("Не удалось загрузить приватный ключ")
         return
 
     timestamp = int(time.time())
     message = f"TRANSFER:{from_address}:{to_address}:{amount}:{timestamp}"
-    signature = ML_DSA_65.sign(private_key, message.encode())
+    try:
+        signature = sign(message.encode())
+    except AgentError as e:
+        click.echo(f"Агент ключей: {e}")
+        return
 
     try:
         resp = requests.post(f"{API_URL}/api/transfer", json={
@@ -221,6 +238,78 @@ def send(to_address, amount):
         click.echo(f"Ошибка: {e}")
 
 
+@cli.command("send-batch")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--yes", is_flag=True, help="Не спрашивать подтверждение")
+def send_batch(path, yes):
+    """Пакетный перевод: CSV (адрес,сумма) или JSONL ({"to", "amount"})"""
+    config = load_config()
+    if not config:
+        click.echo("Сначала выполни: montana init")
+        return
+
+    from_address = config["address"]
+
+    try:
+        rows = read_transfers(path)
+    except ValueError as e:
+        click.echo(f"Ошибка в файле: {e}")
+        return
+    if not rows:
+        click.echo("Файл пуст")
+        return
+
+    total = sum(row["amount"] for row in rows)
+    click.echo(f"Отправить {total} на {len(rows)} адресов?")
+    if not yes and not click.confirm("Подтвердить?"):
+        return
+
+    # Ключ загружается один раз на все пачки (или подписывает агент)
+    sign = get_signer(from_address)
+    if not sign:
+        click.echo("Не удалось загрузить приватный ключ")
+        return
+    public_key = (KEYS_DIR / "public.key").read_bytes().hex()
+
+    # Одно keep-alive соединение на все пачки
+    http = requests.Session()
+    sent = 0
+    try:
+        for start in range(0, len(rows), BATCH_TRANSFER_SIZE):
+            chunk = rows[start:start + BATCH_TRANSFER_SIZE]
+            timestamp = int(time.time())
+            message = transfer_batch_message(from_address, timestamp, chunk)
+
+            resp = http.post(f"{API_URL}/api/transfer/batch", json={
+                "from_address": from_address,
+                "public_key": public_key,
+                "timestamp": timestamp,
+                "signature": sign(message.encode()).hex(),
+                "transfers": chunk
+            }, stream=True, timeout=60)
+
+            summary = read_batch_result(resp, start)
+            if not summary.get("committed"):
+                # Пачка атомарна: она не записана, следующие не отправляем
+                click.echo(f"Строки {start + 1}-{start + len(chunk)} не отправлены: "
+                           f"{summary.get('error') or resp.status_code}")
+                break
+
+            sent += summary["committed"]
+            click.echo(f"  Строки {start + 1}-{start + len(chunk)}: отправлено "
+                       f"(пачка {summary.get('batch_id')})")
+            if "new_balance" in summary:
+                click.echo(f"  Баланс: {summary['new_balance']}")
+    except AgentError as e:
+        click.echo(f"Агент ключей: {e}")
+    except Exception as e:
+        click.echo(f"Ошибка: {e}")
+    finally:
+        http.close()
+
+    click.echo(f"Отправлено {sent} из {len(rows)} переводов")
+
+
 @cli.command()
 def status():
     """Статус сервиса присутствия"""
@@ -263,43 +352,101 @@ def presence(daemon):
 
     address = config["address"]
 
+    # Подписанные пачки требуют ключ; daemon не может спросить когнитивный ключ,
+    # но может подписать через агент
+    sign = get_signer(address, prompt=not (daemon and config.get("encrypted")))
+
     if not daemon:
         click.echo(f"Сервис присутствия запущен")
         click.echo(f"   Адрес: {address}")
+        if not sign:
+            click.echo("   Ключ недоступен — синхронизация без подписи")
         click.echo("   Ctrl+C для остановки\n")
 
-    last_sync = 0
-    presence_seconds = 0
-
-    while True:
-        try:
-            time.sleep(1)
-            presence_seconds += 1
+    # Одно keep-alive соединение на всё время работы
+    http = requests.Session()
+    session = None
+    seq = 0
+    unsent = 0
+    interval = PRESENCE_SYNC_INTERVAL
+    mark = time.monotonic()
+    # Первый проход сразу: открыть сессию
+    next_sync = mark
+    stopping = False
 
-            # Синхронизация каждые 30 секунд
-            if time.time() - last_sync >= 30:
-                try:
-                    resp = requests.post(
+    try:
+        while not stopping:
+            try:
+                time.sleep(max(0.0, next_sync - time.monotonic()))
+            except KeyboardInterrupt:
+                stopping = True
+
+            # Секунды по монотонным часам: сон ноутбука не засчитывается
+            now = time.monotonic()
+            elapsed = int(now - mark)
+            unsent += elapsed
+            mark += elapsed
+            next_sync = now + interval
+
+            try:
+                if sign and (session is None or time.time() >= session["expires_at"]):
+                    try:
+                        session = open_presence_session(http, address, sign)
+                    except AgentError:
+                        # Агент истёк или перезапущен: переподключиться, иначе без подписи
+                        sign = get_signer(address, prompt=False)
+                        session = None
+                        next_sync = now
+                        continue
+                    seq = 0
+                    if session:
+                        interval = session["bundle_interval"]
+                        next_sync = now + interval
+
+                seconds = min(unsent, PRESENCE_MAX_SECONDS)
+                if seconds <= 0:
+                    continue
+
+                if session:
+                    # Сервер засчитывает не больше, чем длится сессия
+                    seconds = min(seconds, int(time.time() - session["opened_at"]))
+                    if seconds <= 0:
+                        continue
+                    resp = send_presence_bundle(http, session, seq + 1, seconds)
+                    if resp.status_code == 401:
+                        session = None
+                        next_sync = now
+                        continue
+                    if resp.status_code in (200, 409):
+                        # 409: пачка уже принята (потерян ответ) или не может быть доказана
+                        seq += 1
+                        unsent -= seconds
+                else:
+                    resp = http.post(
                         f"{API_URL}/api/presence",
                         headers={"X-Device-ID": address},
-                        json={"seconds": presence_seconds},
+                        json={"seconds": seconds},
                         timeout=10
                     )
                     if resp.status_code == 200:
-                        data = resp.json()
-                        presence_seconds = 0
-                        last_sync = time.time()
-                        if not daemon:
-                            bal = data.get("balance", "?")
-                            click.echo(f"  Синхронизировано | Баланс: {bal}")
-                except Exception as e:
-                    if not daemon:
-                        click.echo(f"  Ошибка синхронизации: {e}")
-
-        except KeyboardInterrupt:
-            if not daemon:
-                click.echo("\nОстановлено")
-            break
+                        unsent -= seconds
+
+                if resp.status_code == 200 and not daemon:
+                    data = resp.json() if not session else http.get(
+                        f"{API_URL}/api/user", headers={"X-Device-ID": address}, timeout=10
+                    ).json()
+                    bal = data.get("balance", "?")
+                    click.echo(f"  Синхронизировано | Баланс: {bal}")
+            except Exception as e:
+                if not daemon:
+                    click.echo(f"  Ошибка синхронизации: {e}")
+    except KeyboardInterrupt:
+        # Прерывание посреди запроса: остаток не отправляется
+        pass
+
+    http.close()
+    if not daemon:
+        click.echo("\nОстановлено")
 
 
 @cli.command()
@@ -334,6 +481,104 @@ def start():
         click.echo("Сервис запущен")
 
 
+@cli.group()
+def agent():
+    """Агент ключей: когнитивный ключ один раз на TTL"""
+    pass
+
+
+@agent.command("start")
+@click.option("--ttl", default=AGENT_TTL, show_default=True, help="Сколько секунд держать ключ")
+@click.option("--no-wait", is_flag=True, help="Не ждать окончания расшифровки")
+def agent_start(ttl, no_wait):
+    """Разблокировать ключ и запустить агент"""
+    import subprocess
+
+    config = load_config()
+    if not config:
+        click.echo("Сначала выполни: montana init")
+        return
+
+    address = config["address"]
+    client = connect_agent(address)
+    if client:
+        status = client.status()
+        client.close()
+        click.echo(f"Агент уже запущен: {status['state']}, ещё {status['expires_in']} с")
+        return
+
+    cognitive_key = getpass.getpass("Когнитивный ключ: ") if config.get("encrypted") else ""
+
+    # Отдельный процесс: расшифровка идёт в нём, команда возвращается сразу
+    script = Path(__file__).resolve().parent / "montana_agent.py"
+    proc = subprocess.Popen(
+        [sys.executable, str(script), address, str(KEYS_DIR), str(ttl)],
+        stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        start_new_session=True
+    )
+    proc.stdin.write(cognitive_key.encode() + b"\n")
+    proc.stdin.close()
+    del cognitive_key
+
+    # Сокет появляется до расшифровки
+    for _ in range(100):
+        client = connect_agent(address)
+        if client or proc.poll() is not None:
+            break
+        time.sleep(0.1)
+    if not client:
+        click.echo("Агент не запустился")
+        return
+
+    if no_wait:
+        click.echo(f"Агент запущен: {AGENT_SOCKET} (ключ расшифровывается)")
+        client.close()
+        return
+
+    click.echo("Расшифровываю ключ...")
+    try:
+        status = client.status(wait=True)
+    except AgentError as e:
+        status = {"state": "failed", "error": str(e)}
+    client.close()
+
+    if status["state"] == "ready":
+        click.echo(f"Агент запущен: {AGENT_SOCKET}")
+        click.echo(f"   Ключ в памяти {status['expires_in']} с")
+    else:
+        click.echo(f"Ошибка: {status.get('error') or status['state']}")
+
+
+@agent.command("stop")
+def agent_stop():
+    """Забыть ключ и остановить агент"""
+    config = load_config()
+    client = connect_agent(config["address"]) if config else None
+    if not client:
+        click.echo("Агент не запущен")
+        return
+
+    client.lock()
+    client.close()
+    click.echo("Агент остановлен")
+
+
+@agent.command("status")
+def agent_status():
+    """Состояние агента"""
+    config = load_config()
+    client = connect_agent(config["address"]) if config else None
+    if not client:
+        click.echo("Агент не запущен")
+        return
+
+    status = client.status()
+    client.close()
+    click.echo(f"Агент: {status['state']}")
+    if status["state"] == "ready":
+        click.echo(f"   Ключ в памяти ещё {status['expires_in']} с")
+
+
 # === Вспомогательные функции ===
 
 def generate_keys_from_cognitive(cognitive_key: str) -> str:
@@ -412,6 +657,100 @@ def register_on_server(address: str, cognitive_key: str):
     return resp.status_code == 200
 
 
+def open_presence_session(http, address: str, sign):
+    """Открыть сессию присутствия: одна подпись ML-DSA-65 вместо подписи на каждую пачку"""
+    public_key = (KEYS_DIR / "public.key").read_bytes()
+    timestamp = int(time.time())
+    message = f"PRESENCE_SESSION:{address}:{timestamp}"
+    signature = sign(message.encode())
+
+    resp = http.post(f"{API_URL}/api/presence/session", json={
+        "address": address,
+        "public_key": public_key.hex(),
+        "timestamp": timestamp,
+        "signature": signature.hex()
+    }, timeout=30)
+    if resp.status_code != 200:
+        return None
+
+    data = resp.json()
+    return {
+        "session_id": data["session_id"],
+        "key": bytes.fromhex(data["key"]),
+        "bundle_interval": data.get("bundle_interval", PRESENCE_SYNC_INTERVAL),
+        "opened_at": timestamp,
+        # Переоткрываем заранее, чтобы последняя пачка не попала на истёкшую сессию
+        "expires_at": timestamp + data.get("expires_in", 86400) - data.get("bundle_interval", 0) * 2
+    }
+
+
+def send_presence_bundle(http, session: dict, seq: int, seconds: int):
+    """Пачка присутствия, подписанная HMAC-SHA256 ключом сессии"""
+    body = json.dumps({"seq": seq, "seconds": seconds, "ts": time.time()}).encode()
+    mac = hmac.new(session["key"], body, hashlib.sha256).hexdigest()
+    return http.post(f"{API_URL}/api/presence/bundle", data=body, headers={
+        "Content-Type": "application/json",
+        "X-Presence-Session": session["session_id"],
+        "X-Presence-MAC": mac
+    }, timeout=10)
+
+
+def read_transfers(path: str) -> list:
+    """
+    Строки перевода из файла: [{"to_address", "amount"}, ...].
+
+    .jsonl/.json — объект на строку ({"to": ..., "amount": ...}),
+    иначе CSV: адрес,сумма (строка заголовка пропускается).
+    """
+    rows = []
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.endswith((".jsonl", ".json")):
+            records = ((n, json.loads(line)) for n, line in enumerate(f, 1) if line.strip())
+            pairs = ((n, r.get("to", r.get("to_address")), r.get("amount")) for n, r in records)
+        else:
+            pairs = ((n, *(r + [None, None])[:2]) for n, r in enumerate(csv.reader(f), 1) if r)
+
+        for n, to_address, amount in pairs:
+            to_address = str(to_address or "").strip()
+            try:
+                amount = int(str(amount).strip())
+            except ValueError:
+                if n == 1 and not rows:
+                    continue  # заголовок CSV
+                raise ValueError(f"строка {n}: сумма должна быть целым числом")
+            if not (to_address.startswith("mt") and len(to_address) == 42) or amount <= 0:
+                raise ValueError(f"строка {n}: неверный адрес или сумма")
+            rows.append({"to_address": to_address, "amount": amount})
+    return rows
+
+
+def transfer_batch_message(from_address: str, timestamp: int, transfers: list) -> str:
+    """Сообщение для подписи пачки (как transfer_batch_message в montana_api.py)"""
+    rows = "\n".join(f"{t['to_address']}:{t['amount']}" for t in transfers)
+    digest = hashlib.sha256(rows.encode()).hexdigest()
+    return f"TRANSFER_BATCH:{from_address}:{timestamp}:{digest}"
+
+
+def read_batch_result(resp, offset: int) -> dict:
+    """Читать NDJSON-ответ по мере прихода: ошибки строк сразу, в конце итог"""
+    if resp.headers.get("Content-Type", "").split(";")[0] != "application/x-ndjson":
+        try:
+            return {"error": resp.json().get("error")}
+        except ValueError:
+            return {"error": resp.status_code}
+
+    summary = {}
+    for line in resp.iter_lines():
+        if not line:
+            continue
+        item = json.loads(line)
+        if item.get("done"):
+            summary = item
+        elif item.get("status") == "error":
+            click.echo(f"  Строка {offset + item['row'] + 1}: {item['error']}")
+    return summary
+
+
 def load_config():
     """Загрузить конфигурацию"""
     if CONFIG_FILE.exists():
@@ -438,6 +777,27 @@ def load_private_key_internal(cognitive_key: str) -> bytes:
     return None
 
 
+def get_signer(address: str, prompt: bool = True):
+    """
+    Функция подписи sign(data) -> signature.
+
+    Агент ключей этого адреса подписывает без KDF; иначе ключ
+    загружается как обычно (prompt=False — не спрашивать когнитивный ключ).
+    """
+    client = connect_agent(address)
+    if client:
+        return client.sign
+
+    config = load_config()
+    if not prompt and config and config.get("encrypted"):
+        return None
+
+    private_key = load_private_key()
+    if not private_key:
+        return None
+    return lambda data: ML_DSA_65.sign(private_key, data)
+
+
 def load_private_key():
     """Загрузить приватный ключ (запрашивает когнитивный ключ если нужно)"""
     config = load_config()
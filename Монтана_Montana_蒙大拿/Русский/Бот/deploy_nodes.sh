@@ -37,7 +37,7 @@ SSH_USER="root"
 LOCAL_DIR="$(cd "$(dirname "$0")" && pwd)"
 
 # Файлы для деплоя
-FILES="junomontanaagibot.py montana_api.py leader_election.py junona_ai.py junona_agents.py node_crypto.py time_bank.py timechain.py dialogue_coordinator.py hippocampus.py junona_rag.py breathing_sync.py contracts.py council_voting.py montana_db.py sms_gateway.py webrtc_signaling.py wallet_wizard.py event_ledger.py requirements.txt junona.service"
+FILES="junomontanaagibot.py montana_api.py leader_election.py junona_ai.py junona_agents.py node_crypto.py node_wire.py time_bank.py timechain.py dialogue_coordinator.py hippocampus.py junona_rag.py breathing_sync.py contracts.py council_voting.py montana_db.py sms_gateway.py webrtc_signaling.py wallet_wizard.py event_ledger.py push_hub.py requirements.txt junona.service"
 
 # ═══════════════════════════════════════════════════════════════════════════════
 # ПАРСИНГ АРГУМЕНТОВ
@@ -42,7 +42,7 @@ deploy_to_node() {
     " 2>/dev/null
 
     # Copy core files
-    for FILE in montana_api.py montana_db.py node_crypto.py node_kem.py node_tls.py time_bank.py timechain.py time_ledger.py event_ledger.py breathing_sync.py leader_election.py nts_sync.py distributed_registry.py council_voting.py requirements.txt; do
+    for FILE in montana_api.py montana_db.py node_crypto.py node_kem.py node_tls.py node_wire.py time_bank.py timechain.py time_ledger.py event_ledger.py push_hub.py breathing_sync.py leader_election.py nts_sync.py distributed_registry.py council_voting.py requirements.txt; do
         if [ -f "$FILE" ]; then
             echo "   📄 $FILE"
             expect -c "
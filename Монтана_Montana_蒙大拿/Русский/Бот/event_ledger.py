@@ -29,7 +29,7 @@ import hashlib
 import os
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Dict, List, Optional, Any, Tuple
+from typing import Callable, Dict, List, Optional, Any, Tuple
 from dataclasses import dataclass, asdict
 import logging
 
@@ -47,6 +47,7 @@ class EventType:
     TRANSFER = "TRANSFER"           # Перевод между адресами
     ESCROW_LOCK = "ESCROW_LOCK"     # Заморозка для контракта
     ESCROW_RELEASE = "ESCROW_RELEASE"  # Освобождение escrow
+    CALL = "CALL"                   # Оплата звонков за окно агрегации
     GENESIS = "GENESIS"             # Начальное событие
 
 
@@ -186,6 +187,9 @@ class EventLedger:
         # Последний hash для цепочки
         self._last_hash = self.GENESIS_HASH
 
+        # Подписчики на новые события (push-канал API)
+        self._listeners: List[Callable[[List[Event]], None]] = []
+
         # Загружаем существующие события
         self._load_events()
 
@@ -283,6 +287,29 @@ class EventLedger:
                 f.write(json.dumps(event.to_dict(), ensure_ascii=False) + '\n')
             self._known_event_ids.add(event.event_id)
 
+    def _append_events(self, events: List[Event]):
+        """Записывает пачку событий одним write (append-only, thread-safe)"""
+        data = "".join(json.dumps(event.to_dict(), ensure_ascii=False) + '\n' for event in events)
+        with self._write_lock:
+            with open(self.events_file, 'a', encoding='utf-8') as f:
+                f.write(data)
+            self._known_event_ids.update(event.event_id for event in events)
+
+    def add_listener(self, callback: Callable[[List[Event]], None]):
+        """
+        callback(events) после записи и применения новых событий —
+        своих и смерженных. Вызывается в потоке записи: должен быть быстрым.
+        """
+        self._listeners.append(callback)
+
+    def _notify(self, events: List[Event]):
+        """Сообщает подписчикам; их ошибки не ломают запись"""
+        for callback in self._listeners:
+            try:
+                callback(events)
+            except Exception as e:
+                logger.error(f"Event listener failed: {e}")
+
     def _apply_event_to_balances(self, event: Event):
         """Применяет событие к кэшу балансов"""
         with self._balances_lock:
@@ -347,6 +374,7 @@ class EventLedger:
         self._last_hash = event.event_hash
 
         logger.info(f"EMIT: {amount} Ɉ → {to_addr} [{event.event_id}]")
+        self._notify([event])
         return event
 
     def transfer(
@@ -399,8 +427,113 @@ class EventLedger:
         self._last_hash = event.event_hash
 
         logger.info(f"TRANSFER: {from_addr} → {to_addr}, {amount} Ɉ [{event.event_id}]")
+        self._notify([event])
         return True, "OK", event
 
+    def transfer_batch(
+        self,
+        from_addr: str,
+        transfers: List[Tuple[str, int, Optional[Dict]]]
+    ) -> Tuple[bool, str, List[Event]]:
+        """
+        Создаёт пачку событий TRANSFER от одного отправителя — всё или ничего.
+
+        Баланс проверяется на сумму пачки; события идут одной цепочкой
+        prev_hash и пишутся в events.jsonl одной записью.
+
+        Args:
+            from_addr: Адрес отправителя
+            transfers: [(to_addr, amount, metadata), ...]
+
+        Returns:
+            (success, message, events)
+        """
+        from_addr = str(from_addr)
+        total = sum(amount for _, amount, _ in transfers)
+
+        # Проверка и запись под одним lock: параллельный перевод не вклинится
+        with self._balances_lock:
+            balance = self._balances.get(from_addr, 0)
+            if balance < total:
+                return False, f"Недостаточно средств: {balance} < {total}", []
+
+            events = []
+            prev_hash = self._last_hash
+            for to_addr, amount, metadata in transfers:
+                event = Event(
+                    event_id=self._generate_event_id(),
+                    event_type=EventType.TRANSFER,
+                    timestamp=time.time(),
+                    from_addr=from_addr,
+                    to_addr=str(to_addr),
+                    amount=amount,
+                    metadata=metadata or {},
+                    node_id=self.node_id,
+                    prev_hash=prev_hash,
+                    timestamp_ns=time.time_ns()
+                )
+                prev_hash = event.event_hash
+                events.append(event)
+
+            self._append_events(events)
+            for event in events:
+                self._apply_event_to_balances(event)
+            self._last_hash = prev_hash
+
+        logger.info(f"TRANSFER_BATCH: {from_addr} → {len(events)} адресов, {total} Ɉ")
+        self._notify(events)
+        return True, "OK", events
+
+    def record_calls(self, calls: List[Dict[str, Any]]) -> List[Event]:
+        """
+        Создаёт события CALL — пакет агрегатов CallMeter за окно.
+
+        Звонки уже оплачены (баланс проверен и списан при записи звонка),
+        поэтому баланс здесь не проверяется. События идут одной цепочкой
+        prev_hash и пишутся в events.jsonl одной записью.
+
+        Args:
+            calls: [{"caller", "callee", "call_type", "calls", "seconds", "cost"}, ...]
+
+        Returns:
+            Созданные события
+        """
+        if not calls:
+            return []
+
+        with self._balances_lock:
+            events = []
+            prev_hash = self._last_hash
+            for call in calls:
+                event = Event(
+                    event_id=self._generate_event_id(),
+                    event_type=EventType.CALL,
+                    timestamp=time.time(),
+                    from_addr=str(call["caller"]),
+                    to_addr=str(call["callee"]),
+                    amount=call["cost"],
+                    metadata={
+                        "call_type": call["call_type"],
+                        "calls": call["calls"],
+                        "duration_seconds": call["seconds"],
+                        "price_per_second": 1
+                    },
+                    node_id=self.node_id,
+                    prev_hash=prev_hash,
+                    timestamp_ns=time.time_ns()
+                )
+                prev_hash = event.event_hash
+                events.append(event)
+
+            self._append_events(events)
+            for event in events:
+                self._apply_event_to_balances(event)
+            self._last_hash = prev_hash
+
+        logger.info(f"CALLS: {len(events)} событий, {sum(e.amount for e in events)} Ɉ")
+        self._notify(events)
+        return events
+
     def escrow_lock(
         self,
         from_addr: str,
@@ -447,6 +580,7 @@ class EventLedger:
         self._last_hash = event.event_hash
 
         logger.info(f"ESCROW_LOCK: {from_addr} → {escrow_addr}, {amount} Ɉ")
+        self._notify([event])
         return True, "OK", event
 
     def escrow_release(
@@ -493,6 +627,7 @@ class EventLedger:
         self._last_hash = event.event_hash
 
         logger.info(f"ESCROW_RELEASE: {escrow_addr} → {to_addr}, {amount} Ɉ")
+        self._notify([event])
         return True, "OK", event
 
     # --------------------------------------------------------
@@ -504,6 +639,10 @@ class EventLedger:
         with self._balances_lock:
             return self._balances.get(str(address), 0)
 
+    def has_event(self, event_id: str) -> bool:
+        """Известно ли событие этому узлу (O(1), без чтения файла)"""
+        return event_id in self._known_event_ids
+
     def balances(self) -> Dict[str, int]:
         """Возвращает все балансы"""
         with self._balances_lock:
@@ -618,7 +757,7 @@ class EventLedger:
         Returns:
             Количество добавленных событий
         """
-        added = 0
+        merged = []
         for event_data in remote_events:
             event_id = event_data.get("event_id")
 
@@ -637,16 +776,18 @@ class EventLedger:
                 # Добавляем (thread-safe: _append_event handles write lock + cache)
                 self._append_event(event)
                 self._apply_event_to_balances(event)
-                added += 1
+                merged.append(event)
 
                 logger.info(f"MERGED: {event.event_type} {event_id}")
 
             except Exception as e:
                 logger.error(f"Error merging event {event_id}: {e}")
 
+        added = len(merged)
         if added > 0:
             self._save_balances_cache()
             logger.info(f"Merged {added} events from remote")
+            self._notify(merged)
 
         return added
 
@@ -695,6 +836,36 @@ def get_event_ledger() -> EventLedger:
         return _instance
 
 
+# ============================================================
+# БЕНЧМАРК
+# ============================================================
+
+def benchmark(transfers: int = 1000):
+    """Пакетный перевод против отдельных transfer() на временном ledger"""
+    import tempfile
+
+    logger.setLevel(logging.WARNING)
+    sender = "mt" + "0" * 40
+    rows = [("mt" + f"{i + 1:040x}", 1, {"tx_id": str(i)}) for i in range(transfers)]
+
+    for label, batched in (("transfer() × N", False), ("transfer_batch()", True)):
+        with tempfile.TemporaryDirectory() as root:
+            ledger = EventLedger(Path(root))
+            ledger.emit(sender, transfers)
+
+            start = time.perf_counter()
+            if batched:
+                ledger.transfer_batch(sender, rows)
+            else:
+                for to_addr, amount, metadata in rows:
+                    ledger.transfer(sender, to_addr, amount, metadata=metadata)
+            elapsed = time.perf_counter() - start
+
+            assert ledger.balance(sender) == 0
+            print(f"{label:18} {transfers} переводов: {elapsed * 1000:.0f} ms "
+                  f"({transfers / elapsed:.0f}/s)")
+
+
 # ============================================================
 # CLI
 # ============================================================
@@ -702,6 +873,10 @@ def get_event_ledger() -> EventLedger:
 if __name__ == "__main__":
     import sys
 
+    if sys.argv[1:2] == ["benchmark"]:
+        benchmark(int(sys.argv[2]) if len(sys.argv) > 2 else 1000)
+        sys.exit(0)
+
     ledger = get_event_ledger()
 
     if len(sys.argv) < 2:
@@ -716,6 +891,7 @@ EVENT LEDGER — Event Sourcing для Montana Protocol
     transfer <from> <to> <amount>  — перевод
     events [addr] [limit]  — история событий
     export          — экспорт событий в JSON
+    benchmark [n]   — пакетный перевод против отдельных
         """)
         sys.exit(0)
 
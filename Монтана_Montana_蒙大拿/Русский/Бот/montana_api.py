@@ -9,10 +9,12 @@ Endpoints:
 - /api/status          - Full Montana status
 - /api/balance/{addr}  - Balance by Montana address (mt...)
 - /api/transfer        - Transfer Ɉ between addresses
+- /api/transfer/batch  - Atomic batch of transfers (one signature, NDJSON results)
+- /api/node/events/stream - New events for an address via SSE (long-poll: /events/poll)
 - /api/timechain/*     - TimeChain operations
 """
 
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request
 from flask_cors import CORS
 import json
 import os
@@ -33,6 +35,13 @@ from decimal import Decimal, ROUND_DOWN, InvalidOperation
 # Post-quantum cryptography
 from node_crypto import verify_signature, public_key_to_address
 
+# Compact binary wire format for node-to-node payloads (JSON fallback)
+from node_wire import (
+    WIRE_MIME, JSON_MIME, ENCODINGS, ACCEPT_ENCODING,
+    accepts_wire, choose_encoding, decompress, pack_body,
+    loads as wire_loads, is_wire
+)
+
 # Event Sourcing — P2P replication layer
 try:
     from event_ledger import get_event_ledger, EventLedger, EventType
@@ -40,6 +49,15 @@ try:
 except ImportError:
     EVENT_LEDGER_AVAILABLE = False
 
+# Push channel — SSE / long-poll вместо опроса /api/node/events
+try:
+    from push_hub import (
+        ALL, RESYNC, SSE_HEADERS, HubFull, get_push_hub, long_poll, parse_last_id, sse_stream
+    )
+    PUSH_HUB_AVAILABLE = True
+except ImportError:
+    PUSH_HUB_AVAILABLE = False
+
 # TIME_BANK — T2 finalization engine
 try:
     from time_bank import get_time_bank
@@ -103,6 +121,10 @@ MAX_WALLETS = 100_000  # [FIX CWE-400] Disk DoS protection
 # [FIX CWE-20] Montana address validation
 MONTANA_ADDRESS_RE = re.compile(r'^mt[a-f0-9]{40}$')
 
+# Пакетные переводы: одна подпись на пачку, окно времени против повтора
+MAX_BATCH_TRANSFERS = 1000
+BATCH_TIMESTAMP_WINDOW = 300  # seconds
+
 # Montana Network Nodes
 NODES = {
     "amsterdam": {"ip": "72.56.102.240", "priority": 1, "location": "🇳🇱 Amsterdam"},
@@ -560,6 +582,174 @@ def api_transfer():
         "timestamp": datetime.utcnow().isoformat() + "Z"
     })
 
+_recent_batches = {}  # batch_id -> expires_at (защита от повтора пачки)
+_recent_batches_lock = threading.Lock()
+
+
+def transfer_batch_message(from_addr: str, timestamp, transfers: list) -> str:
+    """
+    Message to sign for a transfer batch (one ML-DSA-65 signature per batch):
+    "TRANSFER_BATCH:{from}:{timestamp}:{sha256 of 'to:amount' lines}"
+    """
+    rows = "\n".join(f"{t['to_address']}:{t['amount']}" for t in transfers)
+    digest = hashlib.sha256(rows.encode()).hexdigest()
+    return f"TRANSFER_BATCH:{from_addr}:{timestamp}:{digest}"
+
+
+def _claim_batch(batch_id: str) -> bool:
+    """Remember batch_id for the timestamp window; False if already seen"""
+    now = time_module.time()
+    with _recent_batches_lock:
+        for key in [k for k, expires in _recent_batches.items() if expires < now]:
+            del _recent_batches[key]
+        if batch_id in _recent_batches:
+            return False
+        _recent_batches[batch_id] = now + 2 * BATCH_TIMESTAMP_WINDOW
+        return True
+
+
+@app.route('/api/transfer/batch', methods=['POST'])
+@rate_limit(limit=10, window=60)
+def api_transfer_batch():
+    """
+    Atomic batch of transfers from one address.
+
+    Required fields:
+    - from_address, public_key, timestamp, signature
+    - transfers: [{"to_address": "mt...", "amount": int}, ...] (up to 1000)
+
+    Message to sign: transfer_batch_message(from, timestamp, transfers)
+
+    All rows are validated first; if any row fails or funds are short,
+    nothing is written. Otherwise all rows go to EventLedger in one write.
+    Response: NDJSON, one line per row, then a summary line.
+    """
+    if not EVENT_LEDGER_AVAILABLE:
+        return jsonify({"error": "LEDGER_UNAVAILABLE"}), 503
+
+    data = request.get_json(silent=True)
+    if not data:
+        return jsonify({"error": "NO_DATA", "message": "Request body required"}), 400
+
+    from_addr = data.get('from_address')
+    public_key = data.get('public_key')
+    timestamp = data.get('timestamp')
+    signature = data.get('signature')
+    transfers = data.get('transfers')
+
+    if not all([from_addr, public_key, timestamp, signature]) or not isinstance(transfers, list):
+        return jsonify({
+            "error": "MISSING_FIELDS",
+            "message": "Required: from_address, public_key, timestamp, signature, transfers"
+        }), 400
+
+    if not transfers or len(transfers) > MAX_BATCH_TRANSFERS:
+        return jsonify({
+            "error": "INVALID_BATCH_SIZE",
+            "message": f"1..{MAX_BATCH_TRANSFERS} transfers per batch"
+        }), 400
+
+    if not _validate_address(from_addr):
+        return jsonify({
+            "error": "INVALID_ADDRESS",
+            "message": "from_address must match format: mt + 40 hex chars"
+        }), 400
+
+    try:
+        if abs(time_module.time() - float(timestamp)) > BATCH_TIMESTAMP_WINDOW:
+            return jsonify({"error": "STALE_TIMESTAMP"}), 400
+    except (TypeError, ValueError):
+        return jsonify({"error": "INVALID_TIMESTAMP"}), 400
+
+    # Rows: the ledger works in whole Ɉ
+    errors = {}
+    for i, row in enumerate(transfers):
+        if not isinstance(row, dict):
+            errors[i] = "INVALID_ROW"
+            continue
+        to_addr = row.get('to_address')
+        amount = row.get('amount')
+        if not isinstance(to_addr, str) or not _validate_address(to_addr):
+            errors[i] = "INVALID_ADDRESS"
+        elif to_addr == from_addr:
+            errors[i] = "SELF_TRANSFER"
+        elif not isinstance(amount, int) or isinstance(amount, bool) or amount <= 0:
+            errors[i] = "INVALID_AMOUNT"
+    if errors:
+        return _stream_batch_result(transfers, errors=errors)
+
+    # One signature covers the whole batch
+    if public_key_to_address(public_key) != from_addr:
+        return jsonify({
+            "error": "ADDRESS_MISMATCH",
+            "message": "Public key does not match from_address"
+        }), 403
+
+    message = transfer_batch_message(from_addr, timestamp, transfers)
+    if not verify_signature_beta(public_key, message, signature):
+        return jsonify({
+            "error": "INVALID_SIGNATURE",
+            "message": "Signature verification failed"
+        }), 403
+
+    batch_id = hashlib.sha256(message.encode()).hexdigest()[:16]
+    if not _claim_batch(batch_id):
+        return jsonify({"error": "DUPLICATE_BATCH", "batch_id": batch_id}), 409
+
+    try:
+        ledger = get_event_ledger()
+        ok, msg, events = ledger.transfer_batch(from_addr, [
+            (row['to_address'], row['amount'], {
+                "tx_id": f"{batch_id}.{i}",
+                "batch_id": batch_id,
+                "timestamp": timestamp,
+                "pq_signed": True
+            })
+            for i, row in enumerate(transfers)
+        ])
+    except Exception as e:
+        log.error(f"EventLedger batch transfer error: {e}")
+        return jsonify({"error": "LEDGER_ERROR", "message": str(e)}), 500
+
+    if not ok:
+        return _stream_batch_result(transfers, rejected=msg, batch_id=batch_id)
+
+    _push_events_to_peers([event.to_dict() for event in events])
+    return _stream_batch_result(transfers, events=events, batch_id=batch_id,
+                                new_balance=ledger.balance(from_addr))
+
+
+def _stream_batch_result(transfers, errors=None, events=None, rejected=None,
+                         batch_id=None, new_balance=None):
+    """NDJSON: a line per row as it is serialized, then the summary line"""
+    def generate():
+        for i, row in enumerate(transfers):
+            line = {"row": i}
+            if events:
+                line.update(status="ok", tx_id=events[i].metadata["tx_id"],
+                            event_id=events[i].event_id)
+            elif errors and i in errors:
+                line.update(status="error", error=errors[i])
+            else:
+                # Atomic batch: the row is valid but was not written
+                line.update(status="skipped")
+            yield json.dumps(line) + "\n"
+
+        summary = {
+            "done": True,
+            "committed": len(events) if events else 0,
+            "batch_id": batch_id,
+            "error": rejected or ("INVALID_ROWS" if errors else None),
+            "timestamp": datetime.utcnow().isoformat() + "Z"
+        }
+        if new_balance is not None:
+            summary["new_balance"] = new_balance
+        yield json.dumps(summary) + "\n"
+
+    status = 200 if events else 400
+    return Response(generate(), status=status, mimetype='application/x-ndjson')
+
+
 @app.route('/api/register', methods=['POST'])
 @rate_limit(limit=5, window=60)
 def api_register():
@@ -1406,24 +1596,7 @@ def api_node_events():
             events = ledger.get_events(limit=limit)
             event_list = [e.to_dict() for e in events]
 
-        # Enrich events with aliases from registry
-        registry = load_registry() or {}
-        addr_to_alias = {}
-        for crypto_hash, info in registry.get("wallets", {}).items():
-            addr = f"mt{crypto_hash}"
-            number = info.get("number", "?")
-            custom_alias = info.get("custom_alias", "")
-            display = custom_alias if custom_alias else f"\u0248-{number}"
-            addr_to_alias[addr] = display
-
-        for evt in event_list:
-            to_addr = evt.get("to_addr", "")
-            from_addr = evt.get("from_addr", "")
-            evt["to_alias"] = addr_to_alias.get(to_addr, "")
-            evt["from_alias"] = addr_to_alias.get(from_addr, "")
-            # TIME_BANK emissions have no from_addr
-            if evt.get("event_type") == "EMISSION" and not from_addr:
-                evt["from_alias"] = "\u0248-0"
+        _enrich_aliases(event_list)
 
         return jsonify({
             "events": event_list,
@@ -1435,6 +1608,152 @@ def api_node_events():
         return jsonify({"error": "SYNC_ERROR", "message": str(e)}), 500
 
 
+def _enrich_aliases(event_list):
+    """Enrich event dicts in place with aliases from registry"""
+    registry = load_registry() or {}
+    addr_to_alias = {}
+    for crypto_hash, info in registry.get("wallets", {}).items():
+        addr = f"mt{crypto_hash}"
+        number = info.get("number", "?")
+        custom_alias = info.get("custom_alias", "")
+        display = custom_alias if custom_alias else f"\u0248-{number}"
+        addr_to_alias[addr] = display
+
+    for evt in event_list:
+        to_addr = evt.get("to_addr", "")
+        from_addr = evt.get("from_addr", "")
+        evt["to_alias"] = addr_to_alias.get(to_addr, "")
+        evt["from_alias"] = addr_to_alias.get(from_addr, "")
+        # TIME_BANK emissions have no from_addr
+        if evt.get("event_type") == "EMISSION" and not from_addr:
+            evt["from_alias"] = "\u0248-0"
+    return event_list
+
+
+_event_hub_lock = threading.Lock()
+_event_hub_ready = False
+
+
+def _event_hub():
+    """
+    Push hub fed by EventLedger: each new event (own or merged from a peer)
+    goes to subscribers of "address:<from>" and "address:<to>"
+    """
+    global _event_hub_ready
+    hub = get_push_hub()
+    with _event_hub_lock:
+        if not _event_hub_ready:
+            def publish(events):
+                for event in events:
+                    data = event.to_dict()
+                    hub.publish([f"address:{event.from_addr}", f"address:{event.to_addr}"],
+                                data["event_type"], data)
+
+            get_event_ledger().add_listener(publish)
+            _event_hub_ready = True
+    return hub
+
+
+def _event_subscription():
+    """Subscription for ?address= (or all events), resuming from Last-Event-ID / last_id"""
+    address = request.args.get('address', '')
+    last_id = parse_last_id(request.headers.get('Last-Event-ID') or request.args.get('last_id'))
+    keys = [f"address:{address}"] if address else [ALL]
+    return _event_hub().subscribe(keys, last_id)
+
+
+def _with_aliases(messages):
+    """Alias enrichment for events delivered by the hub (copies: hub data is shared)"""
+    enriched = [(seq, event_type, data if event_type == RESYNC else dict(data))
+                for seq, event_type, data in messages]
+    _enrich_aliases([data for _, event_type, data in enriched if event_type != RESYNC])
+    return enriched
+
+
+@app.route('/api/node/events/stream')
+@rate_limit(limit=30, window=60)
+def api_node_events_stream():
+    """
+    Push channel for new events — replaces polling /api/node/events.
+
+    GET /api/node/events/stream?address=mt...     (text/event-stream)
+    Header Last-Event-ID — resume after reconnect (sent by EventSource automatically)
+
+    Each SSE message: id = hub seq, event = event_type, data = event JSON
+    (with to_alias/from_alias). "resync" — missed too much, refetch
+    /api/node/events once. Heartbeat comment every 15 s.
+
+    nginx: proxy_buffering off; proxy_read_timeout > 15s
+    """
+    if not EVENT_LEDGER_AVAILABLE:
+        return jsonify({"error": "EVENT_LEDGER_UNAVAILABLE"}), 503
+    if not PUSH_HUB_AVAILABLE:
+        return jsonify({"error": "PUSH_UNAVAILABLE"}), 503
+
+    try:
+        sub = _event_subscription()
+    except HubFull:
+        return jsonify({"error": "TOO_MANY_SUBSCRIBERS"}), 503
+
+    return Response(sse_stream(sub, transform=_with_aliases),
+                    mimetype='text/event-stream', headers=SSE_HEADERS)
+
+
+@app.route('/api/node/events/poll')
+@rate_limit(limit=120, window=60)
+def api_node_events_poll():
+    """
+    Long-poll fallback for clients without SSE.
+
+    GET /api/node/events/poll?address=mt...&last_id=N&timeout=25
+    Returns as soon as there are events (or after timeout):
+    {"events": [{"id": N, "type": "TRANSFER", "data": {...}}], "last_id": N}
+    Pass last_id back in the next request — nothing is lost between polls.
+    """
+    if not EVENT_LEDGER_AVAILABLE:
+        return jsonify({"error": "EVENT_LEDGER_UNAVAILABLE"}), 503
+    if not PUSH_HUB_AVAILABLE:
+        return jsonify({"error": "PUSH_UNAVAILABLE"}), 503
+
+    try:
+        timeout = float(request.args.get('timeout', 25))
+        sub = _event_subscription()
+    except ValueError:
+        return jsonify({"error": "Invalid timeout"}), 400
+    except HubFull:
+        return jsonify({"error": "TOO_MANY_SUBSCRIBERS"}), 503
+
+    return jsonify(long_poll(sub, timeout, transform=_with_aliases))
+
+
+def _node_payload():
+    """
+    Request body from a peer: mw1 (Content-Type: WIRE_MIME) or JSON,
+    optionally compressed (Content-Encoding: zstd / deflate)
+    """
+    try:
+        body = decompress(request.get_data(), request.headers.get('Content-Encoding'))
+        if request.mimetype == WIRE_MIME:
+            return wire_loads(body)
+        return json.loads(body)
+    except ValueError:
+        return None
+
+
+def _node_response(payload, status=200):
+    """
+    Reply in mw1 if the peer advertised it in Accept, otherwise JSON;
+    compressed with the best encoding from Accept-Encoding
+    """
+    binary = accepts_wire(request.headers.get('Accept'))
+    body, encoding = pack_body(payload, binary, choose_encoding(request.headers.get('Accept-Encoding')))
+    response = Response(body, status=status, mimetype=WIRE_MIME if binary else JSON_MIME)
+    response.headers['Vary'] = 'Accept, Accept-Encoding'
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    return response
+
+
 @app.route('/api/node/sync', methods=['POST'])
 @rate_limit(limit=30, window=60)
 def api_node_sync():
@@ -1447,6 +1766,11 @@ def api_node_sync():
         "last_event_id": "...",   # last event the peer knows about
         "node_id": "..."          # peer's node_id
     }
+    Body and response may be mw1 (node_wire): Content-Type / Accept
+    application/x-montana-wire. Peers that don't send it get JSON.
+    Both directions may be compressed: Content-Encoding / Accept-Encoding
+    zstd or deflate. In mw1, batches are column tables with repeated
+    addresses and node IDs dictionary-coded.
 
     Returns: {
         "merged": N,              # events we accepted from peer
@@ -1458,7 +1782,7 @@ def api_node_sync():
     if not EVENT_LEDGER_AVAILABLE:
         return jsonify({"error": "EVENT_LEDGER_UNAVAILABLE"}), 503
 
-    data = request.get_json()
+    data = _node_payload()
     if not data:
         return jsonify({"error": "NO_DATA"}), 400
 
@@ -1482,7 +1806,7 @@ def api_node_sync():
         new_events = ledger.get_events_since(last_known_id)
         event_list = [e.to_dict() for e in new_events[:2000]]
 
-        return jsonify({
+        return _node_response({
             "merged": merged,
             "events": event_list,
             "node_id": ledger.node_id,
@@ -1755,16 +2079,30 @@ def _push_event_to_peers(event_dict: dict):
     Только события созданные ЭТИМ узлом (без relay).
     ThreadPoolExecutor с лимитом 3 потоков.
     """
+    _push_events_to_peers([event_dict])
+
+
+def _push_events_to_peers(event_dicts: list):
+    """
+    INSTANT PUSH пачкой: один запрос на пира для всех событий
+    (пакетный перевод — не 1000 запросов, а один).
+    """
     # Без relay — только свои события
-    if event_dict.get("node_id") != NODE_ID:
+    event_dicts = [e for e in event_dicts if e.get("node_id") == NODE_ID]
+    if not event_dicts:
         return
 
     import urllib.request
 
+    if len(event_dicts) == 1:
+        body = {"event": event_dicts[0]}
+    else:
+        body = {"events": event_dicts}
+
     def _push_to_peer(peer):
         try:
             push_data = json.dumps({
-                "event": event_dict,
+                **body,
                 "source_node": NODE_ID,
                 "timestamp_ns": time_module.time_ns()
             }).encode('utf-8')
@@ -1778,7 +2116,7 @@ def _push_event_to_peers(event_dict: dict):
             with urllib.request.urlopen(req, timeout=5) as resp:
                 result = json.loads(resp.read())
                 if result.get("accepted"):
-                    log.info(f"PUSH: event → {peer['name']} (instant)")
+                    log.info(f"PUSH: {len(event_dicts)} event(s) → {peer['name']} (instant)")
         except Exception as e:
             log.debug(f"PUSH to {peer['name']}: {e}")
 
@@ -1800,24 +2138,31 @@ def api_node_push_event():
         return jsonify({"accepted": False, "reason": "no_ledger"}), 503
 
     data = request.get_json(silent=True) or {}
-    event_data = data.get("event")
     source_node = data.get("source_node", "unknown")
 
+    # Одно событие ("event") или пачка ("events") от пакетного перевода
+    events = data.get("events")
+    if events is None:
+        events = [data.get("event")]
+
     # Validate source is a known peer
     known_names = {p["name"] for p in PEER_NODES}
     if source_node not in known_names:
         return jsonify({"accepted": False, "reason": "unknown_peer"}), 403
 
-    if not event_data or not isinstance(event_data, dict):
+    if (not isinstance(events, list) or not events or len(events) > MAX_BATCH_TRANSFERS
+            or not all(e and isinstance(e, dict) for e in events)):
         return jsonify({"accepted": False, "reason": "invalid_event"}), 400
 
     try:
         ledger = get_event_ledger()
-        merged = ledger.merge_events([event_data])
+        fresh = [e for e in events if not ledger.has_event(e.get("event_id"))]
+        merged = ledger.merge_events(fresh)
 
         if merged > 0:
-            _apply_ledger_events_to_wallets([event_data])
-            log.info(f"PUSH RECEIVED: {event_data.get('event_type')} from {source_node} (instant)")
+            # В кэш кошельков — только реально принятые (не дубли, не битые)
+            _apply_ledger_events_to_wallets([e for e in fresh if ledger.has_event(e.get("event_id"))])
+            log.info(f"PUSH RECEIVED: {merged} event(s) from {source_node} (instant)")
             return jsonify({
                 "accepted": True,
                 "merged": merged,
@@ -2327,6 +2672,32 @@ def api_call_calculate():
         return jsonify({"error": str(e)}), 500
 
 
+def _flush_call_ledger(batch: list):
+    """
+    Ledger sink для CallMeter: одно событие на (звонящий, вызываемый, тип)
+    за окно агрегации вместо события на каждый звонок.
+    """
+    if not EVENT_LEDGER_AVAILABLE:
+        return
+
+    try:
+        events = get_event_ledger().record_calls(batch)
+    except Exception as ledger_err:
+        log.error(f"EventLedger call batch error: {ledger_err}")
+        return
+    _push_events_to_peers([event.to_dict() for event in events])
+
+
+def _get_call_meter():
+    """CallMeter с подключённым EventLedger sink"""
+    from montana_auction import get_call_meter
+
+    meter = get_call_meter(DATA_DIR)
+    if meter.ledger_sink is None:
+        meter.ledger_sink = _flush_call_ledger
+    return meter
+
+
 @app.route('/api/call/record', methods=['POST'])
 @rate_limit(limit=30, window=60)
 def api_call_record():
@@ -2372,10 +2743,6 @@ def api_call_record():
         return jsonify({"error": "INVALID_DURATION"}), 400
 
     try:
-        from montana_auction import get_phone_service
-
-        phones = get_phone_service(DATA_DIR)
-
         # Проверить что у звонящего есть номер
         # (упрощенная проверка — ищем любой номер владельца)
         wallets = load_wallets()
@@ -2402,23 +2769,14 @@ def api_call_record():
             f"{call_type} {duration}s ({cost} Ɉ)"
         )
 
-        # Создать событие в EventLedger
-        if EVENT_LEDGER_AVAILABLE:
-            try:
-                ledger = get_event_ledger()
-                ledger.add_event(
-                    event_type=f"call_{call_type}",
-                    from_address=caller_address,
-                    to_address=callee_address,
-                    amount=cost,
-                    metadata={
-                        "call_type": call_type,
-                        "duration_seconds": duration,
-                        "price_per_second": 1
-                    }
-                )
-            except Exception as ledger_err:
-                log.error(f"EventLedger error: {ledger_err}")
+        # Событие в EventLedger уходит пакетом через CallMeter
+        _get_call_meter().record(
+            call_type,
+            duration,
+            caller_address,
+            callee_address=callee_address,
+            cost=cost
+        )
 
         return jsonify({
             "success": True,
@@ -2639,6 +2997,10 @@ def _p2p_sync_loop():
 
     # Track last known event_id per peer
     last_known = {}
+    # Peers that answered in mw1 — we send them mw1 too
+    wire_peers = set()
+    # Content-Encoding each peer used in its replies — we compress to it the same way
+    peer_encoding = {}
 
     while True:
         try:
@@ -2660,24 +3022,38 @@ def _p2p_sync_loop():
                     our_event_list = [e.to_dict() for e in our_events[:500]]
 
                     # Bidirectional sync via POST /api/node/sync
-                    sync_data = json.dumps({
+                    binary = peer["name"] in wire_peers
+                    sync_data, encoding = pack_body({
                         "events": our_event_list,
                         "last_event_id": peer_last,
                         "node_id": NODE_ID
-                    }).encode('utf-8')
+                    }, binary, peer_encoding.get(peer["name"]))
+
+                    headers = {
+                        "Content-Type": WIRE_MIME if binary else JSON_MIME,
+                        "Accept": f"{WIRE_MIME}, {JSON_MIME}",
+                        "Accept-Encoding": ACCEPT_ENCODING
+                    }
+                    if encoding:
+                        headers["Content-Encoding"] = encoding
 
                     req = urllib.request.Request(
                         f"{peer['url']}/api/node/sync",
                         data=sync_data,
-                        headers={
-                            "Content-Type": "application/json",
-                            "Accept": "application/json"
-                        },
+                        headers=headers,
                         method="POST"
                     )
 
                     with urllib.request.urlopen(req, timeout=15) as resp:
-                        resp_data = json.loads(resp.read())
+                        reply_encoding = resp.headers.get("Content-Encoding")
+                        body = decompress(resp.read(), reply_encoding)
+                        resp_data = wire_loads(body)
+                        if is_wire(body):
+                            wire_peers.add(peer["name"])
+                        else:
+                            wire_peers.discard(peer["name"])
+                        if reply_encoding in ENCODINGS:
+                            peer_encoding[peer["name"]] = reply_encoding
 
                         # Merge events from peer
                         remote_events = resp_data.get("events", [])
@@ -2698,6 +3074,9 @@ def _p2p_sync_loop():
                             log.info(f"P2P SYNC: {peer['name']} accepted {peer_merged} of our events")
 
                 except Exception as e:
+                    # Peer may have been downgraded — next round falls back to plain JSON
+                    wire_peers.discard(peer["name"])
+                    peer_encoding.pop(peer["name"], None)
                     log.debug(f"P2P sync with {peer['name']}: {e}")
 
                 # ── WALLET STATE SYNC ──
@@ -2816,6 +3195,7 @@ if __name__ == '__main__':
 ║    GET  /api/status              - Full status                ║
 ║    GET  /api/balance/<address>   - Get balance                ║
 ║    POST /api/transfer            - Transfer Ɉ                 ║
+║    POST /api/transfer/batch      - Atomic batch of transfers  ║
 ║    POST /api/presence            - Presence heartbeat         ║
 ║    POST /api/register            - Register wallet            ║
 ║    POST /api/agent/register      - AI agent wallet            ║
@@ -15,12 +15,15 @@ Montana Protocol — Ascending Auction System
 - Всем будущим сервисам
 """
 
+import atexit
 import json
+import os
 import threading
 import fcntl
 import time
+from collections import deque
 from pathlib import Path
-from typing import Dict, Optional, List
+from typing import Dict, Optional, List, Callable, Tuple
 from datetime import datetime
 import logging
 
@@ -62,67 +65,357 @@ class ServiceType:
 
 
 # ═══════════════════════════════════════════════════════════════════════════════
-#                            AUCTION COUNTER REGISTRY
+#                            AUCTION STORAGE ENGINE
 # ═══════════════════════════════════════════════════════════════════════════════
 
-class AuctionRegistry:
+# Сколько записей журнала накапливается до компакции в snapshot-файлы
+JOURNAL_COMPACT_EVERY = 5000
+
+
+class AuctionStore:
     """
-    Реестр счетчиков аукциона для каждого типа сервиса.
-    Консенсус между 3 узлами Montana Network.
+    Хранилище аукциона: состояние в памяти + append-only журнал.
+
+    Файлы:
+    - auction_counters.json, auction_purchases.json,
+      domains.json, phone_numbers.json — snapshot (формат не изменился)
+    - auction_journal.jsonl — мутации после последнего snapshot
+    - auction_journal.jsonl.1 — журнал, который сворачивается в фоне
+
+    Покупка, регистрация и учёт звонка = одна строка в журнал, O(1).
+    Раз в JOURNAL_COMPACT_EVERY записей журнал переименовывается, запросы
+    пишут в новый, а snapshot из копии состояния пишет фоновый поток —
+    запрос, на который пришёлся порог, не ждёт перезаписи snapshot.
+
+    Все операции журнала идемпотентны (покупки дедуплицируются по
+    purchase_number, звонки хранят итоговые счётчики, а не дельты),
+    поэтому сбой между записью snapshot и очисткой журнала безопасен.
+
+    Один экземпляр на data_dir (см. get_auction_store) — состояние
+    принадлежит процессу API.
     """
 
-    def __init__(self, data_dir: Path):
+    DOMAINS = "domains"
+    PHONES = "phones"
+
+    def __init__(self, data_dir: Path, compact_every: int = JOURNAL_COMPACT_EVERY):
         self.data_dir = data_dir
         self.data_dir.mkdir(parents=True, exist_ok=True)
-        self.auction_file = self.data_dir / "auction_counters.json"
+        self.counters_file = self.data_dir / "auction_counters.json"
         self.purchases_file = self.data_dir / "auction_purchases.json"
-        self._lock = threading.Lock()
-        self._ensure_files()
-
-    def _ensure_files(self):
-        """Создать файлы аукциона если не существуют"""
-        if not self.auction_file.exists():
-            self._save_counters({service: 0 for service in ServiceType.all()})
-        if not self.purchases_file.exists():
-            self._save_purchases([])
-
-    def _load_counters(self) -> Dict[str, int]:
-        """Загрузить счетчики аукциона (thread-safe)"""
-        with open(self.auction_file, 'r') as f:
+        self.journal_file = self.data_dir / "auction_journal.jsonl"
+        self.rotated_file = self.data_dir / "auction_journal.jsonl.1"
+        self.map_files = {
+            self.DOMAINS: self.data_dir / "domains.json",
+            self.PHONES: self.data_dir / "phone_numbers.json",
+        }
+        self.compact_every = compact_every
+        self._lock = threading.RLock()
+
+        # Состояние в памяти
+        self.counters: Dict[str, int] = {}
+        self.purchases: List[Dict] = []
+        self.maps: Dict[str, Dict[str, Dict]] = {name: {} for name in self.map_files}
+
+        # Индекс истории: service_type → позиции в self.purchases
+        self._history: Dict[str, List[int]] = {}
+        self._revenue: Dict[str, int] = {}
+
+        self._journal = None
+        self._journal_records = 0
+        # Запись snapshot-файлов: одна за раз (фоновая или синхронная)
+        self._compact_lock = threading.Lock()
+        self._compactor: Optional[threading.Thread] = None
+
+        self._load()
+
+    # ─────────────────────────────────────────────────────────────────────────
+    #                            LOAD / REPLAY
+    # ─────────────────────────────────────────────────────────────────────────
+
+    @staticmethod
+    def _read_json(path: Path, default):
+        """Прочитать snapshot (shared lock)"""
+        if not path.exists():
+            return default
+        with open(path, 'r') as f:
             fcntl.flock(f.fileno(), fcntl.LOCK_SH)
             try:
-                data = json.load(f)
+                return json.load(f)
             finally:
                 fcntl.flock(f.fileno(), fcntl.LOCK_UN)
-        return data
 
-    def _save_counters(self, counters: Dict[str, int]):
-        """Сохранить счетчики аукциона (thread-safe)"""
-        with open(self.auction_file, 'w') as f:
-            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
-            try:
-                json.dump(counters, f, indent=2)
-            finally:
-                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    @staticmethod
+    def _write_json(path: Path, data):
+        """Атомарно записать snapshot (tmp + rename)"""
+        tmp = path.with_suffix(path.suffix + ".tmp")
+        with open(tmp, 'w') as f:
+            json.dump(data, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+    def _load(self):
+        """Загрузить snapshot и доиграть журнал"""
+        counters = self._read_json(self.counters_file, None)
+        self.counters = counters if counters is not None else {s: 0 for s in ServiceType.all()}
+
+        for purchase in self._read_json(self.purchases_file, []):
+            self._index_purchase(purchase)
+
+        for name, path in self.map_files.items():
+            self.maps[name] = self._read_json(path, {})
+
+        replayed = skipped = 0
+        # Сначала журнал, не успевший свернуться в фоне до сбоя
+        for journal in (self.rotated_file, self.journal_file):
+            if not journal.exists():
+                continue
+            with open(journal, 'r') as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        self._apply(json.loads(line))
+                        replayed += 1
+                    except (ValueError, KeyError) as e:
+                        # Оборванная последняя строка после сбоя
+                        log.warning(f"Auction journal: skipping bad record: {e}")
+                        skipped += 1
+
+        if replayed or skipped or counters is None:
+            self._compact_locked()
+        else:
+            self._open_journal()
 
-    def _load_purchases(self) -> List[Dict]:
-        """Загрузить историю покупок"""
-        with open(self.purchases_file, 'r') as f:
-            fcntl.flock(f.fileno(), fcntl.LOCK_SH)
-            try:
-                data = json.load(f)
-            finally:
-                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
-        return data
+        if replayed:
+            log.info(f"Auction journal replayed: {replayed} records")
 
-    def _save_purchases(self, purchases: List[Dict]):
-        """Сохранить историю покупок"""
-        with open(self.purchases_file, 'w') as f:
-            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
-            try:
-                json.dump(purchases, f, indent=2)
-            finally:
-                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    def _index_purchase(self, purchase: Dict) -> bool:
+        """Добавить покупку в память и индекс (False если уже есть)"""
+        service_type = purchase.get("service_type")
+        positions = self._history.setdefault(service_type, [])
+
+        number = purchase.get("purchase_number", 0)
+        if positions and self.purchases[positions[-1]].get("purchase_number", 0) >= number:
+            return False
+
+        positions.append(len(self.purchases))
+        self.purchases.append(purchase)
+        self._revenue[service_type] = self._revenue.get(service_type, 0) + purchase.get("price_paid", 0)
+        return True
+
+    def _apply(self, record: Dict):
+        """Применить запись журнала к состоянию в памяти"""
+        op = record["op"]
+        if op == "purchase":
+            purchase = record["purchase"]
+            service_type = purchase["service_type"]
+            self._index_purchase(purchase)
+            self.counters[service_type] = max(
+                self.counters.get(service_type, 0), purchase["purchase_number"]
+            )
+        elif op == "set":
+            self.maps[record["map"]][record["key"]] = record["value"]
+        elif op == "update":
+            entry = self.maps[record["map"]].get(record["key"])
+            if entry is not None:
+                entry.update(record["fields"])
+        else:
+            raise ValueError(f"unknown op {op!r}")
+
+    # ─────────────────────────────────────────────────────────────────────────
+    #                            JOURNAL
+    # ─────────────────────────────────────────────────────────────────────────
+
+    def _open_journal(self):
+        if self._journal is None:
+            self._journal = open(self.journal_file, 'a')
+
+    def _append(self, record: Dict):
+        """Записать мутацию в журнал и применить её (lock удерживается)"""
+        self._open_journal()
+        fcntl.flock(self._journal.fileno(), fcntl.LOCK_EX)
+        try:
+            self._journal.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self._journal.flush()
+        finally:
+            fcntl.flock(self._journal.fileno(), fcntl.LOCK_UN)
+
+        self._apply(record)
+        self._journal_records += 1
+        if self._journal_records >= self.compact_every:
+            self._rotate_locked()
+
+    def _snapshot(self) -> Dict[Path, object]:
+        """Содержимое snapshot-файлов из текущего состояния"""
+        files = {self.counters_file: self.counters, self.purchases_file: self.purchases}
+        for name, path in self.map_files.items():
+            files[path] = self.maps[name]
+        return files
+
+    def _write_snapshot(self, files: Dict[Path, object]):
+        for path, data in files.items():
+            self._write_json(path, data)
+
+    def _rotate_locked(self):
+        """
+        Порог журнала: переименовать журнал и свернуть его в фоне.
+        Под lock только копия состояния и rename; запись JSON и fsync —
+        в потоке компакции. Если фоновая компакция ещё идёт, журнал
+        продолжает расти до следующего порога.
+        """
+        if not self._compact_lock.acquire(blocking=False):
+            return
+        if self.rotated_file.exists():
+            # Прошлая фоновая компакция не завершилась — сворачиваем синхронно
+            self._compact_lock.release()
+            self._compact_locked()
+            return
+
+        # Записи карт меняются на месте (update_entry) — копируются по одной
+        files = {self.counters_file: dict(self.counters), self.purchases_file: list(self.purchases)}
+        for name, path in self.map_files.items():
+            files[path] = {key: dict(entry) for key, entry in self.maps[name].items()}
+
+        self._journal.close()
+        os.replace(self.journal_file, self.rotated_file)
+        self._journal = open(self.journal_file, 'w')
+        self._journal_records = 0
+
+        self._compactor = threading.Thread(
+            target=self._compact_rotated, args=(files,),
+            name="Auction-Compact", daemon=True
+        )
+        self._compactor.start()
+
+    def _compact_rotated(self, files: Dict[Path, object]):
+        """Фоновый поток: snapshot из копии, затем удаление свёрнутого журнала"""
+        try:
+            self._write_snapshot(files)
+            self.rotated_file.unlink()
+        except OSError as e:
+            # Журнал остаётся и доигрывается при загрузке / следующей компакции
+            log.error(f"Auction journal compaction failed: {e}")
+        finally:
+            self._compact_lock.release()
+
+    def _compact_locked(self):
+        """Свернуть журнал в snapshot-файлы (ждёт фоновую компакцию)"""
+        with self._compact_lock:
+            self._write_snapshot(self._snapshot())
+            if self.rotated_file.exists():
+                self.rotated_file.unlink()
+
+            if self._journal is not None:
+                self._journal.close()
+            self._journal = open(self.journal_file, 'w')
+            self._journal_records = 0
+
+    def compact(self):
+        """Принудительная компакция (например, при остановке узла)"""
+        with self._lock:
+            self._compact_locked()
+
+    def close(self):
+        """Компакция и закрытие журнала"""
+        with self._lock:
+            self._compact_locked()
+            self._journal.close()
+            self._journal = None
+
+    # ─────────────────────────────────────────────────────────────────────────
+    #                            MUTATIONS
+    # ─────────────────────────────────────────────────────────────────────────
+
+    @property
+    def lock(self) -> threading.RLock:
+        return self._lock
+
+    def add_purchase(self, purchase: Dict):
+        with self._lock:
+            self._append({"op": "purchase", "purchase": purchase})
+
+    def set_entry(self, map_name: str, key: str, value: Dict):
+        with self._lock:
+            self._append({"op": "set", "map": map_name, "key": key, "value": value})
+
+    def update_entry(self, map_name: str, key: str, fields: Dict):
+        """Обновить поля записи. В журнал пишутся итоговые значения, не дельты."""
+        with self._lock:
+            self._append({"op": "update", "map": map_name, "key": key, "fields": fields})
+
+    # ─────────────────────────────────────────────────────────────────────────
+    #                            READS
+    # ─────────────────────────────────────────────────────────────────────────
+
+    def get_entry(self, map_name: str, key: str) -> Optional[Dict]:
+        with self._lock:
+            entry = self.maps[map_name].get(key)
+            return entry.copy() if entry is not None else None
+
+    def has_entry(self, map_name: str, key: str) -> bool:
+        with self._lock:
+            return key in self.maps[map_name]
+
+    def history(self, service_type: Optional[str], limit: int) -> List[Dict]:
+        """Последние покупки (новые первыми), O(limit)"""
+        with self._lock:
+            if service_type:
+                positions = self._history.get(service_type, [])
+                return [self.purchases[i] for i in reversed(positions[-limit:])] if limit > 0 else []
+            return list(reversed(self.purchases[-limit:])) if limit > 0 else []
+
+    def latest_purchase(self, service_type: str) -> Optional[Dict]:
+        with self._lock:
+            positions = self._history.get(service_type)
+            return self.purchases[positions[-1]] if positions else None
+
+    def revenue(self, service_type: Optional[str] = None) -> int:
+        with self._lock:
+            if service_type is None:
+                return sum(self._revenue.values())
+            return self._revenue.get(service_type, 0)
+
+
+_auction_stores: Dict[Path, AuctionStore] = {}
+_auction_stores_lock = threading.Lock()
+
+
+def get_auction_store(data_dir: Path) -> AuctionStore:
+    """Получить AuctionStore для data_dir (один на директорию)"""
+    key = Path(data_dir).resolve()
+    with _auction_stores_lock:
+        if key not in _auction_stores:
+            _auction_stores[key] = AuctionStore(Path(data_dir))
+        return _auction_stores[key]
+
+
+@atexit.register
+def _compact_auction_stores():
+    """Свернуть журналы при остановке процесса"""
+    for store in list(_auction_stores.values()):
+        try:
+            store.compact()
+        except Exception as e:
+            log.error(f"Auction store compaction failed: {e}")
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+#                            AUCTION COUNTER REGISTRY
+# ═══════════════════════════════════════════════════════════════════════════════
+
+class AuctionRegistry:
+    """
+    Реестр счетчиков аукциона для каждого типа сервиса.
+    Консенсус между 3 узлами Montana Network.
+    """
+
+    def __init__(self, data_dir: Path):
+        self.data_dir = data_dir
+        self.store = get_auction_store(data_dir)
+        self._lock = self.store.lock
 
     def get_current_price(self, service_type: str) -> int:
         """
@@ -138,8 +431,7 @@ class AuctionRegistry:
             raise ValueError(f"Unknown service type: {service_type}")
 
         with self._lock:
-            counters = self._load_counters()
-            count = counters.get(service_type, 0)
+            count = self.store.counters.get(service_type, 0)
             # Следующая цена = текущий счетчик + 1
             return count + 1
 
@@ -157,8 +449,7 @@ class AuctionRegistry:
             raise ValueError(f"Unknown service type: {service_type}")
 
         with self._lock:
-            counters = self._load_counters()
-            return counters.get(service_type, 0)
+            return self.store.counters.get(service_type, 0)
 
     def purchase(
         self,
@@ -186,8 +477,7 @@ class AuctionRegistry:
             raise ValueError(f"Unknown service type: {service_type}")
 
         with self._lock:
-            counters = self._load_counters()
-            current_count = counters.get(service_type, 0)
+            current_count = self.store.counters.get(service_type, 0)
             expected_price = current_count + 1
 
             if amount_paid < expected_price:
@@ -195,12 +485,7 @@ class AuctionRegistry:
                     f"Insufficient payment: {amount_paid} Ɉ, expected {expected_price} Ɉ"
                 )
 
-            # Инкремент счетчика
-            counters[service_type] = current_count + 1
-            self._save_counters(counters)
-
-            # Записать в историю покупок
-            purchases = self._load_purchases()
+            # Инкремент счетчика + запись в историю (одна строка журнала)
             purchase = {
                 "service_type": service_type,
                 "service_id": service_id,
@@ -209,8 +494,7 @@ class AuctionRegistry:
                 "purchase_number": current_count + 1,
                 "timestamp": datetime.utcnow().isoformat() + "Z"
             }
-            purchases.append(purchase)
-            self._save_purchases(purchases)
+            self.store.add_purchase(purchase)
 
             log.info(
                 f"Auction purchase: {service_type} #{current_count + 1} "
@@ -226,6 +510,46 @@ class AuctionRegistry:
                 "next_price": current_count + 2
             }
 
+    def purchase_block(
+        self,
+        service_type: str,
+        buyer_address: str,
+        units: int,
+        last_number: int,
+        amount_paid: int
+    ) -> Dict:
+        """
+        Зарегистрировать пакет единиц одной записью (секунды звонков).
+
+        Номера единиц заранее зарезервированы CallMeter; запись двигает
+        счетчик до last_number и учитывает суммарную оплату.
+
+        Args:
+            service_type: Тип сервиса (audio_second, video_second)
+            buyer_address: Montana адрес покупателя
+            units: Количество единиц в пакете
+            last_number: Номер последней единицы пакета
+            amount_paid: Суммарная оплата в Ɉ
+
+        Returns:
+            Записанная покупка
+        """
+        if service_type not in ServiceType.all():
+            raise ValueError(f"Unknown service type: {service_type}")
+
+        with self._lock:
+            purchase = {
+                "service_type": service_type,
+                "service_id": f"{service_type}_{last_number - units + 1}-{last_number}",
+                "buyer_address": buyer_address,
+                "price_paid": amount_paid,
+                "purchase_number": last_number,
+                "units": units,
+                "timestamp": datetime.utcnow().isoformat() + "Z"
+            }
+            self.store.add_purchase(purchase)
+            return purchase
+
     def get_purchase_history(
         self,
         service_type: Optional[str] = None,
@@ -241,15 +565,8 @@ class AuctionRegistry:
         Returns:
             Список покупок (последние первыми)
         """
-        with self._lock:
-            purchases = self._load_purchases()
-
-            if service_type:
-                purchases = [p for p in purchases if p.get("service_type") == service_type]
-
-            # Последние первыми
-            purchases.reverse()
-            return purchases[:limit]
+        # Последние первыми (индекс по типу сервиса)
+        return self.store.history(service_type, limit)
 
     def get_stats(self) -> Dict:
         """
@@ -259,28 +576,23 @@ class AuctionRegistry:
             Dict со статистикой
         """
         with self._lock:
-            counters = self._load_counters()
-            purchases = self._load_purchases()
-
-            total_revenue = sum(p.get("price_paid", 0) for p in purchases)
+            counters = self.store.counters
 
             stats = {
                 "total_services_sold": sum(counters.values()),
-                "total_revenue": total_revenue,
+                "total_revenue": self.store.revenue(),
                 "services": {}
             }
 
             for service_type in ServiceType.all():
                 count = counters.get(service_type, 0)
                 next_price = count + 1
-                service_purchases = [p for p in purchases if p.get("service_type") == service_type]
-                revenue = sum(p.get("price_paid", 0) for p in service_purchases)
 
                 stats["services"][service_type] = {
                     "total_sold": count,
                     "next_price": next_price,
-                    "revenue": revenue,
-                    "latest_purchase": service_purchases[-1] if service_purchases else None
+                    "revenue": self.store.revenue(service_type),
+                    "latest_purchase": self.store.latest_purchase(service_type)
                 }
 
             return stats
@@ -316,39 +628,12 @@ class DomainService:
     def __init__(self, data_dir: Path):
         self.data_dir = data_dir
         self.data_dir.mkdir(parents=True, exist_ok=True)
-        self.domains_file = self.data_dir / "domains.json"
+        self.store = get_auction_store(data_dir)
         self._lock = threading.Lock()
-        self._ensure_file()
-
-    def _ensure_file(self):
-        """Создать файл доменов если не существует"""
-        if not self.domains_file.exists():
-            self._save_domains({})
-
-    def _load_domains(self) -> Dict[str, Dict]:
-        """Загрузить реестр доменов"""
-        with open(self.domains_file, 'r') as f:
-            fcntl.flock(f.fileno(), fcntl.LOCK_SH)
-            try:
-                data = json.load(f)
-            finally:
-                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
-        return data
-
-    def _save_domains(self, domains: Dict[str, Dict]):
-        """Сохранить реестр доменов"""
-        with open(self.domains_file, 'w') as f:
-            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
-            try:
-                json.dump(domains, f, indent=2)
-            finally:
-                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
 
     def is_available(self, domain: str) -> bool:
         """Проверить доступность домена"""
-        with self._lock:
-            domains = self._load_domains()
-            return domain.lower() not in domains
+        return not self.store.has_entry(AuctionStore.DOMAINS, domain.lower())
 
     def register(
         self,
@@ -374,9 +659,7 @@ class DomainService:
             raise ValueError(f"Invalid domain name: {domain}")
 
         with self._lock:
-            domains = self._load_domains()
-
-            if domain in domains:
+            if self.store.has_entry(AuctionStore.DOMAINS, domain):
                 raise ValueError(f"Domain already registered: {domain}@montana.network")
 
             # Регистрация через аукцион
@@ -389,13 +672,12 @@ class DomainService:
             )
 
             # Сохранить в реестре доменов
-            domains[domain] = {
+            self.store.set_entry(AuctionStore.DOMAINS, domain, {
                 "owner": owner_address,
                 "registered": datetime.utcnow().isoformat() + "Z",
                 "purchase_number": result["purchase_number"],
                 "price_paid": price_paid
-            }
-            self._save_domains(domains)
+            })
 
             log.info(f"Domain registered: {domain}@montana.network → {owner_address[:10]}...")
 
@@ -420,13 +702,10 @@ class DomainService:
         # Убрать @montana.network если есть
         domain = domain.lower().replace("@montana.network", "")
 
-        with self._lock:
-            domains = self._load_domains()
-            if domain in domains:
-                info = domains[domain].copy()
-                info["domain"] = f"{domain}@montana.network"
-                return info
-            return None
+        info = self.store.get_entry(AuctionStore.DOMAINS, domain)
+        if info is not None:
+            info["domain"] = f"{domain}@montana.network"
+        return info
 
     def _validate_domain(self, domain: str) -> bool:
         """
@@ -484,33 +763,8 @@ class PhoneService:
     def __init__(self, data_dir: Path):
         self.data_dir = data_dir
         self.data_dir.mkdir(parents=True, exist_ok=True)
-        self.phone_file = self.data_dir / "phone_numbers.json"
+        self.store = get_auction_store(data_dir)
         self._lock = threading.Lock()
-        self._ensure_file()
-
-    def _ensure_file(self):
-        """Создать файл номеров если не существует"""
-        if not self.phone_file.exists():
-            self._save_numbers({})
-
-    def _load_numbers(self) -> Dict[str, Dict]:
-        """Загрузить реестр номеров"""
-        with open(self.phone_file, 'r') as f:
-            fcntl.flock(f.fileno(), fcntl.LOCK_SH)
-            try:
-                data = json.load(f)
-            finally:
-                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
-        return data
-
-    def _save_numbers(self, numbers: Dict[str, Dict]):
-        """Сохранить реестр номеров"""
-        with open(self.phone_file, 'w') as f:
-            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
-            try:
-                json.dump(numbers, f, indent=2)
-            finally:
-                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
 
     def format_number(self, number: int) -> str:
         """Форматировать номер: 42 → +montana-000042"""
@@ -518,10 +772,7 @@ class PhoneService:
 
     def is_available(self, number: int) -> bool:
         """Проверить доступность номера"""
-        with self._lock:
-            numbers = self._load_numbers()
-            key = self.format_number(number)
-            return key not in numbers
+        return not self.store.has_entry(AuctionStore.PHONES, self.format_number(number))
 
     def register(
         self,
@@ -543,9 +794,7 @@ class PhoneService:
         formatted = self.format_number(number)
 
         with self._lock:
-            numbers = self._load_numbers()
-
-            if formatted in numbers:
+            if self.store.has_entry(AuctionStore.PHONES, formatted):
                 raise ValueError(f"Phone number already registered: {formatted}")
 
             # Регистрация через аукцион
@@ -558,7 +807,7 @@ class PhoneService:
             )
 
             # Сохранить в реестре номеров
-            numbers[formatted] = {
+            self.store.set_entry(AuctionStore.PHONES, formatted, {
                 "owner": owner_address,
                 "number": number,
                 "registered": datetime.utcnow().isoformat() + "Z",
@@ -566,8 +815,7 @@ class PhoneService:
                 "price_paid": price_paid,
                 "audio_seconds_used": 0,
                 "video_seconds_used": 0
-            }
-            self._save_numbers(numbers)
+            })
 
             log.info(f"Phone number registered: {formatted} → {owner_address[:10]}...")
 
@@ -595,11 +843,7 @@ class PhoneService:
         else:
             formatted = self.format_number(int(number))
 
-        with self._lock:
-            numbers = self._load_numbers()
-            if formatted in numbers:
-                return numbers[formatted].copy()
-            return None
+        return self.store.get_entry(AuctionStore.PHONES, formatted)
 
     def record_call(
         self,
@@ -622,20 +866,19 @@ class PhoneService:
         """
         total_cost = duration_seconds * price_per_second
 
-        with self._lock:
-            numbers = self._load_numbers()
+        if call_type not in ("audio", "video"):
+            raise ValueError(f"Invalid call type: {call_type}")
+        field = f"{call_type}_seconds_used"
 
-            if phone_number not in numbers:
+        with self.store.lock:
+            entry = self.store.maps[AuctionStore.PHONES].get(phone_number)
+            if entry is None:
                 raise ValueError(f"Phone number not found: {phone_number}")
 
-            if call_type == "audio":
-                numbers[phone_number]["audio_seconds_used"] += duration_seconds
-            elif call_type == "video":
-                numbers[phone_number]["video_seconds_used"] += duration_seconds
-            else:
-                raise ValueError(f"Invalid call type: {call_type}")
-
-            self._save_numbers(numbers)
+            # В журнал — итоговое значение счётчика (идемпотентно при replay)
+            self.store.update_entry(AuctionStore.PHONES, phone_number, {
+                field: entry.get(field, 0) + duration_seconds
+            })
 
             log.info(
                 f"Call recorded: {phone_number} {call_type} {duration_seconds}s "
@@ -667,6 +910,291 @@ def get_phone_service(data_dir: Path = None) -> PhoneService:
     return _phone_service
 
 
+# ═══════════════════════════════════════════════════════════════════════════════
+#                      CALL METERING — Aggregated Call-Second Pipeline
+# ═══════════════════════════════════════════════════════════════════════════════
+
+METER_FLUSH_INTERVAL = 2.0   # Окно агрегации (сек)
+METER_RING_SIZE = 65536      # Событий в буфере до принудительного flush
+
+CALL_SERVICE_TYPES = {
+    "audio": ServiceType.AUDIO_SECOND,
+    "video": ServiceType.VIDEO_SECOND,
+}
+
+
+class CallMeter:
+    """
+    Конвейер учёта секунд звонков.
+
+    record() — O(1) в памяти: событие кладётся в кольцевой буфер,
+    номера аукционных секунд резервируются сразу (цена известна
+    вызывающему без обращения к диску).
+
+    Фоновый поток раз в METER_FLUSH_INTERVAL агрегирует окно:
+    - аукцион: одна покупка-пакет на непрерывный отрезок номеров звонящего
+    - номера: один update на (номер) с итоговыми секундами
+    - ledger: одно событие на (звонящий, вызываемый, тип) через ledger_sink
+
+    Если буфер заполнен — flush выполняется в потоке записи
+    (backpressure вместо потери биллинговых событий).
+    """
+
+    def __init__(
+        self,
+        auction: 'AuctionRegistry',
+        flush_interval: float = METER_FLUSH_INTERVAL,
+        ring_size: int = METER_RING_SIZE,
+        ledger_sink: Optional[Callable[[List[Dict]], None]] = None
+    ):
+        self.auction = auction
+        self.store = auction.store
+        self.flush_interval = flush_interval
+        self.ring_size = ring_size
+        self.ledger_sink = ledger_sink
+
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._ring: deque = deque()
+
+        # service_type → номер следующей незарезервированной единицы
+        self._next_unit: Dict[str, int] = {}
+
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        self.stats = {"events": 0, "flushes": 0, "writes": 0}
+
+    # ─────────────────────────────────────────────────────────────────────────
+    #                            PRICE TIERS
+    # ─────────────────────────────────────────────────────────────────────────
+
+    def _next_unit_locked(self, service_type: str) -> int:
+        flushed = self.store.counters.get(service_type, 0) + 1
+        return max(self._next_unit.get(service_type, 0), flushed)
+
+    def current_price(self, service_type: str) -> int:
+        """Цена следующей единицы с учётом ещё не сброшенных секунд"""
+        with self._lock:
+            return self._next_unit_locked(service_type)
+
+    # ─────────────────────────────────────────────────────────────────────────
+    #                            RECORD
+    # ─────────────────────────────────────────────────────────────────────────
+
+    def record(
+        self,
+        call_type: str,
+        seconds: int,
+        caller_address: str,
+        callee_address: str = "",
+        phone_number: Optional[str] = None,
+        cost: Optional[int] = None,
+        reserve_units: bool = False
+    ) -> Dict:
+        """
+        Поставить завершённый звонок в очередь учёта.
+
+        Args:
+            call_type: "audio" или "video"
+            seconds: Длительность в секундах
+            caller_address: Montana адрес звонящего
+            callee_address: Montana адрес вызываемого
+            phone_number: Виртуальный номер (учёт audio/video_seconds_used)
+            cost: Уже списанная стоимость (фиксированный тариф)
+            reserve_units: Покупать секунды через аукцион (N-я секунда = N Ɉ)
+
+        Returns:
+            Dict события (для reserve_units — с first_unit и total_cost)
+        """
+        if call_type not in CALL_SERVICE_TYPES:
+            raise ValueError(f"Invalid call type: {call_type}")
+        if seconds <= 0:
+            raise ValueError(f"Invalid duration: {seconds}")
+
+        event = {
+            "call_type": call_type,
+            "seconds": seconds,
+            "caller": caller_address,
+            "callee": callee_address,
+            "phone_number": phone_number,
+            "first_unit": None,
+            "cost": cost if cost is not None else 0,
+        }
+
+        with self._lock:
+            if reserve_units:
+                service_type = CALL_SERVICE_TYPES[call_type]
+                first = self._next_unit_locked(service_type)
+                self._next_unit[service_type] = first + seconds
+                event["first_unit"] = first
+                # Сумма арифметической прогрессии first .. first+seconds-1
+                event["cost"] = seconds * first + (seconds * (seconds - 1)) // 2
+
+            self._ring.append(event)
+            self.stats["events"] += 1
+            overflow = len(self._ring) >= self.ring_size
+
+        if overflow:
+            self.flush()
+        else:
+            self._ensure_thread()
+
+        return event
+
+    # ─────────────────────────────────────────────────────────────────────────
+    #                            FLUSH
+    # ─────────────────────────────────────────────────────────────────────────
+
+    @staticmethod
+    def aggregate(events: List[Dict]) -> Tuple[List[Dict], Dict[str, Dict[str, int]], List[Dict]]:
+        """
+        Свернуть окно событий.
+
+        Returns:
+            (аукционные пакеты, секунды по номерам, события для ledger)
+        """
+        reserved: Dict[Tuple[str, str], List[Dict]] = {}
+        numbers: Dict[str, Dict[str, int]] = {}
+        ledger: Dict[Tuple[str, str, str], Dict] = {}
+
+        for event in events:
+            call_type = event["call_type"]
+            seconds = event["seconds"]
+
+            if event["first_unit"] is not None:
+                key = (CALL_SERVICE_TYPES[call_type], event["caller"])
+                reserved.setdefault(key, []).append(event)
+
+            if event["phone_number"]:
+                usage = numbers.setdefault(event["phone_number"], {})
+                field = f"{call_type}_seconds_used"
+                usage[field] = usage.get(field, 0) + seconds
+
+            key = (event["caller"], event["callee"], call_type)
+            entry = ledger.setdefault(key, {
+                "caller": key[0], "callee": key[1], "call_type": call_type,
+                "calls": 0, "seconds": 0, "cost": 0
+            })
+            entry["calls"] += 1
+            entry["seconds"] += seconds
+            entry["cost"] += event["cost"]
+
+        # Пакет — непрерывный отрезок номеров: при чередовании звонящих
+        # у одного адреса может быть несколько отрезков (1-10 и 21-30)
+        blocks = []
+        for (service_type, caller), caller_events in reserved.items():
+            block = None
+            for event in sorted(caller_events, key=lambda e: e["first_unit"]):
+                if block is None or event["first_unit"] != block["last_number"] + 1:
+                    block = {
+                        "service_type": service_type, "buyer_address": caller,
+                        "units": 0, "last_number": event["first_unit"] - 1, "amount_paid": 0
+                    }
+                    blocks.append(block)
+                block["units"] += event["seconds"]
+                block["amount_paid"] += event["cost"]
+                block["last_number"] += event["seconds"]
+
+        # Покупки внутри типа пишутся по возрастанию номера (см. AuctionStore)
+        ordered = sorted(blocks, key=lambda b: (b["service_type"], b["last_number"]))
+        return ordered, numbers, list(ledger.values())
+
+    def flush(self) -> int:
+        """
+        Сбросить накопленное окно в хранилище и ledger.
+
+        Returns:
+            Количество обработанных событий
+        """
+        with self._flush_lock:
+            with self._lock:
+                if not self._ring:
+                    return 0
+                events = list(self._ring)
+                self._ring.clear()
+
+            blocks, numbers, ledger_batch = self.aggregate(events)
+
+            for block in blocks:
+                self.auction.purchase_block(**block)
+
+            phones = self.store.maps[AuctionStore.PHONES]
+            with self.store.lock:
+                for number, usage in numbers.items():
+                    entry = phones.get(number)
+                    if entry is None:
+                        log.warning(f"Call meter: unknown phone number {number}")
+                        continue
+                    self.store.update_entry(AuctionStore.PHONES, number, {
+                        field: entry.get(field, 0) + seconds for field, seconds in usage.items()
+                    })
+
+            if self.ledger_sink and ledger_batch:
+                try:
+                    self.ledger_sink(ledger_batch)
+                except Exception as e:
+                    log.error(f"Call meter ledger sink failed: {e}")
+
+            self.stats["flushes"] += 1
+            self.stats["writes"] += len(blocks) + len(numbers)
+            log.debug(
+                f"Call meter flush: {len(events)} events → "
+                f"{len(blocks)} purchases, {len(numbers)} numbers, {len(ledger_batch)} ledger"
+            )
+            return len(events)
+
+    # ─────────────────────────────────────────────────────────────────────────
+    #                            BACKGROUND
+    # ─────────────────────────────────────────────────────────────────────────
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._stop.clear()
+                    self._thread = threading.Thread(
+                        target=self._run, name="Call-Meter-Flush", daemon=True
+                    )
+                    self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                log.error(f"Call meter flush failed: {e}")
+
+    def close(self):
+        """Остановить фоновый поток и сбросить остаток"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_interval + 1)
+            self._thread = None
+        self.flush()
+
+
+_call_meter: Optional[CallMeter] = None
+
+
+def get_call_meter(data_dir: Path = None) -> CallMeter:
+    """Получить глобальный экземпляр CallMeter (singleton)"""
+    global _call_meter
+    if _call_meter is None:
+        _call_meter = CallMeter(get_auction_registry(data_dir))
+    return _call_meter
+
+
+@atexit.register
+def _flush_call_meter():
+    """Сбросить неучтённые секунды до компакции журналов"""
+    if _call_meter is not None:
+        try:
+            _call_meter.close()
+        except Exception as e:
+            log.error(f"Call meter final flush failed: {e}")
+
+
 # ═══════════════════════════════════════════════════════════════════════════════
 #                      CALL PRICING — Audio & Video Second Pricing
 # ═══════════════════════════════════════════════════════════════════════════════
@@ -686,14 +1214,15 @@ class CallPricingService:
     def __init__(self, data_dir: Path):
         self.data_dir = data_dir
         self.auction = get_auction_registry(data_dir)
+        self.meter = get_call_meter(data_dir)
 
     def get_current_audio_price(self) -> int:
         """Получить текущую цену за 1 секунду аудио"""
-        return self.auction.get_current_price(ServiceType.AUDIO_SECOND)
+        return self.meter.current_price(ServiceType.AUDIO_SECOND)
 
     def get_current_video_price(self) -> int:
         """Получить текущую цену за 1 секунду видео"""
-        return self.auction.get_current_price(ServiceType.VIDEO_SECOND)
+        return self.meter.current_price(ServiceType.VIDEO_SECOND)
 
     def calculate_audio_call_cost(self, duration_seconds: int) -> int:
         """
@@ -727,63 +1256,52 @@ class CallPricingService:
         cost = duration_seconds * base_price + (duration_seconds * (duration_seconds - 1)) // 2
         return cost
 
-    def register_audio_seconds(self, seconds: int, caller_address: str) -> Dict:
+    def register_audio_seconds(self, seconds: int, caller_address: str,
+                               phone_number: Optional[str] = None) -> Dict:
         """
         Зарегистрировать использование N секунд аудио.
 
+        Секунды резервируются в аукционе сразу, на диск попадают
+        пакетом при следующем flush CallMeter.
+
         Args:
             seconds: Количество секунд
             caller_address: Montana адрес звонящего
+            phone_number: Виртуальный номер звонящего (опционально)
 
         Returns:
             Dict с результатом регистрации
         """
-        total_cost = self.calculate_audio_call_cost(seconds)
-
-        # Зарегистрировать каждую секунду в аукционе
-        for i in range(seconds):
-            current_price = self.auction.get_current_price(ServiceType.AUDIO_SECOND)
-            self.auction.purchase(
-                service_type=ServiceType.AUDIO_SECOND,
-                buyer_address=caller_address,
-                service_id=f"audio_{self.auction.get_total_sold(ServiceType.AUDIO_SECOND) + 1}",
-                amount_paid=current_price
-            )
+        event = self.meter.record("audio", seconds, caller_address,
+                                  phone_number=phone_number, reserve_units=True)
 
         return {
             "service_type": "audio",
             "seconds": seconds,
-            "total_cost": total_cost,
+            "total_cost": event["cost"],
             "caller": caller_address
         }
 
-    def register_video_seconds(self, seconds: int, caller_address: str) -> Dict:
+    def register_video_seconds(self, seconds: int, caller_address: str,
+                               phone_number: Optional[str] = None) -> Dict:
         """
         Зарегистрировать использование N секунд видео.
 
         Args:
             seconds: Количество секунд
             caller_address: Montana адрес звонящего
+            phone_number: Виртуальный номер звонящего (опционально)
 
         Returns:
             Dict с результатом регистрации
         """
-        total_cost = self.calculate_video_call_cost(seconds)
-
-        # Зарегистрировать каждую секунду в аукционе
-        for i in range(seconds):
-            current_price = self.auction.get_current_price(ServiceType.VIDEO_SECOND)
-            self.auction.purchase(
-                service_type=ServiceType.VIDEO_SECOND,
-                buyer_address=caller_address,
-                service_id=f"video_{self.auction.get_total_sold(ServiceType.VIDEO_SECOND) + 1}",
-                amount_paid=current_price
-            )
+        event = self.meter.record("video", seconds, caller_address,
+                                  phone_number=phone_number, reserve_units=True)
 
         return {
             "service_type": "video",
             "seconds": seconds,
-            "total_cost": total_cost,
+            "total_cost": event["cost"],
             "caller": caller_address
         }
 
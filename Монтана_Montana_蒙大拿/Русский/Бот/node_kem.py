@@ -8,6 +8,12 @@ Montana Protocol — ML-KEM-768 Post-Quantum Key Exchange for Nodes
 - AES-256-GCM для симметричного шифрования
 - ML-DSA-65 для аутентификации
 
+Режимы канала:
+- per-message: ключ SHA3-256 на каждое сообщение (совместимость)
+- aead-stream: ключ сессии через HKDF, смена ключа каждые
+  REKEY_MESSAGES сообщений или REKEY_BYTES байт, nonce — счётчик,
+  один AESGCM на эпоху, пакетное шифрование фреймов
+
 Защита от:
 - Квантовых атак (Shor's algorithm, Grover's algorithm)
 - Harvest now, decrypt later
@@ -15,13 +21,16 @@ Montana Protocol — ML-KEM-768 Post-Quantum Key Exchange for Nodes
 """
 
 import hashlib
+import hmac
 import os
+import struct
+import time
 import json
 import asyncio
 import logging
 from pathlib import Path
-from typing import Optional, Tuple, Dict, Any
-from dataclasses import dataclass
+from typing import Optional, Tuple, Dict, Any, List
+from dataclasses import dataclass, field
 from datetime import datetime, timezone
 
 logger = logging.getLogger(__name__)
@@ -69,9 +78,30 @@ PQ_PORT = 19334
 HANDSHAKE_TIMEOUT = 30.0
 MESSAGE_TIMEOUT = 60.0
 
+# Сколько установленный канал переиспользуется без нового handshake
+CHANNEL_TTL = 3600.0
+
 # Версия протокола
 PROTOCOL_VERSION = "PQ-1.0"
 
+# Режимы шифрования канала (согласуются в handshake)
+MODE_MESSAGE = "per-message"
+MODE_STREAM = "aead-stream"
+CIPHER_MODES = (MODE_STREAM, MODE_MESSAGE)
+
+# Смена ключа потока: что наступит раньше
+REKEY_MESSAGES = 1 << 20
+REKEY_BYTES = 1 << 30
+
+# Заголовок фрейма потока = nonce: epoch (4) + seq (8)
+STREAM_HEADER = struct.Struct(">IQ")
+STREAM_SALT = b"montana-pq-stream-v1"
+TAG_SIZE = 16
+
+# Возобновление канала: HMAC по nonce сервера доказывает владение ключом
+RESUME_LABEL = b"montana-pq-resume-v1"
+RESUME_NONCE_SIZE = 32
+
 
 # ═══════════════════════════════════════════════════════════════════════════════
 #                              ML-KEM-768 ФУНКЦИИ
@@ -241,6 +271,162 @@ def aes_decrypt(encrypted: bytes, key: bytes) -> Optional[bytes]:
         return None
 
 
+# ═══════════════════════════════════════════════════════════════════════════════
+#                              ПОТОКОВЫЙ AEAD
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def hkdf_sha256(ikm: bytes, salt: bytes, info: bytes, length: int = 32) -> bytes:
+    """HKDF-SHA256 (RFC 5869): extract + expand"""
+    prk = hmac.new(salt, ikm, hashlib.sha256).digest()
+    okm = b""
+    block = b""
+    counter = 1
+    while len(okm) < length:
+        block = hmac.new(prk, block + info + bytes([counter]), hashlib.sha256).digest()
+        okm += block
+        counter += 1
+    return okm[:length]
+
+
+def derive_stream_key(shared_secret: bytes, sender_address: str, epoch: int) -> bytes:
+    """Ключ эпохи для сообщений одного отправителя"""
+    info = b"montana-stream|" + sender_address.encode() + b"|" + epoch.to_bytes(4, 'big')
+    return hkdf_sha256(shared_secret, STREAM_SALT, info)
+
+
+class StreamCipher:
+    """
+    Одно направление потокового канала (сообщения одного отправителя).
+
+    Фрейм: epoch (4) + seq (8) + ciphertext + tag (16). Заголовок и есть
+    nonce AES-GCM: для ключа эпохи он не повторяется. AESGCM создаётся
+    один раз на эпоху, а не на каждое сообщение. Получатель принимает
+    только возрастающие (epoch, seq) — повтор и переупорядочивание
+    отбрасываются.
+    """
+
+    def __init__(
+        self,
+        shared_secret: bytes,
+        sender_address: str,
+        rekey_messages: int = REKEY_MESSAGES,
+        rekey_bytes: int = REKEY_BYTES
+    ):
+        self.shared_secret = shared_secret
+        self.sender_address = sender_address
+        self.rekey_messages = rekey_messages
+        self.rekey_bytes = rekey_bytes
+
+        self.epoch = 0
+        self.seq = 0
+        self.bytes = 0
+        self._aead = self._context(0)
+
+        self.stats = {"messages": 0, "bytes": 0, "rekeys": 0, "rejected": 0}
+
+    def _context(self, epoch: int):
+        return AESGCM(derive_stream_key(self.shared_secret, self.sender_address, epoch))
+
+    def _rotate(self):
+        self.epoch += 1
+        self.seq = 0
+        self.bytes = 0
+        self._aead = self._context(self.epoch)
+        self.stats["rekeys"] += 1
+
+    # ─── Отправитель ───
+
+    def seal(self, data: bytes) -> bytes:
+        """Шифрует один фрейм"""
+        return self.seal_batch([data])[0]
+
+    def seal_batch(self, frames: List[bytes]) -> List[bytes]:
+        """Шифрует фреймы по порядку; ключ меняется посреди пачки при необходимости"""
+        pack = STREAM_HEADER.pack
+        out = []
+        append = out.append
+        aead, epoch, seq, sent = self._aead, self.epoch, self.seq, self.bytes
+        total = 0
+
+        for data in frames:
+            if seq >= self.rekey_messages or sent >= self.rekey_bytes:
+                self.seq, self.bytes = seq, sent
+                self._rotate()
+                aead, epoch, seq, sent = self._aead, self.epoch, 0, 0
+            seq += 1
+            sent += len(data)
+            total += len(data)
+            nonce = pack(epoch, seq)
+            append(nonce + aead.encrypt(nonce, data, None))
+
+        self.seq, self.bytes = seq, sent
+        self.stats["messages"] += len(frames)
+        self.stats["bytes"] += total
+        return out
+
+    # ─── Получатель ───
+
+    def open(self, frame: bytes) -> Optional[bytes]:
+        """Расшифровывает один фрейм (None — подделка, повтор или мусор)"""
+        if len(frame) < STREAM_HEADER.size + TAG_SIZE:
+            self.stats["rejected"] += 1
+            return None
+
+        epoch, seq = STREAM_HEADER.unpack_from(frame)
+        if epoch == self.epoch:
+            if seq <= self.seq:
+                logger.warning(f"Replay attack detected: {epoch}:{seq} <= {self.epoch}:{self.seq}")
+                self.stats["rejected"] += 1
+                return None
+            aead = self._aead
+        elif epoch > self.epoch:
+            # Ключ новой эпохи принимается только вместе с подлинным фреймом
+            aead = self._context(epoch)
+        else:
+            self.stats["rejected"] += 1
+            return None
+
+        try:
+            data = aead.decrypt(frame[:STREAM_HEADER.size], frame[STREAM_HEADER.size:], None)
+        except Exception:
+            self.stats["rejected"] += 1
+            return None
+
+        if epoch != self.epoch:
+            self.epoch, self._aead = epoch, aead
+            self.stats["rekeys"] += 1
+        self.seq = seq
+        self.stats["messages"] += 1
+        self.stats["bytes"] += len(data)
+        return data
+
+    def open_batch(self, frames: List[bytes]) -> List[Optional[bytes]]:
+        """Расшифровывает фреймы по порядку; отвергнутые — None на своём месте"""
+        header = STREAM_HEADER.size
+        unpack = STREAM_HEADER.unpack_from
+        out = []
+        append = out.append
+
+        for frame in frames:
+            # Быстрый путь: текущая эпоха, следующий номер
+            if len(frame) >= header + TAG_SIZE:
+                epoch, seq = unpack(frame)
+                if epoch == self.epoch and seq > self.seq:
+                    try:
+                        data = self._aead.decrypt(frame[:header], frame[header:], None)
+                    except Exception:
+                        self.stats["rejected"] += 1
+                        append(None)
+                        continue
+                    self.seq = seq
+                    self.stats["messages"] += 1
+                    self.stats["bytes"] += len(data)
+                    append(data)
+                    continue
+            append(self.open(frame))
+        return out
+
+
 # ═══════════════════════════════════════════════════════════════════════════════
 #                              SECURE CHANNEL
 # ═══════════════════════════════════════════════════════════════════════════════
@@ -254,6 +440,9 @@ class SecureChannel:
     - ML-KEM-768 для key exchange
     - AES-256-GCM для шифрования
     - ML-DSA-65 для аутентификации
+
+    mode=MODE_STREAM — потоковый режим (StreamCipher на каждое
+    направление), MODE_MESSAGE — ключ на каждое сообщение.
     """
 
     local_address: str   # Наш адрес (mt...)
@@ -265,6 +454,27 @@ class SecureChannel:
     send_counter: int = 0
     recv_counter: int = 0
 
+    mode: str = MODE_MESSAGE
+    rekey_messages: int = REKEY_MESSAGES
+    rekey_bytes: int = REKEY_BYTES
+
+    _tx: Optional[StreamCipher] = field(default=None, init=False, repr=False, compare=False)
+    _rx: Optional[StreamCipher] = field(default=None, init=False, repr=False, compare=False)
+
+    def _stream(self, outgoing: bool) -> Optional[StreamCipher]:
+        """Шифр направления (создаётся при первом сообщении)"""
+        if not HAS_CRYPTO:
+            return None
+        if outgoing:
+            if self._tx is None:
+                self._tx = StreamCipher(self.shared_secret, self.local_address,
+                                        self.rekey_messages, self.rekey_bytes)
+            return self._tx
+        if self._rx is None:
+            self._rx = StreamCipher(self.shared_secret, self.peer_address,
+                                    self.rekey_messages, self.rekey_bytes)
+        return self._rx
+
     def derive_key(self, sender_address: str, counter: int) -> bytes:
         """
         Деривирует ключ на основе отправителя.
@@ -280,6 +490,10 @@ class SecureChannel:
 
     def encrypt(self, data: bytes) -> Optional[bytes]:
         """Шифрует данные для отправки"""
+        if self.mode == MODE_STREAM:
+            stream = self._stream(outgoing=True)
+            return stream.seal(data) if stream else None
+
         self.send_counter += 1
         key = self.derive_key(self.local_address, self.send_counter)
 
@@ -291,6 +505,10 @@ class SecureChannel:
 
     def decrypt(self, data: bytes) -> Optional[bytes]:
         """Расшифровывает полученные данные"""
+        if self.mode == MODE_STREAM:
+            stream = self._stream(outgoing=False)
+            return stream.open(data) if stream else None
+
         if len(data) < 8:
             return None
 
@@ -310,6 +528,38 @@ class SecureChannel:
 
         return decrypted
 
+    def encrypt_batch(self, frames: List[bytes]) -> Optional[List[bytes]]:
+        """Шифрует пачку фреймов (порядок отправки = порядок в списке)"""
+        if self.mode == MODE_STREAM:
+            stream = self._stream(outgoing=True)
+            return stream.seal_batch(frames) if stream else None
+
+        out = [self.encrypt(data) for data in frames]
+        return None if None in out else out
+
+    def decrypt_batch(self, frames: List[bytes]) -> List[Optional[bytes]]:
+        """Расшифровывает пачку фреймов; отвергнутые — None на своём месте"""
+        if self.mode == MODE_STREAM:
+            stream = self._stream(outgoing=False)
+            return stream.open_batch(frames) if stream else [None] * len(frames)
+
+        return [self.decrypt(data) for data in frames]
+
+    def resume_proof(self, nonce: bytes) -> bytes:
+        """Подтверждение ключа для kem_resume: HMAC-SHA256(shared_secret, nonce)"""
+        return hmac.new(self.shared_secret, RESUME_LABEL + nonce, hashlib.sha256).digest()
+
+    def check_resume_proof(self, nonce: bytes, proof: bytes) -> bool:
+        return hmac.compare_digest(self.resume_proof(nonce), proof)
+
+
+def choose_cipher_mode(offered) -> str:
+    """Режим канала из предложенных узлом (старые узлы не предлагают — per-message)"""
+    for mode in CIPHER_MODES:
+        if offered and mode in offered:
+            return mode
+    return MODE_MESSAGE
+
 
 # ═══════════════════════════════════════════════════════════════════════════════
 #                              NODE KEM MANAGER
@@ -363,7 +613,8 @@ class NodeKEMManager:
                 "kem_public_key": "hex...",  # 1184 bytes
                 "dsa_public_key": "hex...",  # 1952 bytes
                 "timestamp": "iso...",
-                "signature": "hex..."        # ML-DSA-65 подпись
+                "signature": "hex...",       # ML-DSA-65 подпись
+                "cipher_modes": [...]        # Поддерживаемые режимы канала
             }
         """
         if not self.kem_public_key:
@@ -381,7 +632,8 @@ class NodeKEMManager:
             "kem_public_key": self.kem_public_key.hex(),
             "dsa_public_key": self.dsa_public_key.hex(),
             "timestamp": timestamp,
-            "signature": signature.hex()
+            "signature": signature.hex(),
+            "cipher_modes": list(CIPHER_MODES)
         }
 
     def process_handshake_request(
@@ -422,11 +674,13 @@ class NodeKEMManager:
             ciphertext, shared_secret = result
 
             # Создаём канал
+            mode = choose_cipher_mode(request.get("cipher_modes"))
             channel = SecureChannel(
                 local_address=self.node_address,
                 peer_address=peer_address,
                 shared_secret=shared_secret,
-                established_at=datetime.now(timezone.utc)
+                established_at=datetime.now(timezone.utc),
+                mode=mode
             )
 
             # Сохраняем
@@ -444,7 +698,8 @@ class NodeKEMManager:
                 "ciphertext": ciphertext.hex(),  # 1088 bytes
                 "dsa_public_key": self.dsa_public_key.hex(),
                 "timestamp": response_ts,
-                "signature": response_sig.hex()
+                "signature": response_sig.hex(),
+                "cipher_mode": mode
             }
 
             logger.info(f"[NodeKEM] Channel established with {peer_address[:16]}...")
@@ -483,12 +738,13 @@ class NodeKEMManager:
             if not shared_secret:
                 return None
 
-            # Создаём канал
+            # Создаём канал (ответ старого узла без cipher_mode — per-message)
             channel = SecureChannel(
                 local_address=self.node_address,
                 peer_address=peer_address,
                 shared_secret=shared_secret,
-                established_at=datetime.now(timezone.utc)
+                established_at=datetime.now(timezone.utc),
+                mode=choose_cipher_mode([response.get("cipher_mode")])
             )
 
             # Сохраняем
@@ -519,10 +775,25 @@ class NodeKEMManager:
 class PQSecureClient:
     """
     Асинхронный клиент для постквантового обмена ключами.
+
+    Канал к узлу кэшируется на CHANNEL_TTL: повторный вызов не делает
+    новый ML-KEM-768 handshake.
     """
 
     def __init__(self, kem_manager: NodeKEMManager):
         self.kem = kem_manager
+        self._channels: Dict[Tuple[str, int], SecureChannel] = {}
+
+    def _cached_channel(self, host: str, port: int) -> Optional[SecureChannel]:
+        channel = self._channels.get((host, port))
+        if channel is None:
+            return None
+        age = (datetime.now(timezone.utc) - channel.established_at).total_seconds()
+        # Канал мог быть закрыт через kem.close_channel
+        if age >= CHANNEL_TTL or self.kem.get_channel(channel.peer_address) is not channel:
+            del self._channels[(host, port)]
+            return None
+        return channel
 
     async def establish_channel(
         self,
@@ -531,8 +802,12 @@ class PQSecureClient:
         timeout: float = HANDSHAKE_TIMEOUT
     ) -> Optional[SecureChannel]:
         """
-        Устанавливает защищённый канал с узлом.
+        Устанавливает защищённый канал с узлом (или возвращает действующий).
         """
+        channel = self._cached_channel(host, port)
+        if channel is not None:
+            return channel
+
         try:
             reader, writer = await asyncio.wait_for(
                 asyncio.open_connection(host, port),
@@ -546,14 +821,14 @@ class PQSecureClient:
             writer.write(data)
             await writer.drain()
 
-            # Получаем response
+            # Получаем response (readexactly: read(n) может вернуть часть фрейма)
             length_bytes = await asyncio.wait_for(
-                reader.read(4),
+                reader.readexactly(4),
                 timeout=timeout
             )
             length = int.from_bytes(length_bytes, 'big')
             response_data = await asyncio.wait_for(
-                reader.read(length),
+                reader.readexactly(length),
                 timeout=timeout
             )
 
@@ -561,6 +836,8 @@ class PQSecureClient:
 
             if response.get("type") == "kem_response":
                 channel = self.kem.process_handshake_response(response)
+                if channel:
+                    self._channels[(host, port)] = channel
                 writer.close()
                 await writer.wait_closed()
                 return channel
@@ -594,12 +871,12 @@ class PQSecureServer:
         try:
             # Читаем request
             length_bytes = await asyncio.wait_for(
-                reader.read(4),
+                reader.readexactly(4),
                 timeout=HANDSHAKE_TIMEOUT
             )
             length = int.from_bytes(length_bytes, 'big')
             request_data = await asyncio.wait_for(
-                reader.read(length),
+                reader.readexactly(length),
                 timeout=HANDSHAKE_TIMEOUT
             )
 
@@ -645,6 +922,75 @@ class PQSecureServer:
             self._server.close()
 
 
+# ═══════════════════════════════════════════════════════════════════════════════
+#                              BENCHMARK
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def benchmark(sizes=(64, 1024, 16384), total_bytes: int = 32 << 20, batch: int = 64) -> dict:
+    """
+    Пропускная способность канала: per-message против aead-stream
+
+    Для каждого размера сообщения шифруется и расшифровывается
+    total_bytes данных (минимум 2000 сообщений). Пакетный путь —
+    encrypt_batch/decrypt_batch по batch фреймов.
+    """
+    if not HAS_CRYPTO:
+        print("cryptography not installed: pip install cryptography")
+        return {}
+
+    secret = os.urandom(SHARED_SECRET_SIZE)
+    alice, bob = "mt" + "a" * 40, "mt" + "b" * 40
+    now = datetime.now(timezone.utc)
+
+    def pair(mode):
+        return (SecureChannel(alice, bob, secret, now, mode=mode),
+                SecureChannel(bob, alice, secret, now, mode=mode))
+
+    def single(sender, receiver, messages):
+        encrypt, decrypt = sender.encrypt, receiver.decrypt
+        started = time.perf_counter()
+        frames = [encrypt(data) for data in messages]
+        sealed = time.perf_counter()
+        opened = [decrypt(frame) for frame in frames]
+        done = time.perf_counter()
+        assert opened == messages
+        return sealed - started, done - sealed
+
+    def batched(sender, receiver, messages):
+        chunks = [messages[i:i + batch] for i in range(0, len(messages), batch)]
+        started = time.perf_counter()
+        frames = [sender.encrypt_batch(chunk) for chunk in chunks]
+        sealed = time.perf_counter()
+        opened = [receiver.decrypt_batch(chunk) for chunk in frames]
+        done = time.perf_counter()
+        assert [data for chunk in opened for data in chunk] == messages
+        return sealed - started, done - sealed
+
+    paths = [
+        ("per-message", MODE_MESSAGE, single),
+        ("stream", MODE_STREAM, single),
+        (f"stream x{batch}", MODE_STREAM, batched),
+    ]
+
+    results = {}
+    print(f"{'size':>6} {'path':14} {'enc MB/s':>9} {'enc msg/s':>10} {'dec MB/s':>9} {'dec msg/s':>10}")
+    for size in sizes:
+        count = max(2000, total_bytes // size)
+        messages = [os.urandom(size)] * count
+        for name, mode, run in paths:
+            enc, dec = run(*pair(mode), messages)
+            row = {
+                "encrypt_mb_s": round(size * count / enc / 1e6, 1),
+                "encrypt_msg_s": round(count / enc),
+                "decrypt_mb_s": round(size * count / dec / 1e6, 1),
+                "decrypt_msg_s": round(count / dec),
+            }
+            results[(size, name)] = row
+            print(f"{size:>6} {name:14} {row['encrypt_mb_s']:>9} {row['encrypt_msg_s']:>10} "
+                  f"{row['decrypt_mb_s']:>9} {row['decrypt_msg_s']:>10}")
+    return results
+
+
 # ═══════════════════════════════════════════════════════════════════════════════
 #                              ТЕСТИРОВАНИЕ
 # ═══════════════════════════════════════════════════════════════════════════════
@@ -742,5 +1088,10 @@ def test_node_kem():
 
 
 if __name__ == "__main__":
+    import sys
+
     logging.basicConfig(level=logging.INFO)
-    test_node_kem()
+    if "--benchmark" in sys.argv:
+        benchmark()
+    else:
+        test_node_kem()
@@ -26,11 +26,14 @@ import asyncio
 import logging
 import hashlib
 import json
+import os
 from pathlib import Path
 from typing import Optional, Dict, Any, Tuple
 from datetime import datetime, timezone
 from dataclasses import dataclass
 
+from node_wire import WIRE_FORMAT, dumps, loads, is_wire, negotiate
+
 logger = logging.getLogger(__name__)
 
 # ML-KEM-768 Post-Quantum Key Exchange
@@ -39,7 +42,8 @@ try:
         NodeKEMManager,
         SecureChannel as PQSecureChannel,
         check_dependencies as check_pq_dependencies,
-        PQ_PORT
+        PQ_PORT,
+        RESUME_NONCE_SIZE
     )
     HAS_PQ = check_pq_dependencies()
 except ImportError:
@@ -62,6 +66,16 @@ class TLSConfig:
     CONNECT_TIMEOUT: float = 10.0
     READ_TIMEOUT: float = 30.0
 
+    # Постоянные каналы: keepalive чаще, чем сервер закрывает простаивающее соединение
+    KEEPALIVE_INTERVAL: float = 15.0
+    RECONNECT_BASE: float = 0.5
+    RECONNECT_MAX: float = 30.0
+    # Канал без запросов дольше этого закрывается и не переподключается
+    IDLE_TIMEOUT: float = 300.0
+    # PQ канал переиспользуется при переподключении не дольше этого
+    PQ_RESUME_TTL: float = 3600.0
+    MAX_FRAME_SIZE: int = 16 * 1024 * 1024
+
     # SSL/TLS параметры
     TLS_VERSION = ssl.TLSVersion.TLSv1_3
     VERIFY_MODE = ssl.CERT_OPTIONAL  # CERT_REQUIRED для production
@@ -288,6 +302,461 @@ class SecureContext:
         return context
 
 
+# ═══════════════════════════════════════════════════════════════════════════════
+#                              ФРЕЙМЫ
+# ═══════════════════════════════════════════════════════════════════════════════
+
+# Поле с номером потока: ответ сервера несёт тот же номер
+STREAM_FIELD = "_stream"
+KEEPALIVE_TYPE = "keepalive"
+# Согласование формата (node_wire): первый фрейм соединения
+WIRE_HELLO_TYPE = "wire_hello"
+
+
+def write_frame(writer: asyncio.StreamWriter, data: bytes):
+    """Пишет фрейм: 4 байта длины (big-endian) + данные"""
+    writer.write(len(data).to_bytes(4, 'big') + data)
+
+
+async def read_frame(reader: asyncio.StreamReader, timeout: float = None) -> bytes:
+    """
+    Читает фрейм целиком
+
+    reader.read(n) может вернуть меньше n байт (TLS-запись короче фрейма),
+    поэтому только readexactly. Закрытое соединение — IncompleteReadError.
+    """
+    header = await asyncio.wait_for(reader.readexactly(4), timeout=timeout)
+    length = int.from_bytes(header, 'big')
+    if length > TLSConfig.MAX_FRAME_SIZE:
+        raise ValueError(f"Фрейм слишком большой: {length} байт")
+    return await asyncio.wait_for(reader.readexactly(length), timeout=timeout)
+
+
+def _builtin_response(message: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Ответ на служебные сообщения канала (keepalive, wire_hello)"""
+    msg_type = message.get("type")
+    if msg_type == KEEPALIVE_TYPE:
+        return {"type": KEEPALIVE_TYPE}
+    if msg_type == WIRE_HELLO_TYPE:
+        return {"type": WIRE_HELLO_TYPE, "format": negotiate(message.get("formats"))}
+    return None
+
+
+async def _send_response(
+    writer: asyncio.StreamWriter,
+    response: Dict[str, Any],
+    stream: Optional[int],
+    pq_channel: 'PQSecureChannel' = None,
+    binary: bool = False
+):
+    """
+    Отправляет ответ на запрос, возвращая номер потока клиента
+
+    Ответ идёт в формате запроса (binary — запрос был в mw1).
+    """
+    if stream is not None:
+        response = dict(response)
+        response[STREAM_FIELD] = stream
+
+    data = dumps(response, binary)
+    if pq_channel is not None:
+        # encrypt и write без await между ними: счётчики идут в порядке фреймов
+        data = pq_channel.encrypt(data)
+        if not data:
+            return
+
+    write_frame(writer, data)
+    await writer.drain()
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+#                              ПОСТОЯННЫЕ КАНАЛЫ
+# ═══════════════════════════════════════════════════════════════════════════════
+
+class PeerChannel:
+    """
+    Долгоживущее соединение с одним узлом
+
+    Одно TLS соединение (и один ML-KEM-768 канал поверх него) на узел.
+    Параллельные запросы мультиплексируются по номеру потока: ответы
+    разбирает фоновая задача чтения. Ответ без номера (старый сервер,
+    отвечающий строго по порядку) отдаётся самому раннему запросу.
+
+    Простаивающее соединение поддерживается keepalive; оборванное —
+    переподключается с экспоненциальной задержкой. При переподключении
+    PQ канал возобновляется (kem_resume) без нового ML-KEM handshake.
+
+    Первым фреймом соединения согласуется формат (wire_hello): узлы,
+    понимающие mw1 (node_wire), обмениваются бинарными фреймами, старые — JSON.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int = TLSConfig.SECURE_PORT,
+        ssl_context: ssl.SSLContext = None,
+        kem: 'NodeKEMManager' = None,
+        keepalive_interval: float = TLSConfig.KEEPALIVE_INTERVAL,
+        connect_timeout: float = TLSConfig.CONNECT_TIMEOUT
+    ):
+        self.host = host
+        self.port = port
+        self.ssl_context = ssl_context or SecureContext.create_client_context(verify=False)
+        self.kem = kem
+        self.keepalive_interval = keepalive_interval
+        self.connect_timeout = connect_timeout
+
+        self.pq_channel: Optional['PQSecureChannel'] = None
+        # Формат фреймов, согласованный с узлом
+        self.binary = False
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._connect_lock: Optional[asyncio.Lock] = None
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._read_task: Optional[asyncio.Task] = None
+        self._keepalive_task: Optional[asyncio.Task] = None
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._next_stream = 0
+
+        self._backoff = TLSConfig.RECONNECT_BASE
+        self._retry_at = 0.0
+        self._last_activity = 0.0
+        self._last_request = 0.0
+        self._closed = False
+
+        self.stats = {
+            "connects": 0, "reconnects": 0, "connect_failures": 0,
+            "requests": 0, "keepalives": 0, "pq_handshakes": 0, "pq_resumed": 0,
+            "bytes_sent": 0, "bytes_received": 0
+        }
+
+    @property
+    def connected(self) -> bool:
+        return self._writer is not None
+
+    def _bind_loop(self):
+        """Привязка к текущему циклу событий (asyncio.run на каждый вызов — новый цикл)"""
+        loop = asyncio.get_running_loop()
+        if self._loop is loop:
+            return loop
+        # Соединение старого цикла использовать нельзя; PQ канал — можно
+        self._loop = loop
+        self._connect_lock = asyncio.Lock()
+        self._reader = self._writer = None
+        self._read_task = self._keepalive_task = None
+        self._pending = {}
+        self._retry_at = 0.0
+        self._closed = False
+        return loop
+
+    # ─── Соединение ───
+
+    async def _handshake_request(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+        message: Dict[str, Any],
+        binary: bool = None
+    ) -> Dict[str, Any]:
+        """Запрос-ответ до запуска задачи чтения (служебные фреймы соединения)"""
+        write_frame(writer, dumps(message, self.binary if binary is None else binary))
+        await writer.drain()
+        return loads(await read_frame(reader, self.connect_timeout))
+
+    async def _negotiate_format(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """wire_hello в JSON: старый сервер ответит ack без format — остаёмся на JSON"""
+        response = await self._handshake_request(reader, writer, {
+            "type": WIRE_HELLO_TYPE,
+            "formats": [WIRE_FORMAT, "json"]
+        }, binary=False)
+        self.binary = response.get("format") == WIRE_FORMAT
+
+    async def _pq_handshake(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter
+    ) -> 'PQSecureChannel':
+        """Возобновляет PQ канал или выполняет ML-KEM-768 handshake внутри TLS"""
+        channel = self.pq_channel
+        if channel is not None:
+            age = (datetime.now(timezone.utc) - channel.established_at).total_seconds()
+            if age < TLSConfig.PQ_RESUME_TTL:
+                response = await self._handshake_request(reader, writer, {
+                    "type": "kem_resume",
+                    "node_address": self.kem.node_address
+                })
+                if response.get("type") == "kem_challenge":
+                    # Доказываем владение ключом канала: HMAC по nonce сервера
+                    try:
+                        proof = channel.resume_proof(bytes.fromhex(response.get("nonce", "")))
+                    except ValueError:
+                        proof = b""
+                    response = await self._handshake_request(reader, writer, {
+                        "type": "kem_resume_proof",
+                        "proof": proof.hex()
+                    })
+                    # Возобновление — только после проверки ключа; иначе полный handshake
+                    if response.get("type") == "kem_resumed":
+                        self.stats["pq_resumed"] += 1
+                        return channel
+
+        # Ключи и подписи handshake в mw1 — сырые байты вместо hex
+        response = await self._handshake_request(reader, writer, self.kem.get_handshake_request())
+        if response.get("type") == "kem_response":
+            channel = self.kem.process_handshake_response(response)
+            if channel:
+                self.stats["pq_handshakes"] += 1
+                return channel
+        raise ConnectionError("PQ handshake failed")
+
+    async def _connect(self):
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port, ssl=self.ssl_context),
+            timeout=self.connect_timeout
+        )
+        try:
+            await self._negotiate_format(reader, writer)
+            if self.kem is not None:
+                self.pq_channel = await self._pq_handshake(reader, writer)
+        except BaseException:
+            writer.close()
+            raise
+
+        self._reader, self._writer = reader, writer
+        self._last_activity = self._loop.time()
+        self._read_task = asyncio.create_task(self._read_loop(reader, writer))
+
+    async def _ensure_connected(self):
+        """Подключается, если нужно; в окне задержки после сбоя — сразу ConnectionError"""
+        if self._writer is not None:
+            return
+        async with self._connect_lock:
+            if self._writer is not None:
+                return
+            now = self._loop.time()
+            if now < self._retry_at:
+                raise ConnectionError(
+                    f"{self.host}:{self.port} недоступен, повтор через {self._retry_at - now:.1f}с"
+                )
+            try:
+                await self._connect()
+            except Exception as e:
+                self.stats["connect_failures"] += 1
+                self._retry_at = self._loop.time() + self._backoff
+                self._backoff = min(self._backoff * 2, TLSConfig.RECONNECT_MAX)
+                raise ConnectionError(f"Подключение к {self.host}:{self.port}: {e}") from e
+
+            if self.stats["connects"]:
+                self.stats["reconnects"] += 1
+            self.stats["connects"] += 1
+            self._backoff = TLSConfig.RECONNECT_BASE
+            self._retry_at = 0.0
+            logger.debug(f"🔐 Канал {self.host}:{self.port} подключён")
+
+            if self._keepalive_task is None or self._keepalive_task.done():
+                self._keepalive_task = asyncio.create_task(self._keepalive_loop())
+
+    def _drop(self, reason: str, writer: asyncio.StreamWriter = None):
+        """Закрывает текущее соединение; ожидающие запросы получают ConnectionError"""
+        if writer is not None and writer is not self._writer:
+            return
+        writer = self._writer
+        read_task = self._read_task
+        self._reader = self._writer = None
+        self._read_task = None
+
+        if read_task is not None and read_task is not asyncio.current_task():
+            read_task.cancel()
+        if writer is not None:
+            writer.close()
+            logger.debug(f"🔌 Канал {self.host}:{self.port} закрыт: {reason}")
+
+        pending, self._pending = self._pending, {}
+        for future in pending.values():
+            if not future.done():
+                future.set_exception(ConnectionError(reason))
+
+    async def _read_loop(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Разбирает ответы и раздаёт их ожидающим запросам"""
+        reason = "соединение закрыто"
+        try:
+            while True:
+                data = await read_frame(reader)
+                self.stats["bytes_received"] += len(data)
+                if self.pq_channel is not None:
+                    data = self.pq_channel.decrypt(data)
+                    if data is None:
+                        continue
+
+                message = loads(data)
+                self._last_activity = self._loop.time()
+
+                stream = message.pop(STREAM_FIELD, None)
+                if stream is None and self._pending:
+                    stream = next(iter(self._pending))
+                future = self._pending.pop(stream, None)
+                if future is not None and not future.done():
+                    future.set_result(message)
+
+        except asyncio.CancelledError:
+            raise
+        except asyncio.IncompleteReadError:
+            pass
+        except Exception as e:
+            reason = f"ошибка чтения: {e}"
+        self._drop(reason, writer)
+
+    async def _keepalive_loop(self):
+        """Keepalive простаивающего соединения и переподключение с задержкой"""
+        while not self._closed:
+            now = self._loop.time()
+            if now - self._last_request > TLSConfig.IDLE_TIMEOUT:
+                self._drop("простой")
+                break
+
+            if self._writer is None:
+                await asyncio.sleep(max(self._retry_at - now, 0.0))
+                try:
+                    await self._ensure_connected()
+                except ConnectionError:
+                    pass
+                continue
+
+            idle = now - self._last_activity
+            if idle < self.keepalive_interval:
+                await asyncio.sleep(self.keepalive_interval - idle)
+                continue
+
+            writer = self._writer
+            try:
+                self.stats["keepalives"] += 1
+                await self._send({"type": KEEPALIVE_TYPE}, self.keepalive_interval)
+            except (ConnectionError, asyncio.TimeoutError):
+                self._drop("нет ответа на keepalive", writer)
+
+        self._keepalive_task = None
+
+    # ─── Запросы ───
+
+    async def _send(self, message: Dict[str, Any], timeout: float) -> Dict[str, Any]:
+        await self._ensure_connected()
+        writer = self._writer
+
+        self._next_stream += 1
+        stream = self._next_stream
+        future = self._loop.create_future()
+        self._pending[stream] = future
+
+        data = dumps({**message, STREAM_FIELD: stream}, self.binary)
+        if self.pq_channel is not None:
+            data = self.pq_channel.encrypt(data)
+            if not data:
+                self._pending.pop(stream, None)
+                raise ConnectionError("PQ encryption failed")
+        self.stats["bytes_sent"] += len(data)
+
+        try:
+            try:
+                write_frame(writer, data)
+                self._last_activity = self._loop.time()
+                await writer.drain()
+            except (OSError, RuntimeError) as e:
+                self._drop(f"ошибка записи: {e}", writer)
+                raise ConnectionError(str(e)) from e
+            return await asyncio.wait_for(future, timeout=timeout)
+        finally:
+            self._pending.pop(stream, None)
+
+    async def request(
+        self,
+        message: Dict[str, Any],
+        timeout: float = TLSConfig.READ_TIMEOUT
+    ) -> Dict[str, Any]:
+        """
+        Отправляет запрос и ждёт ответ
+
+        Raises:
+            ConnectionError: узел недоступен или соединение оборвалось
+            asyncio.TimeoutError: нет ответа за timeout
+        """
+        self._bind_loop()
+        self._closed = False
+        self._last_request = self._loop.time()
+        self.stats["requests"] += 1
+        return await self._send(message, timeout)
+
+    async def close(self):
+        """Закрывает канал (PQ канал сохраняется для следующего подключения)"""
+        self._closed = True
+        task = self._keepalive_task
+        self._keepalive_task = None
+        if task is not None and task is not asyncio.current_task():
+            task.cancel()
+        writer = self._writer
+        self._drop("канал закрыт")
+        if writer is not None:
+            try:
+                await writer.wait_closed()
+            except Exception:
+                pass
+
+
+class ChannelManager:
+    """
+    Постоянные каналы ко всем узлам: один PeerChannel на (host, port)
+    """
+
+    def __init__(
+        self,
+        ssl_context: ssl.SSLContext = None,
+        kem: 'NodeKEMManager' = None,
+        keepalive_interval: float = TLSConfig.KEEPALIVE_INTERVAL
+    ):
+        # Один SSL контекст на все соединения
+        self.ssl_context = ssl_context or SecureContext.create_client_context(verify=False)
+        self.kem = kem
+        self.keepalive_interval = keepalive_interval
+        self._channels: Dict[Tuple[str, int], PeerChannel] = {}
+
+    def get_channel(self, host: str, port: int = TLSConfig.SECURE_PORT) -> PeerChannel:
+        key = (host, port)
+        channel = self._channels.get(key)
+        if channel is None:
+            channel = PeerChannel(
+                host, port,
+                ssl_context=self.ssl_context,
+                kem=self.kem,
+                keepalive_interval=self.keepalive_interval
+            )
+            self._channels[key] = channel
+        return channel
+
+    async def request(
+        self,
+        host: str,
+        message: Dict[str, Any],
+        port: int = TLSConfig.SECURE_PORT,
+        timeout: float = TLSConfig.READ_TIMEOUT
+    ) -> Dict[str, Any]:
+        """Запрос к узлу через его постоянный канал"""
+        return await self.get_channel(host, port).request(message, timeout)
+
+    async def close(self):
+        for channel in list(self._channels.values()):
+            await channel.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            f"{host}:{port}": {
+                "connected": channel.connected,
+                "format": WIRE_FORMAT if channel.binary else "json",
+                **channel.stats
+            }
+            for (host, port), channel in self._channels.items()
+        }
+
+
 # ═══════════════════════════════════════════════════════════════════════════════
 #                              ЗАЩИЩЁННЫЙ КЛИЕНТ
 # ═══════════════════════════════════════════════════════════════════════════════
@@ -295,10 +764,14 @@ class SecureContext:
 class SecureNodeClient:
     """
     Клиент для защищённой связи с другими узлами
+
+    Сообщения идут через постоянные каналы (ChannelManager): одно TLS
+    соединение на узел вместо handshake на каждое сообщение.
     """
 
     def __init__(self, cert_manager: CertificateManager = None):
         self.cert_manager = cert_manager or CertificateManager()
+        self.channels = ChannelManager()
 
     async def connect(
         self,
@@ -350,39 +823,15 @@ class SecureNodeClient:
         Returns:
             Ответ (dict) или None
         """
-        reader, writer = await self.connect(host, port)
-        if not reader or not writer:
-            return None
-
         try:
-            # Отправляем
-            data = json.dumps(message).encode('utf-8')
-            writer.write(len(data).to_bytes(4, 'big'))
-            writer.write(data)
-            await writer.drain()
-
-            # Получаем ответ
-            length_bytes = await asyncio.wait_for(
-                reader.read(4),
-                timeout=TLSConfig.READ_TIMEOUT
-            )
-            if not length_bytes:
-                return None
-
-            length = int.from_bytes(length_bytes, 'big')
-            response_data = await asyncio.wait_for(
-                reader.read(length),
-                timeout=TLSConfig.READ_TIMEOUT
-            )
-
-            return json.loads(response_data.decode('utf-8'))
-
-        except Exception as e:
-            logger.warning(f"❌ Ошибка отправки: {e}")
+            return await self.channels.request(host, message, port)
+        except (ConnectionError, asyncio.TimeoutError) as e:
+            logger.warning(f"❌ Ошибка отправки на {host}:{port}: {e}")
             return None
-        finally:
-            writer.close()
-            await writer.wait_closed()
+
+    async def close(self):
+        """Закрывает постоянные каналы"""
+        await self.channels.close()
 
 
 # ═══════════════════════════════════════════════════════════════════════════════
@@ -433,48 +882,58 @@ class SecureNodeServer:
         reader: asyncio.StreamReader,
         writer: asyncio.StreamWriter
     ):
-        """Обрабатывает клиентское соединение"""
+        """
+        Обрабатывает клиентское соединение
+
+        Каждый запрос обрабатывается в своей задаче: медленный обработчик
+        не задерживает остальные запросы мультиплексированного канала.
+        """
         peer = writer.get_extra_info('peername')
         logger.debug(f"🔐 TLS клиент подключился: {peer}")
+        tasks = set()
 
         try:
             while True:
-                # Читаем длину сообщения
-                length_bytes = await asyncio.wait_for(
-                    reader.read(4),
-                    timeout=TLSConfig.READ_TIMEOUT
-                )
-                if not length_bytes:
-                    break
-
-                length = int.from_bytes(length_bytes, 'big')
-
-                # Читаем сообщение
-                data = await asyncio.wait_for(
-                    reader.read(length),
-                    timeout=TLSConfig.READ_TIMEOUT
-                )
-
-                message = json.loads(data.decode('utf-8'))
-                msg_type = message.get("type", "unknown")
+                data = await read_frame(reader, TLSConfig.READ_TIMEOUT)
+                message = loads(data)
 
-                # Обрабатываем
-                handler = self._handlers.get(msg_type, self._default_handler)
-                response = await handler(message, peer)
-
-                # Отправляем ответ
-                response_data = json.dumps(response).encode('utf-8')
-                writer.write(len(response_data).to_bytes(4, 'big'))
-                writer.write(response_data)
-                await writer.drain()
+                task = asyncio.create_task(self._reply(writer, message, peer, is_wire(data)))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
 
+        except asyncio.IncompleteReadError:
+            pass
         except asyncio.TimeoutError:
             logger.debug(f"⏰ Клиент {peer} таймаут")
         except Exception as e:
             logger.warning(f"❌ Ошибка обработки клиента {peer}: {e}")
         finally:
+            for task in tasks:
+                task.cancel()
             writer.close()
-            await writer.wait_closed()
+            try:
+                await writer.wait_closed()
+            except Exception:
+                pass
+
+    async def _reply(self, writer: asyncio.StreamWriter, message: Dict, peer, binary: bool = False):
+        """Обрабатывает запрос и отвечает с тем же номером потока"""
+        stream = message.pop(STREAM_FIELD, None)
+        msg_type = message.get("type", "unknown")
+
+        response = _builtin_response(message)
+        if response is None:
+            handler = self._handlers.get(msg_type, self._default_handler)
+            try:
+                response = await handler(message, peer)
+            except Exception as e:
+                logger.warning(f"❌ Ошибка обработчика {msg_type} от {peer}: {e}")
+                response = {"type": "error", "message": str(e)}
+
+        try:
+            await _send_response(writer, response, stream, binary=binary)
+        except (ConnectionError, RuntimeError):
+            pass
 
     async def _default_handler(self, message: Dict, peer) -> Dict:
         """Обработчик по умолчанию"""
@@ -485,12 +944,12 @@ class SecureNodeServer:
             "timestamp": datetime.now(timezone.utc).isoformat()
         }
 
-    async def start(
+    async def listen(
         self,
         host: str = "0.0.0.0",
         port: int = TLSConfig.SECURE_PORT
-    ):
-        """Запускает TLS сервер"""
+    ) -> asyncio.AbstractServer:
+        """Начинает принимать соединения (без ожидания)"""
         ssl_context = SecureContext.create_server_context(
             self.cert_path,
             self.key_path
@@ -504,6 +963,15 @@ class SecureNodeServer:
 
         logger.info(f"🔐 TLS сервер запущен на {host}:{port}")
         logger.info(f"   Сертификат: {self.cert_path}")
+        return self._server
+
+    async def start(
+        self,
+        host: str = "0.0.0.0",
+        port: int = TLSConfig.SECURE_PORT
+    ):
+        """Запускает TLS сервер"""
+        await self.listen(host, port)
 
         async with self._server:
             await self._server.serve_forever()
@@ -530,6 +998,9 @@ class HybridSecureClient:
     Это обеспечивает защиту даже если:
     - TLS взломан квантовым компьютером
     - ML-KEM-768 имеет уязвимость
+
+    send_message держит постоянный канал на узел: handshake TLS и
+    ML-KEM-768 выполняются один раз, а не на каждое сообщение.
     """
 
     def __init__(
@@ -540,6 +1011,24 @@ class HybridSecureClient:
         self.cert_manager = cert_manager or CertificateManager()
         self.kem = kem_manager
         self._tls_client = SecureNodeClient(self.cert_manager)
+        self.channels = ChannelManager(kem=self.kem if HAS_PQ else None)
+
+    async def send_message(
+        self,
+        host: str,
+        message: Dict[str, Any],
+        port: int = TLSConfig.SECURE_PORT
+    ) -> Optional[Dict[str, Any]]:
+        """Отправляет сообщение через постоянный гибридный канал"""
+        try:
+            return await self.channels.request(host, message, port)
+        except (ConnectionError, asyncio.TimeoutError) as e:
+            logger.warning(f"Hybrid send to {host}:{port} failed: {e}")
+            return None
+
+    async def close(self):
+        """Закрывает постоянные каналы"""
+        await self.channels.close()
 
     async def establish_hybrid_channel(
         self,
@@ -568,16 +1057,11 @@ class HybridSecureClient:
 
             # 2. Отправляем ML-KEM-768 handshake внутри TLS
             request = self.kem.get_handshake_request()
-            data = json.dumps(request).encode()
-            writer.write(len(data).to_bytes(4, 'big'))
-            writer.write(data)
+            write_frame(writer, json.dumps(request).encode())
             await writer.drain()
 
             # 3. Получаем ответ
-            length_bytes = await asyncio.wait_for(reader.read(4), timeout=timeout)
-            length = int.from_bytes(length_bytes, 'big')
-            response_data = await asyncio.wait_for(reader.read(length), timeout=timeout)
-            response = json.loads(response_data.decode())
+            response = json.loads((await read_frame(reader, timeout)).decode())
 
             # 4. Обрабатываем ML-KEM-768 ответ
             if response.get("type") == "kem_response":
@@ -615,20 +1099,11 @@ class HybridSecureClient:
                 return None
 
             # 2. Отправляем через TLS
-            writer.write(len(encrypted).to_bytes(4, 'big'))
-            writer.write(encrypted)
+            write_frame(writer, encrypted)
             await writer.drain()
 
             # 3. Получаем зашифрованный ответ
-            length_bytes = await asyncio.wait_for(
-                reader.read(4),
-                timeout=TLSConfig.READ_TIMEOUT
-            )
-            length = int.from_bytes(length_bytes, 'big')
-            encrypted_response = await asyncio.wait_for(
-                reader.read(length),
-                timeout=TLSConfig.READ_TIMEOUT
-            )
+            encrypted_response = await read_frame(reader, TLSConfig.READ_TIMEOUT)
 
             # 4. Расшифровываем ML-KEM-768
             decrypted = pq_channel.decrypt(encrypted_response)
@@ -686,79 +1161,125 @@ class HybridSecureServer:
         reader: asyncio.StreamReader,
         writer: asyncio.StreamWriter
     ):
-        """Обрабатывает клиентское соединение с hybrid security"""
+        """
+        Обрабатывает клиентское соединение с hybrid security
+
+        Первый фрейм — ML-KEM-768 handshake, kem_resume (возобновление
+        канала после переподключения) или обычное TLS сообщение.
+        Запросы обрабатываются параллельно, ответ несёт номер потока.
+        """
         peer = writer.get_extra_info('peername')
         pq_channel = None
+        # (node_address, nonce) выданного kem_challenge
+        resume = None
+        tasks = set()
+
+        def spawn(data: bytes, channel):
+            task = asyncio.create_task(
+                self._reply(writer, loads(data), peer, channel, is_wire(data))
+            )
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
 
         try:
             while True:
-                # Читаем сообщение
-                length_bytes = await asyncio.wait_for(
-                    reader.read(4),
-                    timeout=TLSConfig.READ_TIMEOUT
-                )
-                if not length_bytes:
-                    break
+                data = await read_frame(reader, TLSConfig.READ_TIMEOUT)
 
-                length = int.from_bytes(length_bytes, 'big')
-                data = await asyncio.wait_for(
-                    reader.read(length),
-                    timeout=TLSConfig.READ_TIMEOUT
-                )
-
-                # Проверяем: это ML-KEM handshake или зашифрованное сообщение?
-                if pq_channel is None:
-                    # Первое сообщение — пробуем как JSON handshake
-                    try:
-                        message = json.loads(data.decode())
-
-                        if message.get("type") == "kem_handshake" and self.kem:
-                            # ML-KEM-768 handshake
-                            result = self.kem.process_handshake_request(message)
-                            if result:
-                                response, pq_channel = result
-                                self._pq_channels[message["node_address"]] = pq_channel
-
-                                response_data = json.dumps(response).encode()
-                                writer.write(len(response_data).to_bytes(4, 'big'))
-                                writer.write(response_data)
-                                await writer.drain()
-                                logger.info(f"🔐 PQ handshake complete with {peer}")
-                                continue
-                        else:
-                            # Обычное TLS сообщение
-                            response = await self._process_message(message, peer)
-                            response_data = json.dumps(response).encode()
-                            writer.write(len(response_data).to_bytes(4, 'big'))
-                            writer.write(response_data)
-                            await writer.drain()
-                            continue
-
-                    except json.JSONDecodeError:
-                        # Не JSON — пропускаем
-                        pass
-                else:
+                if pq_channel is not None:
                     # PQ канал установлен — расшифровываем
                     decrypted = pq_channel.decrypt(data)
                     if decrypted:
-                        message = json.loads(decrypted.decode())
-                        response = await self._process_message(message, peer)
+                        spawn(decrypted, pq_channel)
+                    continue
+
+                # Канала ещё нет — открытый фрейм (JSON или mw1)
+                try:
+                    message = loads(data)
+                except ValueError:
+                    continue
+                binary = is_wire(data)
+
+                msg_type = message.get("type")
+                if msg_type == "kem_handshake" and self.kem:
+                    # ML-KEM-768 handshake
+                    result = self.kem.process_handshake_request(message)
+                    if result:
+                        response, pq_channel = result
+                        self._pq_channels[message["node_address"]] = pq_channel
+                        await _send_response(writer, response, None, binary=binary)
+                        logger.info(f"🔐 PQ handshake complete with {peer}")
+
+                elif msg_type == "kem_resume" and self.kem:
+                    # Challenge выдаётся всегда: по ответу не узнать, есть ли канал у узла
+                    resume = (message.get("node_address"), os.urandom(RESUME_NONCE_SIZE))
+                    await _send_response(writer, {"type": "kem_challenge", "nonce": resume[1].hex()},
+                                         None, binary=binary)
+
+                elif msg_type == "kem_resume_proof" and self.kem and resume:
+                    # Тот же ключ, счётчики продолжаются — replay старых фреймов отсекается.
+                    # Ключ, заменённый новым handshake, не пройдёт проверку: kem_unknown
+                    node_address, nonce = resume
+                    resume = None
+                    channel = self._resumable_channel(node_address)
+                    try:
+                        proof = bytes.fromhex(message.get("proof", ""))
+                    except (TypeError, ValueError):
+                        proof = b""
+                    if channel is not None and channel.check_resume_proof(nonce, proof):
+                        pq_channel = channel
+                    status = "kem_resumed" if pq_channel else "kem_unknown"
+                    await _send_response(writer, {"type": status}, None, binary=binary)
 
-                        # Шифруем ответ
-                        response_data = json.dumps(response).encode()
-                        encrypted = pq_channel.encrypt(response_data)
-                        if encrypted:
-                            writer.write(len(encrypted).to_bytes(4, 'big'))
-                            writer.write(encrypted)
-                            await writer.drain()
+                else:
+                    # Обычное TLS сообщение
+                    spawn(data, None)
 
-        except asyncio.TimeoutError:
+        except (asyncio.IncompleteReadError, asyncio.TimeoutError):
             pass
         except Exception as e:
             logger.warning(f"Hybrid client error {peer}: {e}")
         finally:
+            for task in tasks:
+                task.cancel()
             writer.close()
-            await writer.wait_closed()
+            try:
+                await writer.wait_closed()
+            except Exception:
+                pass
+
+    def _resumable_channel(self, node_address: Optional[str]) -> Optional['PQSecureChannel']:
+        """PQ канал узла, если он ещё не устарел"""
+        channel = self._pq_channels.get(node_address)
+        if channel is None:
+            return None
+        age = (datetime.now(timezone.utc) - channel.established_at).total_seconds()
+        if age >= TLSConfig.PQ_RESUME_TTL:
+            del self._pq_channels[node_address]
+            return None
+        return channel
+
+    async def _reply(
+        self,
+        writer: asyncio.StreamWriter,
+        message: Dict,
+        peer,
+        pq_channel,
+        binary: bool = False
+    ):
+        """Обрабатывает запрос и отвечает с тем же номером потока"""
+        stream = message.pop(STREAM_FIELD, None)
+        response = _builtin_response(message)
+        if response is None:
+            try:
+                response = await self._process_message(message, peer)
+            except Exception as e:
+                logger.warning(f"Hybrid handler error {peer}: {e}")
+                response = {"type": "error", "message": str(e)}
+
+        try:
+            await _send_response(writer, response, stream, pq_channel, binary)
+        except (ConnectionError, RuntimeError):
+            pass
 
     async def _process_message(self, message: Dict, peer) -> Dict:
         """Обрабатывает сообщение"""
@@ -776,8 +1297,12 @@ class HybridSecureServer:
             "timestamp": datetime.now(timezone.utc).isoformat()
         }
 
-    async def start(self, host: str = "0.0.0.0", port: int = TLSConfig.SECURE_PORT):
-        """Запускает hybrid TLS сервер"""
+    async def listen(
+        self,
+        host: str = "0.0.0.0",
+        port: int = TLSConfig.SECURE_PORT
+    ) -> asyncio.AbstractServer:
+        """Начинает принимать соединения (без ожидания)"""
         ssl_context = SecureContext.create_server_context(self.cert_path, self.key_path)
 
         self._server = await asyncio.start_server(
@@ -788,6 +1313,11 @@ class HybridSecureServer:
 
         pq_status = "ML-KEM-768 enabled" if self.kem else "TLS only"
         logger.info(f"🔐 Hybrid server started on {host}:{port} ({pq_status})")
+        return self._server
+
+    async def start(self, host: str = "0.0.0.0", port: int = TLSConfig.SECURE_PORT):
+        """Запускает hybrid TLS сервер"""
+        await self.listen(host, port)
 
         async with self._server:
             await self._server.serve_forever()
@@ -798,6 +1328,71 @@ class HybridSecureServer:
             self._server.close()
 
 
+# ═══════════════════════════════════════════════════════════════════════════════
+#                              BENCHMARK
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def benchmark(messages: int = 200, concurrency: int = 32) -> dict:
+    """
+    Задержка сообщения: новое TLS соединение на сообщение против
+    постоянного канала (последовательно и параллельно) на localhost
+    """
+    import tempfile
+    import time
+
+    async def run() -> dict:
+        data_dir = Path(tempfile.mkdtemp(prefix="montana_tls_"))
+        server = SecureNodeServer("bench", "mt" + "0" * 40, CertificateManager(data_dir))
+        listener = await server.listen("127.0.0.1", 0)
+        port = listener.sockets[0].getsockname()[1]
+        message = {"type": "ping", "payload": "x" * 256}
+
+        # Как раньше: TLS handshake на каждое сообщение
+        client = SecureNodeClient(server.cert_manager)
+        started = time.perf_counter()
+        for _ in range(messages):
+            reader, writer = await client.connect("127.0.0.1", port)
+            write_frame(writer, json.dumps(message).encode())
+            await writer.drain()
+            await read_frame(reader)
+            writer.close()
+            await writer.wait_closed()
+        one_shot = (time.perf_counter() - started) / messages
+
+        started = time.perf_counter()
+        for _ in range(messages):
+            await client.send_message("127.0.0.1", message, port)
+        persistent = (time.perf_counter() - started) / messages
+
+        started = time.perf_counter()
+        total = messages * 5
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one():
+            async with semaphore:
+                await client.send_message("127.0.0.1", message, port)
+
+        await asyncio.gather(*(one() for _ in range(total)))
+        multiplexed = total / (time.perf_counter() - started)
+
+        stats = client.channels.get_stats()[f"127.0.0.1:{port}"]
+        await client.close()
+        server.stop()
+
+        return {
+            "one_shot_ms": round(one_shot * 1000, 3),
+            "persistent_ms": round(persistent * 1000, 3),
+            "speedup": round(one_shot / persistent, 1),
+            "multiplexed_msg_per_sec": round(multiplexed),
+            "connects": stats["connects"],
+        }
+
+    result = asyncio.run(run())
+    for name, value in result.items():
+        print(f"{name:24} {value}")
+    return result
+
+
 # ═══════════════════════════════════════════════════════════════════════════════
 #                              CLI
 # ═══════════════════════════════════════════════════════════════════════════════
@@ -813,7 +1408,10 @@ if __name__ == "__main__":
     print("🔐 Montana Node TLS")
     print("=" * 50)
 
-    if len(sys.argv) > 1:
+    if "--benchmark" in sys.argv:
+        benchmark()
+
+    elif len(sys.argv) > 1:
         cmd = sys.argv[1]
 
         if cmd == "gen-cert":
@@ -858,4 +1456,5 @@ if __name__ == "__main__":
   python node_tls.py gen-cert <node_name> [address]  — генерация сертификата
   python node_tls.py server <node_name>              — запуск TLS сервера
   python node_tls.py test <host>                     — тест подключения
+  python node_tls.py --benchmark                     — новое соединение vs постоянный канал
         """)
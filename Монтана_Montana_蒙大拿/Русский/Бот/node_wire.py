@@ -0,0 +1,703 @@
+#!/usr/bin/env python3
+"""
+node_wire.py
+Montana Protocol — Компактный бинарный формат межузловых сообщений
+
+JSON между узлами расточителен: подписи ML-DSA-65 (3309 байт) и ключи
+(1952 байта) идут hex-строками вдвое длиннее, а в пачке событий имена
+полей повторяются в каждой записи. Формат mw1:
+
+- Значения с тегами (msgpack-подобно): null/bool/int/float/str/list/map
+- Hex-строки (хэши, ключи, подписи, адреса mt...) — сырые байты;
+  при декодировании восстанавливается та же строка
+- Список однотипных dict (Event, Transaction, регистрации) — таблица:
+  имена полей один раз, значения по колонкам (int64/float64 через struct,
+  hex-колонка одним bytes.fromhex, повторяющиеся строки и адреса —
+  словарём, монотонные числа — разностями)
+- Поверх формата — сжатие тела (Content-Encoding: zstd, если установлен
+  zstandard, иначе deflate)
+
+Сообщение: WIRE_MAGIC + версия + значение. JSON никогда не начинается
+с \\x00, поэтому loads() различает форматы сам. Формат согласуется с
+каждым узлом отдельно (wire_hello в node_tls, Content-Type/Accept в HTTP);
+JSON остаётся запасным вариантом.
+"""
+
+import re
+import json
+import zlib
+import struct
+from itertools import accumulate
+from typing import Any, List, Optional, Tuple
+
+try:
+    import zstandard
+    HAS_ZSTD = True
+except ImportError:
+    HAS_ZSTD = False
+
+# Ошибки распаковки, которые означают повреждённое тело (→ WireError)
+_DECOMPRESS_ERRORS = (zlib.error, ValueError) + ((zstandard.ZstdError,) if HAS_ZSTD else ())
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+#                              КОНФИГУРАЦИЯ
+# ═══════════════════════════════════════════════════════════════════════════════
+
+WIRE_MAGIC = b"\x00MW"
+WIRE_VERSION = 1
+WIRE_FORMAT = "mw1"
+WIRE_MIME = "application/x-montana-wire"
+JSON_MIME = "application/json"
+
+# Теги значений
+T_NULL = 0
+T_FALSE = 1
+T_TRUE = 2
+T_INT = 3
+T_FLOAT = 4
+T_STR = 5
+T_HEX = 6
+T_LIST = 7
+T_MAP = 8
+T_TABLE = 9
+
+# Типы колонок таблицы
+C_INT = 0
+C_FLOAT = 1
+C_STR = 2
+C_DICT = 3
+C_HEX = 4
+C_ANY = 5
+C_JSON = 6
+C_DELTA = 7
+
+# Hex-хвост не короче 8 байт, префикс без hex-символов (mt..., пусто)
+_HEX_RE = re.compile(r'([^0-9a-f]{0,16})((?:[0-9a-f]{2}){8,})')
+_F64 = struct.Struct("<d")
+_I64 = struct.Struct("<q")
+# Ширина индексов словаря и разностей: наименьший подходящий struct-код
+INDEX_CODES = ((0xFF, "B"), (0xFFFF, "H"), (0xFFFFFFFF, "I"))
+DELTA_CODES = ((0x7F, "b"), (0x7FFF, "h"), (0x7FFFFFFF, "i"))
+
+# Сжатие тела HTTP (Content-Encoding), в порядке предпочтения
+ENCODINGS = ("zstd", "deflate") if HAS_ZSTD else ("deflate",)
+ACCEPT_ENCODING = ", ".join(ENCODINGS)
+COMPRESS_MIN_BYTES = 1024
+ZSTD_LEVEL = 3
+DEFLATE_LEVEL = 6
+# Защита от «zip-бомбы» при распаковке
+MAX_DECOMPRESSED = 64 * 1024 * 1024
+DECOMPRESS_CHUNK = 1 << 16
+
+
+class WireError(ValueError):
+    """Повреждённое или неподдерживаемое сообщение"""
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+#                              КОДИРОВАНИЕ
+# ═══════════════════════════════════════════════════════════════════════════════
+
+class _Encoder:
+
+    def __init__(self):
+        self.out = bytearray()
+
+    def varint(self, n: int):
+        out = self.out
+        while n > 0x7F:
+            out.append((n & 0x7F) | 0x80)
+            n >>= 7
+        out.append(n)
+
+    def raw(self, data: bytes):
+        self.varint(len(data))
+        self.out += data
+
+    def text(self, s: str):
+        self.raw(s.encode('utf-8'))
+
+    def value(self, v: Any):
+        out = self.out
+        t = type(v)
+        if v is None:
+            out.append(T_NULL)
+        elif t is bool:
+            out.append(T_TRUE if v else T_FALSE)
+        elif t is int:
+            out.append(T_INT)
+            # zigzag: произвольная длина, как в Python
+            self.varint(v * 2 if v >= 0 else -v * 2 - 1)
+        elif t is float:
+            out.append(T_FLOAT)
+            out += _F64.pack(v)
+        elif t is str:
+            match = _HEX_RE.fullmatch(v)
+            if match:
+                out.append(T_HEX)
+                self.text(match.group(1))
+                self.raw(bytes.fromhex(match.group(2)))
+            else:
+                out.append(T_STR)
+                self.text(v)
+        elif t is dict:
+            out.append(T_MAP)
+            self.varint(len(v))
+            for key, item in v.items():
+                if type(key) is not str:
+                    raise TypeError(f"Ключ должен быть str: {key!r}")
+                self.text(key)
+                self.value(item)
+        elif t is list or t is tuple:
+            keys = _table_keys(v)
+            if keys is not None:
+                self.table(v, keys)
+            else:
+                out.append(T_LIST)
+                self.varint(len(v))
+                for item in v:
+                    self.value(item)
+        else:
+            raise TypeError(f"Тип не поддерживается: {t.__name__}")
+
+    # ─── Таблицы ───
+
+    def table(self, rows: list, keys: List[str]):
+        self.out.append(T_TABLE)
+        self.varint(len(rows))
+        self.varint(len(keys))
+        for key in keys:
+            self.text(key)
+        for key in keys:
+            column = _Encoder()
+            column.column([row[key] for row in rows])
+            self.raw(column.out)
+
+    def column(self, values: list):
+        n = len(values)
+        types = {type(v) for v in values}
+
+        if types == {int}:
+            if n >= 4 and self.delta_column(values):
+                return
+            try:
+                data = struct.pack(f"<{n}q", *values)
+            except struct.error:
+                pass  # вне int64
+            else:
+                self.out.append(C_INT)
+                self.out += data
+                return
+        elif types == {float}:
+            self.out.append(C_FLOAT)
+            self.out += struct.pack(f"<{n}d", *values)
+            return
+        elif types == {str} and self.str_column(values):
+            return
+        elif types <= {dict, list}:
+            # Вложенные структуры (metadata) — один JSON-массив: в C быстрее тегов в Python
+            self.out.append(C_JSON)
+            self.text(json.dumps(values, separators=(',', ':')))
+            return
+
+        self.out.append(C_ANY)
+        for v in values:
+            self.value(v)
+
+    def strings(self, values: List[str]) -> bool:
+        """Строки через \\x00; False, если \\x00 встречается в данных"""
+        joined = "\x00".join(values)
+        if joined.count("\x00") != max(len(values) - 1, 0):
+            return False
+        self.text(joined)
+        return True
+
+    def delta_column(self, values: List[int]) -> bool:
+        """Разности соседних значений (timestamp_ns, t2_index), если они узкие"""
+        deltas = [b - a for a, b in zip(values, values[1:])]
+        bound = max(max(deltas), -min(deltas))
+        code = _narrowest(DELTA_CODES, bound)
+        if code is None:
+            return False
+        try:
+            first = _I64.pack(values[0])
+        except struct.error:
+            return False
+        self.out.append(C_DELTA)
+        self.out += first
+        self.out += code.encode()
+        self.out += struct.pack(f"<{len(deltas)}{code}", *deltas)
+        return True
+
+    def dict_column(self, values: List[str], labels: List[str]):
+        """Словарь значений (сам — колонка, hex-адреса в нём идут байтами) + индексы"""
+        index = {label: i for i, label in enumerate(labels)}
+        code = _narrowest(INDEX_CODES, len(labels) - 1)
+        nested = _Encoder()
+        nested.column(labels)
+
+        self.out.append(C_DICT)
+        self.varint(len(labels))
+        self.raw(nested.out)
+        self.out += code.encode()
+        self.out += struct.pack(f"<{len(values)}{code}", *map(index.__getitem__, values))
+
+    def str_column(self, values: List[str]) -> bool:
+        n = len(values)
+        # Порядок первого появления: сортировка не нужна
+        distinct = dict.fromkeys(values)
+
+        if len(distinct) * 2 <= n:
+            # node_id, event_type, повторяющиеся адреса
+            self.dict_column(values, list(distinct))
+            return True
+
+        # Образец формы берётся из первых значений: hex-колонка однородна
+        first = next((m for m in map(_HEX_RE.fullmatch, values[:8]) if m), None)
+        if first is not None:
+            prefix, width = first.group(1), len(first.group(2))
+            size = len(prefix) + width
+            if {len(v) for v in values} == {size} and all(v.startswith(prefix) for v in values):
+                # Частый случай: вся колонка — hex одной ширины, проверка одним вызовом
+                hexes, others = [v[len(prefix):] for v in values], []
+                packed = _unhex("".join(hexes))
+                bitmap = b"\xff" * ((n + 7) // 8)
+            else:
+                packed = None
+            if packed is None:
+                hexes, others = [], []
+                bitmap = bytearray((n + 7) // 8)
+                for i, v in enumerate(values):
+                    # Разбиение prefix/hex у значения должно совпасть с образцом
+                    m = _HEX_RE.fullmatch(v) if len(v) == size else None
+                    if m and m.group(1) == prefix:
+                        hexes.append(m.group(2))
+                        bitmap[i >> 3] |= 1 << (i & 7)
+                    else:
+                        others.append(v)
+                packed = bytes.fromhex("".join(hexes))
+
+            if len(hexes) * 2 >= n:
+                mark = len(self.out)
+                self.out.append(C_HEX)
+                self.text(prefix)
+                self.varint(width // 2)
+                self.varint(len(others))
+                self.out += bitmap
+                self.out += packed
+                if self.strings(others):
+                    return True
+                del self.out[mark:]
+
+        mark = len(self.out)
+        self.out.append(C_STR)
+        if self.strings(values):
+            return True
+        del self.out[mark:]
+        return False
+
+
+def _narrowest(codes, bound: int) -> Optional[str]:
+    return next((code for limit, code in codes if bound <= limit), None)
+
+
+def _unhex(digits: str) -> Optional[bytes]:
+    """bytes.fromhex только для строчного hex без пробелов (обратимо через .hex())"""
+    try:
+        packed = bytes.fromhex(digits)
+    except ValueError:
+        return None
+    if len(packed) * 2 != len(digits) or digits != digits.lower():
+        return None
+    return packed
+
+
+def _table_keys(rows) -> Optional[List[str]]:
+    """Имена полей, если список — однотипные dict со строковыми ключами"""
+    if len(rows) < 2 or type(rows[0]) is not dict or not rows[0]:
+        return None
+    keys = rows[0].keys()
+    for row in rows:
+        if type(row) is not dict or row.keys() != keys:
+            return None
+    if not all(type(key) is str for key in keys):
+        return None
+    return list(keys)
+
+
+def encode(obj: Any) -> bytes:
+    """Кодирует JSON-совместимое значение в mw1"""
+    encoder = _Encoder()
+    encoder.out += WIRE_MAGIC
+    encoder.out.append(WIRE_VERSION)
+    encoder.value(obj)
+    return bytes(encoder.out)
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+#                              ДЕКОДИРОВАНИЕ
+# ═══════════════════════════════════════════════════════════════════════════════
+
+class _Decoder:
+
+    def __init__(self, data: bytes, pos: int = 0):
+        self.data = data
+        self.pos = pos
+
+    def byte(self) -> int:
+        try:
+            b = self.data[self.pos]
+        except IndexError:
+            raise WireError("Неожиданный конец сообщения") from None
+        self.pos += 1
+        return b
+
+    def varint(self) -> int:
+        shift = result = 0
+        while True:
+            b = self.byte()
+            result |= (b & 0x7F) << shift
+            if b < 0x80:
+                return result
+            shift += 7
+
+    def take(self, n: int) -> bytes:
+        end = self.pos + n
+        if end > len(self.data):
+            raise WireError("Неожиданный конец сообщения")
+        chunk = self.data[self.pos:end]
+        self.pos = end
+        return chunk
+
+    def raw(self) -> bytes:
+        return self.take(self.varint())
+
+    def text(self) -> str:
+        return self.raw().decode('utf-8')
+
+    def value(self) -> Any:
+        tag = self.byte()
+        if tag == T_STR:
+            return self.text()
+        if tag == T_HEX:
+            prefix = self.text()
+            return prefix + self.raw().hex()
+        if tag == T_INT:
+            n = self.varint()
+            return n >> 1 if not n & 1 else -((n + 1) >> 1)
+        if tag == T_MAP:
+            return {self.text(): self.value() for _ in range(self.varint())}
+        if tag == T_LIST:
+            return [self.value() for _ in range(self.varint())]
+        if tag == T_TABLE:
+            return self.table()
+        if tag == T_FLOAT:
+            return _F64.unpack(self.take(8))[0]
+        if tag == T_NULL:
+            return None
+        if tag == T_TRUE:
+            return True
+        if tag == T_FALSE:
+            return False
+        raise WireError(f"Неизвестный тег: {tag}")
+
+    def struct_code(self, allowed: str) -> str:
+        code = chr(self.byte())
+        if code not in allowed:
+            raise WireError(f"Неверный код ширины: {code!r}")
+        return code
+
+    def strings(self, n: int) -> List[str]:
+        if n == 0:
+            self.raw()
+            return []
+        values = self.text().split("\x00")
+        if len(values) != n:
+            raise WireError("Неверное число строк в колонке")
+        return values
+
+    def table(self) -> list:
+        n = self.varint()
+        keys = [self.text() for _ in range(self.varint())]
+        columns = [_Decoder(self.raw()).column(n) for _ in keys]
+        return [dict(zip(keys, row)) for row in zip(*columns)]
+
+    def column(self, n: int) -> list:
+        kind = self.byte()
+        if kind == C_INT:
+            return list(struct.unpack(f"<{n}q", self.take(8 * n)))
+        if kind == C_FLOAT:
+            return list(struct.unpack(f"<{n}d", self.take(8 * n)))
+        if kind == C_STR:
+            return self.strings(n)
+        if kind == C_DICT:
+            size = self.varint()
+            labels = _Decoder(self.raw()).column(size)
+            code = self.struct_code("BHI")
+            indexes = struct.unpack(f"<{n}{code}", self.take(n * struct.calcsize(code)))
+            try:
+                return [labels[i] for i in indexes]
+            except IndexError:
+                raise WireError("Индекс вне словаря колонки") from None
+        if kind == C_DELTA:
+            first = _I64.unpack(self.take(8))[0]
+            code = self.struct_code("bhi")
+            count = max(n - 1, 0)
+            deltas = struct.unpack(f"<{count}{code}", self.take(count * struct.calcsize(code)))
+            return list(accumulate(deltas, initial=first))
+        if kind == C_HEX:
+            prefix = self.text()
+            step = self.varint() * 2
+            n_others = self.varint()
+            bitmap = self.take((n + 7) // 8)
+            digits = self.take((n - n_others) * step // 2).hex()
+            hexes = [prefix + digits[i:i + step] for i in range(0, len(digits), step)]
+            others = self.strings(n_others)
+            if not others:
+                return hexes
+            others = iter(others)
+            hexes = iter(hexes)
+            return [next(hexes) if bitmap[i >> 3] >> (i & 7) & 1 else next(others)
+                    for i in range(n)]
+        if kind == C_JSON:
+            values = json.loads(self.text())
+            if len(values) != n:
+                raise WireError("Неверное число значений в колонке")
+            return values
+        if kind == C_ANY:
+            return [self.value() for _ in range(n)]
+        raise WireError(f"Неизвестный тип колонки: {kind}")
+
+
+def decode(data: bytes) -> Any:
+    """Декодирует сообщение mw1"""
+    if not data.startswith(WIRE_MAGIC):
+        raise WireError("Нет сигнатуры mw")
+    version = data[len(WIRE_MAGIC)] if len(data) > len(WIRE_MAGIC) else None
+    if version != WIRE_VERSION:
+        raise WireError(f"Неподдерживаемая версия формата: {version}")
+    decoder = _Decoder(bytes(data), len(WIRE_MAGIC) + 1)
+    try:
+        value = decoder.value()
+    except (struct.error, UnicodeDecodeError) as e:
+        raise WireError(str(e)) from e
+    if decoder.pos != len(decoder.data):
+        raise WireError("Лишние байты после сообщения")
+    return value
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+#                              СОГЛАСОВАНИЕ
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def dumps(obj: Any, binary: bool = False) -> bytes:
+    """mw1, если узел его поддерживает, иначе JSON"""
+    if binary:
+        return encode(obj)
+    return json.dumps(obj).encode('utf-8')
+
+
+def loads(data: bytes) -> Any:
+    """Декодирует mw1 или JSON (формат определяется по сигнатуре)"""
+    if data[:len(WIRE_MAGIC)] == WIRE_MAGIC:
+        return decode(data)
+    return json.loads(data)
+
+
+def is_wire(data: bytes) -> bool:
+    return data[:len(WIRE_MAGIC)] == WIRE_MAGIC
+
+
+def accepts_wire(accept_header: Optional[str]) -> bool:
+    """Узел указал mw1 в HTTP Accept"""
+    return bool(accept_header) and WIRE_MIME in accept_header
+
+
+def negotiate(formats) -> str:
+    """Ответ на wire_hello: лучший формат из предложенных узлом"""
+    return WIRE_FORMAT if formats and WIRE_FORMAT in formats else "json"
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+#                              СЖАТИЕ
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def choose_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Лучшее из поддерживаемых сжатий, указанных узлом в Accept-Encoding"""
+    if not accept_encoding:
+        return None
+    offered = {part.split(";")[0].strip().lower() for part in accept_encoding.split(",")}
+    return next((encoding for encoding in ENCODINGS if encoding in offered), None)
+
+
+def compress(data: bytes, encoding: Optional[str]) -> bytes:
+    if not encoding or encoding == "identity":
+        return data
+    if encoding == "zstd" and HAS_ZSTD:
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    if encoding == "deflate":
+        return zlib.compress(data, DEFLATE_LEVEL)
+    raise WireError(f"Сжатие не поддерживается: {encoding}")
+
+
+def _zstd_decompress(data: bytes, limit: int) -> bytes:
+    """
+    Потоковая распаковка zstd: кадры без размера в заголовке (потоковые
+    компрессоры) тоже читаются, выход ограничен limit без аллокации всего тела
+    """
+    chunks, size = [], 0
+    with zstandard.ZstdDecompressor().stream_reader(data) as reader:
+        while True:
+            chunk = reader.read(DECOMPRESS_CHUNK)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > limit:
+                raise WireError("Распакованное тело слишком большое")
+            chunks.append(chunk)
+    return b"".join(chunks)
+
+
+def decompress(data: bytes, encoding: Optional[str], limit: int = MAX_DECOMPRESSED) -> bytes:
+    """Распаковка тела по Content-Encoding; больше limit байт — WireError"""
+    if not encoding or encoding == "identity":
+        return data
+    try:
+        if encoding == "zstd" and HAS_ZSTD:
+            out = _zstd_decompress(data, limit)
+        elif encoding == "deflate":
+            inflater = zlib.decompressobj()
+            out = inflater.decompress(data, limit)
+            if inflater.unconsumed_tail:
+                raise WireError("Распакованное тело слишком большое")
+        else:
+            raise WireError(f"Сжатие не поддерживается: {encoding}")
+    except _DECOMPRESS_ERRORS as e:
+        if isinstance(e, WireError):
+            raise
+        raise WireError(f"Повреждённое сжатое тело: {e}") from e
+    if len(out) > limit:
+        raise WireError("Распакованное тело слишком большое")
+    return out
+
+
+def pack_body(payload: Any, binary: bool, encoding: Optional[str]) -> Tuple[bytes, Optional[str]]:
+    """
+    Тело HTTP-запроса/ответа узлу: mw1 или JSON, сжатое если не мелкое
+
+    Returns:
+        (body, content_encoding) — content_encoding None, если не сжато
+    """
+    body = dumps(payload, binary)
+    if encoding and len(body) >= COMPRESS_MIN_BYTES:
+        return compress(body, encoding), encoding
+    return body, None
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+#                              BENCHMARK
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def _sample_events(count: int) -> list:
+    """События в форме Event.to_dict() (без зависимости от event_ledger)"""
+    import hashlib
+    import random
+
+    rng = random.Random(7)
+    addresses = ["mt" + hashlib.sha256(str(i).encode()).hexdigest()[:40] for i in range(200)]
+    events = []
+    prev_hash = "0" * 64
+    for i in range(count):
+        ts_ns = 1767225600_000_000_000 + i * 1_234_567_891
+        kind = "EMISSION" if i % 3 == 0 else "TRANSFER"
+        event_hash = hashlib.sha256(f"{i}:{prev_hash}".encode()).hexdigest()
+        events.append({
+            "event_id": f"{ts_ns // 1_000_000}.amsterdam.{i}",
+            "event_type": kind,
+            "timestamp": ts_ns / 1e9,
+            "from_addr": "" if kind == "EMISSION" else rng.choice(addresses),
+            "to_addr": rng.choice(addresses),
+            "amount": rng.randint(1, 100000),
+            "metadata": {"t2_index": i // 10} if kind == "EMISSION" else {},
+            "node_id": "amsterdam",
+            "prev_hash": prev_hash,
+            "event_hash": event_hash,
+            "timestamp_ns": ts_ns,
+            "timestamp_iso": f"2026-01-01T00:00:00.{i:09d}Z",
+        })
+        prev_hash = event_hash
+    return events
+
+
+def _sample_transactions(count: int) -> list:
+    """Транзакции TimeLedger с подписью ML-DSA-65 (3309 байт, hex)"""
+    import os
+    import uuid
+
+    return [{
+        "tx_id": str(uuid.UUID(bytes=os.urandom(16))),
+        "timestamp": 1767225600000 + i,
+        "address": "mt" + os.urandom(20).hex(),
+        "amount": 60,
+        "tx_type": "credit",
+        "node": "amsterdam",
+        "t2_index": i // 10,
+        "prev_hash": os.urandom(32).hex(),
+        "signature": os.urandom(3309).hex(),
+    } for i in range(count)]
+
+
+def benchmark(events: int = 500, transactions: int = 100, rounds: int = 20) -> dict:
+    """Размер и скорость mw1 против JSON на пачке синхронизации"""
+    import time
+
+    payloads = {
+        "sync_events": {"events": _sample_events(events), "last_event_id": "", "node_id": "amsterdam"},
+        "ledger_txs": {"transactions": _sample_transactions(transactions)},
+    }
+
+    def timed(fn, arg) -> float:
+        started = time.perf_counter()
+        for _ in range(rounds):
+            fn(arg)
+        return (time.perf_counter() - started) / rounds * 1000
+
+    result = {}
+    for name, payload in payloads.items():
+        as_json = dumps(payload)
+        as_wire = dumps(payload, binary=True)
+        assert loads(as_wire) == payload
+
+        json_cpu = timed(lambda p: json.loads(json.dumps(p).encode()), payload)
+        wire_cpu = timed(lambda p: decode(encode(p)), payload)
+        result[name] = {
+            "json_bytes": len(as_json),
+            "wire_bytes": len(as_wire),
+            "size_ratio": round(len(as_json) / len(as_wire), 2),
+            "json_ms": round(json_cpu, 2),
+            "wire_ms": round(wire_cpu, 2),
+        }
+        for encoding in ENCODINGS:
+            packed_json = compress(as_json, encoding)
+            packed_wire = compress(as_wire, encoding)
+            result[name].update({
+                f"json+{encoding}_bytes": len(packed_json),
+                f"wire+{encoding}_bytes": len(packed_wire),
+                f"wire+{encoding}_ratio": round(len(as_json) / len(packed_wire), 2),
+            })
+
+    for name, row in result.items():
+        print(name)
+        for key, value in row.items():
+            print(f"  {key:22} {value}")
+    return result
+
+
+if __name__ == "__main__":
+    import sys
+
+    if "--benchmark" in sys.argv:
+        benchmark()
+    else:
+        print("Использование: python node_wire.py --benchmark")
@@ -9,14 +9,17 @@ Montana Protocol — Атомные метки времени
 ============
 1. TLS 1.3 обязательно (СТРОГО)
 2. 12 лабораторий мира (НЕ корпорации)
-3. Консенсус из MIN_NTS_CONSENSUS серверов
-4. Медианное значение offset (защита от outliers)
-5. Асинхронный фоновый refresh
+3. Параллельный опрос всех серверов, ранний выход по кворуму
+4. Консенсус из MIN_NTS_CONSENSUS серверов
+5. Медианное значение offset + отбрасывание выбросов (MAD)
+6. Асинхронный фоновый refresh
 
 КОНФИГУРАЦИЯ (env variables):
 - NTS_SYNC_INTERVAL: интервал синхронизации (default: 3600 сек)
 - NTS_TIMEOUT: timeout для NTS-KE (default: 5.0 сек)
 - NTS_MIN_CONSENSUS: минимум серверов для консенсуса (default: 3)
+- NTS_MAX_WORKERS: параллельных запросов к серверам (default: 12)
+- NTS_OUTLIER_MS: допуск отклонения от медианы (default: 250 мс)
 
 DISNEY CRITICS FIXES:
 - Асинхронный refresh (не блокирует запросы)
@@ -33,8 +36,9 @@ import hashlib
 import logging
 import os
 import statistics
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeout
 from datetime import datetime
-from typing import Dict, Any, Optional, List, Tuple
+from typing import Dict, Any, Optional, List, Tuple, Callable
 from dataclasses import dataclass
 
 logging.basicConfig(level=logging.INFO)
@@ -52,6 +56,8 @@ class NTSConfig:
     timeout: float = 5.0               # Timeout для NTS-KE
     min_consensus: int = 3             # Минимум серверов для консенсуса
     async_refresh: bool = True         # Асинхронный refresh в фоне
+    max_workers: int = 12              # Параллельных запросов к серверам
+    outlier_tolerance: float = 0.25    # Допуск отклонения от медианы (сек)
 
     @classmethod
     def from_env(cls) -> 'NTSConfig':
@@ -60,7 +66,9 @@ class NTSConfig:
             sync_interval=float(os.environ.get('NTS_SYNC_INTERVAL', '3600.0')),
             timeout=float(os.environ.get('NTS_TIMEOUT', '5.0')),
             min_consensus=int(os.environ.get('NTS_MIN_CONSENSUS', '3')),
-            async_refresh=os.environ.get('NTS_ASYNC_REFRESH', 'true').lower() == 'true'
+            async_refresh=os.environ.get('NTS_ASYNC_REFRESH', 'true').lower() == 'true',
+            max_workers=int(os.environ.get('NTS_MAX_WORKERS', '12')),
+            outlier_tolerance=float(os.environ.get('NTS_OUTLIER_MS', '250')) / 1000
         )
 
 
@@ -117,6 +125,8 @@ NTP_FALLBACK_SERVERS: List[Tuple[str, int]] = [
     ("ntp.oma.be", 123),               # 🇧🇪 Бельгия
 ]
 
+NTP_TIMEOUT = 2.0  # UDP timeout на один NTP запрос
+
 
 # ═══════════════════════════════════════════════════════════════════════════════
 #                         NTS STATE (Thread-Safe)
@@ -229,14 +239,173 @@ def _create_tls_context() -> ssl.SSLContext:
 #                         NTS-KE SYNC (Encrypted)
 # ═══════════════════════════════════════════════════════════════════════════════
 
+def _probe_nts_server(server: str, port: int, ctx: ssl.SSLContext, timeout: float) -> Optional[float]:
+    """
+    Один NTS-KE обмен с сервером (TLS 1.3).
+
+    Returns:
+        offset в секундах или None если сервер не ответил корректно
+    """
+    try:
+        # ═══════════════════════════════════════════════════════════════════
+        # NTS-KE через TLS 1.3
+        # ═══════════════════════════════════════════════════════════════════
+        with socket.create_connection((server, port), timeout=timeout) as sock:
+            with ctx.wrap_socket(sock, server_hostname=server) as tls_sock:
+                # Проверяем строго TLS 1.3
+                if tls_sock.version() != 'TLSv1.3':
+                    logger.warning(f"⚠️ {server}: Not TLS 1.3, skipping")
+                    return None
+
+                # Получаем цепочку сертификатов
+                cert = tls_sock.getpeercert()
+                if not cert:
+                    logger.warning(f"⚠️ {server}: No certificate")
+                    return None
+
+                # NTS-KE запрос (RFC 8915)
+                # Record Type: NTS Next Protocol Negotiation (0x0001)
+                # Record Type: AEAD Algorithm Negotiation (0x0004)
+                # Record Type: End of Message (0x0000)
+                nts_ke_request = bytes([
+                    0x80, 0x01, 0x00, 0x02, 0x00, 0x00,  # NTS Next Protocol: NTPv4
+                    0x80, 0x04, 0x00, 0x02, 0x00, 0x0F,  # AEAD: AES-SIV-CMAC-256
+                    0x80, 0x00, 0x00, 0x00              # End of Message
+                ])
+
+                t1 = time.time()
+                tls_sock.sendall(nts_ke_request)
+                response = tls_sock.recv(1024)
+                t4 = time.time()
+
+                # Базовая валидация response (должен содержать End of Message)
+                if len(response) < 4:
+                    logger.warning(f"⚠️ {server}: Invalid NTS-KE response (too short)")
+                    return None
+
+                # Вычисляем offset
+                rtt = t4 - t1
+                offset = rtt / 2
+
+                logger.debug(f"🔐 {server}: offset={offset*1000:.3f}ms (TLS 1.3)")
+                return offset
+
+    except ssl.SSLError as e:
+        logger.debug(f"⚠️ NTS-KE TLS error ({server}): {e}")
+    except socket.timeout:
+        logger.debug(f"⚠️ NTS-KE timeout ({server})")
+    except Exception as e:
+        logger.debug(f"⚠️ NTS-KE failed ({server}): {e}")
+    return None
+
+
+def _probe_ntp_server(server: str, port: int, timeout: float) -> Optional[float]:
+    """
+    Один NTP запрос (UDP, БЕЗ шифрования).
+
+    Returns:
+        offset в секундах или None если сервер не ответил
+    """
+    try:
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as client:
+            client.settimeout(timeout)
+
+            # NTP packet: LI=0, VN=4, Mode=3 (client)
+            ntp_data = b'\x23' + 47 * b'\0'
+
+            t1 = time.time()
+            client.sendto(ntp_data, (server, port))
+            data, _ = client.recvfrom(1024)
+            t4 = time.time()
+
+        if len(data) >= 48:
+            unpacked = struct.unpack('!12I', data[:48])
+            t3 = unpacked[10] + float(unpacked[11]) / 2**32 - 2208988800
+            return ((t3 - t1) + (t3 - t4)) / 2
+
+    except Exception as e:
+        logger.warning(f"⚠️ NTP fallback failed ({server}): {e}")
+    return None
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+#                         PARALLEL POLLING + QUORUM
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def _reject_outliers(samples: List[Tuple[str, float]],
+                     tolerance: float) -> List[Tuple[str, float]]:
+    """
+    Отбрасывает offsets, далёкие от медианы.
+
+    Порог = max(tolerance, 3 × MAD): один скомпрометированный сервер
+    (MITM) не может сдвинуть консенсус, а естественный разброс RTT
+    между континентами не считается выбросом.
+    """
+    if len(samples) < 3:
+        return list(samples)
+
+    offsets = [offset for _, offset in samples]
+    median = statistics.median(offsets)
+    mad = statistics.median(abs(o - median) for o in offsets)
+    limit = max(tolerance, 3 * mad)
+
+    return [(server, offset) for server, offset in samples if abs(offset - median) <= limit]
+
+
+def _poll_servers(probe: Callable[[str, int], Optional[float]],
+                  servers: List[Tuple[str, int]],
+                  quorum: int,
+                  deadline: float) -> List[Tuple[str, float]]:
+    """
+    Опрашивает все серверы параллельно.
+
+    Как только набирается quorum согласованных offsets — возвращает
+    результат сразу, оставшиеся запросы отменяются (незапущенные) или
+    дорабатывают в фоне до своего timeout (уже открытые сокеты).
+
+    Args:
+        probe: функция (server, port) → offset | None
+        servers: список (host, port)
+        quorum: сколько согласованных ответов достаточно
+        deadline: общий лимит ожидания в секундах
+
+    Returns:
+        Список (server, offset) после отбрасывания выбросов
+    """
+    config = get_config()
+    samples: List[Tuple[str, float]] = []
+    consistent: List[Tuple[str, float]] = []
+
+    workers = max(1, min(config.max_workers, len(servers)))
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="NTS-Poll")
+    try:
+        futures = {executor.submit(probe, server, port): server for server, port in servers}
+        try:
+            for future in as_completed(futures, timeout=deadline):
+                offset = future.result()
+                if offset is None:
+                    continue
+
+                samples.append((futures[future], offset))
+                consistent = _reject_outliers(samples, config.outlier_tolerance)
+                if len(consistent) >= quorum:
+                    break
+        except FuturesTimeout:
+            logger.debug(f"⚠️ Polling deadline reached: {len(samples)}/{len(servers)} responded")
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    return _reject_outliers(samples, config.outlier_tolerance)
+
+
 def _sync_nts_encrypted() -> bool:
     """
     Синхронизирует время через NTS-KE (TLS 1.3 шифрование).
 
     RFC 8915: NTS Key Exchange
-    - TLS 1.3 handshake с NTS-KE серверами
-    - КОНСЕНСУС из MIN_NTS_CONSENSUS лабораторий
-    - Медианное значение offset (защита от outliers)
+    - TLS 1.3 handshake со всеми NTS-KE серверами ПАРАЛЛЕЛЬНО
+    - КОНСЕНСУС из MIN_NTS_CONSENSUS лабораторий (ранний выход по кворуму)
+    - Медианное значение offset после отбрасывания выбросов
 
     Returns:
         True если синхронизация успешна (минимум MIN_NTS_CONSENSUS серверов)
@@ -244,84 +413,32 @@ def _sync_nts_encrypted() -> bool:
     config = get_config()
     ctx = _create_tls_context()
 
-    offsets: List[float] = []
-    successful_servers: List[str] = []
-
-    for server, port in NTS_KE_SERVERS:
-        try:
-            # ═══════════════════════════════════════════════════════════════════
-            # NTS-KE через TLS 1.3
-            # ═══════════════════════════════════════════════════════════════════
-            with socket.create_connection((server, port), timeout=config.timeout) as sock:
-                with ctx.wrap_socket(sock, server_hostname=server) as tls_sock:
-                    # Проверяем строго TLS 1.3
-                    if tls_sock.version() != 'TLSv1.3':
-                        logger.warning(f"⚠️ {server}: Not TLS 1.3, skipping")
-                        continue
-
-                    # Получаем цепочку сертификатов
-                    cert = tls_sock.getpeercert()
-                    if not cert:
-                        logger.warning(f"⚠️ {server}: No certificate")
-                        continue
-
-                    # NTS-KE запрос (RFC 8915)
-                    # Record Type: NTS Next Protocol Negotiation (0x0001)
-                    # Record Type: AEAD Algorithm Negotiation (0x0004)
-                    # Record Type: End of Message (0x0000)
-                    nts_ke_request = bytes([
-                        0x80, 0x01, 0x00, 0x02, 0x00, 0x00,  # NTS Next Protocol: NTPv4
-                        0x80, 0x04, 0x00, 0x02, 0x00, 0x0F,  # AEAD: AES-SIV-CMAC-256
-                        0x80, 0x00, 0x00, 0x00              # End of Message
-                    ])
-
-                    t1 = time.time()
-                    tls_sock.sendall(nts_ke_request)
-                    response = tls_sock.recv(1024)
-                    t4 = time.time()
-
-                    # Базовая валидация response (должен содержать End of Message)
-                    if len(response) < 4:
-                        logger.warning(f"⚠️ {server}: Invalid NTS-KE response (too short)")
-                        continue
-
-                    # Вычисляем offset
-                    rtt = t4 - t1
-                    offset = rtt / 2
-
-                    offsets.append(offset)
-                    successful_servers.append(server)
-
-                    logger.debug(f"🔐 {server}: offset={offset*1000:.3f}ms (TLS 1.3)")
-
-        except ssl.SSLError as e:
-            logger.debug(f"⚠️ NTS-KE TLS error ({server}): {e}")
-            continue
-        except socket.timeout:
-            logger.debug(f"⚠️ NTS-KE timeout ({server})")
-            continue
-        except Exception as e:
-            logger.debug(f"⚠️ NTS-KE failed ({server}): {e}")
-            continue
+    samples = _poll_servers(
+        lambda server, port: _probe_nts_server(server, port, ctx, config.timeout),
+        NTS_KE_SERVERS,
+        quorum=config.min_consensus,
+        deadline=config.timeout * 2
+    )
 
     # ═══════════════════════════════════════════════════════════════════════════
     # КОНСЕНСУС: минимум MIN_NTS_CONSENSUS лабораторий
     # ═══════════════════════════════════════════════════════════════════════════
-    if len(offsets) >= config.min_consensus:
+    if len(samples) >= config.min_consensus:
         # Используем медиану (защита от outliers / MITM на одном сервере)
-        median_offset = statistics.median(offsets)
+        successful_servers = [server for server, _ in samples]
+        median_offset = statistics.median(offset for _, offset in samples)
 
         _state.offset = median_offset
         _state.last_sync = time.time()
         _state.encrypted = True
         _state.successful_servers = successful_servers
 
-        logger.info(f"🔐 NTS CONSENSUS ({len(offsets)}/{len(NTS_KE_SERVERS)} labs): "
+        logger.info(f"🔐 NTS CONSENSUS ({len(samples)}/{len(NTS_KE_SERVERS)} labs): "
                    f"offset={median_offset*1000:.3f}ms [ENCRYPTED TLS 1.3]")
         logger.info(f"   Labs: {', '.join(s.split('.')[0] for s in successful_servers)}")
         return True
 
-    logger.warning(f"⚠️ NTS consensus failed: only {len(offsets)}/{config.min_consensus} servers responded")
+    logger.warning(f"⚠️ NTS consensus failed: only {len(samples)}/{config.min_consensus} servers responded")
     return False
 
 
@@ -334,42 +451,35 @@ def _sync_ntp_fallback() -> bool:
     Fallback: обычный NTP (БЕЗ шифрования).
     Используется ТОЛЬКО если NTS-KE недоступен.
 
+    Серверы опрашиваются параллельно; при наличии нескольких ответов
+    берётся медиана, иначе — единственный ответивший сервер.
+
     ⚠️ WARNING: Не защищён от MITM атак!
     """
     logger.warning("⚠️ NTS-KE unavailable, falling back to unencrypted NTP")
+    config = get_config()
 
-    for server, port in NTP_FALLBACK_SERVERS:
-        try:
-            client = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-            client.settimeout(2.0)
-
-            # NTP packet: LI=0, VN=4, Mode=3 (client)
-            ntp_data = b'\x23' + 47 * b'\0'
-
-            t1 = time.time()
-            client.sendto(ntp_data, (server, port))
-            data, _ = client.recvfrom(1024)
-            t4 = time.time()
-            client.close()
-
-            if len(data) >= 48:
-                unpacked = struct.unpack('!12I', data)
-                t3 = unpacked[10] + float(unpacked[11]) / 2**32 - 2208988800
+    samples = _poll_servers(
+        lambda server, port: _probe_ntp_server(server, port, NTP_TIMEOUT),
+        NTP_FALLBACK_SERVERS,
+        quorum=min(config.min_consensus, len(NTP_FALLBACK_SERVERS)),
+        deadline=NTP_TIMEOUT * 2
+    )
 
-                offset = ((t3 - t1) + (t3 - t4)) / 2
-                _state.offset = offset
-                _state.last_sync = time.time()
-                _state.encrypted = False
-                _state.successful_servers = [server]
+    if not samples:
+        return False
 
-                logger.warning(f"⚠️ NTP sync (UNENCRYPTED): {server} offset={offset*1000:.3f}ms")
-                return True
+    successful_servers = [server for server, _ in samples]
+    offset = statistics.median(o for _, o in samples)
 
-        except Exception as e:
-            logger.warning(f"⚠️ NTP fallback failed ({server}): {e}")
-            continue
+    _state.offset = offset
+    _state.last_sync = time.time()
+    _state.encrypted = False
+    _state.successful_servers = successful_servers
 
-    return False
+    logger.warning(f"⚠️ NTP sync (UNENCRYPTED): {', '.join(successful_servers)} "
+                   f"offset={offset*1000:.3f}ms")
+    return True
 
 
 # ═══════════════════════════════════════════════════════════════════════════════
@@ -710,6 +820,7 @@ def init():
     logger.info(f"   Sync interval: {config.sync_interval}s")
     logger.info(f"   Timeout: {config.timeout}s")
     logger.info(f"   Min consensus: {config.min_consensus}")
+    logger.info(f"   Parallel workers: {config.max_workers}")
     logger.info(f"   Async refresh: {config.async_refresh}")
     logger.info(f"   Lock backend: {LOCK_BACKEND}")
 
@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+"""
+Push Hub — доставка событий подписчикам (SSE / long-poll) внутри процесса
+
+Вместо опроса /api/messages и /api/node/events клиент держит одно
+соединение: хаб получает события от источника (вставка сообщения,
+запись в EventLedger) и раздаёт их только тем подписчикам, чей фильтр
+совпал — по номеру телефона или адресу.
+
+Ключи фильтра — строки вида "phone:+7...", "address:mt...";
+ALL ("*") получает всё. Индекс ключ → подписчики: публикация стоит
+O(совпавших подписчиков), а не O(всех).
+
+Каждое событие получает номер seq. Последние HISTORY_SIZE событий
+хранятся, поэтому переподключение с Last-Event-ID (SSE) или last_id
+(long-poll) ничего не теряет; если курсор старше истории или хаб
+перезапущен — приходит "resync", и клиент перечитывает данные один раз.
+
+Ɉ MONTANA PROTOCOL
+"""
+
+import json
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+ALL = "*"
+
+# Событий в истории для переподключения
+HISTORY_SIZE = 4096
+# Недоставленных событий на подписчика; больше — resync вместо очереди
+MAX_PENDING = 256
+# Одновременных подписчиков (каждый SSE держит поток веб-сервера)
+MAX_SUBSCRIBERS = 1000
+# SSE: комментарий-heartbeat, чтобы прокси не закрыл соединение (nginx — 60 с)
+HEARTBEAT_INTERVAL = 15
+# SSE: соединение закрывается сервером, клиент переподключается с Last-Event-ID
+STREAM_MAX_SECONDS = 600
+# Long-poll: максимум ожидания
+POLL_TIMEOUT = 25
+
+RESYNC = "resync"
+
+Message = Tuple[int, str, Any]  # (seq, event_type, data)
+# Обработка доставленного пачкой (например, обогащение алиасами).
+# data общие для всех подписчиков — transform не должен менять их на месте
+Transform = Callable[[List[Message]], List[Message]]
+
+
+class HubFull(Exception):
+    """Достигнут MAX_SUBSCRIBERS"""
+    pass
+
+
+class Subscription:
+    """Очередь одного подписчика; ждать можно из потока запроса"""
+
+    def __init__(self, hub: 'PushHub', keys: frozenset):
+        self.hub = hub
+        self.keys = keys
+        self.last_seq = 0
+        self._pending: List[Message] = []
+        self._overflow = False
+        self._closed = False
+        # Занимает слот в хабе (ключей может не быть вовсе)
+        self._registered = False
+        self._cond = threading.Condition()
+
+    def _push(self, message: Message):
+        with self._cond:
+            if self._overflow:
+                return
+            if len(self._pending) >= MAX_PENDING:
+                # Медленный клиент: вместо бесконечной очереди — resync
+                self._pending.clear()
+                self._overflow = True
+            else:
+                self._pending.append(message)
+            self._cond.notify()
+
+    def wait(self, timeout: float) -> List[Message]:
+        """Накопленные события; если их нет — ждать до timeout секунд"""
+        with self._cond:
+            if not self._pending and not self._overflow and not self._closed:
+                self._cond.wait(timeout)
+            messages, self._pending = self._pending, []
+            if self._overflow:
+                self._overflow = False
+                messages = [(self.hub.last_seq, RESYNC, {"reason": "overflow"})]
+        if messages:
+            self.last_seq = messages[-1][0]
+        return messages
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self.hub.unsubscribe(self)
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+
+class PushHub:
+    """Фан-аут событий по ключам фильтра"""
+
+    def __init__(self, history: int = HISTORY_SIZE, max_subscribers: int = MAX_SUBSCRIBERS):
+        self._lock = threading.Lock()
+        self._index: Dict[str, set] = {}
+        self._history: deque = deque(maxlen=history)
+        self._seq = 0
+        self._subscribers = 0
+        self.max_subscribers = max_subscribers
+        self.stats = {"published": 0, "delivered": 0, "resyncs": 0}
+
+    @property
+    def last_seq(self) -> int:
+        return self._seq
+
+    # ─── Подписка ───
+
+    def subscribe(self, keys: Iterable[str], last_id: Optional[int] = None) -> Subscription:
+        """
+        Новый подписчик на ключи; last_id — последний полученный seq
+        (Last-Event-ID): пропущенное из истории придёт сразу.
+        """
+        sub = Subscription(self, frozenset(keys))
+        with self._lock:
+            if self._subscribers >= self.max_subscribers:
+                raise HubFull(f"{self._subscribers} subscribers")
+            self._subscribers += 1
+            sub._registered = True
+            for key in sub.keys:
+                self._index.setdefault(key, set()).add(sub)
+
+            sub.last_seq = self._seq
+            if last_id is not None:
+                self._replay(sub, last_id)
+        return sub
+
+    def _replay(self, sub: Subscription, last_id: int):
+        """Под self._lock: события после last_id из истории"""
+        oldest = self._history[0][0] if self._history else self._seq + 1
+        if last_id > self._seq or last_id < oldest - 1:
+            # Курсор из прошлого запуска или старше истории
+            self.stats["resyncs"] += 1
+            sub._push((self._seq, RESYNC, {"reason": "history"}))
+            return
+        for seq, keys, event_type, data in self._history:
+            if seq > last_id and (ALL in sub.keys or keys & sub.keys):
+                sub._push((seq, event_type, data))
+
+    def unsubscribe(self, sub: Subscription):
+        with self._lock:
+            if not sub._registered:
+                return
+            sub._registered = False
+            self._subscribers -= 1
+            for key in sub.keys:
+                subs = self._index.get(key)
+                if subs:
+                    subs.discard(sub)
+                    if not subs:
+                        del self._index[key]
+
+    # ─── Публикация ───
+
+    def publish(self, keys: Iterable[str], event_type: str, data: Any) -> int:
+        """Раздать событие подписчикам ключей (и ALL); возвращает seq"""
+        keys = frozenset(keys)
+        with self._lock:
+            self._seq += 1
+            seq = self._seq
+            self._history.append((seq, keys, event_type, data))
+
+            targets = set(self._index.get(ALL, ()))
+            for key in keys:
+                targets.update(self._index.get(key, ()))
+
+            # Доставка под блокировкой хаба: подписчик видит seq строго по
+            # возрастанию, и Last-Event-ID после обрыва не перескакивает
+            # через ещё не доставленное событие. _push лишь кладёт в очередь
+            message = (seq, event_type, data)
+            for sub in targets:
+                sub._push(message)
+            self.stats["published"] += 1
+            self.stats["delivered"] += len(targets)
+        return seq
+
+    def subscribers(self) -> int:
+        return self._subscribers
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# ТРАНСПОРТ
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def parse_last_id(value: Optional[str]) -> Optional[int]:
+    """Last-Event-ID / last_id из запроса; мусор — как отсутствие"""
+    try:
+        return int(value) if value not in (None, "") else None
+    except ValueError:
+        return None
+
+
+def format_sse(message: Message) -> str:
+    seq, event_type, data = message
+    return f"id: {seq}\nevent: {event_type}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def sse_stream(sub: Subscription, heartbeat: float = HEARTBEAT_INTERVAL,
+               max_seconds: float = STREAM_MAX_SECONDS,
+               transform: Optional[Transform] = None) -> Iterator[str]:
+    """
+    Тело text/event-stream. Подписка закрывается, когда клиент ушёл
+    (генератор закрыт) или истёк max_seconds.
+    """
+    deadline = time.monotonic() + max_seconds
+    try:
+        # Клиенту — сколько ждать перед переподключением
+        yield "retry: 3000\n\n"
+        while not sub.closed:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            messages = sub.wait(min(heartbeat, remaining))
+            if not messages:
+                yield ": keepalive\n\n"
+                continue
+            if transform:
+                messages = transform(messages)
+            yield "".join(format_sse(m) for m in messages)
+    finally:
+        sub.close()
+
+
+def long_poll(sub: Subscription, timeout: float = POLL_TIMEOUT,
+              transform: Optional[Transform] = None) -> Dict[str, Any]:
+    """Один long-poll: события или пустой список по таймауту"""
+    try:
+        messages = sub.wait(max(0, min(timeout, POLL_TIMEOUT)))
+    finally:
+        sub.close()
+    if transform and messages:
+        messages = transform(messages)
+    return {
+        "events": [{"id": seq, "type": event_type, "data": data}
+                   for seq, event_type, data in messages],
+        "last_id": sub.last_seq
+    }
+
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    # nginx: не буферизовать поток
+    "X-Accel-Buffering": "no"
+}
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# SINGLETON
+# ═══════════════════════════════════════════════════════════════════════════════
+
+_hub: Optional[PushHub] = None
+_hub_lock = threading.Lock()
+
+
+def get_push_hub() -> PushHub:
+    """Глобальный хаб процесса"""
+    global _hub
+    with _hub_lock:
+        if _hub is None:
+            _hub = PushHub()
+        return _hub
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# БЕНЧМАРК
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def benchmark(subscribers: int = 1000, events: int = 20_000) -> dict:
+    """
+    Задержка доставки и стоимость публикации: subscribers подписчиков
+    на разные адреса, события адресованы одному из них.
+    """
+    import random
+
+    hub = PushHub(max_subscribers=subscribers + 1)
+    subs = [hub.subscribe([f"address:{i}"]) for i in range(subscribers)]
+
+    start = time.perf_counter()
+    for n in range(events):
+        hub.publish([f"address:{n % subscribers}"], "TRANSFER", {"n": n})
+    publish_us = (time.perf_counter() - start) / events * 1e6
+    for sub in subs:
+        sub.wait(0)
+
+    # Задержка: публикация из другого потока → подписчик проснулся
+    rng = random.Random(1)
+    target = subs[0]
+    latencies = []
+    for _ in range(200):
+        sent = []
+
+        def producer():
+            time.sleep(rng.random() * 0.002)
+            sent.append(time.perf_counter())
+            hub.publish(["address:0"], "TRANSFER", {})
+
+        thread = threading.Thread(target=producer)
+        thread.start()
+        target.wait(1.0)
+        latencies.append(time.perf_counter() - sent[0])
+        thread.join()
+
+    for sub in subs:
+        sub.close()
+
+    latencies.sort()
+    return {
+        "subscribers": subscribers,
+        "publish_us": round(publish_us, 2),
+        "latency_p50_ms": round(latencies[len(latencies) // 2] * 1000, 3),
+        "latency_p99_ms": round(latencies[int(len(latencies) * 0.99)] * 1000, 3)
+    }
+
+
+if __name__ == "__main__":
+    import sys
+
+    if "--benchmark" in sys.argv:
+        for key, value in benchmark().items():
+            print(f"{key:18} {value}")
+    else:
+        print("Usage: python3 push_hub.py --benchmark")
@@ -41,9 +41,15 @@ try:
 except ImportError:
     ML_DSA_AVAILABLE = False
 
+# Бинарный формат межузловых сообщений (JSON — запасной)
+from node_wire import WIRE_MIME, JSON_MIME, accepts_wire, dumps as wire_dumps, loads as wire_loads
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("TIME_LEDGER")
 
+# Мы понимаем оба формата; узел отвечает в mw1, если умеет
+WIRE_ACCEPT = f"{WIRE_MIME}, {JSON_MIME}"
+
 
 # ═══════════════════════════════════════════════════════════════════════════════
 # КОНФИГУРАЦИЯ СЕТИ
@@ -158,6 +164,8 @@ class TimeLedger:
 
         # HTTP сессия для broadcast
         self._http_session: Optional[aiohttp.ClientSession] = None
+        # Узлы, ответившие в mw1: им транзакции уходят в mw1
+        self._wire_nodes: set = set()
 
         # T2 счётчик
         self.t2_index = 0
@@ -534,18 +542,33 @@ class TimeLedger:
 
     async def _send_tx(self, session: aiohttp.ClientSession,
                        url: str, node_name: str, tx_data: dict) -> bool:
-        """Отправляет TX на один узел"""
+        """Отправляет TX на один узел (mw1, если узел его поддерживает)"""
+        binary = node_name in self._wire_nodes
+        headers = {
+            "Content-Type": WIRE_MIME if binary else JSON_MIME,
+            "Accept": WIRE_ACCEPT
+        }
         try:
-            async with session.post(url, json=tx_data) as resp:
+            async with session.post(url, data=wire_dumps(tx_data, binary), headers=headers) as resp:
+                self._note_format(node_name, resp)
                 if resp.status == 200:
                     return True
                 else:
                     logger.debug(f"⚠️ {node_name}: HTTP {resp.status}")
+                    if binary:
+                        self._wire_nodes.discard(node_name)
                     return False
         except Exception as e:
             logger.debug(f"⚠️ {node_name}: {type(e).__name__}")
             return False
 
+    def _note_format(self, node_name: str, resp: aiohttp.ClientResponse):
+        """Запоминает, отвечает ли узел в mw1"""
+        if resp.content_type == WIRE_MIME:
+            self._wire_nodes.add(node_name)
+        elif resp.content_type == JSON_MIME:
+            self._wire_nodes.discard(node_name)
+
     # ═══════════════════════════════════════════════════════════════════════════
     # SYNC (синхронизация с другими узлами)
     # ═══════════════════════════════════════════════════════════════════════════
@@ -569,11 +592,13 @@ class TimeLedger:
 
         try:
             session = await self._get_session()
-            async with session.get(url, params={"since": since}) as resp:
+            headers = {"Accept": WIRE_ACCEPT}
+            async with session.get(url, params={"since": since}, headers=headers) as resp:
                 if resp.status != 200:
                     return 0
 
-                data = await resp.json()
+                self._note_format(node_name, resp)
+                data = wire_loads(await resp.read())
                 transactions = data.get("transactions", [])
 
                 count = 0
@@ -648,6 +673,15 @@ class TimeLedger:
 
 from aiohttp import web
 
+
+def _wire_response(request: web.Request, payload: Any, status: int = 200) -> web.Response:
+    """Ответ в mw1, если узел указал его в Accept, иначе JSON"""
+    if accepts_wire(request.headers.get("Accept")):
+        return web.Response(body=wire_dumps(payload, binary=True), status=status,
+                            content_type=WIRE_MIME)
+    return web.json_response(payload, status=status)
+
+
 class LedgerAPI:
     """HTTP API для TIME_LEDGER"""
 
@@ -667,17 +701,17 @@ class LedgerAPI:
     async def receive_tx(self, request: web.Request) -> web.Response:
         """Получает транзакцию от другого узла"""
         try:
-            tx_data = await request.json()
+            tx_data = wire_loads(await request.read())
             success = self.ledger.receive_tx(tx_data)
-            return web.json_response({"success": success})
+            return _wire_response(request, {"success": success})
         except Exception as e:
-            return web.json_response({"error": str(e)}, status=400)
+            return _wire_response(request, {"error": str(e)}, status=400)
 
     async def sync_handler(self, request: web.Request) -> web.Response:
         """Отдаёт транзакции для синхронизации"""
         since = int(request.query.get("since", 0))
         transactions = self.ledger.all_transactions(since_timestamp=since)
-        return web.json_response({"transactions": transactions})
+        return _wire_response(request, {"transactions": transactions})
 
     async def balance_handler(self, request: web.Request) -> web.Response:
         """Возвращает баланс адреса"""
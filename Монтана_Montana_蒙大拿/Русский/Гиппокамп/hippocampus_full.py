@@ -9,7 +9,7 @@
 - Консолидация
 
 Фаза 2: Улучшения
-- RAG интеграция (семантический поиск)
+- Семантический поиск (локальный векторный индекс)
 - Визуализация плотности кодирования
 - Экспорт в Markdown/PDF
 - Музыкальные якоря
@@ -24,24 +24,29 @@
     python hippocampus_full.py --help
 """
 
+import bisect
 import json
 import hashlib
+import math
 import os
 from dataclasses import dataclass, field, asdict
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Optional, List, Dict, Set
+from typing import Optional, List, Dict, Set, Tuple, Callable
 from collections import defaultdict
 import argparse
 import re
+import queue
+import threading
+import time
+from collections import OrderedDict
 
 # Опциональные зависимости
 try:
-    import chromadb
-    from chromadb.config import Settings
-    HAS_CHROMADB = True
+    import numpy as np
+    HAS_NUMPY = True
 except ImportError:
-    HAS_CHROMADB = False
+    HAS_NUMPY = False
 
 try:
     from sentence_transformers import SentenceTransformer
@@ -128,6 +133,1121 @@ class UserMemory:
     connected_users: List[int] = field(default_factory=list)  # Через shared memories
 
 
+# ═══════════════════════════════════════════════════════════════════════════════
+#                              ИНДЕКСЫ
+# ═══════════════════════════════════════════════════════════════════════════════
+
+class InvertedIndex:
+    """
+    Инвертированный индекс: тег / терм / трек → ID координат
+
+    Обновляется инкрементально при save() — cross-reference и поиск
+    работают по posting-спискам, а не сканируют весь архив.
+    """
+
+    TERM_RE = re.compile(r'\w+')
+
+    # Термы, встречающиеся чаще, не несут сигнала для cross-reference
+    # (союзы, предлоги) и пропускаются при подсчёте общих слов
+    TERM_DF_LIMIT = 5000
+
+    def __init__(self):
+        self.tags: Dict[str, Set[str]] = defaultdict(set)
+        self.terms: Dict[str, Set[str]] = defaultdict(set)
+        self.music: Dict[str, Set[str]] = defaultdict(set)
+        self._music_of: Dict[str, str] = {}
+
+    @classmethod
+    def terms_of(cls, text: str) -> Set[str]:
+        """Нормализованные термы текста"""
+        return set(cls.TERM_RE.findall(text.lower()))
+
+    def add(self, coord: 'Coordinate'):
+        """Проиндексировать координату"""
+        for tag in coord.tags:
+            self.tags[tag].add(coord.id)
+        for term in self.terms_of(coord.thought):
+            self.terms[term].add(coord.id)
+        self.set_music(coord.id, coord.music_track)
+
+    def set_music(self, coord_id: str, track: Optional[str]):
+        """Обновить трек координаты в индексе"""
+        old = self._music_of.pop(coord_id, None)
+        if old is not None:
+            self.music[old].discard(coord_id)
+            if not self.music[old]:
+                del self.music[old]
+        if track:
+            key = track.lower()
+            self.music[key].add(coord_id)
+            self._music_of[coord_id] = key
+
+    def related(self, coord: 'Coordinate', min_common_terms: int = 3) -> Dict[str, Tuple[int, int]]:
+        """
+        Кандидаты для cross-reference.
+
+        Returns:
+            {coord_id: (общих тегов, общих термов)} — только для координат
+            с хотя бы одним общим тегом или >= min_common_terms общими термами
+        """
+        tag_hits: Dict[str, int] = defaultdict(int)
+        for tag in coord.tags:
+            for other_id in self.tags.get(tag, ()):
+                tag_hits[other_id] += 1
+
+        term_hits: Dict[str, int] = defaultdict(int)
+        terms = self.terms_of(coord.thought)
+        if len(terms) >= min_common_terms:
+            postings = [self.terms[t] for t in terms if t in self.terms]
+            for posting in postings:
+                if len(posting) > self.TERM_DF_LIMIT:
+                    continue
+                for other_id in posting:
+                    term_hits[other_id] += 1
+
+        result = {}
+        for other_id in set(tag_hits) | {i for i, n in term_hits.items() if n >= min_common_terms}:
+            if other_id != coord.id:
+                result[other_id] = (tag_hits.get(other_id, 0), term_hits.get(other_id, 0))
+        return result
+
+    def text_candidates(self, query: str) -> Optional[Set[str]]:
+        """
+        Надмножество координат, чей текст может содержать query как подстроку.
+
+        Внутренние слова запроса (окружены не-буквами) — целые термы,
+        берутся напрямую из posting-списков. Крайние слова могут быть
+        частью терма — ищутся по словарю термов.
+
+        Returns:
+            Множество ID или None если индекс не может сузить поиск
+        """
+        query = query.lower()
+        spans = [(m.start(), m.end(), m.group()) for m in self.TERM_RE.finditer(query)]
+        if not spans:
+            return None
+
+        interior = [t for start, end, t in spans if start > 0 and end < len(query)]
+        if interior:
+            postings = sorted((self.terms.get(t, set()) for t in interior), key=len)
+            return set.intersection(*postings) if postings else set()
+
+        candidates: Optional[Set[str]] = None
+        for _, _, token in spans:
+            matched: Set[str] = set()
+            for term, posting in self.terms.items():
+                if token in term:
+                    matched |= posting
+            candidates = matched if candidates is None else candidates & matched
+            if not candidates:
+                return set()
+        return candidates
+
+    def by_music(self, track_query: str) -> Set[str]:
+        """Координаты, чей трек содержит track_query (по словарю треков)"""
+        query = track_query.lower()
+        result: Set[str] = set()
+        for track, ids in self.music.items():
+            if query in track:
+                result |= ids
+        return result
+
+
+class SpatialIndex:
+    """
+    Сеточный индекс геолокаций
+
+    Поверхность делится на ячейки CELL_DEG × CELL_DEG градусов.
+    Запрос по радиусу смотрит только ячейки bounding box, расстояния
+    считаются векторно (numpy) по точкам этих ячеек. Ближайшие K —
+    расширяющийся радиус. Места пользователя (location_name) ведутся
+    отдельно, без сканирования архива.
+    """
+
+    CELL_DEG = 0.05          # ~5.5 км по широте
+    EARTH_RADIUS_KM = 6371
+    KM_PER_DEG = 111.195     # Длина градуса меридиана
+
+    def __init__(self):
+        self._points: Dict[str, Tuple[float, float]] = {}         # id → (lat, lon)
+        self._cells: Dict[Tuple[int, int], Set[str]] = defaultdict(set)
+        self._arrays: Dict[Tuple[int, int], tuple] = {}           # ячейка → (ids, lat, lon)
+        self._places: Dict[int, Dict[str, Dict[str, str]]] = defaultdict(lambda: defaultdict(dict))
+        self._place_of: Dict[str, Tuple[int, str]] = {}
+
+    @staticmethod
+    def parse(location: Optional[str]) -> Optional[Tuple[float, float]]:
+        """'lat,lon' → (lat, lon)"""
+        if not location:
+            return None
+        try:
+            lat, lon = map(float, location.split(','))
+        except ValueError:
+            return None
+        return lat, lon
+
+    def _cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        # Долгота по модулю 360: ±180° — одна и та же колонка
+        return int((lat + 90) // self.CELL_DEG), int(((lon + 180) % 360) // self.CELL_DEG)
+
+    def set(
+        self,
+        coord_id: str,
+        user_id: int,
+        timestamp: str,
+        location: Optional[str],
+        place: Optional[str]
+    ):
+        """Добавить или обновить геолокацию координаты"""
+        old = self._points.pop(coord_id, None)
+        if old is not None:
+            cell = self._cell(*old)
+            self._cells[cell].discard(coord_id)
+            self._arrays.pop(cell, None)
+            if not self._cells[cell]:
+                del self._cells[cell]
+
+        old_place = self._place_of.pop(coord_id, None)
+        if old_place is not None:
+            places = self._places[old_place[0]]
+            places[old_place[1]].pop(coord_id, None)
+            if not places[old_place[1]]:
+                del places[old_place[1]]
+
+        point = self.parse(location)
+        if point is not None:
+            cell = self._cell(*point)
+            self._points[coord_id] = point
+            self._cells[cell].add(coord_id)
+            self._arrays.pop(cell, None)
+
+        if place:
+            self._places[user_id][place][coord_id] = timestamp
+            self._place_of[coord_id] = (user_id, place)
+
+    def __len__(self) -> int:
+        return len(self._points)
+
+    def places(self, user_id: int) -> Dict[str, Dict[str, str]]:
+        """Места пользователя: {название: {id: timestamp}}"""
+        return self._places.get(user_id, {})
+
+    # ─────────────────────────────────────────────────────────────────────────
+    #                            ЗАПРОСЫ
+    # ─────────────────────────────────────────────────────────────────────────
+
+    def _candidate_cells(self, lat: float, lon: float, radius_km: float):
+        """Ячейки, пересекающие bounding box круга"""
+        dlat = radius_km / self.KM_PER_DEG
+        lat_lo, lat_hi = max(lat - dlat, -90.0), min(lat + dlat, 90.0)
+
+        # Вблизи полюса или на большом радиусе — все долготы
+        cos_lat = min(math.cos(math.radians(lat_lo)), math.cos(math.radians(lat_hi)))
+        dlon = 180.0 if cos_lat <= 1e-9 else dlat / cos_lat
+        lon_cells = round(360 / self.CELL_DEG)
+
+        row_lo, row_hi = self._cell(lat_lo, 0)[0], self._cell(lat_hi, 0)[0]
+        if dlon >= 180:
+            columns = None
+            span = lon_cells
+        else:
+            col_lo = int((lon - dlon + 180) // self.CELL_DEG)
+            col_hi = int((lon + dlon + 180) // self.CELL_DEG)
+            span = col_hi - col_lo + 1
+            columns = {col % lon_cells for col in range(col_lo, col_hi + 1)}
+
+        # Перебор bbox дороже перебора занятых ячеек — фильтруем занятые
+        if (row_hi - row_lo + 1) * span > len(self._cells):
+            return [
+                cell for cell in self._cells
+                if row_lo <= cell[0] <= row_hi and (columns is None or cell[1] in columns)
+            ]
+
+        columns = range(lon_cells) if columns is None else columns
+        return [
+            (row, col) for row in range(row_lo, row_hi + 1) for col in columns
+            if (row, col) in self._cells
+        ]
+
+    def _cell_arrays(self, cell: Tuple[int, int]) -> tuple:
+        arrays = self._arrays.get(cell)
+        if arrays is None:
+            ids = list(self._cells[cell])
+            lats = [self._points[i][0] for i in ids]
+            lons = [self._points[i][1] for i in ids]
+            if HAS_NUMPY:
+                lats, lons = np.radians(np.array(lats)), np.radians(np.array(lons))
+            arrays = (ids, lats, lons)
+            self._arrays[cell] = arrays
+        return arrays
+
+    def within(self, lat: float, lon: float, radius_km: float) -> List[Tuple[str, float]]:
+        """Точки в радиусе: [(id, км)] по возрастанию расстояния"""
+        cells = self._candidate_cells(lat, lon, radius_km)
+        if not cells:
+            return []
+
+        parts = [self._cell_arrays(cell) for cell in cells]
+        ids = [coord_id for part in parts for coord_id in part[0]]
+
+        if HAS_NUMPY:
+            lats = np.concatenate([part[1] for part in parts])
+            lons = np.concatenate([part[2] for part in parts])
+            lat0, lon0 = math.radians(lat), math.radians(lon)
+            a = (np.sin((lats - lat0) / 2) ** 2
+                 + math.cos(lat0) * np.cos(lats) * np.sin((lons - lon0) / 2) ** 2)
+            dist = 2 * self.EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+            inside = np.flatnonzero(dist <= radius_km)
+            inside = inside[np.argsort(dist[inside], kind="stable")]
+            return [(ids[i], float(dist[i])) for i in inside]
+
+        hits = []
+        for coord_id in ids:
+            c_lat, c_lon = self._points[coord_id]
+            dist = ExternalHippocampus._haversine(lat, lon, c_lat, c_lon)
+            if dist <= radius_km:
+                hits.append((coord_id, dist))
+        hits.sort(key=lambda hit: hit[1])
+        return hits
+
+    def nearest(self, lat: float, lon: float, k: int = 10) -> List[Tuple[str, float]]:
+        """K ближайших точек: радиус удваивается, пока их не наберётся K"""
+        if not self._points:
+            return []
+
+        radius = self.CELL_DEG * self.KM_PER_DEG
+        max_radius = math.pi * self.EARTH_RADIUS_KM
+        while True:
+            hits = self.within(lat, lon, radius)
+            if len(hits) >= k or radius >= max_radius:
+                return hits[:k]
+            radius = min(radius * 2, max_radius)
+
+
+class TimelineIndex:
+    """
+    Временные индексы: глобальная лента, ленты пользователей,
+    публичная лента и счётчики по дням
+
+    Списки (timestamp, id) отсортированы — новые мысли почти всегда
+    дописываются в конец. Выборки по пользователю/датам — bisect,
+    статистика и плотность — готовые счётчики, без сканирования архива.
+    """
+
+    def __init__(self):
+        self._all: List[Tuple[str, str]] = []
+        self._users: Dict[int, List[Tuple[str, str]]] = defaultdict(list)
+        self._public: List[Tuple[str, str]] = []
+        self._shared_to: Dict[int, List[str]] = defaultdict(list)
+
+        self._daily: Dict[int, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self._daily_all: Dict[str, int] = defaultdict(int)
+        self._tags: Dict[int, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self._tags_all: Dict[str, int] = defaultdict(int)
+        self._usernames: Dict[int, Tuple[str, str]] = {}          # user → (timestamp, username) первой мысли
+        self._connected: Dict[int, Set[int]] = defaultdict(set)
+        self._state: Dict[str, Tuple[Set[int], bool]] = {}          # id → (shared_with, is_public)
+        self._shared_count = 0
+
+    @staticmethod
+    def _insert(items: list, item):
+        if not items or items[-1] <= item:
+            items.append(item)
+        else:
+            bisect.insort(items, item)
+
+    def add(self, coord_id: str, meta: dict):
+        """Добавить координату или применить изменения shared/public"""
+        user_id, timestamp = meta["u"], meta["t"]
+        key = (timestamp, coord_id)
+        shared, public = set(meta["s"]), meta["pub"]
+
+        state = self._state.get(coord_id)
+        if state is None:
+            self._insert(self._all, key)
+            self._insert(self._users[user_id], key)
+            date = timestamp[:10]
+            self._daily[user_id][date] += 1
+            self._daily_all[date] += 1
+            for tag in meta["g"]:
+                self._tags[user_id][tag] += 1
+                self._tags_all[tag] += 1
+            first = self._usernames.get(user_id)
+            if first is None or timestamp < first[0]:
+                self._usernames[user_id] = (timestamp, meta["un"])
+            old_shared, old_public = set(), False
+        else:
+            old_shared, old_public = state
+
+        if shared and not old_shared:
+            self._shared_count += 1
+        for to_user in shared - old_shared:
+            self._shared_to[to_user].append(coord_id)
+        self._connected[user_id].update(shared)
+        if public and not old_public:
+            self._insert(self._public, key)
+
+        self._state[coord_id] = (shared, public)
+
+    # ─────────────────────────────────────────────────────────────────────────
+    #                            ВЫБОРКИ
+    # ─────────────────────────────────────────────────────────────────────────
+
+    def __len__(self) -> int:
+        return len(self._all)
+
+    def ids(
+        self,
+        user_id: Optional[int] = None,
+        from_date: Optional[str] = None,
+        to_date: Optional[str] = None
+    ) -> List[str]:
+        """ID по возрастанию времени, с фильтром по пользователю и датам"""
+        items = self._users.get(user_id, []) if user_id else self._all
+        start = bisect.bisect_left(items, (from_date, "")) if from_date else 0
+        # Конец дня to_date: любая метка с этой датой меньше to_date + "\uffff"
+        end = bisect.bisect_left(items, (to_date + "\uffff", "")) if to_date else len(items)
+        return [coord_id for _, coord_id in items[start:end]]
+
+    def latest(self, user_id: int, limit: int) -> List[str]:
+        """Последние limit мыслей пользователя (по возрастанию времени)"""
+        return [coord_id for _, coord_id in self._users.get(user_id, [])[-limit:]]
+
+    def public(self, limit: int) -> List[str]:
+        """Последние публичные (новые первыми)"""
+        return [coord_id for _, coord_id in reversed(self._public[-limit:])]
+
+    def shared_to(self, user_id: int) -> List[str]:
+        return list(self._shared_to.get(user_id, []))
+
+    def daily(self, user_id: Optional[int] = None) -> Dict[str, int]:
+        """Количество мыслей по дням"""
+        return dict(self._daily.get(user_id, {}) if user_id else self._daily_all)
+
+    # ─────────────────────────────────────────────────────────────────────────
+    #                            СТАТИСТИКА
+    # ─────────────────────────────────────────────────────────────────────────
+
+    def user_ids(self) -> List[int]:
+        return list(self._users)
+
+    def user_profile(self, user_id: int) -> UserMemory:
+        """Профиль пользователя из счётчиков"""
+        items = self._users.get(user_id, [])
+        tag_counts = self._tags.get(user_id, {})
+        top_tags = sorted(tag_counts, key=lambda tag: -tag_counts[tag])[:5]
+
+        if len(items) >= 2:
+            first = datetime.fromisoformat(items[0][0].replace("Z", ""))
+            last = datetime.fromisoformat(items[-1][0].replace("Z", ""))
+            days = max(1, (last - first).days)
+            density = len(items) / days
+        else:
+            density = len(items)
+
+        return UserMemory(
+            user_id=user_id,
+            username=self._usernames.get(user_id, ("", "unknown"))[1],
+            total_thoughts=len(items),
+            first_thought=items[0][0] if items else None,
+            last_thought=items[-1][0] if items else None,
+            density_per_day=round(density, 2),
+            top_tags=top_tags,
+            connected_users=list(self._connected.get(user_id, ()))
+        )
+
+    def global_stats(self) -> Dict:
+        if not self._all:
+            return {"total": 0}
+
+        return {
+            "total_coordinates": len(self._all),
+            "total_users": len(self._users),
+            "total_shared": self._shared_count,
+            "total_public": len(self._public),
+            "top_tags": sorted(self._tags_all.items(), key=lambda x: -x[1])[:10],
+            "first_memory": self._all[0][0],
+            "last_memory": self._all[-1][0]
+        }
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+#                              ХРАНИЛИЩЕ
+# ═══════════════════════════════════════════════════════════════════════════════
+
+class CoordinateStore:
+    """
+    Хранилище координат: append-only stream + индекс смещений по ID
+
+    Файлы:
+    - stream.jsonl — журнал версий координат. Новая мысль и любое
+      изменение (музыка, место, shared, связи) = одна дописанная строка
+    - index.jsonl — индекс {id, смещение, длина, user_id, timestamp, связи,
+      теги, геолокация, shared/public},
+      тоже только дописывается
+
+    Чтение координаты — seek по смещению (+ LRU кэш), весь stream
+    при запуске не разбирается. Устаревшие версии убираются фоновой
+    компакцией, когда их становится больше, чем живых координат.
+    """
+
+    COMPACT_MIN_STALE = 1000  # Не компактировать ради пары устаревших строк
+
+    def __init__(self, stream_file: Path, index_file: Path, cache_size: int = 4096):
+        self.stream_file = stream_file
+        self.index_file = index_file
+        self.cache_size = cache_size
+        self.on_compact: Optional[Callable[[], None]] = None
+
+        self._lock = threading.RLock()
+        self._offsets: Dict[str, Tuple[int, int]] = {}   # id → (offset, length)
+        self._meta: Dict[str, dict] = {}                # id → {"u", "t", "r"}
+        self._cache: "OrderedDict[str, Coordinate]" = OrderedDict()
+        self._stale = 0
+        self._end = 0
+        self._compactor: Optional[threading.Thread] = None
+
+        self._load()
+        self._open()
+
+    # ─────────────────────────────────────────────────────────────────────────
+    #                            ЗАГРУЗКА ИНДЕКСА
+    # ─────────────────────────────────────────────────────────────────────────
+
+    def _open(self):
+        self._writer = open(self.stream_file, "ab")
+        self._reader = open(self.stream_file, "rb")
+        self._index_writer = open(self.index_file, "a", encoding="utf-8")
+
+    def _close(self):
+        for handle in (self._writer, self._reader, self._index_writer):
+            handle.close()
+
+    @staticmethod
+    def meta_of(coord: 'Coordinate') -> dict:
+        """Метаданные координаты, которые хранятся в индексе"""
+        return {
+            "u": coord.user_id, "un": coord.username, "t": coord.timestamp,
+            "r": list(coord.references), "g": list(coord.tags),
+            "l": coord.location, "p": coord.location_name,
+            "s": list(coord.shared_with), "pub": coord.is_public
+        }
+
+    @classmethod
+    def _entry(cls, coord: 'Coordinate', offset: int, length: int) -> dict:
+        return {"id": coord.id, "o": offset, "n": length, **cls.meta_of(coord)}
+
+    def _apply_entry(self, entry: dict):
+        if entry["id"] in self._offsets:
+            self._stale += 1
+        self._offsets[entry["id"]] = (entry["o"], entry["n"])
+        self._meta[entry["id"]] = {
+            key: value for key, value in entry.items() if key not in ("id", "o", "n")
+        }
+
+    def _load(self):
+        """Прочитать индекс; доиндексировать хвост stream после сбоя"""
+        indexed_end = 0
+        if self.index_file.exists():
+            with open(self.index_file, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    self._apply_entry(entry)
+                    indexed_end = max(indexed_end, entry["o"] + entry["n"])
+
+        stream_size = self.stream_file.stat().st_size if self.stream_file.exists() else 0
+
+        if stream_size < indexed_end:
+            # Индекс от другого stream — перестраиваем целиком
+            self._offsets.clear()
+            self._meta.clear()
+            self._stale = 0
+            self.index_file.unlink()
+            indexed_end = 0
+
+        self._end = self._scan_tail(indexed_end, stream_size)
+
+    def _scan_tail(self, start: int, stream_size: int) -> int:
+        """Проиндексировать строки stream начиная со start"""
+        if start >= stream_size:
+            return start
+
+        position = start
+        entries = []
+        with open(self.stream_file, "rb") as f:
+            f.seek(start)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # Оборванная запись — отрезаем ниже
+                try:
+                    coord = Coordinate.from_dict(json.loads(line))
+                except (ValueError, TypeError):
+                    position += len(line)
+                    continue
+                entry = self._entry(coord, position, len(line))
+                self._apply_entry(entry)
+                entries.append(entry)
+                position += len(line)
+
+        if position < stream_size:
+            with open(self.stream_file, "r+b") as f:
+                f.truncate(position)
+
+        with open(self.index_file, "a", encoding="utf-8") as f:
+            for entry in entries:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        return position
+
+    # ─────────────────────────────────────────────────────────────────────────
+    #                            ЗАПИСЬ / ЧТЕНИЕ
+    # ─────────────────────────────────────────────────────────────────────────
+
+    def put(self, coord: 'Coordinate'):
+        """Записать новую координату или новую версию существующей, O(1)"""
+        data = (json.dumps(coord.to_dict(), ensure_ascii=False) + "\n").encode("utf-8")
+        with self._lock:
+            entry = self._entry(coord, self._end, len(data))
+            self._writer.write(data)
+            self._writer.flush()
+            self._index_writer.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self._index_writer.flush()
+            self._end += len(data)
+
+            self._apply_entry(entry)
+            self._remember(coord)
+            self._maybe_compact()
+
+    def _remember(self, coord: 'Coordinate'):
+        self._cache[coord.id] = coord
+        self._cache.move_to_end(coord.id)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def _read(self, offset: int, length: int) -> 'Coordinate':
+        self._reader.seek(offset)
+        return Coordinate.from_dict(json.loads(self._reader.read(length)))
+
+    def get(self, coord_id: str, default=None) -> Optional['Coordinate']:
+        with self._lock:
+            coord = self._cache.get(coord_id)
+            if coord is not None:
+                self._cache.move_to_end(coord_id)
+                return coord
+            location = self._offsets.get(coord_id)
+            if location is None:
+                return default
+            coord = self._read(*location)
+            self._remember(coord)
+            return coord
+
+    def __getitem__(self, coord_id: str) -> 'Coordinate':
+        coord = self.get(coord_id)
+        if coord is None:
+            raise KeyError(coord_id)
+        return coord
+
+    def __contains__(self, coord_id: str) -> bool:
+        return coord_id in self._offsets
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    def __iter__(self):
+        return iter(list(self._offsets))
+
+    def meta(self, coord_id: str) -> Optional[dict]:
+        """Метаданные из индекса (см. meta_of) без чтения stream"""
+        return self._meta.get(coord_id)
+
+    def meta_items(self):
+        return list(self._meta.items())
+
+    def values(self):
+        """Все живые координаты — последовательное чтение stream"""
+        with self._lock:
+            live = {offset: coord_id for coord_id, (offset, _) in self._offsets.items()}
+            end = self._end
+
+        position = 0
+        with open(self.stream_file, "rb") as f:
+            for line in f:
+                if position >= end:
+                    break
+                coord_id = live.get(position)
+                position += len(line)
+                if coord_id is None:
+                    continue
+                cached = self._cache.get(coord_id)
+                yield cached if cached is not None else Coordinate.from_dict(json.loads(line))
+
+    # ─────────────────────────────────────────────────────────────────────────
+    #                            КОМПАКЦИЯ
+    # ─────────────────────────────────────────────────────────────────────────
+
+    def _maybe_compact(self):
+        if self._stale < max(self.COMPACT_MIN_STALE, len(self._offsets)):
+            return
+        if self._compactor is not None and self._compactor.is_alive():
+            return
+        self._compactor = threading.Thread(target=self.compact, name="Hippocampus-Compact", daemon=True)
+        self._compactor.start()
+
+    def compact(self):
+        """
+        Переписать stream без устаревших версий (по времени) и индекс.
+
+        Основная часть копируется без блокировки — stream только
+        дописывается. Под блокировкой переносится лишь хвост, записанный
+        за время компакции.
+        """
+        with self._lock:
+            end = self._end
+            live = sorted(self._offsets.items(), key=lambda item: self._meta[item[0]]["t"])
+
+        tmp_stream = self.stream_file.with_suffix(".jsonl.compact")
+        offsets: Dict[str, Tuple[int, int]] = {}
+        position = 0
+
+        with open(self.stream_file, "rb") as src, open(tmp_stream, "wb") as dst:
+            for coord_id, (offset, length) in live:
+                if offset >= end:
+                    continue
+                src.seek(offset)
+                dst.write(src.read(length))
+                offsets[coord_id] = (position, length)
+                position += length
+
+            with self._lock:
+                # Хвост: версии, дописанные во время компакции, новее
+                src.seek(end)
+                tail = src.read(self._end - end)
+                for line in tail.splitlines(keepends=True):
+                    coord_id = json.loads(line)["id"]
+                    dst.write(line)
+                    offsets[coord_id] = (position, len(line))
+                    position += len(line)
+                dst.flush()
+                os.fsync(dst.fileno())
+
+                tmp_index = self.index_file.with_suffix(".jsonl.compact")
+                with open(tmp_index, "w", encoding="utf-8") as f:
+                    for coord_id, (offset, length) in offsets.items():
+                        entry = {"id": coord_id, "o": offset, "n": length, **self._meta[coord_id]}
+                        f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                    f.flush()
+                    os.fsync(f.fileno())
+
+                self._close()
+                os.replace(tmp_stream, self.stream_file)
+                os.replace(tmp_index, self.index_file)
+                self._offsets = offsets
+                self._end = position
+                self._stale = 0
+                self._open()
+
+        if self.on_compact:
+            self.on_compact()
+
+    def close(self):
+        with self._lock:
+            self._close()
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+#                              ВЕКТОРНЫЙ ИНДЕКС
+# ═══════════════════════════════════════════════════════════════════════════════
+
+class SentenceEncoder:
+    """SentenceTransformer, загружаемый при первом пакете (не при старте)"""
+
+    MODEL = 'paraphrase-multilingual-MiniLM-L12-v2'
+
+    def __init__(self, model_name: str = MODEL):
+        self.model_name = model_name
+        self._model = None
+        self._lock = threading.Lock()
+
+    def __call__(self, texts: List[str]) -> "np.ndarray":
+        with self._lock:
+            if self._model is None:
+                self._model = SentenceTransformer(self.model_name)
+        return self._model.encode(
+            texts, batch_size=len(texts), normalize_embeddings=True, show_progress_bar=False
+        )
+
+
+class VectorIndex:
+    """
+    Локальный векторный индекс для семантического поиска
+
+    Файлы:
+    - vectors.json — размерность и тип матрицы
+    - vectors.bin — матрица embeddings (float32 или int8), только дописывается,
+      читается через memmap
+    - vectors.jsonl — строка i матрицы → {id, user_id, дата, теги}
+    - vectors.ivf.npy — центроиды IVF (когда матрица большая)
+
+    Векторы нормализованы: косинусная близость = скалярное произведение,
+    top-k — одно умножение матрицы на запрос. Новые мысли embedding-уются
+    пакетами в фоновом потоке.
+    """
+
+    BATCH_SIZE = 64
+    FLUSH_INTERVAL = 0.5      # Секунд ожидания неполного пакета
+    IVF_MIN_ROWS = 100_000    # С какого размера разбивать матрицу на кластеры
+    IVF_NPROBE = 8            # Сколько ближайших кластеров просматривать
+    IVF_SCAN_ROWS = 20_000    # Меньше кандидатов после фильтров — полный перебор
+
+    def __init__(
+        self,
+        data_dir: Path,
+        encode: Callable[[List[str]], "np.ndarray"],
+        quantize: bool = False
+    ):
+        self.encode = encode
+        self.dtype = np.dtype(np.int8 if quantize else np.float32)
+        self.dim = 0
+
+        self.meta_file = data_dir / "vectors.json"
+        self.matrix_file = data_dir / "vectors.bin"
+        self.ids_file = data_dir / "vectors.jsonl"
+        self.ivf_file = data_dir / "vectors.ivf.npy"
+
+        self._lock = threading.RLock()
+        self._ids: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self._users = np.zeros(0, dtype=np.int64)
+        self._dates = np.zeros(0, dtype="U10")
+        self._tags: Dict[str, List[int]] = defaultdict(list)
+        self._matrix: Optional["np.ndarray"] = None
+        self._centroids: Optional["np.ndarray"] = None
+        self._assign = np.zeros(0, dtype=np.int32)
+
+        self._queue: "queue.Queue[Coordinate]" = queue.Queue()
+        self._pending: Set[str] = set()
+        self._worker: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+        self._load()
+
+    # ─────────────────────────────────────────────────────────────────────────
+    #                            ЗАГРУЗКА
+    # ─────────────────────────────────────────────────────────────────────────
+
+    def _load(self):
+        """Прочитать матрицу и карту ID; отрезать недописанный хвост"""
+        if not self.meta_file.exists():
+            return
+
+        with open(self.meta_file, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        self.dim = meta["dim"]
+        self.dtype = np.dtype(meta["dtype"])
+
+        entries = []
+        clean = True
+        if self.ids_file.exists():
+            with open(self.ids_file, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        if not line.endswith("\n"):
+                            raise ValueError("truncated")
+                        entries.append(json.loads(line))
+                    except ValueError:
+                        clean = False
+                        break
+
+        row_bytes = self.dim * self.dtype.itemsize
+        matrix_size = self.matrix_file.stat().st_size if self.matrix_file.exists() else 0
+        rows = min(len(entries), matrix_size // row_bytes)
+
+        # Сбой между записью матрицы и карты ID — оставляем общую часть
+        if matrix_size != rows * row_bytes:
+            with open(self.matrix_file, "ab") as f:
+                f.truncate(rows * row_bytes)
+        if len(entries) != rows or not clean:
+            with open(self.ids_file, "w", encoding="utf-8") as f:
+                for entry in entries[:rows]:
+                    f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+        self._register(entries[:rows])
+        self._remap()
+
+        if self.ivf_file.exists() and rows:
+            self._centroids = np.load(self.ivf_file)
+            self._assign = self._nearest_centroids(0, rows)
+
+    def _register(self, entries: List[dict]):
+        """Добавить строки в карту ID и массивы фильтров"""
+        start = len(self._ids)
+        for offset, entry in enumerate(entries):
+            self._ids.append(entry["id"])
+            self._rows[entry["id"]] = start + offset
+            for tag in entry["tags"]:
+                self._tags[tag].append(start + offset)
+        self._users = np.concatenate([
+            self._users, np.array([e["u"] for e in entries], dtype=np.int64)
+        ])
+        self._dates = np.concatenate([
+            self._dates, np.array([e["d"] for e in entries], dtype="U10")
+        ])
+
+    def _remap(self):
+        rows = len(self._ids)
+        self._matrix = np.memmap(
+            self.matrix_file, dtype=self.dtype, mode="r", shape=(rows, self.dim)
+        ) if rows else None
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __contains__(self, coord_id: str) -> bool:
+        return coord_id in self._rows
+
+    # ─────────────────────────────────────────────────────────────────────────
+    #                            ПАКЕТНЫЙ EMBEDDING
+    # ─────────────────────────────────────────────────────────────────────────
+
+    def add(self, coord: 'Coordinate'):
+        """Поставить координату в очередь на embedding"""
+        with self._lock:
+            if coord.id in self._rows or coord.id in self._pending:
+                return
+            self._pending.add(coord.id)
+        self._queue.put(coord)
+        self._ensure_worker()
+
+    def backfill(self, store: 'CoordinateStore'):
+        """Доиндексировать координаты, которых ещё нет в матрице (в фоне)"""
+        missing = [cid for cid in store if cid not in self._rows]
+        if not missing:
+            return
+
+        def run():
+            for coord_id in missing:
+                coord = store.get(coord_id)
+                if coord is not None:
+                    self.add(coord)
+
+        threading.Thread(target=run, name="Hippocampus-Backfill", daemon=True).start()
+
+    def _ensure_worker(self):
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="Hippocampus-Embed", daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                batch = [self._queue.get(timeout=1.0)]
+            except queue.Empty:
+                continue
+
+            deadline = time.time() + self.FLUSH_INTERVAL
+            while len(batch) < self.BATCH_SIZE:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            self._index_batch(batch)
+
+    def flush(self):
+        """Дождаться, пока очередь embedding обработана"""
+        while True:
+            batch = []
+            while len(batch) < self.BATCH_SIZE:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if not batch:
+                break
+            self._index_batch(batch)
+        self._queue.join()
+
+    def _index_batch(self, coords: List['Coordinate']):
+        """Embedding пакета и дозапись в матрицу"""
+        try:
+            try:
+                vectors = self._normalize(self.encode([c.thought for c in coords]))
+            except Exception as e:
+                print(f"Embedding failed: {e}")
+                with self._lock:
+                    self._pending.difference_update(c.id for c in coords)
+                return
+
+            with self._lock:
+                if not self.dim:
+                    self.dim = vectors.shape[1]
+                    with open(self.meta_file, "w", encoding="utf-8") as f:
+                        json.dump({"dim": self.dim, "dtype": self.dtype.name}, f)
+
+                entries = [
+                    {"id": c.id, "u": c.user_id, "d": c.timestamp[:10], "tags": c.tags}
+                    for c in coords if c.id not in self._rows
+                ]
+                fresh = [i for i, c in enumerate(coords) if c.id not in self._rows]
+                self._pending.difference_update(c.id for c in coords)
+                if not entries:
+                    return
+
+                # Сначала матрица, потом карта ID: при сбое лишние строки отрежет _load
+                with open(self.matrix_file, "ab") as f:
+                    f.write(self._quantize(vectors[fresh]).tobytes())
+                with open(self.ids_file, "a", encoding="utf-8") as f:
+                    for entry in entries:
+                        f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+                start = len(self._ids)
+                self._register(entries)
+                self._remap()
+
+                if self._centroids is not None:
+                    self._assign = np.concatenate([
+                        self._assign, self._nearest_centroids(start, len(self._ids))
+                    ])
+                elif len(self._ids) >= self.IVF_MIN_ROWS:
+                    self.build_ivf()
+        finally:
+            for _ in coords:
+                self._queue.task_done()
+
+    @staticmethod
+    def _normalize(vectors) -> "np.ndarray":
+        vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+    def _quantize(self, vectors: "np.ndarray") -> "np.ndarray":
+        # Компоненты нормализованного вектора в [-1, 1] → int8 без масштаба на строку
+        if self.dtype == np.int8:
+            return np.round(vectors * 127).astype(np.int8)
+        return vectors.astype(np.float32)
+
+    def _scores(self, rows: Optional["np.ndarray"], query: "np.ndarray") -> "np.ndarray":
+        block = self._matrix if rows is None else self._matrix[rows]
+        scores = block.astype(np.float32, copy=False) @ query
+        if self.dtype == np.int8:
+            scores /= 127
+        return scores
+
+    # ─────────────────────────────────────────────────────────────────────────
+    #                            IVF
+    # ─────────────────────────────────────────────────────────────────────────
+
+    def build_ivf(self, nlist: Optional[int] = None, iterations: int = 10, sample: int = 20_000):
+        """Обучить центроиды (сферический k-means) и разложить строки по кластерам"""
+        with self._lock:
+            rows = len(self._ids)
+            if not rows:
+                return
+            nlist = min(nlist or int(np.sqrt(rows)), rows)
+
+            rng = np.random.default_rng(0)
+            picked = np.sort(rng.choice(rows, size=min(sample, rows), replace=False))
+            data = self._normalize(self._matrix[picked])
+            centroids = data[rng.choice(len(data), size=nlist, replace=False)]
+
+            for _ in range(iterations):
+                labels = np.argmax(data @ centroids.T, axis=1)
+                for cluster in range(nlist):
+                    members = data[labels == cluster]
+                    if len(members):
+                        centroids[cluster] = members.mean(axis=0)
+                centroids = self._normalize(centroids)
+
+            self._centroids = centroids
+            np.save(self.ivf_file, centroids)
+            self._assign = self._nearest_centroids(0, rows)
+
+    def _nearest_centroids(self, start: int, end: int, chunk: int = 65536) -> "np.ndarray":
+        parts = [np.zeros(0, dtype=np.int32)]
+        for offset in range(start, end, chunk):
+            block = self._matrix[offset:min(end, offset + chunk)].astype(np.float32)
+            parts.append(np.argmax(block @ self._centroids.T, axis=1).astype(np.int32))
+        return np.concatenate(parts)
+
+    # ─────────────────────────────────────────────────────────────────────────
+    #                            ПОИСК
+    # ─────────────────────────────────────────────────────────────────────────
+
+    def _prefilter(
+        self,
+        user_id: Optional[int],
+        from_date: Optional[str],
+        to_date: Optional[str],
+        tags: Optional[List[str]]
+    ) -> Optional["np.ndarray"]:
+        """Строки, прошедшие фильтры (None = все)"""
+        mask = None
+
+        def narrow(condition):
+            nonlocal mask
+            mask = condition if mask is None else mask & condition
+
+        if user_id:
+            narrow(self._users == user_id)
+        if from_date:
+            narrow(self._dates >= from_date)
+        if to_date:
+            narrow(self._dates <= to_date)
+        if tags:
+            tagged = np.zeros(len(self._ids), dtype=bool)
+            for tag in tags:
+                tagged[self._tags.get(tag, [])] = True
+            narrow(tagged)
+
+        return None if mask is None else np.flatnonzero(mask)
+
+    def search(
+        self,
+        query: str,
+        limit: int = 10,
+        user_id: Optional[int] = None,
+        from_date: Optional[str] = None,
+        to_date: Optional[str] = None,
+        tags: Optional[List[str]] = None
+    ) -> List[Tuple[str, float]]:
+        """Top-k ближайших координат: [(id, косинусная близость)]"""
+        query_vector = self._normalize(self.encode([query]))[0]
+
+        with self._lock:
+            if not self._ids:
+                return []
+
+            rows = self._prefilter(user_id, from_date, to_date, tags)
+            candidates = len(self._ids) if rows is None else len(rows)
+
+            if self._centroids is not None and candidates > self.IVF_SCAN_ROWS:
+                probes = np.argsort(-(self._centroids @ query_vector))[:self.IVF_NPROBE]
+                in_probes = np.flatnonzero(np.isin(self._assign, probes))
+                rows = in_probes if rows is None else np.intersect1d(rows, in_probes)
+
+            if rows is not None and not len(rows):
+                return []
+
+            scores = self._scores(rows, query_vector)
+            k = min(limit, len(scores))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+
+            ids = self._ids if rows is None else [self._ids[r] for r in rows]
+            return [(ids[i], float(scores[i])) for i in top]
+
+    def close(self):
+        self._stop.set()
+
+
 # ═══════════════════════════════════════════════════════════════════════════════
 #                              ВНЕШНИЙ ГИППОКАМП
 # ═══════════════════════════════════════════════════════════════════════════════
@@ -140,33 +1260,43 @@ class ExternalHippocampus:
     ПЕРЕЖИВАЕТ СМЕРТЬ НОСИТЕЛЯ
     """
 
-    def __init__(self, data_dir: Optional[str] = None):
+    def __init__(
+        self,
+        data_dir: Optional[str] = None,
+        encoder: Optional[Callable[[List[str]], "np.ndarray"]] = None
+    ):
         self.data_dir = Path(data_dir) if data_dir else Path(__file__).parent / "data"
         self.data_dir.mkdir(parents=True, exist_ok=True)
 
         # Файлы данных
         self.stream_file = self.data_dir / "stream.jsonl"
-        self.index_file = self.data_dir / "index.json"
+        self.index_file = self.data_dir / "index.jsonl"
         self.users_file = self.data_dir / "users.json"
         self.shared_file = self.data_dir / "shared.jsonl"
         self.references_file = self.data_dir / "references.json"
 
-        # RAG (если доступен)
-        self.chroma_client = None
-        self.collection = None
-        self.embedder = None
-        if HAS_CHROMADB:
-            self._init_rag()
+        # Хранилище координат (lazy, по смещениям)
+        self._coords = CoordinateStore(self.stream_file, self.index_file)
+        self._coords.on_compact = self._save_references
 
         # Кэши
-        self._index_cache: Dict[str, Coordinate] = {}
         self._user_cache: Dict[int, UserMemory] = {}
         self._references_cache: Dict[str, Set[str]] = defaultdict(set)
+        self._inverted_index: Optional[InvertedIndex] = None
+        self._spatial_index: Optional[SpatialIndex] = None
+        self._timeline_index: Optional[TimelineIndex] = None
 
-        # Загружаем индексы
-        self._load_index()
+        # Загружаем граф связей из индекса
         self._load_references()
 
+        # Векторный индекс (если есть numpy и модель embeddings)
+        self.vectors: Optional[VectorIndex] = None
+        if encoder is None and HAS_EMBEDDINGS:
+            encoder = SentenceEncoder()
+        if HAS_NUMPY and encoder is not None:
+            self.vectors = VectorIndex(self.data_dir, encoder)
+            self.vectors.backfill(self._coords)
+
     # ═══════════════════════════════════════════════════════════════════════════
     #                              ФАЗА 1: ЯДРО
     # ═══════════════════════════════════════════════════════════════════════════
@@ -245,91 +1375,36 @@ class ExternalHippocampus:
         refs = self._find_references(coord)
         coord.references = refs
 
-        # Сохраняем в stream (append-only)
-        with open(self.stream_file, "a", encoding="utf-8") as f:
-            f.write(json.dumps(coord.to_dict(), ensure_ascii=False) + "\n")
-
-        # Обновляем индекс
-        self._index_cache[coord.id] = coord
-        self._save_index()
+        # Сохраняем в stream (append-only) + индекс
+        self._coords.put(coord)
+        self._inverted.add(coord)
+        if self._spatial_index is not None:
+            self._spatial_index.set(coord.id, user_id, coord.timestamp, location, location_name)
+        if self._timeline_index is not None:
+            self._timeline_index.add(coord.id, CoordinateStore.meta_of(coord))
 
         # Обновляем references
         for ref_id in refs:
             self._references_cache[ref_id].add(coord.id)
-        self._save_references()
 
-        # Добавляем в RAG
-        if self.collection:
-            self._add_to_rag(coord)
+        # В очередь на embedding (пакетами в фоне)
+        if self.vectors is not None:
+            self.vectors.add(coord)
 
         return coord
 
     def get(self, coord_id: str) -> Optional[Coordinate]:
         """Получить координату по ID"""
-        return self._index_cache.get(coord_id)
+        return self._coords.get(coord_id)
 
     def get_user_stream(self, user_id: int, limit: int = 100) -> List[Coordinate]:
         """Получить мысли пользователя"""
-        coords = [c for c in self._index_cache.values() if c.user_id == user_id]
-        coords.sort(key=lambda x: x.timestamp)
-        return coords[-limit:]
+        return self._load_ids(self._timeline.latest(user_id, limit))
 
     # ═══════════════════════════════════════════════════════════════════════════
-    #                              ФАЗА 2: RAG ПОИСК
+    #                              ФАЗА 2: СЕМАНТИЧЕСКИЙ ПОИСК
     # ═══════════════════════════════════════════════════════════════════════════
 
-    def _init_rag(self):
-        """Инициализация RAG системы"""
-        try:
-            self.chroma_client = chromadb.Client(Settings(
-                chroma_db_impl="duckdb+parquet",
-                persist_directory=str(self.data_dir / "chroma"),
-                anonymized_telemetry=False
-            ))
-            self.collection = self.chroma_client.get_or_create_collection(
-                name="hippocampus",
-                metadata={"hnsw:space": "cosine"}
-            )
-
-            if HAS_EMBEDDINGS:
-                self.embedder = SentenceTransformer('paraphrase-multilingual-MiniLM-L12-v2')
-        except Exception as e:
-            print(f"RAG init failed: {e}")
-            self.collection = None
-
-    def _add_to_rag(self, coord: Coordinate):
-        """Добавить координату в RAG"""
-        if not self.collection:
-            return
-
-        try:
-            # Создаём embedding
-            if self.embedder:
-                embedding = self.embedder.encode(coord.thought).tolist()
-                self.collection.add(
-                    ids=[coord.id],
-                    embeddings=[embedding],
-                    documents=[coord.thought],
-                    metadatas=[{
-                        "user_id": coord.user_id,
-                        "timestamp": coord.timestamp,
-                        "tags": ",".join(coord.tags)
-                    }]
-                )
-            else:
-                # Без embeddings — просто документы
-                self.collection.add(
-                    ids=[coord.id],
-                    documents=[coord.thought],
-                    metadatas=[{
-                        "user_id": coord.user_id,
-                        "timestamp": coord.timestamp,
-                        "tags": ",".join(coord.tags)
-                    }]
-                )
-        except Exception as e:
-            print(f"RAG add failed: {e}")
-
     def search(
         self,
         query: str,
@@ -342,34 +1417,15 @@ class ExternalHippocampus:
         """
         Семантический поиск по памяти
         """
-        # Пробуем RAG поиск
-        if self.collection and self.embedder:
+        # Векторный индекс: фильтры до ранжирования, top-k одним умножением
+        if self.vectors is not None:
             try:
-                where_filter = {}
-                if user_id:
-                    where_filter["user_id"] = user_id
-
-                query_embedding = self.embedder.encode(query).tolist()
-                results = self.collection.query(
-                    query_embeddings=[query_embedding],
-                    n_results=limit,
-                    where=where_filter if where_filter else None
-                )
-
-                coord_ids = results['ids'][0] if results['ids'] else []
-                coords = [self._index_cache[cid] for cid in coord_ids if cid in self._index_cache]
-
-                # Дополнительная фильтрация
-                if from_date:
-                    coords = [c for c in coords if c.timestamp[:10] >= from_date]
-                if to_date:
-                    coords = [c for c in coords if c.timestamp[:10] <= to_date]
-                if tags:
-                    coords = [c for c in coords if any(t in c.tags for t in tags)]
-
-                return coords
+                hits = self.vectors.search(query, limit, user_id, from_date, to_date, tags)
+                coords = [self._coords[cid] for cid, _ in hits if cid in self._coords]
+                if coords:
+                    return coords
             except Exception as e:
-                print(f"RAG search failed: {e}")
+                print(f"Vector search failed: {e}")
 
         # Fallback: простой текстовый поиск
         return self._simple_search(query, user_id, limit, from_date, to_date, tags)
@@ -383,11 +1439,20 @@ class ExternalHippocampus:
         to_date: Optional[str] = None,
         tags: Optional[List[str]] = None
     ) -> List[Coordinate]:
-        """Простой текстовый поиск"""
+        """Простой текстовый поиск (кандидаты из инвертированного индекса)"""
         query_lower = query.lower()
         results = []
 
-        for coord in self._index_cache.values():
+        candidate_ids = self._inverted.text_candidates(query)
+        if candidate_ids is None:
+            candidates = self._coords.values()
+        else:
+            candidates = sorted(
+                (self._coords[cid] for cid in candidate_ids if cid in self._coords),
+                key=lambda x: x.timestamp
+            )
+
+        for coord in candidates:
             if user_id and coord.user_id != user_id:
                 continue
             if from_date and coord.timestamp[:10] < from_date:
@@ -399,8 +1464,10 @@ class ExternalHippocampus:
 
             if query_lower in coord.thought.lower():
                 results.append(coord)
+                if len(results) >= limit:
+                    break
 
-        return results[:limit]
+        return results
 
     # ═══════════════════════════════════════════════════════════════════════════
     #                              ФАЗА 2: ВИЗУАЛИЗАЦИЯ
@@ -423,19 +1490,12 @@ class ExternalHippocampus:
         if not HAS_MATPLOTLIB:
             return "matplotlib не установлен. pip install matplotlib"
 
-        coords = list(self._index_cache.values())
-        if user_id:
-            coords = [c for c in coords if c.user_id == user_id]
+        # Счётчики по дням ведутся инкрементально
+        daily_counts = self._timeline.daily(user_id)
 
-        if not coords:
+        if not daily_counts:
             return "Нет данных для визуализации"
 
-        # Группируем по дням
-        daily_counts = defaultdict(int)
-        for coord in coords:
-            date = coord.timestamp[:10]
-            daily_counts[date] += 1
-
         # Сортируем
         dates = sorted(daily_counts.keys())
         counts = [daily_counts[d] for d in dates]
@@ -628,27 +1688,28 @@ class ExternalHippocampus:
 
         Музыка = машина времени. Каждый повтор трека = телепорт назад.
         """
-        coord = self._index_cache.get(coord_id)
+        coord = self._coords.get(coord_id)
         if not coord:
             return False
 
         coord.music_track = track_name
         coord.music_id = track_id
+        if self._inverted_index is not None:
+            self._inverted_index.set_music(coord_id, track_name)
 
-        self._save_index()
+        self._coords.put(coord)
         return True
 
     def get_by_music(self, track_name: str) -> List[Coordinate]:
         """Найти все координаты с определённым треком"""
-        track_lower = track_name.lower()
-        return [
-            c for c in self._index_cache.values()
-            if c.music_track and track_lower in c.music_track.lower()
-        ]
+        ids = self._inverted.by_music(track_name)
+        coords = [self._coords[cid] for cid in ids if cid in self._coords]
+        coords.sort(key=lambda x: x.timestamp)
+        return coords
 
     def get_soundtrack(self, user_id: int) -> List[Dict]:
         """Получить саундтрек пользователя — все треки из памяти"""
-        coords = [c for c in self._index_cache.values() if c.user_id == user_id and c.music_track]
+        coords = [c for c in self._coords.values() if c.user_id == user_id and c.music_track]
 
         # Группируем по трекам
         tracks = defaultdict(list)
@@ -679,14 +1740,16 @@ class ExternalHippocampus:
         name: Optional[str] = None
     ) -> bool:
         """Добавить геолокацию к координате"""
-        coord = self._index_cache.get(coord_id)
+        coord = self._coords.get(coord_id)
         if not coord:
             return False
 
         coord.location = f"{lat},{lon}"
         coord.location_name = name
 
-        self._save_index()
+        self._coords.put(coord)
+        if self._spatial_index is not None:
+            self._spatial_index.set(coord.id, coord.user_id, coord.timestamp, coord.location, name)
         return True
 
     def get_by_location(
@@ -695,36 +1758,25 @@ class ExternalHippocampus:
         lon: float,
         radius_km: float = 1.0
     ) -> List[Coordinate]:
-        """Найти координаты рядом с местом"""
-        results = []
+        """Найти координаты рядом с местом (ближайшие первыми)"""
+        hits = self._spatial.within(lat, lon, radius_km)
+        return [self._coords[coord_id] for coord_id, _ in hits if coord_id in self._coords]
 
-        for coord in self._index_cache.values():
-            if not coord.location:
-                continue
-
-            try:
-                c_lat, c_lon = map(float, coord.location.split(','))
-                dist = self._haversine(lat, lon, c_lat, c_lon)
-                if dist <= radius_km:
-                    results.append(coord)
-            except:
-                continue
-
-        return results
+    def get_nearest(self, lat: float, lon: float, k: int = 10) -> List[Tuple[Coordinate, float]]:
+        """K ближайших координат с расстоянием в км"""
+        hits = self._spatial.nearest(lat, lon, k)
+        return [(self._coords[coord_id], dist) for coord_id, dist in hits if coord_id in self._coords]
 
     def get_places(self, user_id: int) -> List[Dict]:
         """Получить все места пользователя"""
-        coords = [c for c in self._index_cache.values() if c.user_id == user_id and c.location_name]
-
-        places = defaultdict(list)
-        for coord in coords:
-            places[coord.location_name].append(coord.timestamp)
+        places = self._spatial.places(user_id)
 
         result = []
-        for place, timestamps in sorted(places.items(), key=lambda x: -len(x[1])):
+        for place, visits in sorted(places.items(), key=lambda x: -len(x[1])):
+            timestamps = visits.values()
             result.append({
                 "place": place,
-                "count": len(timestamps),
+                "count": len(visits),
                 "first": min(timestamps),
                 "last": max(timestamps)
             })
@@ -752,73 +1804,12 @@ class ExternalHippocampus:
 
     def get_all_users(self) -> List[UserMemory]:
         """Получить всех пользователей с их статистикой"""
-        user_coords = defaultdict(list)
-
-        for coord in self._index_cache.values():
-            user_coords[coord.user_id].append(coord)
-
-        users = []
-        for user_id, coords in user_coords.items():
-            coords.sort(key=lambda x: x.timestamp)
-
-            # Собираем теги
-            all_tags = []
-            for c in coords:
-                all_tags.extend(c.tags)
-            tag_counts = defaultdict(int)
-            for tag in all_tags:
-                tag_counts[tag] += 1
-            top_tags = sorted(tag_counts.keys(), key=lambda x: -tag_counts[x])[:5]
-
-            # Плотность
-            if len(coords) >= 2:
-                first = datetime.fromisoformat(coords[0].timestamp.replace("Z", ""))
-                last = datetime.fromisoformat(coords[-1].timestamp.replace("Z", ""))
-                days = max(1, (last - first).days)
-                density = len(coords) / days
-            else:
-                density = len(coords)
-
-            # Связанные пользователи
-            connected = set()
-            for c in coords:
-                connected.update(c.shared_with)
-
-            users.append(UserMemory(
-                user_id=user_id,
-                username=coords[0].username if coords else "unknown",
-                total_thoughts=len(coords),
-                first_thought=coords[0].timestamp if coords else None,
-                last_thought=coords[-1].timestamp if coords else None,
-                density_per_day=round(density, 2),
-                top_tags=top_tags,
-                connected_users=list(connected)
-            ))
-
-        return users
+        timeline = self._timeline
+        return [timeline.user_profile(user_id) for user_id in timeline.user_ids()]
 
     def get_global_stats(self) -> Dict:
         """Глобальная статистика гиппокампа"""
-        coords = list(self._index_cache.values())
-
-        if not coords:
-            return {"total": 0}
-
-        users = set(c.user_id for c in coords)
-        tags = defaultdict(int)
-        for c in coords:
-            for tag in c.tags:
-                tags[tag] += 1
-
-        return {
-            "total_coordinates": len(coords),
-            "total_users": len(users),
-            "total_shared": len([c for c in coords if c.shared_with]),
-            "total_public": len([c for c in coords if c.is_public]),
-            "top_tags": sorted(tags.items(), key=lambda x: -x[1])[:10],
-            "first_memory": min(c.timestamp for c in coords),
-            "last_memory": max(c.timestamp for c in coords)
-        }
+        return self._timeline.global_stats()
 
     # ═══════════════════════════════════════════════════════════════════════════
     #                              ФАЗА 3: SHARED MEMORIES
@@ -826,13 +1817,15 @@ class ExternalHippocampus:
 
     def share(self, coord_id: str, with_user_id: int) -> bool:
         """Поделиться координатой с другим пользователем"""
-        coord = self._index_cache.get(coord_id)
+        coord = self._coords.get(coord_id)
         if not coord:
             return False
 
         if with_user_id not in coord.shared_with:
             coord.shared_with.append(with_user_id)
-            self._save_index()
+            self._coords.put(coord)
+            if self._timeline_index is not None:
+                self._timeline_index.add(coord.id, CoordinateStore.meta_of(coord))
 
             # Записываем в shared log
             share_entry = {
@@ -848,26 +1841,23 @@ class ExternalHippocampus:
 
     def make_public(self, coord_id: str) -> bool:
         """Сделать координату публичной"""
-        coord = self._index_cache.get(coord_id)
+        coord = self._coords.get(coord_id)
         if not coord:
             return False
 
         coord.is_public = True
-        self._save_index()
+        self._coords.put(coord)
+        if self._timeline_index is not None:
+            self._timeline_index.add(coord.id, CoordinateStore.meta_of(coord))
         return True
 
     def get_shared_with_me(self, user_id: int) -> List[Coordinate]:
         """Получить координаты, которыми поделились со мной"""
-        return [
-            c for c in self._index_cache.values()
-            if user_id in c.shared_with
-        ]
+        return self._load_ids(self._timeline.shared_to(user_id))
 
     def get_public_stream(self, limit: int = 100) -> List[Coordinate]:
         """Получить публичный поток"""
-        public = [c for c in self._index_cache.values() if c.is_public]
-        public.sort(key=lambda x: x.timestamp, reverse=True)
-        return public[:limit]
+        return self._load_ids(self._timeline.public(limit))
 
     # ═══════════════════════════════════════════════════════════════════════════
     #                              ФАЗА 3: CROSS-REFERENCE
@@ -888,35 +1878,28 @@ class ExternalHippocampus:
         return list(set(hashtags + found_keywords))
 
     def _find_references(self, coord: Coordinate) -> List[str]:
-        """Найти связанные координаты"""
-        references = []
+        """
+        Найти связанные координаты
 
-        # По тегам
-        if coord.tags:
-            for other in self._index_cache.values():
-                if other.id == coord.id:
-                    continue
-                if any(tag in other.tags for tag in coord.tags):
-                    references.append(other.id)
-
-        # По похожести текста (простая эвристика)
-        words = set(coord.thought.lower().split())
-        if len(words) >= 3:
-            for other in self._index_cache.values():
-                if other.id == coord.id:
-                    continue
-                other_words = set(other.thought.lower().split())
-                common = words & other_words
-                if len(common) >= 3:
-                    if other.id not in references:
-                        references.append(other.id)
+        Кандидаты — пересечение posting-списков инвертированного индекса:
+        общий тег или >= 3 общих терма. Сначала связи по тегам, затем
+        по тексту; внутри группы — больше совпадений и новее выше.
+        """
+        scored = self._inverted.related(coord)
+
+        def rank(item):
+            other_id, (tag_score, term_score) = item
+            other = self._coords.get(other_id)
+            timestamp = other.timestamp if other else ""
+            return (tag_score > 0, tag_score, term_score, timestamp)
 
-        return references[:10]  # Максимум 10 связей
+        ordered = sorted(scored.items(), key=rank, reverse=True)
+        return [other_id for other_id, _ in ordered[:10]]  # Максимум 10 связей
 
     def link(self, coord_id_1: str, coord_id_2: str) -> bool:
         """Создать связь между координатами вручную"""
-        coord1 = self._index_cache.get(coord_id_1)
-        coord2 = self._index_cache.get(coord_id_2)
+        coord1 = self._coords.get(coord_id_1)
+        coord2 = self._coords.get(coord_id_2)
 
         if not coord1 or not coord2:
             return False
@@ -929,13 +1912,13 @@ class ExternalHippocampus:
         self._references_cache[coord_id_1].add(coord_id_2)
         self._references_cache[coord_id_2].add(coord_id_1)
 
-        self._save_index()
-        self._save_references()
+        self._coords.put(coord1)
+        self._coords.put(coord2)
         return True
 
     def get_related(self, coord_id: str, depth: int = 1) -> List[Coordinate]:
         """Получить связанные координаты (с глубиной)"""
-        coord = self._index_cache.get(coord_id)
+        coord = self._coords.get(coord_id)
         if not coord:
             return []
 
@@ -950,7 +1933,7 @@ class ExternalHippocampus:
                     continue
                 visited.add(ref_id)
 
-                ref_coord = self._index_cache.get(ref_id)
+                ref_coord = self._coords.get(ref_id)
                 if ref_coord:
                     all_related.append(ref_coord)
                     next_level.update(ref_coord.references)
@@ -961,7 +1944,7 @@ class ExternalHippocampus:
 
     def get_graph(self, user_id: Optional[int] = None) -> Dict:
         """Получить граф связей для визуализации"""
-        coords = list(self._index_cache.values())
+        coords = list(self._coords.values())
         if user_id:
             coords = [c for c in coords if c.user_id == user_id]
 
@@ -977,7 +1960,7 @@ class ExternalHippocampus:
             })
 
             for ref_id in coord.references:
-                if ref_id in self._index_cache:
+                if ref_id in self._coords:
                     edges.append({
                         "from": coord.id,
                         "to": ref_id
@@ -995,54 +1978,62 @@ class ExternalHippocampus:
         from_date: Optional[str] = None,
         to_date: Optional[str] = None
     ) -> List[Coordinate]:
-        """Фильтрация координат"""
-        coords = list(self._index_cache.values())
-
-        if user_id:
-            coords = [c for c in coords if c.user_id == user_id]
-        if from_date:
-            coords = [c for c in coords if c.timestamp[:10] >= from_date]
-        if to_date:
-            coords = [c for c in coords if c.timestamp[:10] <= to_date]
-
-        coords.sort(key=lambda x: x.timestamp)
-        return coords
-
-    def _load_index(self):
-        """Загрузить индекс из файла"""
-        if self.stream_file.exists():
-            with open(self.stream_file, "r", encoding="utf-8") as f:
-                for line in f:
-                    if line.strip():
-                        try:
-                            data = json.loads(line)
-                            coord = Coordinate.from_dict(data)
-                            self._index_cache[coord.id] = coord
-                        except:
-                            continue
-
-    def _save_index(self):
-        """Сохранить индекс (перезаписать stream)"""
-        with open(self.stream_file, "w", encoding="utf-8") as f:
-            for coord in sorted(self._index_cache.values(), key=lambda x: x.timestamp):
-                f.write(json.dumps(coord.to_dict(), ensure_ascii=False) + "\n")
+        """Фильтрация координат (по времени)"""
+        return self._load_ids(self._timeline.ids(user_id, from_date, to_date))
+
+    def _load_ids(self, coord_ids: List[str]) -> List[Coordinate]:
+        return [self._coords[coord_id] for coord_id in coord_ids if coord_id in self._coords]
+
+    def close(self):
+        """Остановить фоновые потоки и закрыть файлы"""
+        if self.vectors is not None:
+            self.vectors.close()
+        self._coords.close()
+
+    @property
+    def _inverted(self) -> InvertedIndex:
+        """Инвертированный индекс (строится при первом обращении)"""
+        if self._inverted_index is None:
+            index = InvertedIndex()
+            for coord in self._coords.values():
+                index.add(coord)
+            self._inverted_index = index
+        return self._inverted_index
+
+    @property
+    def _timeline(self) -> TimelineIndex:
+        """Временные индексы (строятся из индекса хранилища при первом обращении)"""
+        if self._timeline_index is None:
+            index = TimelineIndex()
+            for coord_id, meta in self._coords.meta_items():
+                index.add(coord_id, meta)
+            self._timeline_index = index
+        return self._timeline_index
+
+    @property
+    def _spatial(self) -> SpatialIndex:
+        """Геоиндекс (строится из индекса хранилища при первом обращении)"""
+        if self._spatial_index is None:
+            index = SpatialIndex()
+            for coord_id, meta in self._coords.meta_items():
+                if meta["l"] or meta["p"]:
+                    index.set(coord_id, meta["u"], meta["t"], meta["l"], meta["p"])
+            self._spatial_index = index
+        return self._spatial_index
 
     def _load_references(self):
-        """Загрузить граф связей"""
-        if self.references_file.exists():
-            try:
-                with open(self.references_file, "r", encoding="utf-8") as f:
-                    data = json.load(f)
-                    for k, v in data.items():
-                        self._references_cache[k] = set(v)
-            except:
-                pass
+        """Построить граф связей из индекса (без чтения stream)"""
+        for coord_id, meta in self._coords.meta_items():
+            for ref_id in meta["r"]:
+                self._references_cache[ref_id].add(coord_id)
 
     def _save_references(self):
-        """Сохранить граф связей"""
+        """Snapshot графа связей (пишется при компакции)"""
         data = {k: list(v) for k, v in self._references_cache.items()}
-        with open(self.references_file, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        tmp = self.references_file.with_suffix(".json.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp, self.references_file)
 
 
 # ═══════════════════════════════════════════════════════════════════════════════
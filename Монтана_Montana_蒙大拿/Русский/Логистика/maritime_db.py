@@ -3,16 +3,54 @@
 Maritime Database — Schema and Operations
 SeaFare_Montana Data Layer
 
+Позиции хранятся в помесячных партициях positions_YYYYMM (WITHOUT ROWID,
+ключ (mmsi, ts) — кластерный покрывающий индекс), последняя позиция каждого
+судна — в таблице latest_positions. Запись идёт пакетами через пул
+WAL-соединений. Поиск судов и контактов — FTS5-индексы, которые
+синхронизируют триггеры.
+
 Ɉ MONTANA PROTOCOL — ML-DSA-65 (FIPS 204)
 """
 
 import sqlite3
 import json
-from datetime import datetime
+import queue
+import re
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from itertools import islice
 from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
 
 DB_PATH = Path(__file__).parent / "data" / "maritime.db"
 
+# Пул соединений
+POOL_SIZE = 8
+BUSY_TIMEOUT_MS = 5000
+CACHE_SIZE_KB = 65536
+
+# Пакетная запись позиций: строк на один executemany
+BULK_CHUNK = 10000
+
+# Полнотекстовый поиск (FTS5): индексируемые колонки и веса bm25
+VESSEL_SEARCH_COLUMNS = ("name", "mmsi", "imo", "callsign", "owner", "operator")
+VESSEL_SEARCH_WEIGHTS = (10.0, 8.0, 8.0, 4.0, 2.0, 2.0)
+CONTACT_SEARCH_COLUMNS = ("company_name", "contact_person", "city", "country", "email", "notes")
+CONTACT_SEARCH_WEIGHTS = (10.0, 6.0, 2.0, 1.0, 3.0, 1.0)
+
+# Опечатки: кандидатов на слово, сколько терминов словаря просмотреть
+FUZZY_CANDIDATES = 5
+FUZZY_SCAN_LIMIT = 5000
+
+PARTITION_PREFIX = "positions_"
+POSITION_FIELDS = ("speed", "course", "heading", "status", "destination", "eta")
+
+
+# =============================================================================
+# CONNECTION POOL
+# =============================================================================
 
 def get_connection():
     """Get database connection"""
@@ -22,158 +60,495 @@ def get_connection():
     return conn
 
 
+class ConnectionPool:
+    """
+    Пул WAL-соединений к одной базе
+
+    Соединения в autocommit-режиме; транзакцию открывает connection(write=True)
+    через BEGIN IMMEDIATE. WAL позволяет читателям не ждать писателя.
+
+    Кэш партиций общий: созданные и удалённые в транзакции партиции
+    попадают в него только после COMMIT — читатель не увидит таблицу,
+    которой нет в его снимке.
+    """
+
+    def __init__(self, path: Path, size: int = POOL_SIZE):
+        self.path = Path(path)
+        self.size = size
+        self._idle = queue.LifoQueue(maxsize=size)
+        self._lock = threading.RLock()
+        self._partitions: Optional[frozenset] = None
+        # id(conn) → (созданные, удалённые) партиции незакоммиченной транзакции
+        self._uncommitted: Dict[int, Tuple[set, set]] = {}
+
+    def _open(self) -> sqlite3.Connection:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(self.path), timeout=BUSY_TIMEOUT_MS / 1000,
+                               isolation_level=None, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+        conn.execute(f"PRAGMA cache_size=-{CACHE_SIZE_KB}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        return conn
+
+    @contextmanager
+    def connection(self, write: bool = False):
+        """Взять соединение из пула (write=True — в транзакции)"""
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = self._open()
+
+        try:
+            if write:
+                conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                raise
+            if conn.in_transaction:
+                conn.execute("COMMIT")
+            self._publish(conn)
+        except BaseException:
+            self._discard(conn)  # DDL откатился вместе с транзакцией
+            conn.close()
+            raise
+
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def close(self):
+        """Закрыть свободные соединения"""
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+    # ─── Партиции позиций ───
+
+    def partitions(self, conn: sqlite3.Connection, refresh: bool = False) -> set:
+        """
+        Имена существующих партиций (кэшируются) — копия, которую можно менять.
+        Внутри транзакции — вместе с её собственными созданными/удалёнными.
+        """
+        with self._lock:
+            if self._partitions is None or refresh:
+                rows = conn.execute(
+                    "SELECT name FROM sqlite_master WHERE type='table' AND name GLOB ?",
+                    (PARTITION_PREFIX + "[0-9][0-9][0-9][0-9][0-9][0-9]",)
+                ).fetchall()
+                names = {row[0] for row in rows}
+                if conn.in_transaction:
+                    # Снимок писателя видит его незакоммиченный DDL — в кэш не кладём
+                    return names
+                self._partitions = frozenset(names)
+
+            created, dropped = self._uncommitted.get(id(conn), ((), ()))
+            return (set(self._partitions) | set(created)) - set(dropped)
+
+    def _changes(self, conn: sqlite3.Connection) -> Tuple[set, set]:
+        return self._uncommitted.setdefault(id(conn), (set(), set()))
+
+    def _publish(self, conn: sqlite3.Connection):
+        """После COMMIT: изменения партиций соединения попадают в общий кэш"""
+        with self._lock:
+            changes = self._uncommitted.pop(id(conn), None)
+            if changes and self._partitions is not None:
+                created, dropped = changes
+                self._partitions = (self._partitions | created) - dropped
+
+    def _discard(self, conn: sqlite3.Connection):
+        with self._lock:
+            self._uncommitted.pop(id(conn), None)
+
+    def ensure_partition(self, conn: sqlite3.Connection, name: str):
+        """Создать партицию, если её ещё нет"""
+        with self._lock:
+            known = self.partitions(conn)
+            if name in known:
+                return
+            conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS {name} (
+                    mmsi TEXT NOT NULL,
+                    ts INTEGER NOT NULL,
+                    latitude REAL NOT NULL,
+                    longitude REAL NOT NULL,
+                    speed REAL,
+                    course REAL,
+                    heading REAL,
+                    status TEXT,
+                    destination TEXT,
+                    eta TEXT,
+                    received_at INTEGER NOT NULL,
+                    PRIMARY KEY (mmsi, ts)
+                ) WITHOUT ROWID
+            """)
+            created, dropped = self._changes(conn)
+            created.add(name)
+            dropped.discard(name)
+            known.add(name)
+            _refresh_positions_view(conn, known)
+        if not conn.in_transaction:
+            self._publish(conn)
+
+    def drop_partition(self, conn: sqlite3.Connection, name: str):
+        """Удалить партицию (VIEW positions обновляет вызывающий)"""
+        conn.execute(f"DROP TABLE {name}")
+        with self._lock:
+            created, dropped = self._changes(conn)
+            created.discard(name)
+            dropped.add(name)
+        if not conn.in_transaction:
+            self._publish(conn)
+
+
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    """Пул для текущего DB_PATH"""
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool.path != Path(DB_PATH):
+            if _pool is not None:
+                _pool.close()
+            _pool = ConnectionPool(DB_PATH)
+        return _pool
+
+
+def close_pool():
+    """Закрыть пул (тесты, завершение процесса)"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+
+def _refresh_positions_view(conn: sqlite3.Connection, partitions: set):
+    """VIEW positions — объединение всех партиций для ad-hoc запросов"""
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='positions'").fetchone():
+        return  # старая таблица ещё не перенесена
+    conn.execute("DROP VIEW IF EXISTS positions")
+    if partitions:
+        union = " UNION ALL ".join(f"SELECT * FROM {name}" for name in sorted(partitions))
+        conn.execute(f"CREATE VIEW positions AS {union}")
+
+
 def init_db():
     """Initialize database schema"""
-    conn = get_connection()
-    cursor = conn.cursor()
-
-    # Vessels table — основные данные судна
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS vessels (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            mmsi TEXT UNIQUE NOT NULL,
-            imo TEXT,
-            name TEXT,
-            type TEXT,
-            type_code INTEGER,
-            flag TEXT,
-            flag_code TEXT,
-            callsign TEXT,
-            length REAL,
-            width REAL,
-            draught REAL,
-            gross_tonnage INTEGER,
-            deadweight INTEGER,
-            year_built INTEGER,
-
-            -- Owner/Operator info
-            owner TEXT,
-            owner_country TEXT,
-            operator TEXT,
-            operator_country TEXT,
-
-            -- Technical
-            engine_type TEXT,
-            speed_max REAL,
-
-            -- Metadata
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            source TEXT DEFAULT 'marinetraffic'
-        )
-    """)
+    pool = get_pool()
 
-    # Positions table — позиции (история)
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS positions (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            mmsi TEXT NOT NULL,
-            latitude REAL NOT NULL,
-            longitude REAL NOT NULL,
-            speed REAL,
-            course REAL,
-            heading REAL,
-            status TEXT,
-            destination TEXT,
-            eta TEXT,
-            timestamp TIMESTAMP NOT NULL,
-            received_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-
-            FOREIGN KEY (mmsi) REFERENCES vessels(mmsi)
-        )
-    """)
+    with pool.connection(write=True) as conn:
+        cursor = conn.cursor()
 
-    # Contacts table — контакты участников фрахта
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS contacts (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            type TEXT NOT NULL,  -- owner, operator, agent, broker, shipper
-            company_name TEXT NOT NULL,
-            country TEXT,
-            city TEXT,
-            address TEXT,
-            phone TEXT,
-            email TEXT,
-            website TEXT,
-            contact_person TEXT,
-            notes TEXT,
-
-            -- Links
-            vessels_mmsi TEXT,  -- JSON array of MMSI numbers
-
-            -- Source tracking
-            source TEXT,  -- marinetraffic, dato_network, manual
-            verified BOOLEAN DEFAULT 0,
-
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    """)
+        # Vessels table — основные данные судна
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS vessels (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                mmsi TEXT UNIQUE NOT NULL,
+                imo TEXT,
+                name TEXT,
+                type TEXT,
+                type_code INTEGER,
+                flag TEXT,
+                flag_code TEXT,
+                callsign TEXT,
+                length REAL,
+                width REAL,
+                draught REAL,
+                gross_tonnage INTEGER,
+                deadweight INTEGER,
+                year_built INTEGER,
+
+                -- Owner/Operator info
+                owner TEXT,
+                owner_country TEXT,
+                operator TEXT,
+                operator_country TEXT,
+
+                -- Technical
+                engine_type TEXT,
+                speed_max REAL,
+
+                -- Metadata
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                source TEXT DEFAULT 'marinetraffic'
+            )
+        """)
+
+        # Latest positions — последняя позиция судна (одна строка на MMSI)
+        # История позиций — в партициях positions_YYYYMM (ensure_partition)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS latest_positions (
+                mmsi TEXT PRIMARY KEY,
+                ts INTEGER NOT NULL,
+                latitude REAL NOT NULL,
+                longitude REAL NOT NULL,
+                speed REAL,
+                course REAL,
+                heading REAL,
+                status TEXT,
+                destination TEXT,
+                eta TEXT,
+                received_at INTEGER NOT NULL
+            ) WITHOUT ROWID
+        """)
+
+        # Contacts table — контакты участников фрахта
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS contacts (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                type TEXT NOT NULL,  -- owner, operator, agent, broker, shipper
+                company_name TEXT NOT NULL,
+                country TEXT,
+                city TEXT,
+                address TEXT,
+                phone TEXT,
+                email TEXT,
+                website TEXT,
+                contact_person TEXT,
+                notes TEXT,
+
+                -- Links
+                vessels_mmsi TEXT,  -- JSON array of MMSI numbers
+
+                -- Source tracking
+                source TEXT,  -- marinetraffic, dato_network, manual
+                verified BOOLEAN DEFAULT 0,
+
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+
+        # Port calls — заходы в порты
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS port_calls (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                mmsi TEXT NOT NULL,
+                port_name TEXT NOT NULL,
+                port_code TEXT,
+                country TEXT,
+                arrival TIMESTAMP,
+                departure TIMESTAMP,
+                berth TEXT,
+                cargo_type TEXT,
+
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+
+                FOREIGN KEY (mmsi) REFERENCES vessels(mmsi)
+            )
+        """)
+
+        # Demurrage records — записи о демердже
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS demurrage (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                mmsi TEXT NOT NULL,
+                port_name TEXT NOT NULL,
+
+                -- Time
+                agreed_days REAL NOT NULL,
+                actual_days REAL NOT NULL,
+                delay_days REAL GENERATED ALWAYS AS (actual_days - agreed_days) STORED,
+
+                -- Money
+                daily_rate REAL,
+                currency TEXT DEFAULT 'USD',
+                total_amount REAL GENERATED ALWAYS AS (
+                    CASE WHEN actual_days > agreed_days
+                    THEN (actual_days - agreed_days) * daily_rate
+                    ELSE 0 END
+                ) STORED,
+
+                -- Status
+                status TEXT DEFAULT 'pending',  -- pending, paid, disputed
+                notes TEXT,
+
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+
+                FOREIGN KEY (mmsi) REFERENCES vessels(mmsi)
+            )
+        """)
+
+        # Create indexes
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_vessels_mmsi ON vessels(mmsi)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_vessels_imo ON vessels(imo)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_vessels_name ON vessels(name)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_contacts_type ON contacts(type)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_port_calls_mmsi ON port_calls(mmsi)")
+
+        _create_search_index(conn, "vessels", VESSEL_SEARCH_COLUMNS)
+        _create_search_index(conn, "contacts", CONTACT_SEARCH_COLUMNS)
+
+        _migrate_legacy_positions(pool, conn)
 
-    # Port calls — заходы в порты
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS port_calls (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            mmsi TEXT NOT NULL,
-            port_name TEXT NOT NULL,
-            port_code TEXT,
-            country TEXT,
-            arrival TIMESTAMP,
-            departure TIMESTAMP,
-            berth TEXT,
-            cargo_type TEXT,
-
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-
-            FOREIGN KEY (mmsi) REFERENCES vessels(mmsi)
-        )
+    print(f"Database initialized: {DB_PATH}")
+    return True
+
+
+def _migrate_legacy_positions(pool: ConnectionPool, conn: sqlite3.Connection):
+    """Перенос старой таблицы positions в партиции (в транзакции init_db)"""
+    legacy = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='positions'"
+    ).fetchone()
+    if not legacy:
+        return
+
+    now = int(time.time())
+    cursor = conn.execute("""
+        SELECT mmsi, latitude, longitude, speed, course, heading, status,
+               destination, eta, timestamp, received_at
+        FROM positions ORDER BY id
     """)
+    while True:
+        rows = cursor.fetchmany(BULK_CHUNK)
+        if not rows:
+            break
+        _insert_positions(pool, conn, [_position_row(dict(row), now) for row in rows])
+
+    conn.execute("DROP TABLE positions")
+    _refresh_positions_view(conn, pool.partitions(conn))
+
 
-    # Demurrage records — записи о демердже
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS demurrage (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            mmsi TEXT NOT NULL,
-            port_name TEXT NOT NULL,
-
-            -- Time
-            agreed_days REAL NOT NULL,
-            actual_days REAL NOT NULL,
-            delay_days REAL GENERATED ALWAYS AS (actual_days - agreed_days) STORED,
-
-            -- Money
-            daily_rate REAL,
-            currency TEXT DEFAULT 'USD',
-            total_amount REAL GENERATED ALWAYS AS (
-                CASE WHEN actual_days > agreed_days
-                THEN (actual_days - agreed_days) * daily_rate
-                ELSE 0 END
-            ) STORED,
-
-            -- Status
-            status TEXT DEFAULT 'pending',  -- pending, paid, disputed
-            notes TEXT,
-
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-
-            FOREIGN KEY (mmsi) REFERENCES vessels(mmsi)
+# =============================================================================
+# SEARCH INDEX (FTS5)
+# =============================================================================
+
+def _create_search_index(conn: sqlite3.Connection, table: str, columns: tuple):
+    """
+    External-content FTS5 индекс {table}_fts + словарь {table}_fts_vocab
+
+    Синхронизируется триггерами (upsert = UPDATE). Существующие строки
+    индексируются один раз при создании.
+    """
+    fts = f"{table}_fts"
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (fts,)
+    ).fetchone()
+
+    cols = ", ".join(columns)
+    new_cols = ", ".join(f"new.{c}" for c in columns)
+    old_cols = ", ".join(f"old.{c}" for c in columns)
+
+    conn.execute(f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5(
+            {cols}, content='{table}', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2', prefix='2 3'
         )
     """)
+    conn.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts}_vocab USING fts5vocab({fts}, 'row')")
 
-    # Create indexes
-    cursor.execute("CREATE INDEX IF NOT EXISTS idx_vessels_mmsi ON vessels(mmsi)")
-    cursor.execute("CREATE INDEX IF NOT EXISTS idx_vessels_imo ON vessels(imo)")
-    cursor.execute("CREATE INDEX IF NOT EXISTS idx_vessels_name ON vessels(name)")
-    cursor.execute("CREATE INDEX IF NOT EXISTS idx_positions_mmsi ON positions(mmsi)")
-    cursor.execute("CREATE INDEX IF NOT EXISTS idx_positions_timestamp ON positions(timestamp)")
-    cursor.execute("CREATE INDEX IF NOT EXISTS idx_contacts_type ON contacts(type)")
-    cursor.execute("CREATE INDEX IF NOT EXISTS idx_port_calls_mmsi ON port_calls(mmsi)")
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN
+            INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_cols});
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN
+            INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_cols});
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {cols} ON {table} BEGIN
+            INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_cols});
+            INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_cols});
+        END
+    """)
 
-    conn.commit()
-    conn.close()
+    if not exists:
+        conn.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+
+
+def _search_tokens(query: str) -> list:
+    return re.findall(r"\w+", query.lower())
+
+
+def _edit_distance(a: str, b: str, limit: int) -> int:
+    """Расстояние Левенштейна с ранним выходом (> limit → limit + 1)"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1,
+                               previous[j - 1] + (ca != cb)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+def _similar_terms(conn: sqlite3.Connection, table: str, token: str) -> list:
+    """
+    Термины словаря индекса на расстоянии правки 1 (2 для длинных слов)
+
+    Просматривается только диапазон терминов с тем же началом слова,
+    поэтому опечатка в первых буквах не исправляется.
+    """
+    if len(token) < 4 or token.isdigit():
+        return []
+    limit = 2 if len(token) >= 8 else 1
+    head = token[:2] if len(token) >= 5 else token[:1]
+
+    rows = conn.execute(f"""
+        SELECT term, doc FROM {table}_fts_vocab
+        WHERE term >= ? AND term < ? LIMIT ?
+    """, (head, head + "\uffff", FUZZY_SCAN_LIMIT)).fetchall()
+
+    scored = []
+    for term, docs in rows:
+        if term == token or abs(len(term) - len(token)) > limit:
+            continue
+        distance = _edit_distance(token, term, limit)
+        if distance <= limit:
+            scored.append((distance, -docs, term))
+    return [term for _, _, term in sorted(scored)[:FUZZY_CANDIDATES]]
+
+
+def _match_expression(tokens: list, similar: dict = None) -> str:
+    """Все слова обязательны; каждое — префикс или близкий термин"""
+    groups = []
+    for token in tokens:
+        variants = [f'"{token}"*'] + [f'"{term}"' for term in (similar or {}).get(token, ())]
+        groups.append(variants[0] if len(variants) == 1 else "(" + " OR ".join(variants) + ")")
+    return " AND ".join(groups)
+
+
+def _search(conn: sqlite3.Connection, table: str, weights: tuple, query: str,
+            limit: int, where: str = "", params: tuple = ()) -> list:
+    """Ранжированный поиск по {table}_fts; при пустом результате — с учётом опечаток"""
+    tokens = _search_tokens(query)
+    if not tokens:
+        return []
+
+    fts = f"{table}_fts"
+    sql = f"""
+        SELECT {table}.* FROM {fts}
+        JOIN {table} ON {table}.id = {fts}.rowid
+        WHERE {fts} MATCH ? {where}
+        ORDER BY bm25({fts}, {", ".join(map(str, weights))})
+        LIMIT ?
+    """
+    rows = conn.execute(sql, (_match_expression(tokens), *params, limit)).fetchall()
+    if rows:
+        return rows
 
-    print(f"Database initialized: {DB_PATH}")
-    return True
+    similar = {token: _similar_terms(conn, table, token) for token in tokens}
+    if not any(similar.values()):
+        return rows
+    return conn.execute(sql, (_match_expression(tokens, similar), *params, limit)).fetchall()
 
 
 # =============================================================================
@@ -182,61 +557,45 @@ def init_db():
 
 def upsert_vessel(data: dict) -> int:
     """Insert or update vessel"""
-    conn = get_connection()
-    cursor = conn.cursor()
-
     data['updated_at'] = datetime.utcnow().isoformat()
 
     columns = ', '.join(data.keys())
     placeholders = ', '.join(['?' for _ in data])
     updates = ', '.join([f"{k}=excluded.{k}" for k in data.keys() if k != 'mmsi'])
 
-    cursor.execute(f"""
-        INSERT INTO vessels ({columns}) VALUES ({placeholders})
-        ON CONFLICT(mmsi) DO UPDATE SET {updates}
-    """, list(data.values()))
-
-    conn.commit()
-    vessel_id = cursor.lastrowid
-    conn.close()
+    with get_pool().connection(write=True) as conn:
+        cursor = conn.execute(f"""
+            INSERT INTO vessels ({columns}) VALUES ({placeholders})
+            ON CONFLICT(mmsi) DO UPDATE SET {updates}
+        """, list(data.values()))
+        vessel_id = cursor.lastrowid
 
     return vessel_id
 
 
 def get_vessel(mmsi: str = None, imo: str = None, name: str = None) -> dict:
     """Get vessel by MMSI, IMO, or name"""
-    conn = get_connection()
-    cursor = conn.cursor()
-
-    if mmsi:
-        cursor.execute("SELECT * FROM vessels WHERE mmsi = ?", (mmsi,))
-    elif imo:
-        cursor.execute("SELECT * FROM vessels WHERE imo = ?", (imo,))
-    elif name:
-        cursor.execute("SELECT * FROM vessels WHERE name LIKE ?", (f"%{name}%",))
-    else:
-        return None
-
-    row = cursor.fetchone()
-    conn.close()
+    with get_pool().connection() as conn:
+        if mmsi:
+            row = conn.execute("SELECT * FROM vessels WHERE mmsi = ?", (mmsi,)).fetchone()
+        elif imo:
+            row = conn.execute("SELECT * FROM vessels WHERE imo = ?", (imo,)).fetchone()
+        elif name:
+            # Точное совпадение имени, иначе лучший результат поиска
+            row = conn.execute("SELECT * FROM vessels WHERE name = ? LIMIT 1", (name,)).fetchone()
+            if row is None:
+                rows = _search(conn, "vessels", VESSEL_SEARCH_WEIGHTS, name, 1)
+                row = rows[0] if rows else None
+        else:
+            return None
 
     return dict(row) if row else None
 
 
 def search_vessels(query: str, limit: int = 20) -> list:
-    """Search vessels by name, MMSI, or IMO"""
-    conn = get_connection()
-    cursor = conn.cursor()
-
-    cursor.execute("""
-        SELECT * FROM vessels
-        WHERE name LIKE ? OR mmsi LIKE ? OR imo LIKE ?
-        ORDER BY updated_at DESC
-        LIMIT ?
-    """, (f"%{query}%", f"%{query}%", f"%{query}%", limit))
-
-    rows = cursor.fetchall()
-    conn.close()
+    """Search vessels by name, MMSI, IMO, callsign, owner or operator (ranked)"""
+    with get_pool().connection() as conn:
+        rows = _search(conn, "vessels", VESSEL_SEARCH_WEIGHTS, query, limit)
 
     return [dict(row) for row in rows]
 
@@ -245,57 +604,190 @@ def search_vessels(query: str, limit: int = 20) -> list:
 # POSITION OPERATIONS
 # =============================================================================
 
+def _to_epoch(value, default: int) -> int:
+    """ISO-строка / datetime / число → Unix-секунды (наивное время = UTC)"""
+    if value is None or value == "":
+        return default
+    if isinstance(value, (int, float)):
+        return int(value)
+    if isinstance(value, datetime):
+        moment = value
+    else:
+        moment = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return int(moment.timestamp())
+
+
+def _iso(epoch: int) -> str:
+    """Unix-секунды → ISO без зоны (как datetime.utcnow().isoformat())"""
+    return datetime.fromtimestamp(epoch, timezone.utc).replace(tzinfo=None).isoformat()
+
+
+def _partition_name(epoch: int) -> str:
+    moment = time.gmtime(epoch)
+    return f"{PARTITION_PREFIX}{moment.tm_year:04d}{moment.tm_mon:02d}"
+
+
+def _position_row(record: dict, now: int) -> tuple:
+    """Запись позиции → строка партиции (порядок колонок таблицы)"""
+    lat = record.get('latitude', record.get('lat'))
+    lon = record.get('longitude', record.get('lon'))
+    return (
+        str(record['mmsi']),
+        _to_epoch(record.get('timestamp'), now),
+        float(lat),
+        float(lon),
+        *(record.get(field) for field in POSITION_FIELDS),
+        _to_epoch(record.get('received_at'), now),
+    )
+
+
+def _position_dict(row: sqlite3.Row) -> dict:
+    """Строка партиции → словарь в прежнем формате (timestamp/received_at — ISO)"""
+    position = dict(row)
+    position['timestamp'] = _iso(position.pop('ts'))
+    position['received_at'] = _iso(position['received_at'])
+    return position
+
+
+def _insert_positions(pool: ConnectionPool, conn: sqlite3.Connection, rows: list) -> int:
+    """executemany по партициям + обновление latest_positions; возвращает число новых строк"""
+    by_partition = {}
+    latest = {}
+    for row in rows:
+        by_partition.setdefault(_partition_name(row[1]), []).append(row)
+        best = latest.get(row[0])
+        if best is None or row[1] > best[1]:
+            latest[row[0]] = row
+
+    before = conn.total_changes
+    for name, chunk in by_partition.items():
+        pool.ensure_partition(conn, name)
+        conn.executemany(
+            f"INSERT OR IGNORE INTO {name} VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", chunk
+        )
+    inserted = conn.total_changes - before
+
+    conn.executemany("""
+        INSERT INTO latest_positions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(mmsi) DO UPDATE SET
+            ts = excluded.ts, latitude = excluded.latitude,
+            longitude = excluded.longitude, speed = excluded.speed,
+            course = excluded.course, heading = excluded.heading,
+            status = excluded.status, destination = excluded.destination,
+            eta = excluded.eta, received_at = excluded.received_at
+        WHERE excluded.ts > latest_positions.ts
+    """, latest.values())
+
+    return inserted
+
+
+def add_positions(records: Iterable[dict]) -> int:
+    """
+    Bulk insert positions in one transaction
+
+    Записи — словари с mmsi, latitude/lat, longitude/lon и необязательными
+    speed, course, heading, status, destination, eta, timestamp.
+    Повтор (mmsi, timestamp) игнорируется. Возвращает число новых строк.
+    """
+    pool = get_pool()
+    now = int(time.time())
+    inserted = 0
+    records = iter(records)
+
+    with pool.connection(write=True) as conn:
+        while True:
+            chunk = [_position_row(record, now) for record in islice(records, BULK_CHUNK)]
+            if not chunk:
+                break
+            inserted += _insert_positions(pool, conn, chunk)
+
+    return inserted
+
+
 def add_position(mmsi: str, lat: float, lon: float, speed: float = None,
                  course: float = None, heading: float = None, status: str = None,
                  destination: str = None, eta: str = None, timestamp: str = None):
     """Add vessel position"""
-    conn = get_connection()
-    cursor = conn.cursor()
-
-    cursor.execute("""
-        INSERT INTO positions (mmsi, latitude, longitude, speed, course,
-                              heading, status, destination, eta, timestamp)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    """, (mmsi, lat, lon, speed, course, heading, status, destination, eta,
-          timestamp or datetime.utcnow().isoformat()))
-
-    conn.commit()
-    conn.close()
+    add_positions([{
+        'mmsi': mmsi, 'latitude': lat, 'longitude': lon, 'speed': speed,
+        'course': course, 'heading': heading, 'status': status,
+        'destination': destination, 'eta': eta, 'timestamp': timestamp
+    }])
 
 
 def get_last_position(mmsi: str) -> dict:
     """Get last known position for vessel"""
-    conn = get_connection()
-    cursor = conn.cursor()
-
-    cursor.execute("""
-        SELECT * FROM positions
-        WHERE mmsi = ?
-        ORDER BY timestamp DESC
-        LIMIT 1
-    """, (mmsi,))
-
-    row = cursor.fetchone()
-    conn.close()
-
-    return dict(row) if row else None
+    with get_pool().connection() as conn:
+        row = conn.execute(
+            "SELECT * FROM latest_positions WHERE mmsi = ?", (mmsi,)
+        ).fetchone()
+
+    return _position_dict(row) if row else None
+
+
+def get_position_range(mmsi: str, start, end=None) -> list:
+    """Позиции судна за [start, end], новые первыми (только нужные партиции)"""
+    now = int(time.time())
+    start = _to_epoch(start, now)
+    end = _to_epoch(end, now)
+    if start > end:
+        return []
+
+    pool = get_pool()
+    positions = []
+    with pool.connection() as conn:
+        names = _partition_names(start, end)
+        existing = pool.partitions(conn)
+        if not existing.issuperset(names):
+            # Партицию мог создать другой процесс
+            existing = pool.partitions(conn, refresh=True)
+        for name in reversed(names):
+            if name not in existing:
+                continue
+            rows = conn.execute(f"""
+                SELECT * FROM {name}
+                WHERE mmsi = ? AND ts >= ? AND ts <= ?
+                ORDER BY ts DESC
+            """, (mmsi, start, end)).fetchall()
+            positions.extend(_position_dict(row) for row in rows)
+
+    return positions
+
+
+def _partition_names(start: int, end: int) -> list:
+    """Имена партиций, покрывающих [start, end], по возрастанию"""
+    first, last = time.gmtime(start), time.gmtime(end)
+    year, month = first.tm_year, first.tm_mon
+    names = []
+    while (year, month) <= (last.tm_year, last.tm_mon):
+        names.append(f"{PARTITION_PREFIX}{year:04d}{month:02d}")
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return names
 
 
 def get_position_history(mmsi: str, hours: int = 24) -> list:
     """Get position history for vessel"""
-    conn = get_connection()
-    cursor = conn.cursor()
+    now = int(time.time())
+    return get_position_range(mmsi, now - hours * 3600, now)
 
-    cursor.execute("""
-        SELECT * FROM positions
-        WHERE mmsi = ? AND timestamp > datetime('now', ?)
-        ORDER BY timestamp DESC
-    """, (mmsi, f"-{hours} hours"))
 
-    rows = cursor.fetchall()
-    conn.close()
+def drop_positions_before(timestamp) -> list:
+    """Удалить целые месячные партиции старше timestamp (retention)"""
+    pool = get_pool()
+    cutoff = _partition_name(_to_epoch(timestamp, int(time.time())))
 
-    return [dict(row) for row in rows]
+    with pool.connection(write=True) as conn:
+        known = pool.partitions(conn)
+        dropped = sorted(name for name in known if name < cutoff)
+        for name in dropped:
+            pool.drop_partition(conn, name)
+            known.discard(name)
+        if dropped:
+            _refresh_positions_view(conn, known)
+
+    return dropped
 
 
 # =============================================================================
@@ -304,9 +796,6 @@ def get_position_history(mmsi: str, hours: int = 24) -> list:
 
 def add_contact(contact_type: str, company_name: str, **kwargs) -> int:
     """Add contact"""
-    conn = get_connection()
-    cursor = conn.cursor()
-
     data = {
         'type': contact_type,
         'company_name': company_name,
@@ -316,59 +805,40 @@ def add_contact(contact_type: str, company_name: str, **kwargs) -> int:
     columns = ', '.join(data.keys())
     placeholders = ', '.join(['?' for _ in data])
 
-    cursor.execute(f"INSERT INTO contacts ({columns}) VALUES ({placeholders})",
-                   list(data.values()))
-
-    conn.commit()
-    contact_id = cursor.lastrowid
-    conn.close()
+    with get_pool().connection(write=True) as conn:
+        cursor = conn.execute(f"INSERT INTO contacts ({columns}) VALUES ({placeholders})",
+                              list(data.values()))
+        contact_id = cursor.lastrowid
 
     return contact_id
 
 
 def search_contacts(query: str = None, contact_type: str = None, limit: int = 20) -> list:
-    """Search contacts"""
-    conn = get_connection()
-    cursor = conn.cursor()
-
-    if query and contact_type:
-        cursor.execute("""
-            SELECT * FROM contacts
-            WHERE type = ? AND (company_name LIKE ? OR contact_person LIKE ?)
-            ORDER BY updated_at DESC LIMIT ?
-        """, (contact_type, f"%{query}%", f"%{query}%", limit))
-    elif contact_type:
-        cursor.execute("""
-            SELECT * FROM contacts WHERE type = ?
-            ORDER BY updated_at DESC LIMIT ?
-        """, (contact_type, limit))
-    elif query:
-        cursor.execute("""
-            SELECT * FROM contacts
-            WHERE company_name LIKE ? OR contact_person LIKE ?
-            ORDER BY updated_at DESC LIMIT ?
-        """, (f"%{query}%", f"%{query}%", limit))
-    else:
-        cursor.execute("SELECT * FROM contacts ORDER BY updated_at DESC LIMIT ?", (limit,))
-
-    rows = cursor.fetchall()
-    conn.close()
+    """Search contacts (ranked full-text search when query is given)"""
+    with get_pool().connection() as conn:
+        if query:
+            where, params = ("AND contacts.type = ?", (contact_type,)) if contact_type else ("", ())
+            rows = _search(conn, "contacts", CONTACT_SEARCH_WEIGHTS, query, limit, where, params)
+        elif contact_type:
+            rows = conn.execute("""
+                SELECT * FROM contacts WHERE type = ?
+                ORDER BY updated_at DESC LIMIT ?
+            """, (contact_type, limit)).fetchall()
+        else:
+            rows = conn.execute(
+                "SELECT * FROM contacts ORDER BY updated_at DESC LIMIT ?", (limit,)
+            ).fetchall()
 
     return [dict(row) for row in rows]
 
 
 def get_contacts_for_vessel(mmsi: str) -> list:
     """Get all contacts associated with a vessel"""
-    conn = get_connection()
-    cursor = conn.cursor()
-
-    cursor.execute("""
-        SELECT * FROM contacts
-        WHERE vessels_mmsi LIKE ?
-    """, (f'%"{mmsi}"%',))
-
-    rows = cursor.fetchall()
-    conn.close()
+    with get_pool().connection() as conn:
+        rows = conn.execute("""
+            SELECT * FROM contacts
+            WHERE vessels_mmsi LIKE ?
+        """, (f'%"{mmsi}"%',)).fetchall()
 
     return [dict(row) for row in rows]
 
@@ -379,31 +849,123 @@ def get_contacts_for_vessel(mmsi: str) -> list:
 
 def get_stats() -> dict:
     """Get database statistics"""
-    conn = get_connection()
-    cursor = conn.cursor()
-
+    pool = get_pool()
     stats = {}
 
-    cursor.execute("SELECT COUNT(*) FROM vessels")
-    stats['vessels'] = cursor.fetchone()[0]
+    with pool.connection() as conn:
+        def count(table: str) -> int:
+            return conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
 
-    cursor.execute("SELECT COUNT(*) FROM positions")
-    stats['positions'] = cursor.fetchone()[0]
+        partitions = sorted(pool.partitions(conn))
 
-    cursor.execute("SELECT COUNT(*) FROM contacts")
-    stats['contacts'] = cursor.fetchone()[0]
+        stats['vessels'] = count("vessels")
+        stats['positions'] = sum(count(name) for name in partitions)
+        stats['position_partitions'] = len(partitions)
+        stats['vessels_with_position'] = count("latest_positions")
+        stats['contacts'] = count("contacts")
+        stats['port_calls'] = count("port_calls")
+        stats['demurrage_records'] = count("demurrage")
 
-    cursor.execute("SELECT COUNT(*) FROM port_calls")
-    stats['port_calls'] = cursor.fetchone()[0]
+    return stats
 
-    cursor.execute("SELECT COUNT(*) FROM demurrage")
-    stats['demurrage_records'] = cursor.fetchone()[0]
 
-    conn.close()
+# =============================================================================
+# BENCHMARK
+# =============================================================================
 
-    return stats
+def benchmark(vessels: int = 2000, positions: int = 200000, batch: int = 5000,
+              fleet: int = 50000) -> dict:
+    """Пакетная запись позиций, чтение последней позиции и поиск судов (во временной БД)"""
+    import random
+    import shutil
+    import tempfile
+
+    global DB_PATH
+    saved_path = DB_PATH
+    tmp = Path(tempfile.mkdtemp(prefix="maritime_bench_"))
+    DB_PATH = tmp / "maritime.db"
+
+    try:
+        init_db()
+        rng = random.Random(7)
+        start_ts = int(time.time()) - positions
+        records = [{
+            'mmsi': str(200000000 + rng.randrange(vessels)),
+            'lat': rng.uniform(-60, 60),
+            'lon': rng.uniform(-180, 180),
+            'speed': rng.uniform(0, 20),
+            'timestamp': start_ts + i,
+        } for i in range(positions)]
+
+        started = time.perf_counter()
+        for offset in range(0, positions, batch):
+            add_positions(records[offset:offset + batch])
+        ingest = time.perf_counter() - started
+
+        probes = [records[rng.randrange(positions)]['mmsi'] for _ in range(2000)]
+        started = time.perf_counter()
+        for mmsi in probes:
+            get_last_position(mmsi)
+        lookup = time.perf_counter() - started
+
+        started = time.perf_counter()
+        for mmsi in probes[:200]:
+            get_position_history(mmsi, hours=24)
+        history = time.perf_counter() - started
+
+        syllables = ["mar", "sk", "ever", "gre", "en", "ocean", "star", "nord", "lin", "ia", "pac", "ific"]
+        names = [" ".join("".join(rng.choice(syllables) for _ in range(3)) for _ in range(2))
+                 for _ in range(fleet)]
+        with get_pool().connection(write=True) as conn:
+            conn.executemany(
+                "INSERT INTO vessels (mmsi, imo, name, owner) VALUES (?, ?, ?, ?)",
+                [(str(300000000 + i), str(9000000 + i), name.upper(), "Montana Shipping")
+                 for i, name in enumerate(names)]
+            )
+
+        queries = [names[rng.randrange(fleet)].split()[0][:5] for _ in range(200)]
+        started = time.perf_counter()
+        for query in queries:
+            search_vessels(query)
+        search = time.perf_counter() - started
+
+        typos = []
+        for name in names[:200]:
+            word = name.split()[0]
+            typos.append(word[:-2] + word[-1] + word[-2])
+        started = time.perf_counter()
+        for query in typos:
+            search_vessels(query)
+        fuzzy = time.perf_counter() - started
+
+        result = {
+            'positions': positions,
+            'inserts_per_sec': round(positions / ingest),
+            'last_position_us': round(lookup / len(probes) * 1e6, 1),
+            'history_24h_ms': round(history / 200 * 1e3, 2),
+            'vessels': fleet,
+            'search_ms': round(search / len(queries) * 1e3, 2),
+            'fuzzy_search_ms': round(fuzzy / len(typos) * 1e3, 2),
+        }
+    finally:
+        close_pool()
+        DB_PATH = saved_path
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    print(f"Positions:        {result['positions']}")
+    print(f"Bulk ingest:      {result['inserts_per_sec']} rows/s")
+    print(f"Last position:    {result['last_position_us']} µs")
+    print(f"History 24h:      {result['history_24h_ms']} ms")
+    print(f"Vessel search:    {result['search_ms']} ms ({result['vessels']} vessels)")
+    print(f"Search w/ typo:   {result['fuzzy_search_ms']} ms")
+    return result
 
 
 if __name__ == "__main__":
-    init_db()
-    print("Stats:", get_stats())
+    import sys
+
+    if "--benchmark" in sys.argv:
+        benchmark()
+    else:
+        init_db()
+        print("Stats:", get_stats())
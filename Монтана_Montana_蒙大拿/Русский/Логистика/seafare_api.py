@@ -8,7 +8,7 @@ Serves data from local DB, falls back to MarineTraffic
 
 import os
 import json
-from datetime import datetime, timedelta
+from datetime import datetime, timezone
 from typing import Optional, Dict, List
 
 from flask import Flask, request, jsonify
@@ -16,6 +16,7 @@ from flask_cors import CORS
 
 import maritime_db as db
 import marinetraffic_parser as mt
+from upstream_cache import TieredCache
 
 app = Flask(__name__)
 CORS(app)
@@ -24,6 +25,80 @@ CORS(app)
 POSITION_CACHE_MINUTES = 5
 VESSEL_CACHE_HOURS = 24
 
+# Stale-while-revalidate: сколько после TTL отдавать старое с фоновым обновлением
+POSITION_STALE_MINUTES = 60
+VESSEL_STALE_HOURS = 24 * 7
+
+
+# =============================================================================
+# UPSTREAM CACHE
+# =============================================================================
+
+def _epoch(value: Optional[str]) -> float:
+    """ISO-время из БД (наивное = UTC) → Unix-время"""
+    moment = datetime.fromisoformat(value or '2000-01-01')
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.timestamp()
+
+
+def _load_position(mmsi: str):
+    position = db.get_last_position(mmsi)
+    return (position, _epoch(position.get('received_at'))) if position else None
+
+
+def _fetch_position(mmsi: str) -> Optional[Dict]:
+    vessel_data = mt.get_parser().get_vessel_page(mmsi)
+    if not (vessel_data.get('latitude') and vessel_data.get('longitude')):
+        return None
+    return {
+        'mmsi': mmsi,
+        'latitude': vessel_data['latitude'],
+        'longitude': vessel_data['longitude'],
+        'speed': vessel_data.get('speed'),
+        'course': vessel_data.get('course'),
+        'heading': vessel_data.get('heading'),
+        'destination': vessel_data.get('destination'),
+        'eta': vessel_data.get('eta'),
+        'timestamp': datetime.utcnow().isoformat()
+    }
+
+
+def _store_position(mmsi: str, position: Dict):
+    db.add_position(
+        mmsi=mmsi,
+        lat=position['latitude'],
+        lon=position['longitude'],
+        speed=position.get('speed'),
+        course=position.get('course'),
+        heading=position.get('heading'),
+        destination=position.get('destination'),
+        eta=position.get('eta'),
+        timestamp=position['timestamp']
+    )
+
+
+def _load_vessel(mmsi: str):
+    vessel = db.get_vessel(mmsi=mmsi)
+    return (vessel, _epoch(vessel.get('updated_at'))) if vessel else None
+
+
+def _fetch_vessel(mmsi: str) -> Optional[Dict]:
+    return mt.get_parser().get_vessel_page(mmsi) or None
+
+
+position_cache = TieredCache(
+    "position", _fetch_position,
+    ttl=POSITION_CACHE_MINUTES * 60, stale_ttl=POSITION_STALE_MINUTES * 60,
+    load=_load_position, store=_store_position
+)
+
+vessel_cache = TieredCache(
+    "vessel", _fetch_vessel,
+    ttl=VESSEL_CACHE_HOURS * 3600, stale_ttl=VESSEL_STALE_HOURS * 3600,
+    load=_load_vessel, store=lambda mmsi, vessel: db.upsert_vessel(dict(vessel))
+)
+
 
 # =============================================================================
 # VESSEL ENDPOINTS
@@ -33,50 +108,27 @@ VESSEL_CACHE_HOURS = 24
 def get_vessel(identifier: str):
     """
     Get vessel by MMSI, IMO, or name
-    First checks local DB, then fetches from MarineTraffic
+    Memory → local DB → MarineTraffic (one upstream fetch per MMSI)
     """
     # Determine identifier type
     if identifier.isdigit() and len(identifier) == 9:
-        vessel = db.get_vessel(mmsi=identifier)
-        search_param = {'mmsi': identifier}
-    elif identifier.isdigit() and len(identifier) == 7:
-        vessel = db.get_vessel(imo=identifier)
-        search_param = {'imo': identifier}
+        mmsi = identifier
     else:
-        vessel = db.get_vessel(name=identifier)
-        search_param = {'name': identifier}
-
-    # Check if we need to refresh
-    if vessel:
-        updated = datetime.fromisoformat(vessel.get('updated_at', '2000-01-01'))
-        if datetime.utcnow() - updated < timedelta(hours=VESSEL_CACHE_HOURS):
-            return jsonify({
-                'success': True,
-                'source': 'cache',
-                'vessel': vessel
-            })
-
-    # Fetch from MarineTraffic
-    parser = mt.get_parser()
-    mmsi = search_param.get('mmsi') or (vessel.get('mmsi') if vessel else None)
+        if identifier.isdigit() and len(identifier) == 7:
+            vessel = db.get_vessel(imo=identifier)
+        else:
+            vessel = db.get_vessel(name=identifier)
+        mmsi = vessel.get('mmsi') if vessel else None
 
     if mmsi:
-        fresh_data = parser.get_vessel_page(mmsi)
-        if fresh_data:
-            db.upsert_vessel(fresh_data)
+        vessel, source = vessel_cache.get(mmsi)
+        if vessel:
             return jsonify({
                 'success': True,
-                'source': 'marinetraffic',
-                'vessel': fresh_data
+                'source': source,
+                'vessel': vessel
             })
 
-    if vessel:
-        return jsonify({
-            'success': True,
-            'source': 'cache_stale',
-            'vessel': vessel
-        })
-
     return jsonify({
         'success': False,
         'error': 'Vessel not found'
@@ -122,52 +174,14 @@ def search_vessels():
 def get_position(mmsi: str):
     """
     Get current vessel position
+    Memory → local DB → MarineTraffic (one upstream fetch per MMSI)
     """
-    # Check cache
-    cached = db.get_last_position(mmsi)
-    if cached:
-        received = datetime.fromisoformat(cached.get('received_at', '2000-01-01'))
-        if datetime.utcnow() - received < timedelta(minutes=POSITION_CACHE_MINUTES):
-            return jsonify({
-                'success': True,
-                'source': 'cache',
-                'position': cached
-            })
-
-    # Fetch fresh from MarineTraffic
-    parser = mt.get_parser()
-    vessel_data = parser.get_vessel_page(mmsi)
-
-    if vessel_data.get('latitude') and vessel_data.get('longitude'):
-        db.add_position(
-            mmsi=mmsi,
-            lat=vessel_data['latitude'],
-            lon=vessel_data['longitude'],
-            speed=vessel_data.get('speed'),
-            course=vessel_data.get('course'),
-            heading=vessel_data.get('heading'),
-            destination=vessel_data.get('destination'),
-            eta=vessel_data.get('eta')
-        )
-
-        return jsonify({
-            'success': True,
-            'source': 'marinetraffic',
-            'position': {
-                'mmsi': mmsi,
-                'latitude': vessel_data['latitude'],
-                'longitude': vessel_data['longitude'],
-                'speed': vessel_data.get('speed'),
-                'course': vessel_data.get('course'),
-                'timestamp': datetime.utcnow().isoformat()
-            }
-        })
-
-    if cached:
+    position, source = position_cache.get(mmsi)
+    if position:
         return jsonify({
             'success': True,
-            'source': 'cache_stale',
-            'position': cached
+            'source': source,
+            'position': position
         })
 
     return jsonify({
@@ -303,6 +317,10 @@ def get_stats():
     stats = db.get_stats()
     stats['api_version'] = '1.0'
     stats['marinetraffic_api'] = mt.get_parser().has_api_key()
+    stats['upstream_cache'] = {
+        'position': position_cache.stats,
+        'vessel': vessel_cache.stats
+    }
 
     return jsonify({
         'success': True,
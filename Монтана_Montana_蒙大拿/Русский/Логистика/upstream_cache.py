@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+Upstream Cache — Tiered cache for MarineTraffic/Equasis lookups
+SeaFare_Montana Data Layer
+
+Память (LRU) → SQLite → upstream. Один запрос к upstream на ключ
+(single-flight), устаревшие данные отдаются сразу с фоновым обновлением
+(stale-while-revalidate), параллельность запросов ограничена пулом.
+
+Ɉ MONTANA PROTOCOL — ML-DSA-65 (FIPS 204)
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+
+# Пул запросов к upstream (общий для всех кэшей)
+FETCH_WORKERS = 8
+# Фоновых обновлений в очереди сверх этого — пропускаются
+MAX_PENDING_REFRESH = 64
+# Сколько ждать upstream на потоке запроса
+FETCH_TIMEOUT = 15.0
+
+MEMORY_ENTRIES = 10000
+# Пустой ответ upstream тоже кэшируется, чтобы не долбить его на каждый запрос
+NEGATIVE_TTL = 60.0
+
+# Источники ответа (совместимы с полем 'source' в seafare_api)
+SOURCE_CACHE = "cache"
+SOURCE_STALE = "cache_stale"
+SOURCE_UPSTREAM = "marinetraffic"
+
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_fetch_pool() -> ThreadPoolExecutor:
+    """Общий ограниченный пул запросов к upstream"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=FETCH_WORKERS,
+                                           thread_name_prefix="seafare-fetch")
+        return _executor
+
+
+class TieredCache:
+    """
+    Кэш одного вида данных (позиции, суда)
+
+    fetch(key) -> value | None — запрос к upstream (медленный)
+    load(key)  -> (value, fetched_at) | None — чтение из SQLite
+    store(key, value) — запись свежего значения в SQLite
+    fetched_at — Unix-время получения данных.
+    """
+
+    def __init__(self, name: str, fetch: Callable[[str], Any],
+                 ttl: float, stale_ttl: float,
+                 load: Callable[[str], Optional[Tuple[Any, float]]] = None,
+                 store: Callable[[str, Any], None] = None,
+                 max_entries: int = MEMORY_ENTRIES,
+                 executor: ThreadPoolExecutor = None,
+                 clock: Callable[[], float] = time.time):
+        self.name = name
+        self.fetch = fetch
+        self.load = load
+        self.store = store
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self.executor = executor
+        self.clock = clock
+
+        self._memory: "OrderedDict[str, Tuple[Any, float]]" = OrderedDict()
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+        self.stats = {"memory_hits": 0, "db_hits": 0, "stale_served": 0,
+                      "fetches": 0, "coalesced": 0, "refresh_skipped": 0}
+
+    # ─── Память ───
+
+    def _remember(self, key: str, value: Any, fetched_at: float):
+        with self._lock:
+            self._memory[key] = (value, fetched_at)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def _recall(self, key: str) -> Optional[Tuple[Any, float]]:
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+            return entry
+
+    def invalidate(self, key: str):
+        with self._lock:
+            self._memory.pop(key, None)
+
+    # ─── Upstream ───
+
+    def _run_fetch(self, key: str) -> Any:
+        """Запрос к upstream + запись в SQLite и память (в потоке пула)"""
+        try:
+            value = self.fetch(key)
+        except Exception as e:
+            print(f"[{self.name}] upstream error for {key}: {e}")
+            value = None
+
+        now = self.clock()
+        if value:
+            if self.store is not None:
+                try:
+                    self.store(key, value)
+                except Exception as e:
+                    print(f"[{self.name}] store error for {key}: {e}")
+            self._remember(key, value, now)
+        else:
+            previous = self._recall(key)
+            if previous is None or previous[0] is None:
+                # Отрицательный кэш: fetched_at сдвинут, чтобы запись была свежей NEGATIVE_TTL секунд
+                self._remember(key, None, now - self.ttl + NEGATIVE_TTL)
+        return value
+
+    def _flight(self, key: str, background: bool) -> Optional[Future]:
+        """Единственный полёт на ключ; повторные вызовы получают тот же Future"""
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                self.stats["coalesced"] += 1
+                return future
+            if background and len(self._inflight) >= MAX_PENDING_REFRESH:
+                self.stats["refresh_skipped"] += 1
+                return None
+            future = Future()
+            self._inflight[key] = future
+            self.stats["fetches"] += 1
+
+        def run():
+            try:
+                future.set_result(self._run_fetch(key))
+            except BaseException as e:
+                future.set_exception(e)
+            finally:
+                with self._lock:
+                    self._inflight.pop(key, None)
+
+        (self.executor or get_fetch_pool()).submit(run)
+        return future
+
+    def refresh(self, key: str) -> Optional[Future]:
+        """Фоновое обновление (не блокирует)"""
+        return self._flight(key, background=True)
+
+    # ─── Чтение ───
+
+    def get(self, key: str, timeout: float = FETCH_TIMEOUT) -> Tuple[Any, Optional[str]]:
+        """
+        Значение и источник: cache / cache_stale / marinetraffic
+
+        (None, None) — данных нет ни в кэше, ни в upstream.
+        """
+        now = self.clock()
+        entry = self._recall(key)
+        if entry is not None:
+            self.stats["memory_hits"] += 1
+        elif self.load is not None:
+            entry = self.load(key)
+            if entry is not None:
+                self.stats["db_hits"] += 1
+                self._remember(key, *entry)
+
+        if entry is not None:
+            value, fetched_at = entry
+            age = now - fetched_at
+            if age < self.ttl:
+                return (value, SOURCE_CACHE) if value is not None else (None, None)
+            if value is not None and age < self.ttl + self.stale_ttl:
+                self.stats["stale_served"] += 1
+                self.refresh(key)
+                return value, SOURCE_STALE
+
+        future = self._flight(key, background=False)
+        try:
+            value = future.result(timeout=timeout)
+        except Exception:
+            value = None
+
+        if value:
+            return value, SOURCE_UPSTREAM
+        if entry is not None and entry[0] is not None:
+            self.stats["stale_served"] += 1
+            return entry[0], SOURCE_STALE
+        return None, None
+
+
+# =============================================================================
+# BENCHMARK
+# =============================================================================
+
+def benchmark(keys: int = 200, requests_total: int = 20000, threads: int = 32,
+              upstream_latency: float = 0.05) -> dict:
+    """Zipf-подобная нагрузка на кэш с локальным upstream-заглушкой"""
+    import random
+
+    calls = {"count": 0}
+    calls_lock = threading.Lock()
+
+    def upstream(key: str) -> dict:
+        with calls_lock:
+            calls["count"] += 1
+        time.sleep(upstream_latency)
+        return {"mmsi": key, "latitude": 51.9, "longitude": 4.3}
+
+    cache = TieredCache("bench", upstream, ttl=300, stale_ttl=3600)
+    rng = random.Random(3)
+    weights = [1 / (rank + 1) for rank in range(keys)]
+    plan = rng.choices([str(200000000 + i) for i in range(keys)], weights, k=requests_total)
+    chunks = [plan[i::threads] for i in range(threads)]
+
+    def worker(chunk):
+        for key in chunk:
+            cache.get(key)
+
+    started = time.perf_counter()
+    pool = [threading.Thread(target=worker, args=(chunk,)) for chunk in chunks]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    result = {
+        "requests": requests_total,
+        "distinct_keys": len(set(plan)),
+        "upstream_calls": calls["count"],
+        "requests_per_sec": round(requests_total / elapsed),
+        **cache.stats,
+    }
+    for name, value in result.items():
+        print(f"{name:16} {value}")
+    return result
+
+
+if __name__ == "__main__":
+    import sys
+
+    if "--benchmark" in sys.argv:
+        benchmark()
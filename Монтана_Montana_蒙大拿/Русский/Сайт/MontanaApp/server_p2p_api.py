@@ -1,33 +1,79 @@
 # P2P Messages API Endpoints
-# Add these routes to junona_api.py on server 72.56.102.240
+# Copy next to junona_api.py on server 72.56.102.240 (with message_store.py and
+# ../../Бот/push_hub.py) and register:
+#
+#     from server_p2p_api import p2p_api
+#     app.register_blueprint(p2p_api)
 
 """
-CREATE TABLE IF NOT EXISTS messages (
-    id TEXT PRIMARY KEY,
-    from_phone TEXT NOT NULL,
-    to_phone TEXT NOT NULL,
-    content TEXT NOT NULL,
-    timestamp TEXT NOT NULL,
-    is_read INTEGER DEFAULT 0
+Schema — message_store.py (created on first start, old `messages` table migrated):
+
+CREATE TABLE p2p_messages (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,   -- keyset cursor
+    id TEXT UNIQUE NOT NULL,
+    conversation_id TEXT NOT NULL,           -- "phone_a:phone_b", sorted
+    from_phone, to_phone, content, timestamp, is_read
+);
+CREATE INDEX idx_p2p_conversation ON p2p_messages(conversation_id, timestamp, seq);
+
+CREATE TABLE p2p_inbox (                     -- one row per participant
+    phone, contact_phone, conversation_id, last_seq, unread,
+    PRIMARY KEY (phone, contact_phone)
 );
 
-CREATE INDEX IF NOT EXISTS idx_messages_phones ON messages(from_phone, to_phone);
-CREATE INDEX IF NOT EXISTS idx_messages_timestamp ON messages(timestamp);
+Push: GET /api/messages/stream (SSE) or /api/messages/poll (long-poll)
+deliver new messages instead of polling GET /api/messages.
+nginx: proxy_buffering off; proxy_read_timeout > 15s for /api/messages/stream
 """
 
-from flask import jsonify, request
-import sqlite3
-import uuid
-from datetime import datetime
+import threading
 
-# Add to existing Flask app
+from flask import Blueprint, Response, jsonify, request
 
-@app.route('/api/messages', methods=['POST'])
-def send_message():
-    """Send P2P message to contact"""
+from message_store import PAGE_SIZE, get_message_store
+from push_hub import SSE_HEADERS, HubFull, get_push_hub, long_poll, parse_last_id, sse_stream
+
+DB_PATH = '/opt/junona/montana.db'
+
+p2p_api = Blueprint('p2p_api', __name__)
+
+_hub_lock = threading.Lock()
+_hub_ready = False
+
+
+def _message_hub():
+    """Push hub fed by MessageStore.send: each message goes to phone:<from> and phone:<to>"""
+    global _hub_ready
+    hub = get_push_hub()
+    with _hub_lock:
+        if not _hub_ready:
+            def publish(message):
+                hub.publish([f"phone:{message['from_phone']}", f"phone:{message['to_phone']}"],
+                            "message", message)
+
+            get_message_store(DB_PATH).add_listener(publish)
+            _hub_ready = True
+    return hub
+
+
+def _current_user():
+    """(user_id, phone) of the X-Device-ID sender, or an error response"""
     device_id = request.headers.get('X-Device-ID')
     if not device_id:
-        return jsonify({"error": "No device ID"}), 401
+        return None, (jsonify({"error": "No device ID"}), 401)
+
+    user = get_message_store(DB_PATH).user(device_id)
+    if not user:
+        return None, (jsonify({"error": "User not found"}), 404)
+    return user, None
+
+
+@p2p_api.route('/api/messages', methods=['POST'])
+def send_message():
+    """Send P2P message to contact"""
+    user, error = _current_user()
+    if error:
+        return error
 
     data = request.get_json() or {}
     to_phone = data.get('to_phone')
@@ -36,179 +82,103 @@ def send_message():
     if not to_phone or not content:
         return jsonify({"error": "Missing to_phone or content"}), 400
 
-    # Get sender's phone from device_id
-    conn = sqlite3.connect('/opt/junona/montana.db')
-    cursor = conn.cursor()
-    cursor.execute("SELECT phone FROM users WHERE device_id = ?", (device_id,))
-    row = cursor.fetchone()
-
-    if not row:
-        conn.close()
-        return jsonify({"error": "User not found"}), 404
-
-    from_phone = row[0]
-
-    # Create message
-    message_id = str(uuid.uuid4())
-    timestamp = datetime.utcnow().isoformat() + 'Z'
-
-    # Create messages table if not exists
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS messages (
-            id TEXT PRIMARY KEY,
-            from_phone TEXT NOT NULL,
-            to_phone TEXT NOT NULL,
-            content TEXT NOT NULL,
-            timestamp TEXT NOT NULL,
-            is_read INTEGER DEFAULT 0
-        )
-    ''')
+    _, from_phone = user
+    return jsonify(get_message_store(DB_PATH).send(from_phone, to_phone, content))
 
-    cursor.execute('''
-        INSERT INTO messages (id, from_phone, to_phone, content, timestamp, is_read)
-        VALUES (?, ?, ?, ?, ?, 0)
-    ''', (message_id, from_phone, to_phone, content, timestamp))
 
-    conn.commit()
-    conn.close()
+@p2p_api.route('/api/messages', methods=['GET'])
+def get_messages():
+    """
+    Page of messages with a contact, oldest first.
 
-    return jsonify({
-        "id": message_id,
-        "from_phone": from_phone,
-        "to_phone": to_phone,
-        "content": content,
-        "timestamp": timestamp,
-        "is_read": False
-    })
+    ?with=PHONE               — latest page (marks incoming as read)
+    &before=CURSOR            — older page (scroll up)
+    &after=CURSOR             — newer messages (catch up)
+    &limit=N                  — page size (default 100, max 200)
 
-
-@app.route('/api/messages', methods=['GET'])
-def get_messages():
-    """Get messages with specific contact"""
-    device_id = request.headers.get('X-Device-ID')
-    if not device_id:
-        return jsonify({"error": "No device ID"}), 401
+    Response: {"messages": [...], "next_cursor": "..." | null}
+    """
+    user, error = _current_user()
+    if error:
+        return error
 
     with_phone = request.args.get('with')
     if not with_phone:
         return jsonify({"error": "Missing 'with' parameter"}), 400
 
-    conn = sqlite3.connect('/opt/junona/montana.db')
-    cursor = conn.cursor()
-
-    # Get user's phone
-    cursor.execute("SELECT phone FROM users WHERE device_id = ?", (device_id,))
-    row = cursor.fetchone()
-
-    if not row:
-        conn.close()
-        return jsonify({"error": "User not found"}), 404
-
-    my_phone = row[0]
-
-    # Get messages between user and contact
-    cursor.execute('''
-        SELECT id, from_phone, to_phone, content, timestamp, is_read
-        FROM messages
-        WHERE (from_phone = ? AND to_phone = ?)
-           OR (from_phone = ? AND to_phone = ?)
-        ORDER BY timestamp ASC
-        LIMIT 100
-    ''', (my_phone, with_phone, with_phone, my_phone))
-
-    messages = []
-    for row in cursor.fetchall():
-        messages.append({
-            "id": row[0],
-            "from_phone": row[1],
-            "to_phone": row[2],
-            "content": row[3],
-            "timestamp": row[4],
-            "is_read": bool(row[5])
-        })
-
-    # Mark received messages as read
-    cursor.execute('''
-        UPDATE messages SET is_read = 1
-        WHERE from_phone = ? AND to_phone = ? AND is_read = 0
-    ''', (with_phone, my_phone))
-
-    conn.commit()
-    conn.close()
-
-    return jsonify({"messages": messages})
-
-
-@app.route('/api/conversations', methods=['GET'])
+    try:
+        limit = int(request.args.get('limit', PAGE_SIZE))
+        before = request.args.get('before')
+        after = request.args.get('after')
+        _, my_phone = user
+        messages, next_cursor = get_message_store(DB_PATH).messages(
+            my_phone, with_phone, limit=limit,
+            before=int(before) if before else None,
+            after=int(after) if after else None
+        )
+    except ValueError:
+        return jsonify({"error": "Invalid limit or cursor"}), 400
+
+    return jsonify({"messages": messages, "next_cursor": next_cursor})
+
+
+@p2p_api.route('/api/conversations', methods=['GET'])
 def get_conversations():
-    """Get list of conversations with last message"""
-    device_id = request.headers.get('X-Device-ID')
-    if not device_id:
-        return jsonify({"error": "No device ID"}), 401
-
-    conn = sqlite3.connect('/opt/junona/montana.db')
-    cursor = conn.cursor()
-
-    # Get user's phone
-    cursor.execute("SELECT phone FROM users WHERE device_id = ?", (device_id,))
-    row = cursor.fetchone()
-
-    if not row:
-        conn.close()
-        return jsonify({"error": "User not found"}), 404
-
-    my_phone = row[0]
-
-    # Get all unique contacts with messages
-    cursor.execute('''
-        SELECT DISTINCT
-            CASE WHEN from_phone = ? THEN to_phone ELSE from_phone END as contact_phone
-        FROM messages
-        WHERE from_phone = ? OR to_phone = ?
-    ''', (my_phone, my_phone, my_phone))
-
-    contact_phones = [row[0] for row in cursor.fetchall()]
-
-    conversations = []
-    for contact_phone in contact_phones:
-        # Get last message
-        cursor.execute('''
-            SELECT content, timestamp FROM messages
-            WHERE (from_phone = ? AND to_phone = ?)
-               OR (from_phone = ? AND to_phone = ?)
-            ORDER BY timestamp DESC
-            LIMIT 1
-        ''', (my_phone, contact_phone, contact_phone, my_phone))
-
-        last_msg = cursor.fetchone()
-        if not last_msg:
-            continue
-
-        # Get unread count
-        cursor.execute('''
-            SELECT COUNT(*) FROM messages
-            WHERE from_phone = ? AND to_phone = ? AND is_read = 0
-        ''', (contact_phone, my_phone))
-        unread_count = cursor.fetchone()[0]
-
-        # Get contact name from contacts table
-        cursor.execute('''
-            SELECT name FROM contacts
-            WHERE phone = ? AND telegram_id = (
-                SELECT telegram_id FROM users WHERE phone = ?
-            )
-        ''', (contact_phone, my_phone))
-        name_row = cursor.fetchone()
-        contact_name = name_row[0] if name_row else contact_phone
-
-        conversations.append({
-            "contact_phone": contact_phone,
-            "contact_name": contact_name,
-            "last_message": last_msg[0],
-            "last_message_time": last_msg[1],
-            "unread_count": unread_count
-        })
-
-    conn.close()
-
-    return jsonify({"conversations": conversations})
+    """Get list of conversations with last message, most recent first"""
+    user, error = _current_user()
+    if error:
+        return error
+
+    user_id, my_phone = user
+    return jsonify({"conversations": get_message_store(DB_PATH).conversations(my_phone, user_id)})
+
+
+def _message_subscription(phone):
+    """Subscription for the user's messages, resuming from Last-Event-ID / last_id"""
+    last_id = parse_last_id(request.headers.get('Last-Event-ID') or request.args.get('last_id'))
+    return _message_hub().subscribe([f"phone:{phone}"], last_id)
+
+
+@p2p_api.route('/api/messages/stream', methods=['GET'])
+def stream_messages():
+    """
+    New messages (sent and received) as text/event-stream.
+
+    Header Last-Event-ID — resume after reconnect (EventSource sends it).
+    Events: "message" (same JSON as POST /api/messages returns);
+    "resync" — missed too much, reload /api/conversations once.
+    """
+    user, error = _current_user()
+    if error:
+        return error
+
+    _, my_phone = user
+    try:
+        sub = _message_subscription(my_phone)
+    except HubFull:
+        return jsonify({"error": "Too many subscribers"}), 503
+
+    return Response(sse_stream(sub), mimetype='text/event-stream', headers=SSE_HEADERS)
+
+
+@p2p_api.route('/api/messages/poll', methods=['GET'])
+def poll_messages():
+    """
+    Long-poll fallback: ?last_id=N&timeout=25
+
+    Response: {"events": [{"id": N, "type": "message", "data": {...}}], "last_id": N}
+    """
+    user, error = _current_user()
+    if error:
+        return error
+
+    _, my_phone = user
+    try:
+        timeout = float(request.args.get('timeout', 25))
+        sub = _message_subscription(my_phone)
+    except ValueError:
+        return jsonify({"error": "Invalid timeout"}), 400
+    except HubFull:
+        return jsonify({"error": "Too many subscribers"}), 503
+
+    return jsonify(long_poll(sub, timeout))
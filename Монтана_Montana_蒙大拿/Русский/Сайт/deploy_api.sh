@@ -16,6 +16,7 @@ ssh $SERVER "mkdir -p /opt/junona"
 # 2. Копируем API
 echo "📦 Uploading API..."
 scp "$LOCAL_PATH/junona_api.py" "$SERVER:/opt/junona/"
+scp "$LOCAL_PATH/presence_aggregator.py" "$SERVER:/opt/junona/"
 scp "$LOCAL_PATH/junona_api.service" "$SERVER:/etc/systemd/system/"
 
 # 3. Копируем фронтенд
@@ -26,7 +27,7 @@ scp "$LOCAL_PATH/junona/sw.js" "$SERVER:/var/www/html/"
 
 # 4. Устанавливаем зависимости
 echo "📦 Installing dependencies..."
-ssh $SERVER "pip3 install flask flask-cors --quiet"
+ssh $SERVER "pip3 install flask flask-cors dilithium-py --quiet"
 
 # 5. Настраиваем nginx
 echo "⚙️ Configuring nginx..."
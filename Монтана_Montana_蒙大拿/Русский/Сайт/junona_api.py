@@ -20,6 +20,10 @@ import openai
 import anthropic
 import requests
 
+from presence_aggregator import (
+    BUNDLE_INTERVAL, SESSION_TTL, PresenceError, get_presence_aggregator
+)
+
 app = Flask(__name__)
 CORS(app)
 
@@ -482,11 +486,14 @@ def get_user():
     if not user:
         return jsonify({"error": "User not found"}), 404
 
+    # Начисления, ещё не записанные агрегатором
+    pending = get_presence_aggregator(DB_PATH).pending(device_id)
+
     return jsonify({
         "phone": user['phone'],
         "verified": bool(user['verified']),
-        "balance": user['balance'],
-        "presence": user['presence_seconds'],
+        "balance": user['balance'] + pending,
+        "presence": user['presence_seconds'] + pending,
         "created_at": user['created_at'],
         "last_seen": user['last_seen']
     })
@@ -506,28 +513,64 @@ def update_presence():
         return jsonify({"error": "Invalid seconds (1-3600)"}), 400
 
     db = get_db()
-    user = db.execute('SELECT * FROM users WHERE device_id = ?', (device_id,)).fetchone()
+    user = db.execute(
+        'SELECT balance, presence_seconds FROM users WHERE device_id = ?', (device_id,)
+    ).fetchone()
 
     if not user:
         return jsonify({"error": "User not found"}), 404
 
-    # 1 секунда = 1 Ɉ
-    new_balance = user['balance'] + seconds
-    new_presence = user['presence_seconds'] + seconds
-
-    db.execute(
-        'UPDATE users SET balance = ?, presence_seconds = ?, last_seen = CURRENT_TIMESTAMP WHERE device_id = ?',
-        (new_balance, new_presence, device_id)
-    )
-    db.commit()
+    # 1 секунда = 1 Ɉ; запись — пачкой в агрегаторе
+    pending = get_presence_aggregator(DB_PATH).add(device_id, seconds)
 
     return jsonify({
         "added": seconds,
-        "balance": new_balance,
-        "total_presence": new_presence
+        "balance": user['balance'] + pending,
+        "total_presence": user['presence_seconds'] + pending
     })
 
 
+@app.route('/api/presence/session', methods=['POST'])
+def open_presence_session():
+    """Сессия демона присутствия: подпись ML-DSA-65 один раз, дальше пачки с HMAC"""
+    data = request.json or {}
+
+    try:
+        session_id, key = get_presence_aggregator(DB_PATH).open_session(
+            data.get('address'),
+            data.get('public_key'),
+            data.get('timestamp'),
+            data.get('signature')
+        )
+    except PresenceError as e:
+        return jsonify({"error": str(e)}), e.status
+
+    return jsonify({
+        "session_id": session_id,
+        "key": key.hex(),
+        "bundle_interval": BUNDLE_INTERVAL,
+        "expires_in": SESSION_TTL
+    })
+
+
+@app.route('/api/presence/bundle', methods=['POST'])
+def presence_bundle():
+    """
+    Пачка присутствия: тело {"seq", "seconds", "ts"},
+    заголовки X-Presence-Session и X-Presence-MAC (HMAC-SHA256 тела)
+    """
+    try:
+        result = get_presence_aggregator(DB_PATH).submit_bundle(
+            request.headers.get('X-Presence-Session'),
+            request.get_data(),
+            request.headers.get('X-Presence-MAC')
+        )
+    except PresenceError as e:
+        return jsonify({"error": str(e)}), e.status
+
+    return jsonify(result)
+
+
 @app.route('/api/transfer', methods=['POST'])
 def transfer():
     """Перевод Ɉ между номерами телефонов"""
@@ -0,0 +1,475 @@
+#!/usr/bin/env python3
+"""
+Message Store — хранилище P2P сообщений по диалогам
+
+Каждое сообщение лежит под каноническим conversation_id (два номера
+в порядке сортировки), индекс (conversation_id, timestamp, seq) отдаёт
+страницу диалога без OR по парам номеров. Страницы — keyset-курсоры:
+"до" и "после" сообщения, без OFFSET.
+
+p2p_inbox — строка на участника диалога: последнее сообщение и счётчик
+непрочитанных. Список диалогов — O(диалогов пользователя), а не скан
+всех сообщений; отметка "прочитано" не пишет ничего, если читать нечего.
+
+Соединения SQLite (WAL) берутся из пула, а не открываются на запрос.
+
+Ɉ MONTANA PROTOCOL
+"""
+
+import logging
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger("MESSAGE_STORE")
+
+# Соединений в пуле (WAL: читатели не ждут писателя)
+POOL_SIZE = 4
+# Страница диалога
+PAGE_SIZE = 100
+MAX_PAGE_SIZE = 200
+# device_id → (user_id, phone) кэшируется: номер меняется редко
+USER_CACHE_TTL = 60
+USER_CACHE_SIZE = 50_000
+
+
+SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS p2p_messages (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        id TEXT UNIQUE NOT NULL,
+        conversation_id TEXT NOT NULL,
+        from_phone TEXT NOT NULL,
+        to_phone TEXT NOT NULL,
+        content TEXT NOT NULL,
+        timestamp TEXT NOT NULL,
+        is_read INTEGER DEFAULT 0
+    );
+
+    CREATE INDEX IF NOT EXISTS idx_p2p_conversation
+        ON p2p_messages(conversation_id, timestamp, seq);
+
+    -- Только непрочитанные: отметка "прочитано" не сканирует диалог
+    CREATE INDEX IF NOT EXISTS idx_p2p_unread
+        ON p2p_messages(conversation_id, to_phone) WHERE is_read = 0;
+
+    CREATE TABLE IF NOT EXISTS p2p_inbox (
+        phone TEXT NOT NULL,
+        contact_phone TEXT NOT NULL,
+        conversation_id TEXT NOT NULL,
+        last_seq INTEGER NOT NULL,
+        unread INTEGER DEFAULT 0,
+        PRIMARY KEY (phone, contact_phone)
+    ) WITHOUT ROWID;
+'''
+
+
+def conversation_id(phone_a: str, phone_b: str) -> str:
+    """Канонический ID диалога: одинаков для обеих сторон"""
+    return ":".join(sorted((phone_a, phone_b)))
+
+
+def utc_timestamp() -> str:
+    """ISO 8601 с микросекундами всегда — строки сортируются как время"""
+    return datetime.utcnow().isoformat(timespec='microseconds') + 'Z'
+
+
+def _message(row) -> Dict:
+    return {
+        "id": row["id"],
+        "from_phone": row["from_phone"],
+        "to_phone": row["to_phone"],
+        "content": row["content"],
+        "timestamp": row["timestamp"],
+        "is_read": bool(row["is_read"]),
+        "cursor": str(row["seq"])
+    }
+
+
+class MessageStore:
+    """
+    P2P сообщения Montana поверх SQLite (той же montana.db, что у Юноны).
+
+    Чтение и запись — через пул соединений; запись сообщения и обновление
+    p2p_inbox обеих сторон — одна транзакция.
+    """
+
+    def __init__(self, db_path: str, pool_size: int = POOL_SIZE):
+        self.db_path = db_path
+        self._pool = queue.LifoQueue()
+        self._pool_size = pool_size
+        self._opened = 0
+        self._pool_lock = threading.Lock()
+
+        self._users: Dict[str, Tuple[float, int, str]] = {}
+        self._users_lock = threading.Lock()
+
+        self.stats = {"sent": 0, "pages": 0, "marked_read": 0}
+
+        # Подписчики на новые сообщения (push-канал API)
+        self._listeners: List[Callable[[Dict], None]] = []
+
+        with self._connection() as db:
+            self._init_schema(db)
+
+    # ─── Пул соединений ───
+
+    def _connect(self) -> sqlite3.Connection:
+        db = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+        db.row_factory = sqlite3.Row
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.execute("PRAGMA busy_timeout=5000")
+        return db
+
+    @contextmanager
+    def _connection(self):
+        try:
+            db = self._pool.get_nowait()
+        except queue.Empty:
+            with self._pool_lock:
+                create = self._opened < self._pool_size
+                if create:
+                    self._opened += 1
+            db = self._connect() if create else self._pool.get()
+        try:
+            yield db
+        finally:
+            if db.in_transaction:
+                db.rollback()
+            self._pool.put(db)
+
+    # ─── Схема ───
+
+    def _init_schema(self, db: sqlite3.Connection):
+        """Таблицы диалогов; однократный перенос старой таблицы messages"""
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            fresh = not db.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'p2p_messages'"
+            ).fetchone()
+            for statement in SCHEMA.split(";"):
+                if statement.strip():
+                    db.execute(statement)
+
+            legacy = db.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'messages'"
+            ).fetchone()
+            if fresh and legacy:
+                self._migrate_legacy(db)
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+
+    @staticmethod
+    def _migrate_legacy(db: sqlite3.Connection):
+        """messages (from_phone, to_phone, ...) → p2p_messages + p2p_inbox"""
+        db.execute('''
+            INSERT INTO p2p_messages (id, conversation_id, from_phone, to_phone, content, timestamp, is_read)
+            SELECT id,
+                   CASE WHEN from_phone < to_phone THEN from_phone || ':' || to_phone
+                        ELSE to_phone || ':' || from_phone END,
+                   from_phone, to_phone, content, timestamp, is_read
+            FROM messages ORDER BY timestamp
+        ''')
+        db.execute('''
+            INSERT INTO p2p_inbox (phone, contact_phone, conversation_id, last_seq, unread)
+            SELECT me, contact, conversation_id, MAX(seq), SUM(unread)
+            FROM (
+                SELECT from_phone AS me, to_phone AS contact, conversation_id, seq, 0 AS unread
+                FROM p2p_messages
+                UNION ALL
+                SELECT to_phone, from_phone, conversation_id, seq, is_read = 0
+                FROM p2p_messages
+            )
+            GROUP BY me, contact
+        ''')
+
+    # ─── Пользователи ───
+
+    def user(self, device_id: str) -> Optional[Tuple[int, str]]:
+        """(user_id, phone) по device_id; None если нет пользователя или номера"""
+        now = time.monotonic()
+        with self._users_lock:
+            cached = self._users.get(device_id)
+            if cached and cached[0] > now:
+                return cached[1], cached[2]
+
+        with self._connection() as db:
+            row = db.execute(
+                "SELECT id, phone FROM users WHERE device_id = ?", (device_id,)
+            ).fetchone()
+        if not row or not row["phone"]:
+            return None
+
+        with self._users_lock:
+            if len(self._users) >= USER_CACHE_SIZE:
+                self._users.clear()
+            self._users[device_id] = (now + USER_CACHE_TTL, row["id"], row["phone"])
+        return row["id"], row["phone"]
+
+    # ─── Запись ───
+
+    def send(self, from_phone: str, to_phone: str, content: str) -> Dict:
+        """Сохранить сообщение и обновить p2p_inbox обеих сторон"""
+        cid = conversation_id(from_phone, to_phone)
+        message_id = str(uuid.uuid4())
+        timestamp = utc_timestamp()
+
+        with self._connection() as db:
+            db.execute("BEGIN IMMEDIATE")
+            seq = db.execute('''
+                INSERT INTO p2p_messages (id, conversation_id, from_phone, to_phone, content, timestamp, is_read)
+                VALUES (?, ?, ?, ?, ?, ?, 0)
+            ''', (message_id, cid, from_phone, to_phone, content, timestamp)).lastrowid
+            db.execute('''
+                INSERT INTO p2p_inbox (phone, contact_phone, conversation_id, last_seq, unread)
+                VALUES (?, ?, ?, ?, 0)
+                ON CONFLICT (phone, contact_phone) DO UPDATE SET last_seq = excluded.last_seq
+            ''', (from_phone, to_phone, cid, seq))
+            db.execute('''
+                INSERT INTO p2p_inbox (phone, contact_phone, conversation_id, last_seq, unread)
+                VALUES (?, ?, ?, ?, 1)
+                ON CONFLICT (phone, contact_phone)
+                DO UPDATE SET last_seq = excluded.last_seq, unread = unread + 1
+            ''', (to_phone, from_phone, cid, seq))
+            db.execute("COMMIT")
+
+        self.stats["sent"] += 1
+        message = {
+            "id": message_id,
+            "from_phone": from_phone,
+            "to_phone": to_phone,
+            "content": content,
+            "timestamp": timestamp,
+            "is_read": False,
+            "cursor": str(seq)
+        }
+        self._notify(message)
+        return message
+
+    def add_listener(self, callback: Callable[[Dict], None]):
+        """callback(message) после коммита каждого send()"""
+        self._listeners.append(callback)
+
+    def _notify(self, message: Dict):
+        for callback in self._listeners:
+            try:
+                callback(message)
+            except Exception as e:
+                logger.error(f"Message listener failed: {e}")
+
+    # ─── Чтение ───
+
+    def messages(self, my_phone: str, with_phone: str, limit: int = PAGE_SIZE,
+                 before: Optional[str] = None, after: Optional[str] = None,
+                 mark_read: bool = True) -> Tuple[List[Dict], Optional[str]]:
+        """
+        Страница диалога по возрастанию времени.
+
+        Без курсора — последние limit сообщений; before — более старые,
+        after — более новые (догрузка). Возвращает (сообщения, next_cursor):
+        next_cursor — для следующей страницы в том же направлении или None.
+        """
+        cid = conversation_id(my_phone, with_phone)
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        # Курсор — seq сообщения; сравнение идёт по (timestamp, seq) внутри диалога
+        anchor = '''(timestamp, seq) {} (SELECT timestamp, seq FROM p2p_messages
+                                          WHERE seq = ? AND conversation_id = ?)'''
+
+        if after is not None:
+            sql = (f"SELECT * FROM p2p_messages WHERE conversation_id = ? AND {anchor.format('>')} "
+                   "ORDER BY timestamp, seq LIMIT ?")
+            params = (cid, int(after), cid, limit + 1)
+        elif before is not None:
+            sql = (f"SELECT * FROM p2p_messages WHERE conversation_id = ? AND {anchor.format('<')} "
+                   "ORDER BY timestamp DESC, seq DESC LIMIT ?")
+            params = (cid, int(before), cid, limit + 1)
+        else:
+            sql = ("SELECT * FROM p2p_messages WHERE conversation_id = ? "
+                   "ORDER BY timestamp DESC, seq DESC LIMIT ?")
+            params = (cid, limit + 1)
+
+        with self._connection() as db:
+            rows = db.execute(sql, params).fetchall()
+            more = len(rows) > limit
+            rows = rows[:limit]
+            if after is None:
+                rows.reverse()
+
+            if mark_read:
+                self._mark_read(db, my_phone, with_phone, cid)
+
+        self.stats["pages"] += 1
+        messages = [_message(row) for row in rows]
+        next_cursor = None
+        if more and messages:
+            next_cursor = messages[-1]["cursor"] if after is not None else messages[0]["cursor"]
+        return messages, next_cursor
+
+    def _mark_read(self, db: sqlite3.Connection, my_phone: str, with_phone: str, cid: str):
+        """Входящие диалога — прочитаны; без записи, если непрочитанных нет"""
+        unread = db.execute(
+            "SELECT unread FROM p2p_inbox WHERE phone = ? AND contact_phone = ?",
+            (my_phone, with_phone)
+        ).fetchone()
+        if not unread or not unread["unread"]:
+            return
+
+        db.execute("BEGIN IMMEDIATE")
+        db.execute('''
+            UPDATE p2p_messages SET is_read = 1
+            WHERE conversation_id = ? AND to_phone = ? AND is_read = 0
+        ''', (cid, my_phone))
+        db.execute(
+            "UPDATE p2p_inbox SET unread = 0 WHERE phone = ? AND contact_phone = ?",
+            (my_phone, with_phone)
+        )
+        db.execute("COMMIT")
+        self.stats["marked_read"] += 1
+
+    def conversations(self, my_phone: str, user_id: Optional[int] = None) -> List[Dict]:
+        """Диалоги пользователя, свежие первыми: строки p2p_inbox + последнее сообщение"""
+        with self._connection() as db:
+            rows = db.execute('''
+                SELECT i.contact_phone, i.unread, m.content, m.timestamp
+                FROM p2p_inbox i JOIN p2p_messages m ON m.seq = i.last_seq
+                WHERE i.phone = ?
+                ORDER BY i.last_seq DESC
+            ''', (my_phone,)).fetchall()
+
+            names = {}
+            if user_id is not None and rows:
+                names = dict(db.execute(
+                    "SELECT phone, name FROM contacts WHERE user_id = ? AND phone IS NOT NULL",
+                    (user_id,)
+                ).fetchall())
+
+        return [{
+            "contact_phone": row["contact_phone"],
+            "contact_name": names.get(row["contact_phone"], row["contact_phone"]),
+            "last_message": row["content"],
+            "last_message_time": row["timestamp"],
+            "unread_count": row["unread"]
+        } for row in rows]
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# SINGLETON
+# ═══════════════════════════════════════════════════════════════════════════════
+
+_store: Optional[MessageStore] = None
+_store_lock = threading.Lock()
+
+
+def get_message_store(db_path: str) -> MessageStore:
+    """Глобальный MessageStore для montana.db"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = MessageStore(db_path)
+        return _store
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# БЕНЧМАРК
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def benchmark(users: int = 500, messages: int = 200_000, requests: int = 200) -> dict:
+    """
+    /api/conversations и /api/messages: старые запросы по таблице messages
+    против p2p_inbox и keyset-страниц на тех же данных.
+    """
+    import os
+    import random
+    import tempfile
+
+    rng = random.Random(7)
+    root = tempfile.mkdtemp(prefix="montana_messages_")
+    path = os.path.join(root, "montana.db")
+    phones = [f"+7900{i:07d}" for i in range(users)]
+
+    db = sqlite3.connect(path)
+    db.executescript('''
+        CREATE TABLE users (id INTEGER PRIMARY KEY, device_id TEXT UNIQUE, phone TEXT);
+        CREATE TABLE contacts (id INTEGER PRIMARY KEY, user_id INTEGER, name TEXT, phone TEXT);
+        CREATE TABLE messages (id TEXT PRIMARY KEY, from_phone TEXT NOT NULL, to_phone TEXT NOT NULL,
+                               content TEXT NOT NULL, timestamp TEXT NOT NULL, is_read INTEGER DEFAULT 0);
+        CREATE INDEX idx_messages_phones ON messages(from_phone, to_phone);
+        CREATE INDEX idx_messages_timestamp ON messages(timestamp);
+    ''')
+    db.executemany("INSERT INTO users (device_id, phone) VALUES (?, ?)",
+                   ((f"device-{i}", p) for i, p in enumerate(phones)))
+
+    def rows():
+        base = datetime(2026, 1, 9)
+        for n in range(messages):
+            # Половина сообщений — у 20 активных пользователей с сотнями собеседников
+            a = rng.choice(phones[:20]) if rng.random() < 0.5 else rng.choice(phones)
+            b = rng.choice(phones)
+            if a == b:
+                continue
+            ts = datetime.fromtimestamp(base.timestamp() + n * 7.3).isoformat(timespec='microseconds') + 'Z'
+            yield str(uuid.uuid4()), a, b, "x" * 40, ts, int(rng.random() < 0.9)
+
+    db.executemany("INSERT INTO messages VALUES (?, ?, ?, ?, ?, ?)", rows())
+    db.commit()
+
+    start = time.perf_counter()
+    store = MessageStore(path)
+    migrate = time.perf_counter() - start
+
+    sample = [rng.choice(phones[:20]) for _ in range(requests)]
+
+    def legacy_conversations(me):
+        conn = sqlite3.connect(path)
+        cur = conn.cursor()
+        cur.execute('''SELECT DISTINCT CASE WHEN from_phone = ? THEN to_phone ELSE from_phone END
+                       FROM messages WHERE from_phone = ? OR to_phone = ?''', (me, me, me))
+        for (contact,) in cur.fetchall():
+            cur.execute('''SELECT content, timestamp FROM messages
+                           WHERE (from_phone = ? AND to_phone = ?) OR (from_phone = ? AND to_phone = ?)
+                           ORDER BY timestamp DESC LIMIT 1''', (me, contact, contact, me))
+            cur.fetchone()
+            cur.execute('''SELECT COUNT(*) FROM messages
+                           WHERE from_phone = ? AND to_phone = ? AND is_read = 0''', (contact, me))
+            cur.fetchone()
+        conn.close()
+
+    def legacy_messages(me, contact):
+        conn = sqlite3.connect(path)
+        conn.execute('''SELECT * FROM messages
+                        WHERE (from_phone = ? AND to_phone = ?) OR (from_phone = ? AND to_phone = ?)
+                        ORDER BY timestamp ASC LIMIT 100''', (me, contact, contact, me)).fetchall()
+        conn.close()
+
+    result = {"messages": messages, "users": users, "migrate_s": round(migrate, 2)}
+    for label, fn in (
+        ("legacy_conversations", legacy_conversations),
+        ("store_conversations", lambda me: store.conversations(me, 1)),
+        ("legacy_messages", lambda me: legacy_messages(me, phones[-1])),
+        ("store_messages", lambda me: store.messages(me, phones[-1], mark_read=False)),
+    ):
+        start = time.perf_counter()
+        for me in sample:
+            fn(me)
+        result[label + "_ms"] = round((time.perf_counter() - start) / requests * 1000, 3)
+
+    import shutil
+    shutil.rmtree(root, ignore_errors=True)
+    return result
+
+
+if __name__ == "__main__":
+    import sys
+
+    if "--benchmark" in sys.argv:
+        for key, value in benchmark().items():
+            print(f"{key:24} {value}")
+    else:
+        print("Usage: python3 message_store.py --benchmark")
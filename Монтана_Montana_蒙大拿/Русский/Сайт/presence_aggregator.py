@@ -0,0 +1,448 @@
+#!/usr/bin/env python3
+"""
+Presence Aggregator — пакетное начисление присутствия для Юноны
+
+Демон присутствия открывает сессию один раз (подпись ML-DSA-65),
+дальше шлёт пачки секунд, подписанные HMAC ключом сессии. Начисления
+копятся в памяти и раз в FLUSH_INTERVAL пишутся в SQLite одной
+транзакцией для всех устройств (write-behind) — вместе с номерами
+пачек сессий, чтобы повтор после перезапуска не начислил дважды.
+
+Ɉ MONTANA PROTOCOL — ML-DSA-65 (FIPS 204)
+"""
+
+import atexit
+import hashlib
+import hmac
+import json
+import secrets
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+# ML-DSA-65 для открытия сессии
+try:
+    from dilithium_py.ml_dsa import ML_DSA_65
+    HAS_DILITHIUM = True
+except ImportError:
+    HAS_DILITHIUM = False
+
+# Запись накопленных начислений
+FLUSH_INTERVAL = 5.0
+# Устройств в очереди сверх этого — запись сразу, не дожидаясь интервала
+FLUSH_MAX_DEVICES = 50_000
+
+# Как часто демон шлёт пачку (сервер сообщает клиенту при открытии сессии)
+BUNDLE_INTERVAL = 300
+# Максимум секунд в одной пачке (как у /api/presence)
+MAX_BUNDLE_SECONDS = 3600
+# Запас на расхождение часов: начислено за сессию <= прошло времени + запас
+CLOCK_SLACK = 5
+# Время пачки и подписи открытия сессии должны быть не старше
+MAX_CLOCK_SKEW = 300
+
+SESSION_TTL = 24 * 3600
+SESSION_CACHE = 200_000
+
+
+class PresenceError(Exception):
+    """Отказ в начислении; status — HTTP код ответа"""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+
+def session_message(address: str, timestamp: int) -> bytes:
+    """Что подписывает демон при открытии сессии"""
+    return f"PRESENCE_SESSION:{address}:{timestamp}".encode()
+
+
+def bundle_mac(key: bytes, body: bytes) -> str:
+    """Подпись пачки ключом сессии"""
+    return hmac.new(key, body, hashlib.sha256).hexdigest()
+
+
+class _Session:
+    __slots__ = ("session_id", "device_id", "key", "opened_at", "seq", "credited")
+
+    def __init__(self, session_id, device_id, key, opened_at, seq=0, credited=0):
+        self.session_id = session_id
+        self.device_id = device_id
+        self.key = key
+        self.opened_at = opened_at
+        self.seq = seq
+        self.credited = credited
+
+
+class PresenceAggregator:
+    """
+    Сессии демонов присутствия и отложенная запись начислений
+
+    verify(public_key, message, signature) -> bool — проверка ML-DSA-65
+    (по умолчанию dilithium-py). clock — Unix-время.
+    """
+
+    def __init__(self, db_path: str,
+                 flush_interval: float = FLUSH_INTERVAL,
+                 max_devices: int = FLUSH_MAX_DEVICES,
+                 verify: Callable[[bytes, bytes, bytes], bool] = None,
+                 clock: Callable[[], float] = time.time):
+        self.db_path = db_path
+        self.flush_interval = flush_interval
+        self.max_devices = max_devices
+        self.verify = verify or (ML_DSA_65.verify if HAS_DILITHIUM else None)
+        self.clock = clock
+
+        self._db = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS presence_sessions (
+                device_id TEXT PRIMARY KEY,
+                session_id TEXT UNIQUE NOT NULL,
+                key TEXT NOT NULL,
+                opened_at REAL NOT NULL,
+                seq INTEGER DEFAULT 0,
+                credited INTEGER DEFAULT 0
+            )
+        """)
+        self._db_lock = threading.Lock()
+
+        self._lock = threading.Lock()
+        self._sessions: Dict[str, _Session] = {}
+        self._by_device: Dict[str, str] = {}
+        self._pending: Dict[str, int] = {}
+        self._dirty: Dict[str, _Session] = {}
+        self._recent_opens: Dict[bytes, float] = {}
+        self._pruned_at = 0.0
+
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        self.stats = {"sessions_opened": 0, "bundles": 0, "rejected": 0,
+                      "seconds": 0, "flushes": 0, "devices_flushed": 0,
+                      "last_flush_ms": 0.0}
+
+    # ─── Сессии ───
+
+    def open_session(self, address: str, public_key_hex: str,
+                     timestamp: int, signature_hex: str) -> Tuple[str, bytes]:
+        """Проверяет подпись демона и выдаёт (session_id, ключ HMAC)"""
+        if self.verify is None:
+            raise PresenceError("ML-DSA-65 verification unavailable", 503)
+        try:
+            public_key = bytes.fromhex(public_key_hex)
+            signature = bytes.fromhex(signature_hex)
+            timestamp = int(timestamp)
+        except (TypeError, ValueError):
+            raise PresenceError("Malformed session request")
+
+        now = self.clock()
+        if abs(now - timestamp) > MAX_CLOCK_SKEW:
+            raise PresenceError("Session timestamp out of range")
+        if address != "mt" + hashlib.sha256(public_key).hexdigest()[:40]:
+            raise PresenceError("Address does not match public key", 401)
+
+        # Перехваченный запрос открытия не открывает вторую сессию; подпись
+        # занимается до проверки, чтобы два одновременных запроса не прошли оба
+        digest = hashlib.sha256(signature).digest()
+        with self._lock:
+            if now - self._pruned_at > MAX_CLOCK_SKEW:
+                self._recent_opens = {d: t for d, t in self._recent_opens.items()
+                                      if now - t <= MAX_CLOCK_SKEW}
+                self._pruned_at = now
+            if digest in self._recent_opens:
+                raise PresenceError("Session request replayed", 409)
+            self._recent_opens[digest] = now
+
+        try:
+            if not self.verify(public_key, session_message(address, timestamp), signature):
+                raise PresenceError("Invalid signature", 401)
+
+            with self._db_lock:
+                if not self._db.execute("SELECT 1 FROM users WHERE device_id = ?",
+                                        (address,)).fetchone():
+                    raise PresenceError("User not found", 404)
+        except BaseException:
+            # Сессия не открыта — подпись освобождается
+            with self._lock:
+                self._recent_opens.pop(digest, None)
+            raise
+
+        session = _Session(secrets.token_hex(16), address, secrets.token_bytes(32), now)
+        # Новая сессия устройства вытесняет старую: параллельные демоны не удваивают время
+        with self._db_lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO presence_sessions "
+                "(device_id, session_id, key, opened_at) VALUES (?, ?, ?, ?)",
+                (address, session.session_id, session.key.hex(), now)
+            )
+        with self._lock:
+            self._dirty.pop(address, None)
+            self._sessions.pop(self._by_device.get(address), None)
+            self._remember(session)
+            self.stats["sessions_opened"] += 1
+        return session.session_id, session.key
+
+    def _remember(self, session: _Session):
+        if len(self._sessions) >= SESSION_CACHE:
+            # Выбрасываем старейшие чистые сессии; они подгрузятся из SQLite
+            for sid in list(self._sessions)[:SESSION_CACHE // 10]:
+                device = self._sessions[sid].device_id
+                if device not in self._dirty:
+                    del self._sessions[sid]
+                    self._by_device.pop(device, None)
+        self._sessions[session.session_id] = session
+        self._by_device[session.device_id] = session.session_id
+
+    def _session(self, session_id: str) -> Optional[_Session]:
+        with self._lock:
+            session = self._sessions.get(session_id)
+        if session is not None:
+            return session
+
+        with self._db_lock:
+            row = self._db.execute(
+                "SELECT device_id, key, opened_at, seq, credited FROM presence_sessions "
+                "WHERE session_id = ?", (session_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        with self._lock:
+            # Пока читали, сессию могли подгрузить или вытеснить
+            session = self._sessions.get(session_id)
+            if session is None:
+                if row[0] in self._by_device:
+                    # У устройства уже другая, более новая сессия
+                    return None
+                session = _Session(session_id, row[0], bytes.fromhex(row[1]), row[2], row[3], row[4])
+                self._remember(session)
+        return session
+
+    # ─── Пачки ───
+
+    def submit_bundle(self, session_id: str, body: bytes, mac: str) -> Dict[str, int]:
+        """
+        Принимает пачку {"seq", "seconds", "ts"} с подписью HMAC
+
+        401 — сессии нет или истекла (демон открывает новую),
+        409 — повтор или секунд больше, чем прошло времени.
+        """
+        session = self._session(session_id or "")
+        now = self.clock()
+        if session is None or now - session.opened_at > SESSION_TTL:
+            self.stats["rejected"] += 1
+            raise PresenceError("Unknown or expired session", 401)
+        if not hmac.compare_digest(bundle_mac(session.key, body), mac or ""):
+            self.stats["rejected"] += 1
+            raise PresenceError("Invalid bundle signature", 401)
+
+        try:
+            bundle = json.loads(body)
+            seq, seconds, ts = int(bundle["seq"]), int(bundle["seconds"]), float(bundle["ts"])
+        except (ValueError, TypeError, KeyError):
+            self.stats["rejected"] += 1
+            raise PresenceError("Malformed bundle")
+
+        if not 0 < seconds <= MAX_BUNDLE_SECONDS:
+            self.stats["rejected"] += 1
+            raise PresenceError(f"Invalid seconds (1-{MAX_BUNDLE_SECONDS})")
+        if abs(now - ts) > MAX_CLOCK_SKEW:
+            self.stats["rejected"] += 1
+            raise PresenceError("Bundle timestamp out of range", 409)
+
+        with self._lock:
+            if self._sessions.get(session_id) is not session:
+                self.stats["rejected"] += 1
+                raise PresenceError("Session replaced", 401)
+            if seq <= session.seq:
+                self.stats["rejected"] += 1
+                raise PresenceError("Bundle replayed", 409)
+            if session.credited + seconds > now - session.opened_at + CLOCK_SLACK:
+                self.stats["rejected"] += 1
+                raise PresenceError("Presence exceeds session time", 409)
+
+            session.seq = seq
+            session.credited += seconds
+            self._dirty[session.device_id] = session
+            pending = self._pending.get(session.device_id, 0) + seconds
+            self._pending[session.device_id] = pending
+            self.stats["bundles"] += 1
+            self.stats["seconds"] += seconds
+            overflow = len(self._pending) >= self.max_devices
+
+        if overflow:
+            self._wake.set()
+        return {"accepted": seconds, "pending": pending}
+
+    def add(self, device_id: str, seconds: int) -> int:
+        """Начисление без сессии (старый /api/presence); возвращает ожидающие секунды"""
+        with self._lock:
+            pending = self._pending.get(device_id, 0) + seconds
+            self._pending[device_id] = pending
+            self.stats["seconds"] += seconds
+            overflow = len(self._pending) >= self.max_devices
+        if overflow:
+            self._wake.set()
+        return pending
+
+    def pending(self, device_id: str) -> int:
+        """Начислено, но ещё не записано в SQLite"""
+        with self._lock:
+            return self._pending.get(device_id, 0)
+
+    # ─── Запись ───
+
+    def flush(self) -> int:
+        """Пишет все накопленные начисления одной транзакцией; возвращает число устройств"""
+        with self._lock:
+            credits, self._pending = self._pending, {}
+            dirty, self._dirty = self._dirty, {}
+            sessions = [(s.seq, s.credited, s.session_id) for s in dirty.values()]
+        if not credits and not sessions:
+            return 0
+
+        started = time.perf_counter()
+        try:
+            with self._db_lock:
+                self._db.execute("BEGIN IMMEDIATE")
+                try:
+                    self._db.executemany(
+                        "UPDATE users SET balance = balance + ?, presence_seconds = presence_seconds + ?, "
+                        "last_seen = CURRENT_TIMESTAMP WHERE device_id = ?",
+                        ((seconds, seconds, device) for device, seconds in credits.items())
+                    )
+                    self._db.executemany(
+                        "UPDATE presence_sessions SET seq = ?, credited = ? WHERE session_id = ?",
+                        sessions
+                    )
+                    self._db.execute("COMMIT")
+                except BaseException:
+                    self._db.execute("ROLLBACK")
+                    raise
+        except Exception as e:
+            # Не потерять начисления: вернуть в очередь до следующей записи
+            with self._lock:
+                for device, seconds in credits.items():
+                    self._pending[device] = self._pending.get(device, 0) + seconds
+                for device, session in dirty.items():
+                    self._dirty.setdefault(device, session)
+            print(f"[Presence] flush error: {e}")
+            return 0
+
+        self.stats["flushes"] += 1
+        self.stats["devices_flushed"] += len(credits)
+        self.stats["last_flush_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        return len(credits)
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def start(self):
+        """Фоновая запись раз в flush_interval"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="presence-flush", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Остановить фон и записать остаток"""
+        self._stopped.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+
+_aggregator: Optional[PresenceAggregator] = None
+_aggregator_lock = threading.Lock()
+
+
+def get_presence_aggregator(db_path: str) -> PresenceAggregator:
+    """Общий агрегатор процесса (запускает фоновую запись)"""
+    global _aggregator
+    with _aggregator_lock:
+        if _aggregator is None:
+            _aggregator = PresenceAggregator(db_path)
+            _aggregator.start()
+            # Остаток очереди пишется при остановке процесса
+            atexit.register(_aggregator.stop)
+        return _aggregator
+
+
+# =============================================================================
+# BENCHMARK
+# =============================================================================
+
+def benchmark(devices: int = 100_000, legacy_calls: int = 2000) -> dict:
+    """
+    Одна пачка от каждого из devices демонов + запись, против старого
+    пути (SELECT + UPDATE + COMMIT на каждый вызов) на legacy_calls вызовах
+    """
+    import os
+    import tempfile
+
+    path = os.path.join(tempfile.mkdtemp(prefix="montana_presence_"), "montana.db")
+    db = sqlite3.connect(path)
+    db.execute("""
+        CREATE TABLE users (id INTEGER PRIMARY KEY, device_id TEXT UNIQUE NOT NULL,
+                            balance INTEGER DEFAULT 0, presence_seconds INTEGER DEFAULT 0,
+                            last_seen TEXT DEFAULT CURRENT_TIMESTAMP)
+    """)
+    public_keys = [i.to_bytes(8, "big") for i in range(devices)]
+    addresses = ["mt" + hashlib.sha256(pk).hexdigest()[:40] for pk in public_keys]
+    db.executemany("INSERT INTO users (device_id) VALUES (?)", ((a,) for a in addresses))
+    db.commit()
+
+    # Старый путь
+    db.execute("PRAGMA journal_mode=WAL")
+    started = time.perf_counter()
+    for address in addresses[:legacy_calls]:
+        user = db.execute("SELECT * FROM users WHERE device_id = ?", (address,)).fetchone()
+        db.execute("UPDATE users SET balance = ?, presence_seconds = ?, last_seen = CURRENT_TIMESTAMP "
+                   "WHERE device_id = ?", (user[2] + 30, user[3] + 30, address))
+        db.commit()
+    legacy = legacy_calls / (time.perf_counter() - started)
+    db.close()
+
+    # Сессии открываются раз в сутки — подпись здесь не измеряется
+    opened_at = [time.time() - BUNDLE_INTERVAL]
+    aggregator = PresenceAggregator(path, max_devices=devices + 1,
+                                    verify=lambda *args: True, clock=lambda: opened_at[0])
+    sessions = [aggregator.open_session(a, pk.hex(), int(opened_at[0]), "%064x" % i)
+                for i, (a, pk) in enumerate(zip(addresses, public_keys))]
+    opened_at[0] += BUNDLE_INTERVAL
+
+    bodies = [json.dumps({"seq": 1, "seconds": BUNDLE_INTERVAL, "ts": opened_at[0]}).encode()
+              for _ in range(devices)]
+    started = time.perf_counter()
+    for (sid, key), body in zip(sessions, bodies):
+        aggregator.submit_bundle(sid, body, bundle_mac(key, body))
+    accepted = time.perf_counter() - started
+
+    started = time.perf_counter()
+    flushed = aggregator.flush()
+    flush_time = time.perf_counter() - started
+
+    result = {
+        "legacy_calls_per_sec": round(legacy),
+        "bundles_per_sec": round(devices / accepted),
+        "flush_devices": flushed,
+        "flush_seconds": round(flush_time, 2),
+        "fleet_per_node": round(BUNDLE_INTERVAL * devices / (accepted + flush_time)),
+    }
+    for name, value in result.items():
+        print(f"{name:22} {value}")
+    return result
+
+
+if __name__ == "__main__":
+    import sys
+
+    if "--benchmark" in sys.argv:
+        benchmark()
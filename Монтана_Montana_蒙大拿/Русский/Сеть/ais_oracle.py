@@ -14,14 +14,26 @@ AIS (Automatic Identification System) — международный станд
 
 Montana использует эту инфраструктуру как оракул времени:
 время судна в порту → Ɉ
+
+Потоковый приём: пакеты NMEA (!AIVDM) или JSON → дедупликация
+в скользящем окне → порт по сеточному индексу → конечный автомат
+на каждое судно (MMSI) → завершённые стоянки пишутся на диск.
 """
 
+from collections import deque
 from dataclasses import dataclass, field
 from datetime import datetime, timezone, timedelta
 from decimal import Decimal
-from typing import Dict, List, Optional, Tuple
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
 from enum import Enum
+import csv
 import hashlib
+import json
+import math
+import os
+import sys
+import time
 
 
 class VesselStatus(Enum):
@@ -71,7 +83,19 @@ class PortStay:
     port_name: str
     arrival: str            # ISO timestamp
     departure: Optional[str] = None  # None = ещё в порту
-    messages: List[str] = field(default_factory=list)  # Hashes AIS сообщений
+    messages: List[str] = field(default_factory=list)  # Hashes последних AIS сообщений
+    message_count: int = 0  # Всего сообщений за стоянку
+    evidence: str = ""      # Цепочка hash всех сообщений: sha256(evidence + hash)
+
+    EVIDENCE_LIMIT = 32     # Сколько последних hash хранить в messages
+
+    def add_evidence(self, msg_hash: str) -> None:
+        """Добавить сообщение как доказательство присутствия."""
+        self.message_count += 1
+        self.evidence = hashlib.sha256((self.evidence + msg_hash).encode()).hexdigest()
+        self.messages.append(msg_hash)
+        if len(self.messages) > self.EVIDENCE_LIMIT:
+            del self.messages[0]
 
     @property
     def duration_seconds(self) -> int:
@@ -91,6 +115,432 @@ class PortStay:
         # 1 секунда = 1 Ɉ (при текущем halving)
         return Decimal(self.duration_seconds)
 
+    def to_dict(self) -> dict:
+        return {
+            "mmsi": self.vessel_mmsi,
+            "name": self.vessel_name,
+            "port": self.port_name,
+            "arrival": self.arrival,
+            "departure": self.departure,
+            "messages": self.messages,
+            "message_count": self.message_count,
+            "evidence": self.evidence
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'PortStay':
+        return cls(
+            vessel_mmsi=data["mmsi"],
+            vessel_name=data["name"],
+            port_name=data["port"],
+            arrival=data["arrival"],
+            departure=data.get("departure"),
+            messages=list(data.get("messages", [])),
+            message_count=data.get("message_count", 0),
+            evidence=data.get("evidence", "")
+        )
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+#                         ПОРТЫ
+# ═══════════════════════════════════════════════════════════════════════════════
+
+KM_PER_DEG = 111.195      # Длина градуса меридиана
+DEFAULT_PORTS_FILE = Path(__file__).parent / "ports.json"
+
+
+@dataclass
+class Port:
+    """Порт: центр + радиус акватории или полигон."""
+    name: str
+    lat: float
+    lon: float
+    radius_km: float = 10.0
+    country: str = ""
+    polygon: Optional[List[Tuple[float, float]]] = None  # [(lat, lon), ...]
+
+    def bbox(self) -> Tuple[float, float, float, float]:
+        """(lat_min, lat_max, lon_min, lon_max)"""
+        if self.polygon:
+            lats = [p[0] for p in self.polygon]
+            lons = [p[1] for p in self.polygon]
+            return min(lats), max(lats), min(lons), max(lons)
+        dlat = self.radius_km / KM_PER_DEG
+        dlon = dlat / max(math.cos(math.radians(self.lat)), 1e-6)
+        return self.lat - dlat, self.lat + dlat, self.lon - dlon, self.lon + dlon
+
+    def distance(self, lat: float, lon: float) -> Optional[float]:
+        """
+        Расстояние до центра в км, если точка внутри порта, иначе None.
+
+        В пределах акватории (десятки км) равнопромежуточная проекция
+        отличается от haversine на доли процента и в разы дешевле.
+        """
+        dlon = (lon - self.lon + 180.0) % 360.0 - 180.0
+        dx = dlon * KM_PER_DEG * math.cos(math.radians((lat + self.lat) / 2))
+        dy = (lat - self.lat) * KM_PER_DEG
+        dist = math.sqrt(dx * dx + dy * dy)
+        if self.polygon:
+            return dist if self._in_polygon(lat, lon) else None
+        return dist if dist <= self.radius_km else None
+
+    def _in_polygon(self, lat: float, lon: float) -> bool:
+        """Ray casting по (lon, lat)."""
+        inside = False
+        points = self.polygon
+        j = len(points) - 1
+        for i in range(len(points)):
+            lat_i, lon_i = points[i]
+            lat_j, lon_j = points[j]
+            if (lat_i > lat) != (lat_j > lat):
+                cross = lon_i + (lat - lat_i) * (lon_j - lon_i) / (lat_j - lat_i)
+                if lon < cross:
+                    inside = not inside
+            j = i
+        return inside
+
+
+def load_ports(path: Optional[str] = None) -> List[Port]:
+    """
+    Загрузить порты.
+
+    JSON: {"ports": [{"name", "lat", "lon", "radius_km", "country", "polygon"}]}
+    CSV (World Port Index и аналоги): колонки с названием порта, широтой
+    и долготой определяются по заголовку.
+    """
+    path = Path(path) if path else DEFAULT_PORTS_FILE
+
+    if path.suffix.lower() == ".csv":
+        ports = []
+        with open(path, "r", encoding="utf-8-sig", newline="") as f:
+            reader = csv.DictReader(f)
+            columns = {name.lower(): name for name in reader.fieldnames or []}
+
+            def column(*candidates):
+                for candidate in candidates:
+                    for lower, original in columns.items():
+                        if candidate in lower:
+                            return original
+                raise ValueError(f"Port CSV has no column like {candidates[0]}: {path}")
+
+            name_col = column("main port name", "port name", "name")
+            lat_col = column("latitude", "lat")
+            lon_col = column("longitude", "lon")
+            for row in reader:
+                try:
+                    ports.append(Port(row[name_col], float(row[lat_col]), float(row[lon_col])))
+                except (TypeError, ValueError):
+                    continue
+        return ports
+
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    entries = data["ports"] if isinstance(data, dict) else data
+    return [
+        Port(
+            name=entry["name"],
+            lat=entry["lat"],
+            lon=entry["lon"],
+            radius_km=entry.get("radius_km", 10.0),
+            country=entry.get("country", ""),
+            polygon=[tuple(p) for p in entry["polygon"]] if entry.get("polygon") else None
+        )
+        for entry in entries
+    ]
+
+
+class PortIndex:
+    """
+    Сеточный индекс портов.
+
+    Порт регистрируется во всех ячейках CELL_DEG°, которые пересекает его
+    bounding box. Позиция в открытом море — один промах по словарю;
+    в порту — проверка 1-2 кандидатов.
+    """
+
+    CELL_DEG = 0.5
+    LON_CELLS = round(360 / CELL_DEG)
+
+    def __init__(self, ports: Iterable[Port] = ()):
+        self.ports: List[Port] = []
+        self._cells: Dict[Tuple[int, int], List[Port]] = {}
+        for port in ports:
+            self.add(port)
+
+    def _cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        return int((lat + 90) // self.CELL_DEG), int(((lon + 180) % 360) // self.CELL_DEG)
+
+    def add(self, port: Port) -> None:
+        self.ports.append(port)
+        lat_lo, lat_hi, lon_lo, lon_hi = port.bbox()
+        row_lo, row_hi = self._cell(lat_lo, 0)[0], self._cell(lat_hi, 0)[0]
+        col_lo = int((lon_lo + 180) // self.CELL_DEG)
+        col_hi = int((lon_hi + 180) // self.CELL_DEG)
+        for row in range(row_lo, row_hi + 1):
+            for col in range(col_lo, col_hi + 1):
+                self._cells.setdefault((row, col % self.LON_CELLS), []).append(port)
+
+    def locate(self, lat: float, lon: float) -> Optional[Port]:
+        """Порт, в акватории которого находится точка (ближайший центр)."""
+        candidates = self._cells.get(self._cell(lat, lon))
+        if not candidates:
+            return None
+
+        best, best_dist = None, None
+        for port in candidates:
+            dist = port.distance(lat, lon)
+            if dist is not None and (best_dist is None or dist < best_dist):
+                best, best_dist = port, dist
+        return best
+
+    def __len__(self) -> int:
+        return len(self.ports)
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+#                         NMEA
+# ═══════════════════════════════════════════════════════════════════════════════
+
+# 6-битная «бронировка» AIS: '0'..'W' → 0..39, '`'..'w' → 40..63.
+# Символ → строка из 6 бит: payload.translate() + int(..., 2) работают на C
+_SIXBIT = {c: c - 48 for c in range(48, 88)}
+_SIXBIT.update({c: c - 56 for c in range(96, 120)})
+_SIXBIT_BITS = {c: format(v, "06b") for c, v in _SIXBIT.items()}
+
+STATUS_UNKNOWN = -1       # Class B не передаёт навигационный статус
+MOORED_SPEED_KN = 0.5     # Быстрее — судно в движении
+
+
+def _bits(payload: str) -> Tuple[int, int]:
+    bits = payload.translate(_SIXBIT_BITS)
+    if len(bits) != len(payload) * 6:
+        raise ValueError(f"Invalid AIS payload: {payload}")
+    return int(bits, 2), len(bits)
+
+
+def _uint(value: int, total: int, start: int, length: int) -> int:
+    return (value >> (total - start - length)) & ((1 << length) - 1)
+
+
+def _int(value: int, total: int, start: int, length: int) -> int:
+    raw = _uint(value, total, start, length)
+    return raw - (1 << length) if raw & (1 << (length - 1)) else raw
+
+
+def _text(value: int, total: int, start: int, length: int) -> str:
+    chars = []
+    for offset in range(start, start + length, 6):
+        code = _uint(value, total, offset, 6)
+        chars.append(chr(code + 64) if code < 32 else chr(code))
+    return "".join(chars).rstrip("@ ").strip()
+
+
+def _checksum(body: str) -> int:
+    """XOR всех байт: сворачиваем число пополам, пока не останется байт."""
+    data = body.encode("ascii")
+    value = int.from_bytes(data, "little")
+    width = len(data)
+    while width > 1:
+        half = (width + 1) // 2
+        value = (value & ((1 << (half * 8)) - 1)) ^ (value >> (half * 8))
+        width = half
+    return value
+
+
+class NMEADecoder:
+    """
+    Декодер !AIVDM/!AIVDO.
+
+    Поддерживаются позиционные отчёты Class A (типы 1-3), Class B (18)
+    и статические данные (5, собирается из фрагментов). Время берётся
+    из tag block (\\c:unix\\), иначе — время приёма пакета.
+
+    decode() возвращает кортеж:
+    - ("pos", mmsi, lat, lon, sog, cog, status, ts)
+    - ("static", mmsi, name, imo)
+    - None — неподдерживаемый тип, битая контрольная сумма, неполный фрагмент
+    """
+
+    FRAGMENT_LIMIT = 1024    # Незавершённых многочастных сообщений
+
+    def __init__(self):
+        self._fragments: Dict[Tuple[str, str], List[str]] = {}
+        self.errors = 0
+
+    def decode(self, line: str, received_at: float) -> Optional[tuple]:
+        line = line.strip()
+        timestamp = received_at
+
+        # Tag block: \s:station,c:1700000000*hh\!AIVDM,...
+        if line.startswith("\\"):
+            end = line.find("\\", 1)
+            if end < 0:
+                self.errors += 1
+                return None
+            for part in line[1:end].split("*")[0].split(","):
+                if part.startswith("c:"):
+                    try:
+                        timestamp = float(part[2:])
+                    except ValueError:
+                        pass
+            line = line[end + 1:]
+
+        star = line.rfind("*")
+        if not line.startswith("!") or star < 0:
+            self.errors += 1
+            return None
+        try:
+            if _checksum(line[1:star]) != int(line[star + 1:star + 3], 16):
+                self.errors += 1
+                return None
+            _, count, number, seq_id, channel, payload, _ = line[:star].split(",")
+            count, number = int(count), int(number)
+        except ValueError:
+            self.errors += 1
+            return None
+
+        if count > 1:
+            key = (seq_id, channel)
+            parts = self._fragments.setdefault(key, [])
+            parts.append(payload)
+            if number < count:
+                if len(self._fragments) > self.FRAGMENT_LIMIT:
+                    self._fragments.pop(next(iter(self._fragments)))
+                return None
+            payload = "".join(self._fragments.pop(key))
+
+        try:
+            value, total = _bits(payload)
+        except ValueError:
+            self.errors += 1
+            return None
+        if total < 38:
+            return None
+
+        msg_type = _uint(value, total, 0, 6)
+        mmsi = str(_uint(value, total, 8, 30)).zfill(9)
+
+        if msg_type in (1, 2, 3) and total >= 137:
+            lon = _int(value, total, 61, 28) / 600000.0
+            lat = _int(value, total, 89, 27) / 600000.0
+            if abs(lat) > 90 or abs(lon) > 180:
+                return None
+            return ("pos", mmsi, lat, lon,
+                    _uint(value, total, 50, 10) / 10.0,
+                    _uint(value, total, 116, 12) / 10.0,
+                    _uint(value, total, 38, 4),
+                    timestamp)
+
+        if msg_type == 18 and total >= 133:
+            lon = _int(value, total, 57, 28) / 600000.0
+            lat = _int(value, total, 85, 27) / 600000.0
+            if abs(lat) > 90 or abs(lon) > 180:
+                return None
+            return ("pos", mmsi, lat, lon,
+                    _uint(value, total, 46, 10) / 10.0,
+                    _uint(value, total, 112, 12) / 10.0,
+                    STATUS_UNKNOWN,
+                    timestamp)
+
+        if msg_type == 5 and total >= 232:
+            imo = _uint(value, total, 40, 30)
+            return ("static", mmsi, _text(value, total, 112, 120), str(imo) if imo else "")
+
+        return None
+
+
+def _armor(fields: List[Tuple[int, int]]) -> str:
+    """[(значение, бит)] → payload AIS (для реплея и тестов)."""
+    value, total = 0, 0
+    for field_value, length in fields:
+        value = (value << length) | (field_value & ((1 << length) - 1))
+        total += length
+    pad = -total % 6
+    value <<= pad
+    total += pad
+
+    chars = []
+    for offset in range(0, total, 6):
+        code = (value >> (total - offset - 6)) & 0x3F
+        chars.append(chr(code + 48) if code < 40 else chr(code + 56))
+    return "".join(chars)
+
+
+def encode_position_report(
+    mmsi: str,
+    lat: float,
+    lon: float,
+    sog: float,
+    cog: float,
+    status: int,
+    timestamp: Optional[float] = None
+) -> str:
+    """Сформировать предложение !AIVDM типа 1 (Class A)."""
+    payload = _armor([
+        (1, 6), (0, 2), (int(mmsi), 30), (status, 4), (128, 8),
+        (int(round(sog * 10)), 10), (0, 1),
+        (int(round(lon * 600000)), 28), (int(round(lat * 600000)), 27),
+        (int(round(cog * 10)), 12), (511, 9), (0, 6), (0, 2), (0, 3), (0, 1), (0, 19)
+    ])
+    body = f"AIVDM,1,1,,A,{payload},0"
+    sentence = f"!{body}*{_checksum(body):02X}"
+    if timestamp is not None:
+        tag = f"c:{int(timestamp)}"
+        sentence = f"\\{tag}*{_checksum(tag):02X}\\{sentence}"
+    return sentence
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+#                         ПОТОКОВЫЙ ПРИЁМ
+# ═══════════════════════════════════════════════════════════════════════════════
+
+class RollingHashWindow:
+    """Ограниченное окно последних сообщений для дедупликации между источниками."""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._order: deque = deque()
+        self._seen: set = set()
+
+    def add(self, key) -> bool:
+        """True — сообщение новое; False — уже было в окне."""
+        if key in self._seen:
+            return False
+        self._seen.add(key)
+        self._order.append(key)
+        if len(self._order) > self.capacity:
+            self._seen.discard(self._order.popleft())
+        return True
+
+    def __len__(self) -> int:
+        return len(self._order)
+
+
+class VesselState:
+    """Конечный автомат судна: в движении ↔ стоянка в порту."""
+
+    __slots__ = ("mmsi", "stay", "last_seen")
+
+    def __init__(self, mmsi: str):
+        self.mmsi = mmsi
+        self.stay: Optional[PortStay] = None
+        self.last_seen = 0.0
+
+    @property
+    def in_port(self) -> bool:
+        return self.stay is not None
+
+
+_last_iso: Tuple[float, str] = (-1.0, "")
+
+
+def _iso(timestamp: float) -> str:
+    """unix → ISO; в потоке соседние сообщения часто с одной секундой."""
+    global _last_iso
+    if _last_iso[0] != timestamp:
+        _last_iso = (timestamp, datetime.fromtimestamp(timestamp, timezone.utc).isoformat())
+    return _last_iso[1]
+
 
 class AISOracle:
     """
@@ -107,11 +557,37 @@ class AISOracle:
         "AIS2": "162.025 MHz",  # Channel 88B
     }
 
-    def __init__(self):
+    DEDUP_WINDOW = 500_000        # Сообщений в окне дедупликации
+    CHECKPOINT_INTERVAL = 30.0    # Секунд между checkpoint активных стоянок
+    COMPLETED_FLUSH = 1000        # Завершённых стоянок в буфере до записи
+
+    def __init__(
+        self,
+        data_dir: Optional[str] = None,
+        ports: Optional[Iterable[Port]] = None
+    ):
         self.sources: Dict[OracleSource, bool] = {s: False for s in OracleSource}
-        self.messages: List[AISMessage] = []
         self.port_stays: Dict[str, PortStay] = {}  # key = mmsi:port
 
+        self.ports = PortIndex(load_ports() if ports is None else ports)
+        self.decoder = NMEADecoder()
+        self.messages_received = 0
+        self.duplicates = 0
+
+        self._window = RollingHashWindow(self.DEDUP_WINDOW)
+        self._vessels: Dict[str, VesselState] = {}
+        self._static: Dict[str, Tuple[str, str]] = {}   # mmsi → (name, imo)
+        self._completed: List[PortStay] = []
+
+        # Checkpoint на диск (если задана директория)
+        self.data_dir = Path(data_dir) if data_dir else None
+        self._last_checkpoint = time.time()
+        if self.data_dir:
+            self.data_dir.mkdir(parents=True, exist_ok=True)
+            self.stays_file = self.data_dir / "port_stays.jsonl"
+            self.checkpoint_file = self.data_dir / "ais_checkpoint.json"
+            self._restore()
+
     def register_source(self, source: OracleSource) -> None:
         """Зарегистрировать источник данных."""
         self.sources[source] = True
@@ -127,52 +603,171 @@ class AISOracle:
             Hash сообщения
         """
         msg_hash = message.to_hash()
-        self.messages.append(message)
-
-        # Если судно пришвартовано — начать отсчёт времени
-        if message.status == VesselStatus.MOORED:
-            self._track_port_stay(message)
+        if message.name:
+            self._static[message.mmsi] = (message.name, message.imo)
 
+        timestamp = datetime.fromisoformat(message.timestamp.replace('Z', '+00:00')).timestamp()
+        self._process(
+            message.mmsi, message.latitude, message.longitude, message.speed,
+            message.status.value, timestamp, message.timestamp
+        )
         return msg_hash
 
-    def _track_port_stay(self, message: AISMessage) -> None:
-        """Отслеживать пребывание в порту."""
-        # Определить порт по координатам (упрощённо)
-        port = self._detect_port(message.latitude, message.longitude)
-        if not port:
-            return
+    # ─────────────────────────────────────────────────────────────────────────
+    #                            ПАКЕТЫ
+    # ─────────────────────────────────────────────────────────────────────────
 
-        key = f"{message.mmsi}:{port}"
+    def ingest_nmea(
+        self,
+        lines: Iterable[str],
+        source: OracleSource = OracleSource.AIS_HUB,
+        received_at: Optional[float] = None
+    ) -> int:
+        """
+        Принять пакет предложений NMEA.
 
-        if key not in self.port_stays:
-            # Новое прибытие
-            self.port_stays[key] = PortStay(
-                vessel_mmsi=message.mmsi,
-                vessel_name=message.name,
-                port_name=port,
-                arrival=message.timestamp
+        Returns:
+            Количество новых (не дубликатов) позиционных сообщений
+        """
+        self.sources[source] = True
+        received_at = time.time() if received_at is None else received_at
+        decode = self.decoder.decode
+        process = self._process
+        accepted = 0
+
+        for line in lines:
+            decoded = decode(line, received_at)
+            if decoded is None:
+                continue
+            if decoded[0] == "pos":
+                _, mmsi, lat, lon, sog, _, status, timestamp = decoded
+                if process(mmsi, lat, lon, sog, status, timestamp):
+                    accepted += 1
+            else:
+                _, mmsi, name, imo = decoded
+                self._static[mmsi] = (name, imo)
+
+        self._maybe_checkpoint()
+        return accepted
+
+    def ingest_json(
+        self,
+        records: Iterable[dict],
+        source: OracleSource = OracleSource.AIS_HUB
+    ) -> int:
+        """
+        Принять пакет JSON-записей (формат агрегаторов: mmsi, lat/latitude,
+        lon/longitude, sog/speed, status, timestamp ISO или unix, name, imo).
+        """
+        self.sources[source] = True
+        accepted = 0
+
+        for record in records:
+            try:
+                mmsi = str(record["mmsi"]).zfill(9)
+                lat = float(record.get("lat", record.get("latitude")))
+                lon = float(record.get("lon", record.get("longitude")))
+                sog = float(record.get("sog", record.get("speed", 0.0)) or 0.0)
+                status = record.get("status", record.get("nav_status", STATUS_UNKNOWN))
+                if isinstance(status, str):
+                    status = VesselStatus[status.upper()].value
+                timestamp = record.get("timestamp")
+                iso = None
+                if isinstance(timestamp, str):
+                    iso = timestamp
+                    timestamp = datetime.fromisoformat(timestamp.replace('Z', '+00:00')).timestamp()
+                elif timestamp is None:
+                    timestamp = time.time()
+            except (KeyError, TypeError, ValueError):
+                continue
+
+            if record.get("name"):
+                self._static[mmsi] = (record["name"], str(record.get("imo", "")))
+            if self._process(mmsi, lat, lon, sog, int(status), float(timestamp), iso):
+                accepted += 1
+
+        self._maybe_checkpoint()
+        return accepted
+
+    # ─────────────────────────────────────────────────────────────────────────
+    #                            АВТОМАТ СУДНА
+    # ─────────────────────────────────────────────────────────────────────────
+
+    def _process(
+        self,
+        mmsi: str,
+        lat: float,
+        lon: float,
+        sog: float,
+        status: int,
+        timestamp: float,
+        iso: Optional[str] = None
+    ) -> bool:
+        """Одно позиционное сообщение: дедупликация → порт → переход состояния."""
+        if not self._window.add((mmsi, timestamp, lat, lon)):
+            self.duplicates += 1
+            return False
+        self.messages_received += 1
+
+        state = self._vessels.get(mmsi)
+        if state is None:
+            state = self._vessels[mmsi] = VesselState(mmsi)
+        state.last_seen = timestamp
+
+        port = self.ports.locate(lat, lon)
+        moored = status == VesselStatus.MOORED.value or (
+            status == STATUS_UNKNOWN and sog <= MOORED_SPEED_KN
+        )
+        stay = state.stay
+
+        if moored and port is not None:
+            if stay is not None and stay.port_name != port.name:
+                self._close_stay(state, timestamp)
+                stay = None
+
+            iso = iso or _iso(timestamp)
+            if stay is None:
+                stay = self._open_stay(state, port, iso)
+            stay.add_evidence(
+                hashlib.sha256(f"{mmsi}:{iso}:{lat}:{lon}".encode()).hexdigest()
             )
 
-        # Добавить сообщение как доказательство
-        self.port_stays[key].messages.append(message.to_hash())
+        elif stay is not None and (
+            port is None or port.name != stay.port_name or sog > MOORED_SPEED_KN
+        ):
+            # Отход: движение или позиция вне акватории порта
+            self._close_stay(state, timestamp)
 
-    def _detect_port(self, lat: float, lon: float) -> Optional[str]:
-        """Определить порт по координатам (упрощённо)."""
-        # Основные порты мира (примерные координаты)
-        PORTS = {
-            "Rotterdam": (51.9, 4.5),
-            "Singapore": (1.3, 103.8),
-            "Shanghai": (31.2, 121.5),
-            "Dubai": (25.0, 55.0),
-            "Los Angeles": (33.7, -118.3),
-        }
+        return True
 
-        for port_name, (port_lat, port_lon) in PORTS.items():
-            # Простая проверка близости (0.5 градуса)
-            if abs(lat - port_lat) < 0.5 and abs(lon - port_lon) < 0.5:
-                return port_name
+    def _open_stay(self, state: VesselState, port: Port, arrival: str) -> PortStay:
+        name = self._static.get(state.mmsi, ("", ""))[0]
+        stay = PortStay(
+            vessel_mmsi=state.mmsi,
+            vessel_name=name,
+            port_name=port.name,
+            arrival=arrival
+        )
+        self.port_stays[f"{state.mmsi}:{port.name}"] = stay
+        state.stay = stay
+        return stay
 
-        return None
+    def _close_stay(self, state: VesselState, timestamp: float) -> None:
+        stay = state.stay
+        stay.departure = _iso(timestamp)
+        state.stay = None
+        self._completed.append(stay)
+        if len(self._completed) >= self.COMPLETED_FLUSH:
+            self._flush_completed()
+
+    def _track_port_stay(self, message: AISMessage) -> None:
+        """Отслеживать пребывание в порту (одно сообщение)."""
+        self.receive_ais(message)
+
+    def _detect_port(self, lat: float, lon: float) -> Optional[str]:
+        """Определить порт по координатам."""
+        port = self.ports.locate(lat, lon)
+        return port.name if port else None
 
     def finalize_port_stay(self, mmsi: str, port: str, departure: str) -> PortStay:
         """
@@ -191,8 +786,78 @@ class AISOracle:
         if key not in self.port_stays:
             raise ValueError(f"Port stay not found: {key}")
 
-        self.port_stays[key].departure = departure
-        return self.port_stays[key]
+        stay = self.port_stays[key]
+        stay.departure = departure
+
+        state = self._vessels.get(mmsi)
+        if state is not None and state.stay is stay:
+            state.stay = None
+            self._completed.append(stay)
+        return stay
+
+    # ─────────────────────────────────────────────────────────────────────────
+    #                            CHECKPOINT
+    # ─────────────────────────────────────────────────────────────────────────
+
+    def _flush_completed(self) -> None:
+        """Дописать завершённые стоянки в port_stays.jsonl."""
+        if not self.data_dir or not self._completed:
+            self._completed.clear()
+            return
+        with open(self.stays_file, "a", encoding="utf-8") as f:
+            for stay in self._completed:
+                f.write(json.dumps(stay.to_dict(), ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self._completed.clear()
+
+    def _maybe_checkpoint(self) -> None:
+        if self.data_dir and time.time() - self._last_checkpoint >= self.CHECKPOINT_INTERVAL:
+            self.checkpoint()
+
+    def checkpoint(self) -> None:
+        """Записать завершённые стоянки и snapshot активных (атомарно)."""
+        if not self.data_dir:
+            return
+        self._flush_completed()
+
+        active = [state.stay.to_dict() for state in self._vessels.values() if state.stay]
+        data = {
+            "saved_at": _iso(time.time()),
+            "messages_received": self.messages_received,
+            "active_stays": active,
+            "static": self._static
+        }
+        tmp = self.checkpoint_file.with_suffix(".json.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.checkpoint_file)
+        self._last_checkpoint = time.time()
+
+    def _restore(self) -> None:
+        """Восстановить активные стоянки после перезапуска."""
+        if not self.checkpoint_file.exists():
+            return
+        with open(self.checkpoint_file, "r", encoding="utf-8") as f:
+            data = json.load(f)
+
+        self.messages_received = data.get("messages_received", 0)
+        self._static = {mmsi: tuple(info) for mmsi, info in data.get("static", {}).items()}
+        for entry in data.get("active_stays", []):
+            stay = PortStay.from_dict(entry)
+            self.port_stays[f"{stay.vessel_mmsi}:{stay.port_name}"] = stay
+            state = self._vessels.setdefault(stay.vessel_mmsi, VesselState(stay.vessel_mmsi))
+            state.stay = stay
+
+    def close(self) -> None:
+        """Финальный checkpoint."""
+        self.checkpoint()
+
+    # ─────────────────────────────────────────────────────────────────────────
+    #                            СТАТУС
+    # ─────────────────────────────────────────────────────────────────────────
 
     def get_oracle_status(self) -> Dict:
         """Статус оракула."""
@@ -201,7 +866,10 @@ class AISOracle:
         return {
             "active_sources": active_sources,
             "total_sources": len(OracleSource),
-            "messages_received": len(self.messages),
+            "messages_received": self.messages_received,
+            "duplicates_dropped": self.duplicates,
+            "vessels_tracked": len(self._vessels),
+            "ports_indexed": len(self.ports),
             "active_port_stays": len([p for p in self.port_stays.values() if not p.departure]),
             "completed_port_stays": len([p for p in self.port_stays.values() if p.departure]),
             "ais_frequencies": self.AIS_FREQUENCIES,
@@ -216,11 +884,84 @@ class AISOracle:
         return total
 
 
+# ═══════════════════════════════════════════════════════════════════════════════
+#                         BENCHMARK
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def generate_replay(vessels: int = 2000, messages: int = 300_000, duplicate_rate: float = 0.1) -> List[str]:
+    """
+    Синтетический поток NMEA: суда подходят к портам, стоят у причала,
+    уходят в море. Часть предложений повторяется (второй приёмник).
+    """
+    import random
+
+    rng = random.Random(5)
+    ports = load_ports()
+    start = 1_767_225_600  # 2026-01-01
+    lines = []
+
+    fleet = []
+    for i in range(vessels):
+        port = ports[i % len(ports)]
+        fleet.append((str(200_000_000 + i), port, rng.randrange(40, 160)))
+
+    for n in range(messages):
+        mmsi, port, cycle = fleet[n % vessels]
+        step = n // vessels
+        phase = step % cycle
+        timestamp = start + step * 10
+
+        if phase < cycle // 2:
+            # У причала
+            line = encode_position_report(mmsi, port.lat + 0.01, port.lon + 0.01, 0.0, 0.0, 5, timestamp)
+        else:
+            # В море: ~1-2° от порта
+            offset = 1.0 + phase / cycle
+            line = encode_position_report(mmsi, port.lat - offset, port.lon + offset, 12.5, 135.0, 0, timestamp)
+
+        lines.append(line)
+        if rng.random() < duplicate_rate:
+            lines.append(line)
+
+    return lines
+
+
+def replay_benchmark(vessels: int = 2000, messages: int = 300_000, batch: int = 5000) -> float:
+    """Бенчмарк: реплей потока NMEA через полный конвейер (один поток)."""
+    import tempfile
+
+    lines = generate_replay(vessels, messages)
+    print(f"\n🏁 Replaying {len(lines):,} NMEA sentences from {vessels:,} vessels...\n")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        oracle = AISOracle(data_dir=tmp)
+        start = time.perf_counter()
+        for offset in range(0, len(lines), batch):
+            oracle.ingest_nmea(lines[offset:offset + batch])
+        oracle.close()
+        elapsed = time.perf_counter() - start
+
+        status = oracle.get_oracle_status()
+        with open(oracle.stays_file, encoding="utf-8") as f:
+            completed = sum(1 for _ in f)
+
+    rate = len(lines) / elapsed
+    print(f"⏱️  Time: {elapsed:.2f} s")
+    print(f"🚀 Rate: {rate:,.0f} messages/second")
+    print(f"📊 Accepted: {status['messages_received']:,}, duplicates: {status['duplicates_dropped']:,}")
+    print(f"⚓ Port stays: {status['active_port_stays']:,} active, {completed:,} completed on disk")
+    return rate
+
+
 # ═══════════════════════════════════════════════════════════════════════════════
 #                         DEMO
 # ═══════════════════════════════════════════════════════════════════════════════
 
 if __name__ == "__main__":
+    if "--benchmark" in sys.argv:
+        replay_benchmark()
+        sys.exit(0)
+
     oracle = AISOracle()
 
     print("=" * 60)
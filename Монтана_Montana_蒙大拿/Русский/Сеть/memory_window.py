@@ -8,9 +8,9 @@ memory_window.py — Синхронизация окна памяти Montana
 > Более старые — в распределённом хранилище."
 
 Архитектура:
-- Локальный кэш (RAM) — горячие данные
-- Локальное хранилище — тёплые данные
-- Распределённая сеть — холодные данные (архив)
+- Локальный кэш (RAM) — горячие данные, LRU
+- Локальное хранилище — тёплые данные, append-only сегменты
+- Распределённая сеть — холодные данные (архив), блобы по sha256
 
 Синхронизация обеспечивает:
 - Быстрый доступ к недавним данным
@@ -18,12 +18,19 @@ memory_window.py — Синхронизация окна памяти Montana
 - Автоматическую миграцию по возрасту
 """
 
+from collections import OrderedDict, deque
 from dataclasses import dataclass, field
-from datetime import datetime, timezone, timedelta
-from typing import Dict, List, Optional, Tuple
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
 from enum import Enum
 import hashlib
 import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
 
 
 class StorageTier(Enum):
@@ -50,6 +57,7 @@ class MemoryRecord:
     tier: StorageTier = StorageTier.HOT
     sync_status: SyncStatus = SyncStatus.PENDING
     replicas: List[str] = field(default_factory=list)  # node_ids с копиями
+    created_ts: float = 0.0                            # Unix-время (без разбора ISO)
 
     def to_dict(self) -> dict:
         return {
@@ -61,6 +69,39 @@ class MemoryRecord:
             "replicas": self.replicas
         }
 
+    def to_line(self) -> bytes:
+        """Строка сегмента warm-уровня"""
+        return json.dumps({
+            "id": self.record_id,
+            "content": self.content,
+            "created_at": self.created_at,
+            "ts": self.created_ts,
+            "sync": self.sync_status.value,
+            "replicas": self.replicas
+        }, ensure_ascii=False, separators=(",", ":")).encode() + b"\n"
+
+    def to_blob(self) -> bytes:
+        """Неизменяемая часть записи — содержимое cold-блоба"""
+        return json.dumps({
+            "id": self.record_id,
+            "content": self.content,
+            "created_at": self.created_at,
+            "ts": self.created_ts
+        }, ensure_ascii=False, sort_keys=True, separators=(",", ":")).encode()
+
+    @classmethod
+    def from_line(cls, data: bytes, tier: StorageTier) -> "MemoryRecord":
+        raw = json.loads(data)
+        return cls(
+            record_id=raw["id"],
+            content=raw["content"],
+            created_at=raw["created_at"],
+            tier=tier,
+            sync_status=SyncStatus(raw.get("sync", SyncStatus.SYNCED.value)),
+            replicas=raw.get("replicas", []),
+            created_ts=raw["ts"]
+        )
+
 
 @dataclass
 class WindowConfig:
@@ -69,6 +110,206 @@ class WindowConfig:
     warm_window_days: int = 7          # Локально 7 дней
     min_replicas: int = 3              # Минимум 3 копии в сети
     sync_interval_seconds: int = 60    # Синхронизация каждую минуту
+    hot_max_records: int = 10000       # Потолок LRU в RAM
+    segment_max_bytes: int = 64 * 1024 * 1024  # Ротация сегментов warm-уровня
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+#                         ХРАНИЛИЩА УРОВНЕЙ
+# ═══════════════════════════════════════════════════════════════════════════════
+
+# Расположение версии записи в сегменте: (номер сегмента, смещение, длина)
+Location = Tuple[int, int, int]
+
+
+class SegmentLog:
+    """
+    Warm-уровень: append-only сегменты segment_NNNNNN.log.
+
+    Каждая строка — версия записи. Для каждого сегмента считается число
+    живых версий; сегмент без живых версий (всё ушло в cold или
+    перезаписано) удаляется целиком — без компакции.
+    """
+
+    def __init__(self, directory: Path, max_bytes: int):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+
+        self._live: Dict[int, int] = {}
+        self._readers: Dict[int, object] = {}
+        numbers = sorted(int(p.stem.split("_")[1]) for p in self.directory.glob("segment_*.log"))
+        for number in numbers:
+            self._live[number] = 0
+
+        self.active = numbers[-1] if numbers else 1
+        self._live.setdefault(self.active, 0)
+        self._writer = open(self._path(self.active), "ab", buffering=0)
+        self._size = self._writer.tell()
+
+    def _path(self, number: int) -> Path:
+        return self.directory / f"segment_{number:06d}.log"
+
+    def __len__(self) -> int:
+        return len(self._live)
+
+    def append(self, line: bytes) -> Location:
+        if self._size and self._size + len(line) > self.max_bytes:
+            self._rotate()
+        offset = self._size
+        self._writer.write(line)
+        self._size += len(line)
+        return self.active, offset, len(line)
+
+    def _rotate(self):
+        self._writer.close()
+        previous = self.active
+        self.active += 1
+        self._writer = open(self._path(self.active), "ab", buffering=0)
+        self._size = 0
+        self._live.setdefault(self.active, 0)
+        if self._live.get(previous) == 0:
+            self._drop(previous)
+
+    def read(self, location: Location) -> bytes:
+        number, offset, length = location
+        reader = self._readers.get(number)
+        if reader is None:
+            reader = open(self._path(number), "rb")
+            self._readers[number] = reader
+        reader.seek(offset)
+        return reader.read(length)
+
+    def retain(self, number: int):
+        self._live[number] = self._live.get(number, 0) + 1
+
+    def release(self, number: int):
+        self._live[number] -= 1
+        if self._live[number] == 0 and number != self.active:
+            self._drop(number)
+
+    def collect(self):
+        """Удалить сегменты без живых версий (после восстановления)"""
+        for number in [n for n, live in self._live.items() if live == 0 and n != self.active]:
+            self._drop(number)
+
+    def _drop(self, number: int):
+        reader = self._readers.pop(number, None)
+        if reader is not None:
+            reader.close()
+        self._live.pop(number, None)
+        try:
+            self._path(number).unlink()
+        except FileNotFoundError:
+            pass
+
+    def scan(self) -> Iterator[Tuple[Location, bytes]]:
+        """Все версии по порядку записи; оборванная последняя строка отрезается"""
+        for number in sorted(self._live):
+            path = self._path(number)
+            offset = 0
+            with open(path, "rb") as f:
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        if number == self.active:
+                            self._writer.truncate(offset)
+                            self._size = offset
+                        break
+                    yield (number, offset, len(line)), line
+                    offset += len(line)
+
+    def close(self):
+        self._writer.close()
+        for reader in self._readers.values():
+            reader.close()
+        self._readers.clear()
+
+
+class BlobStore:
+    """Cold-уровень: контентно-адресуемые блобы blobs/ab/<sha256>."""
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, digest: str) -> Path:
+        return self.directory / digest[:2] / digest
+
+    def put(self, data: bytes) -> str:
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._path(digest)
+        if not path.exists():
+            path.parent.mkdir(exist_ok=True)
+            tmp = path.with_suffix(".tmp")
+            tmp.write_bytes(data)
+            os.replace(tmp, path)
+        return digest
+
+    def get(self, digest: str) -> Optional[bytes]:
+        """Блоб или None; повреждённый блоб (хеш не сходится) не отдаётся"""
+        try:
+            data = self._path(digest).read_bytes()
+        except FileNotFoundError:
+            return None
+        return data if hashlib.sha256(data).hexdigest() == digest else None
+
+    def __contains__(self, digest: str) -> bool:
+        return self._path(digest).exists()
+
+
+class ColdIndex:
+    """
+    record_id → (digest, replicas) на диске (SQLite).
+
+    Индекс cold-уровня растёт со всей историей, поэтому в RAM не держится.
+    """
+
+    def __init__(self, path: Path):
+        self._db = sqlite3.connect(str(path))
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS cold (
+                id TEXT PRIMARY KEY,
+                digest TEXT NOT NULL,
+                replicas TEXT NOT NULL,
+                ts REAL NOT NULL
+            ) WITHOUT ROWID
+        """)
+        self._count = self._db.execute("SELECT COUNT(*) FROM cold").fetchone()[0]
+
+    def put(self, record_id: str, digest: str, replicas: List[str], ts: float):
+        cursor = self._db.execute(
+            "INSERT OR IGNORE INTO cold VALUES (?, ?, ?, ?)",
+            (record_id, digest, json.dumps(replicas), ts)
+        )
+        self._count += cursor.rowcount
+
+    def commit(self):
+        self._db.commit()
+
+    def get(self, record_id: str) -> Optional[Tuple[str, List[str]]]:
+        row = self._db.execute(
+            "SELECT digest, replicas FROM cold WHERE id = ?", (record_id,)
+        ).fetchone()
+        return (row[0], json.loads(row[1])) if row else None
+
+    def __contains__(self, record_id: str) -> bool:
+        return self._db.execute(
+            "SELECT 1 FROM cold WHERE id = ?", (record_id,)
+        ).fetchone() is not None
+
+    def __len__(self) -> int:
+        return self._count
+
+    def close(self):
+        self._db.commit()
+        self._db.close()
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+#                         ОКНО ПАМЯТИ
+# ═══════════════════════════════════════════════════════════════════════════════
+
+COLD_PLACEHOLDER = "[COLD STORAGE — fetch from network]"
 
 
 class MemoryWindow:
@@ -78,16 +319,47 @@ class MemoryWindow:
     Книга Монтана:
     > "Узел не хранит всё. Он хранит своё окно.
     > Остальное — в сети. Сеть = коллективная память."
+
+    HOT — LRU в RAM (не больше hot_max_records записей), WARM — сегменты
+    на диске с индексом смещений, COLD — блобы по sha256 + индекс в SQLite.
+    Каждая запись сразу пишется в сегмент; HOT/WARM различаются только
+    возрастом. Миграция идёт по очередям в порядке создания, поэтому
+    затрагивает лишь записи, пересекающие границу окна. В RAM — только
+    окно (индекс смещений HOT+WARM), а не вся история.
+
+    fetch_blob(digest, replicas) -> bytes | None — чтение блоба с реплик
+    push_blob(digest, data, replicas) — отправка блоба на реплики
     """
 
-    def __init__(self, node_id: str, config: WindowConfig = None):
+    def __init__(self, node_id: str, config: WindowConfig = None,
+                 data_dir: Optional[str] = None,
+                 fetch_blob: Callable[[str, List[str]], Optional[bytes]] = None,
+                 push_blob: Callable[[str, bytes, List[str]], None] = None,
+                 clock: Callable[[], float] = time.time):
         self.node_id = node_id
         self.config = config or WindowConfig()
+        self.clock = clock
+        self.fetch_blob = fetch_blob
+        self.push_blob = push_blob
+
+        # Без data_dir — эфемерный узел во временной директории, удаляется в close()
+        self._tmpdir = None
+        if not data_dir:
+            self._tmpdir = tempfile.TemporaryDirectory(prefix=f"montana_window_{node_id}_")
+            data_dir = self._tmpdir.name
+        self.data_dir = Path(data_dir)
+        self.data_dir.mkdir(parents=True, exist_ok=True)
 
         # Хранилища по уровням
-        self.hot_storage: Dict[str, MemoryRecord] = {}   # RAM
-        self.warm_storage: Dict[str, MemoryRecord] = {}  # "Локальный диск"
-        self.cold_index: Dict[str, List[str]] = {}       # ID → node_ids где хранится
+        self.segments = SegmentLog(self.data_dir / "warm", self.config.segment_max_bytes)
+        self.blobs = BlobStore(self.data_dir / "cold")
+        self.cold_index = ColdIndex(self.data_dir / "cold_index.db")
+
+        self._cache: "OrderedDict[str, MemoryRecord]" = OrderedDict()  # LRU (RAM)
+        self._locations: Dict[str, Location] = {}       # HOT+WARM → сегмент
+        self._hot_queue: deque = deque()                # (ts, id) по возрасту
+        self._warm_queue: deque = deque()
+        self._pending: deque = deque()                  # id, ждущие синхронизации
 
         # Статистика
         self.stats = {
@@ -95,9 +367,136 @@ class MemoryWindow:
             "reads": 0,
             "migrations_hot_to_warm": 0,
             "migrations_warm_to_cold": 0,
-            "syncs": 0
+            "syncs": 0,
+            "cache_hits": 0,
+            "cold_fetches": 0
         }
 
+        self._restore()
+
+    # ─────────────────────────────────────────────────────────────────────────
+    #                            ВНУТРЕННЕЕ
+    # ─────────────────────────────────────────────────────────────────────────
+
+    def _restore(self):
+        """Индекс смещений и очереди — из сегментов (cold-записи пропускаются)"""
+        found: Dict[str, Tuple[float, Location, Optional[str]]] = {}
+        for location, line in self.segments.scan():
+            try:
+                raw = json.loads(line)
+            except ValueError:
+                continue
+            found[raw["id"]] = (raw["ts"], location, raw.get("sync"))
+
+        for record_id, (ts, location, sync) in sorted(found.items(), key=lambda item: item[1][0]):
+            if record_id in self.cold_index:
+                continue
+            self._place(record_id, location)
+            self._hot_queue.append((ts, record_id))
+            if sync == SyncStatus.PENDING.value:
+                self._pending.append(record_id)
+
+        self.segments.collect()
+        self.migrate()
+
+    def _place(self, record_id: str, location: Location):
+        previous = self._locations.get(record_id)
+        self._locations[record_id] = location
+        self.segments.retain(location[0])
+        if previous is not None:
+            self.segments.release(previous[0])
+
+    def _persist(self, record: MemoryRecord):
+        self._place(record.record_id, self.segments.append(record.to_line()))
+
+    def _remember(self, record: MemoryRecord):
+        self._cache[record.record_id] = record
+        self._cache.move_to_end(record.record_id)
+        while len(self._cache) > self.config.hot_max_records:
+            self._cache.popitem(last=False)
+
+    def _tier_of(self, ts: float) -> StorageTier:
+        """HOT, если запись не старше самой старой записи HOT-очереди"""
+        if self._hot_queue and ts >= self._hot_queue[0][0]:
+            return StorageTier.HOT
+        return StorageTier.WARM
+
+    def _get(self, record_id: str) -> Optional[MemoryRecord]:
+        record = self._cache.get(record_id)
+        if record is not None:
+            self._cache.move_to_end(record_id)
+            self.stats["cache_hits"] += 1
+            return record
+
+        location = self._locations.get(record_id)
+        if location is not None:
+            line = self.segments.read(location)
+            record = MemoryRecord.from_line(line, StorageTier.WARM)
+            record.tier = self._tier_of(record.created_ts)
+            self._remember(record)
+            return record
+
+        entry = self.cold_index.get(record_id)
+        if entry is not None:
+            return self._read_cold(record_id, *entry)
+
+        return None
+
+    def _read_cold(self, record_id: str, digest: str, replicas: List[str]) -> MemoryRecord:
+        """Ленивое чтение cold-блоба: локально, иначе с реплик (с проверкой хеша)"""
+        data = self.blobs.get(digest)
+        if data is None and self.fetch_blob is not None:
+            fetched = self.fetch_blob(digest, [r for r in replicas if r != self.node_id])
+            if fetched is not None and hashlib.sha256(fetched).hexdigest() == digest:
+                self.blobs.put(fetched)
+                self.stats["cold_fetches"] += 1
+                data = fetched
+
+        if data is None:
+            return MemoryRecord(
+                record_id=record_id,
+                content=COLD_PLACEHOLDER,
+                created_at="",
+                tier=StorageTier.COLD,
+                sync_status=SyncStatus.SYNCED,
+                replicas=replicas
+            )
+
+        raw = json.loads(data)
+        record = MemoryRecord(
+            record_id=record_id,
+            content=raw["content"],
+            created_at=raw["created_at"],
+            tier=StorageTier.COLD,
+            sync_status=SyncStatus.SYNCED,
+            replicas=replicas,
+            created_ts=raw["ts"]
+        )
+        self._remember(record)
+        return record
+
+    def _to_cold(self, record_id: str) -> Optional[Location]:
+        """WARM → COLD: блоб по sha256 + запись в индекс; возвращает место в сегменте"""
+        location = self._locations.pop(record_id, None)
+        if location is None:
+            return None
+        record = self._cache.get(record_id) or MemoryRecord.from_line(
+            self.segments.read(location), StorageTier.WARM)
+
+        blob = record.to_blob()
+        digest = self.blobs.put(blob)
+        if self.push_blob is not None:
+            self.push_blob(digest, blob, [r for r in record.replicas if r != self.node_id])
+        self.cold_index.put(record_id, digest, record.replicas.copy(), record.created_ts)
+
+        record.tier = StorageTier.COLD
+        record.sync_status = SyncStatus.SYNCED
+        return location
+
+    # ─────────────────────────────────────────────────────────────────────────
+    #                            API
+    # ─────────────────────────────────────────────────────────────────────────
+
     def write(self, content: str) -> MemoryRecord:
         """
         Записать новую запись (всегда в HOT).
@@ -108,20 +507,26 @@ class MemoryWindow:
         Returns:
             MemoryRecord
         """
+        now = self.clock()
+        created_at = datetime.fromtimestamp(now, timezone.utc).isoformat()
         record_id = hashlib.sha256(
-            f"{self.node_id}:{datetime.now().isoformat()}:{content}".encode()
+            f"{self.node_id}:{created_at}:{content}".encode()
         ).hexdigest()[:16]
 
         record = MemoryRecord(
             record_id=record_id,
             content=content,
-            created_at=datetime.now(timezone.utc).isoformat(),
+            created_at=created_at,
             tier=StorageTier.HOT,
             sync_status=SyncStatus.PENDING,
-            replicas=[self.node_id]
+            replicas=[self.node_id],
+            created_ts=now
         )
 
-        self.hot_storage[record_id] = record
+        self._persist(record)
+        self._remember(record)
+        self._hot_queue.append((now, record_id))
+        self._pending.append(record_id)
         self.stats["writes"] += 1
 
         return record
@@ -137,69 +542,50 @@ class MemoryWindow:
             MemoryRecord или None
         """
         self.stats["reads"] += 1
+        return self._get(record_id)
 
-        # Сначала HOT (самый быстрый)
-        if record_id in self.hot_storage:
-            return self.hot_storage[record_id]
-
-        # Потом WARM
-        if record_id in self.warm_storage:
-            return self.warm_storage[record_id]
-
-        # COLD — только индекс, данные в сети
-        if record_id in self.cold_index:
-            return MemoryRecord(
-                record_id=record_id,
-                content="[COLD STORAGE — fetch from network]",
-                created_at="",
-                tier=StorageTier.COLD,
-                sync_status=SyncStatus.SYNCED,
-                replicas=self.cold_index[record_id]
-            )
-
-        return None
-
-    def migrate(self) -> Dict[str, int]:
+    def migrate(self, now: Optional[float] = None) -> Dict[str, int]:
         """
         Миграция записей между уровнями по возрасту.
 
+        Очереди упорядочены по времени создания: обрабатывается только
+        голова очереди, пересёкшая границу окна.
+
         Returns:
             Статистика миграции
         """
-        now = datetime.now(timezone.utc)
-        hot_threshold = now - timedelta(minutes=self.config.hot_window_minutes)
-        warm_threshold = now - timedelta(days=self.config.warm_window_days)
+        now = self.clock() if now is None else now
+        hot_threshold = now - self.config.hot_window_minutes * 60
+        warm_threshold = now - self.config.warm_window_days * 86400
 
         migrated = {"hot_to_warm": 0, "warm_to_cold": 0}
 
-        # HOT → WARM
-        hot_to_migrate = []
-        for record_id, record in self.hot_storage.items():
-            created = datetime.fromisoformat(record.created_at.replace('Z', '+00:00'))
-            if created < hot_threshold:
-                hot_to_migrate.append(record_id)
-
-        for record_id in hot_to_migrate:
-            record = self.hot_storage.pop(record_id)
-            record.tier = StorageTier.WARM
-            self.warm_storage[record_id] = record
+        # HOT → WARM (данные уже в сегменте — меняется только уровень)
+        while self._hot_queue and self._hot_queue[0][0] < hot_threshold:
+            item = self._hot_queue.popleft()
+            self._warm_queue.append(item)
+            record = self._cache.get(item[1])
+            if record is not None:
+                record.tier = StorageTier.WARM
             migrated["hot_to_warm"] += 1
-            self.stats["migrations_hot_to_warm"] += 1
 
         # WARM → COLD
-        warm_to_migrate = []
-        for record_id, record in self.warm_storage.items():
-            created = datetime.fromisoformat(record.created_at.replace('Z', '+00:00'))
-            if created < warm_threshold:
-                warm_to_migrate.append(record_id)
-
-        for record_id in warm_to_migrate:
-            record = self.warm_storage.pop(record_id)
-            # В COLD храним только индекс
-            self.cold_index[record_id] = record.replicas.copy()
+        released = []
+        while self._warm_queue and self._warm_queue[0][0] < warm_threshold:
+            _, record_id = self._warm_queue.popleft()
+            location = self._to_cold(record_id)
+            if location is not None:
+                released.append(location[0])
             migrated["warm_to_cold"] += 1
-            self.stats["migrations_warm_to_cold"] += 1
 
+        # Сегменты освобождаются только после фиксации cold-индекса
+        if released:
+            self.cold_index.commit()
+            for number in released:
+                self.segments.release(number)
+
+        self.stats["migrations_hot_to_warm"] += migrated["hot_to_warm"]
+        self.stats["migrations_warm_to_cold"] += migrated["warm_to_cold"]
         return migrated
 
     def sync_to_network(self, peer_nodes: List[str]) -> Dict[str, int]:
@@ -210,6 +596,8 @@ class MemoryWindow:
         > "Сеть = коллективная память. Каждый хранит часть.
         > Вместе — полная картина."
 
+        Обходит только очередь ожидающих записей, а не всё окно.
+
         Args:
             peer_nodes: Список ID пиринговых узлов
 
@@ -218,22 +606,27 @@ class MemoryWindow:
         """
         synced = {"records": 0, "replicas_added": 0}
 
-        # Синхронизируем HOT и WARM записи
-        for storage in [self.hot_storage, self.warm_storage]:
-            for record_id, record in storage.items():
-                if record.sync_status == SyncStatus.PENDING:
-                    # Симуляция отправки в сеть
-                    record.sync_status = SyncStatus.SYNCING
+        while self._pending:
+            record_id = self._pending.popleft()
+            if record_id not in self._locations:
+                continue  # уже в COLD
+            record = self._get(record_id)
+            if record.sync_status != SyncStatus.PENDING:
+                continue
 
-                    # Добавляем реплики (выбираем случайных пиров)
-                    needed_replicas = self.config.min_replicas - len(record.replicas)
-                    if needed_replicas > 0 and peer_nodes:
-                        new_replicas = peer_nodes[:needed_replicas]
-                        record.replicas.extend(new_replicas)
-                        synced["replicas_added"] += len(new_replicas)
+            # Симуляция отправки в сеть
+            record.sync_status = SyncStatus.SYNCING
 
-                    record.sync_status = SyncStatus.SYNCED
-                    synced["records"] += 1
+            # Добавляем реплики (выбираем случайных пиров)
+            needed_replicas = self.config.min_replicas - len(record.replicas)
+            if needed_replicas > 0 and peer_nodes:
+                new_replicas = peer_nodes[:needed_replicas]
+                record.replicas.extend(new_replicas)
+                synced["replicas_added"] += len(new_replicas)
+
+            record.sync_status = SyncStatus.SYNCED
+            self._persist(record)
+            synced["records"] += 1
 
         self.stats["syncs"] += 1
         return synced
@@ -247,18 +640,21 @@ class MemoryWindow:
         """
         return {
             "node_id": self.node_id,
-            "hot_records": len(self.hot_storage),
-            "warm_records": len(self.warm_storage),
+            "hot_records": len(self._hot_queue),
+            "warm_records": len(self._warm_queue),
             "cold_records": len(self.cold_index),
             "total_records": (
-                len(self.hot_storage) +
-                len(self.warm_storage) +
+                len(self._hot_queue) +
+                len(self._warm_queue) +
                 len(self.cold_index)
             ),
+            "cached_records": len(self._cache),
+            "warm_segments": len(self.segments),
             "config": {
                 "hot_window_minutes": self.config.hot_window_minutes,
                 "warm_window_days": self.config.warm_window_days,
-                "min_replicas": self.config.min_replicas
+                "min_replicas": self.config.min_replicas,
+                "hot_max_records": self.config.hot_max_records
             },
             "stats": self.stats
         }
@@ -273,9 +669,20 @@ class MemoryWindow:
         Returns:
             Список записей
         """
-        records = list(self.hot_storage.values())
-        records.sort(key=lambda r: r.created_at, reverse=True)
-        return records[:limit]
+        recent = []
+        for _, record_id in reversed(self._hot_queue):
+            if len(recent) >= limit:
+                break
+            recent.append(self._get(record_id))
+        return recent
+
+    def close(self):
+        """Закрыть файлы уровней; временная директория удаляется"""
+        self.segments.close()
+        self.cold_index.close()
+        if self._tmpdir is not None:
+            self._tmpdir.cleanup()
+            self._tmpdir = None
 
 
 class DistributedMemoryNetwork:
@@ -287,16 +694,37 @@ class DistributedMemoryNetwork:
     > Память распределена между всеми участниками."
     """
 
-    def __init__(self):
+    def __init__(self, data_dir: Optional[str] = None):
+        self.data_dir = Path(data_dir) if data_dir else None
         self.nodes: Dict[str, MemoryWindow] = {}
         self.global_index: Dict[str, List[str]] = {}  # record_id → node_ids
 
-    def add_node(self, node_id: str) -> MemoryWindow:
+    def add_node(self, node_id: str, config: WindowConfig = None) -> MemoryWindow:
         """Добавить узел в сеть."""
-        window = MemoryWindow(node_id)
+        window = MemoryWindow(
+            node_id, config,
+            data_dir=str(self.data_dir / node_id) if self.data_dir else None,
+            fetch_blob=self._fetch_blob,
+            push_blob=self._push_blob
+        )
         self.nodes[node_id] = window
         return window
 
+    def _push_blob(self, digest: str, data: bytes, replicas: List[str]):
+        """Cold-блоб — в хранилища узлов-реплик."""
+        for node_id in replicas:
+            if node_id in self.nodes:
+                self.nodes[node_id].blobs.put(data)
+
+    def _fetch_blob(self, digest: str, replicas: List[str]) -> Optional[bytes]:
+        """Первая реплика, у которой есть блоб."""
+        for node_id in replicas:
+            if node_id in self.nodes:
+                data = self.nodes[node_id].blobs.get(digest)
+                if data is not None:
+                    return data
+        return None
+
     def write_to_network(
         self,
         node_id: str,
@@ -383,12 +811,87 @@ class DistributedMemoryNetwork:
             "redundancy": "distributed across network"
         }
 
+    def close(self):
+        """Закрыть все узлы сети"""
+        for window in self.nodes.values():
+            window.close()
+        self.nodes.clear()
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+#                         BENCHMARK
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def benchmark(records: int = 100_000, days: int = 30, migrate_every: int = 1000) -> Dict:
+    """Запись истории за `days` дней с миграцией; что осталось в RAM и скорость чтения"""
+    import random
+    import shutil
+
+    tmp = tempfile.mkdtemp(prefix="montana_window_bench_")
+    clock = {"now": time.time() - days * 86400}
+    step = days * 86400 / records
+    window = MemoryWindow("bench", WindowConfig(hot_max_records=2000), data_dir=tmp,
+                          clock=lambda: clock["now"])
+
+    try:
+        ids = []
+        started = time.perf_counter()
+        for i in range(records):
+            clock["now"] += step
+            ids.append(window.write(f"мысль {i}: " + "x" * 200).record_id)
+            if i % migrate_every == 0:
+                window.migrate()
+                window.sync_to_network(["peer_a", "peer_b"])
+        window.migrate()
+        elapsed = time.perf_counter() - started
+
+        rng = random.Random(1)
+        timings = {}
+        hot_count = window.get_window_status()["hot_records"]
+        samples = {
+            "hot": ids[-hot_count:] if hot_count else [],
+            "warm": ids[-len(window._locations):-hot_count or None],
+            "cold": ids[:len(window.cold_index)],
+        }
+        for tier, pool in samples.items():
+            if not pool:
+                continue
+            picks = [rng.choice(pool) for _ in range(1000)]
+            window._cache.clear()
+            t0 = time.perf_counter()
+            for record_id in picks:
+                window.read(record_id)
+            timings[tier] = round((time.perf_counter() - t0) / len(picks) * 1e6, 1)
+
+        status = window.get_window_status()
+        result = {
+            "records": records,
+            "writes_per_sec": round(records / elapsed),
+            "hot": status["hot_records"],
+            "warm": status["warm_records"],
+            "cold": status["cold_records"],
+            "in_ram_records": status["cached_records"],
+            "warm_segments": status["warm_segments"],
+            "read_us": timings,
+        }
+    finally:
+        window.close()
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    for name, value in result.items():
+        print(f"{name:16} {value}")
+    return result
+
 
 # ═══════════════════════════════════════════════════════════════════════════════
 #                         DEMO
 # ═══════════════════════════════════════════════════════════════════════════════
 
 if __name__ == "__main__":
+    if "--benchmark" in sys.argv:
+        benchmark()
+        sys.exit(0)
+
     print("=" * 60)
     print("MEMORY WINDOW SYNC — Скользящее окно памяти")
     print("=" * 60)
@@ -442,6 +945,7 @@ if __name__ == "__main__":
         print(f"Найдено: {data['content'][:50]}...")
         print(f"Уровень: {data['tier']}")
         print(f"Реплики на: {data['replicas']}")
+    network.close()
 
     print("\n" + "=" * 60)
     print("'Сеть = коллективная память. Вместе — полная картина.'")
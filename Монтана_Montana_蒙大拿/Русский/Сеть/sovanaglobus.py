@@ -17,10 +17,30 @@ Sovanaglobus — это ПРОТОКОЛ, не платформа:
 
 from dataclasses import dataclass, field
 from datetime import datetime, timezone
-from decimal import Decimal
-from typing import Dict, List, Optional, Set
+from decimal import Decimal, InvalidOperation
+from itertools import count
+from typing import Dict, Iterator, List, Optional, Set, Tuple
 from enum import Enum
 import hashlib
+import heapq
+import re
+import sys
+import time
+
+
+_VOLUME = re.compile(r"(\d[\d,\s]*(?:\.\d+)?)\s*([^\d\s]*)")
+
+
+def parse_volume(volume: str) -> Tuple[Decimal, str]:
+    """"50,000 MT" → (Decimal(50000), "MT"); без числа → (0, "")"""
+    match = _VOLUME.search(volume or "")
+    if not match:
+        return Decimal(0), ""
+    try:
+        quantity = Decimal(re.sub(r"[,\s]", "", match.group(1)))
+    except InvalidOperation:
+        return Decimal(0), ""
+    return quantity, match.group(2).upper()
 
 
 class ParticipantType(Enum):
@@ -72,6 +92,14 @@ class FreightRequest:
     laydays: str              # Период погрузки
     currency: str             # Предпочтительная валюта
     created_at: str
+    max_rate: Optional[Decimal] = None    # Предельная ставка (None — любая)
+    status: str = "open"                  # open / matched / cancelled
+    contract_id: Optional[str] = None
+    quantity: Decimal = field(init=False, default=Decimal(0))
+    unit: str = field(init=False, default="")
+
+    def __post_init__(self):
+        self.quantity, self.unit = parse_volume(self.volume)
 
     def to_hash(self) -> str:
         data = f"{self.request_id}:{self.cargo_owner}:{self.origin_port}:{self.destination_port}"
@@ -90,6 +118,18 @@ class FreightOffer:
     currency: str             # Валюта ставки
     eta: str                  # Ожидаемое прибытие
     created_at: str
+    # Открытое предложение тоннажа (request_id == ""): направление и вместимость
+    cargo_type: Optional[CargoType] = None
+    origin_port: str = ""
+    destination_port: str = ""
+    capacity: str = ""        # "60,000 MT" / "800 TEU"
+    status: str = "open"      # open / matched / cancelled
+    contract_id: Optional[str] = None
+    quantity: Decimal = field(init=False, default=Decimal(0))
+    unit: str = field(init=False, default="")
+
+    def __post_init__(self):
+        self.quantity, self.unit = parse_volume(self.capacity)
 
     def to_hash(self) -> str:
         data = f"{self.offer_id}:{self.ship_owner}:{self.rate}:{self.currency}"
@@ -115,6 +155,130 @@ class FreightContract:
         return hashlib.sha256(data.encode()).hexdigest()
 
 
+# ═══════════════════════════════════════════════════════════════════════════════
+#                         КНИГА ЗАЯВОК
+# ═══════════════════════════════════════════════════════════════════════════════
+
+# Направление: (тип груза, порт погрузки, порт выгрузки, валюта, единица объёма)
+Lane = Tuple[CargoType, str, str, str, str]
+
+
+def lane_key(cargo_type: CargoType, origin: str, destination: str,
+             currency: str, unit: str) -> Lane:
+    return (cargo_type, origin.strip().lower(), destination.strip().lower(),
+            currency.upper(), unit.upper())
+
+
+def _size_class(quantity: Decimal) -> int:
+    """Класс объёма: [2^(c-1), 2^c) → c. Всё в классе выше заведомо больше."""
+    return int(quantity).bit_length()
+
+
+def _in_order(heap: list) -> Iterator[tuple]:
+    """Элементы кучи по возрастанию без её изменения (O(k log k) на k первых)"""
+    if not heap:
+        return
+    frontier = [(heap[0], 0)]
+    while frontier:
+        entry, index = heapq.heappop(frontier)
+        yield entry
+        for child in (2 * index + 1, 2 * index + 2):
+            if child < len(heap):
+                heapq.heappush(frontier, (heap[child], child))
+
+
+class LaneBook:
+    """
+    Книга одного направления.
+
+    Предложения тоннажа — кучи (ставка, seq, offer_id) по классам
+    вместимости, запросы — кучи (seq, request_id) по классам объёма.
+    Класс выше нужного подходит целиком, проверяется только пограничный.
+    Исполненные и отменённые заявки удаляются лениво.
+    """
+
+    # Перестроить кучи, когда мёртвых записей больше половины
+    COMPACT_MIN_ENTRIES = 64
+
+    def __init__(self):
+        self.offers: Dict[int, list] = {}
+        self.requests: Dict[int, list] = {}
+        self.entries = 0
+        self.dead = 0
+
+    def add_offer(self, offer: "FreightOffer", seq: int):
+        heapq.heappush(self.offers.setdefault(_size_class(offer.quantity), []),
+                       (offer.rate, seq, offer.offer_id))
+        self.entries += 1
+
+    def add_request(self, request: "FreightRequest", seq: int):
+        heapq.heappush(self.requests.setdefault(_size_class(request.quantity), []),
+                       (seq, request.request_id))
+        self.entries += 1
+
+    def retire(self, live_offers: Dict, live_requests: Dict):
+        """Заявка исполнена/отменена; при необходимости — компакция"""
+        self.dead += 1
+        if self.entries >= self.COMPACT_MIN_ENTRIES and self.dead * 2 > self.entries:
+            for books, live in ((self.offers, live_offers), (self.requests, live_requests)):
+                for size_class in list(books):
+                    heap = [entry for entry in books[size_class] if entry[-1] in live]
+                    if heap:
+                        heapq.heapify(heap)
+                        books[size_class] = heap
+                    else:
+                        del books[size_class]
+            self.entries = sum(map(len, self.offers.values())) + sum(map(len, self.requests.values()))
+            self.dead = 0
+
+    @staticmethod
+    def _prune(heap: list, live: Dict):
+        while heap and heap[0][-1] not in live:
+            heapq.heappop(heap)
+
+    def best_offer(self, request: "FreightRequest",
+                   live: Dict[str, "FreightOffer"]) -> Optional["FreightOffer"]:
+        """Самая дешёвая (затем самая ранняя) подходящая по вместимости"""
+        need = _size_class(request.quantity)
+        best_key, best = None, None
+        for size_class, heap in self.offers.items():
+            if size_class < need:
+                continue
+            self._prune(heap, live)
+            for rate, seq, offer_id in _in_order(heap):
+                if best_key is not None and (rate, seq) >= best_key:
+                    break
+                if request.max_rate is not None and rate > request.max_rate:
+                    break
+                offer = live.get(offer_id)
+                if offer is None or offer.quantity < request.quantity:
+                    continue
+                best_key, best = (rate, seq), offer
+                break
+        return best
+
+    def best_request(self, offer: "FreightOffer",
+                     live: Dict[str, "FreightRequest"]) -> Optional["FreightRequest"]:
+        """Самый ранний запрос, который помещается и согласен на ставку"""
+        limit = _size_class(offer.quantity)
+        best_seq, best = None, None
+        for size_class, heap in self.requests.items():
+            if size_class > limit:
+                continue
+            self._prune(heap, live)
+            for seq, request_id in _in_order(heap):
+                if best_seq is not None and seq >= best_seq:
+                    break
+                request = live.get(request_id)
+                if request is None or request.quantity > offer.quantity:
+                    continue
+                if request.max_rate is not None and offer.rate > request.max_rate:
+                    continue
+                best_seq, best = seq, request
+                break
+        return best
+
+
 class SovanaglobusProtocol:
     """
     Протокол P2P фрахтования.
@@ -131,12 +295,32 @@ class SovanaglobusProtocol:
     MARKET_SIZE = "$14-16 trillion/year"
     WORLD_TRADE_SHARE = "90% by volume"
 
-    def __init__(self):
+    def __init__(self, auto_match: bool = True):
         self.participants: Dict[str, Participant] = {}
         self.requests: Dict[str, FreightRequest] = {}
         self.offers: Dict[str, FreightOffer] = {}
         self.contracts: Dict[str, FreightContract] = {}
 
+        # Книга заявок: непрерывное сопоставление при поступлении
+        self.auto_match = auto_match
+        self.books: Dict[Lane, LaneBook] = {}
+        self.open_requests: Dict[str, FreightRequest] = {}
+        self.open_offers: Dict[str, FreightOffer] = {}   # открытый тоннаж
+        self._seq = count()
+        self._book_of: Dict[str, Tuple[Lane, int]] = {}  # id заявки → (направление, seq)
+
+    def _new_id(self, *parts: str) -> str:
+        """ID заявки; порядковый номер исключает совпадения в одной микросекунде"""
+        return hashlib.sha256(
+            f"{':'.join(parts)}:{datetime.now().isoformat()}:{next(self._seq)}".encode()
+        ).hexdigest()[:16]
+
+    def _book(self, lane: Lane) -> LaneBook:
+        book = self.books.get(lane)
+        if book is None:
+            book = self.books[lane] = LaneBook()
+        return book
+
     def register_participant(
         self,
         node_id: str,
@@ -176,11 +360,15 @@ class SovanaglobusProtocol:
         destination: str,
         volume: str,
         laydays: str,
-        currency: str = "USD"
+        currency: str = "USD",
+        max_rate: float = None
     ) -> FreightRequest:
         """
         Создать запрос на фрахт.
 
+        При auto_match запрос сразу сопоставляется с лучшим открытым
+        тоннажем направления; иначе остаётся в книге (status == "open").
+
         Args:
             cargo_owner_id: node_id грузовладельца
             cargo_type: Тип груза
@@ -189,6 +377,7 @@ class SovanaglobusProtocol:
             volume: Объём
             laydays: Период погрузки
             currency: Валюта
+            max_rate: Предельная ставка
 
         Returns:
             FreightRequest
@@ -196,9 +385,7 @@ class SovanaglobusProtocol:
         if cargo_owner_id not in self.participants:
             raise ValueError(f"Participant not registered: {cargo_owner_id}")
 
-        request_id = hashlib.sha256(
-            f"{cargo_owner_id}:{datetime.now().isoformat()}".encode()
-        ).hexdigest()[:16]
+        request_id = self._new_id(cargo_owner_id)
 
         request = FreightRequest(
             request_id=request_id,
@@ -209,10 +396,12 @@ class SovanaglobusProtocol:
             volume=volume,
             laydays=laydays,
             currency=currency,
-            created_at=datetime.now(timezone.utc).isoformat()
+            created_at=datetime.now(timezone.utc).isoformat(),
+            max_rate=Decimal(str(max_rate)) if max_rate is not None else None
         )
 
         self.requests[request_id] = request
+        self._place_request(request)
         return request
 
     def submit_offer(
@@ -243,9 +432,7 @@ class SovanaglobusProtocol:
         if request_id not in self.requests:
             raise ValueError(f"Request not found: {request_id}")
 
-        offer_id = hashlib.sha256(
-            f"{ship_owner_id}:{request_id}:{datetime.now().isoformat()}".encode()
-        ).hexdigest()[:16]
+        offer_id = self._new_id(ship_owner_id, request_id)
 
         offer = FreightOffer(
             offer_id=offer_id,
@@ -286,9 +473,10 @@ class SovanaglobusProtocol:
         if offer.request_id != request_id:
             raise ValueError("Offer does not match request")
 
-        contract_id = hashlib.sha256(
-            f"{request_id}:{offer_id}:{datetime.now().isoformat()}".encode()
-        ).hexdigest()[:16]
+        if request.status != "open" or offer.status != "open":
+            raise ValueError("Request or offer already closed")
+
+        contract_id = self._new_id(request_id, offer_id)
 
         # Конвертация в Ɉ (через Beeple benchmark)
         # $0.16/sec = базовая ставка
@@ -309,8 +497,151 @@ class SovanaglobusProtocol:
         )
 
         self.contracts[contract_id] = contract
+
+        for order in (request, offer):
+            order.status = "matched"
+            order.contract_id = contract_id
+        self._close(request_id)
+        self._close(offer_id)
         return contract
 
+    # ─────────────────────────────────────────────────────────────────────────
+    #                            КНИГА ЗАЯВОК
+    # ─────────────────────────────────────────────────────────────────────────
+
+    def post_capacity(
+        self,
+        ship_owner_id: str,
+        cargo_type: CargoType,
+        origin: str,
+        destination: str,
+        capacity: str,
+        rate: float,
+        currency: str,
+        vessel_name: str,
+        vessel_imo: str,
+        eta: str
+    ) -> FreightOffer:
+        """
+        Выставить открытый тоннаж на направление.
+
+        При auto_match судно сразу получает самый ранний подходящий
+        запрос из книги; иначе остаётся в книге (status == "open").
+
+        Args:
+            ship_owner_id: node_id судовладельца
+            cargo_type: Тип груза
+            origin: Порт погрузки
+            destination: Порт выгрузки
+            capacity: Вместимость ("60,000 MT")
+            rate: Ставка
+            currency: Валюта
+            vessel_name: Название судна
+            vessel_imo: IMO номер
+            eta: Ожидаемое прибытие
+
+        Returns:
+            FreightOffer
+        """
+        if ship_owner_id not in self.participants:
+            raise ValueError(f"Participant not registered: {ship_owner_id}")
+
+        offer = FreightOffer(
+            offer_id=self._new_id(ship_owner_id, origin, destination),
+            request_id="",
+            ship_owner=ship_owner_id,
+            vessel_name=vessel_name,
+            vessel_imo=vessel_imo,
+            rate=Decimal(str(rate)),
+            currency=currency,
+            eta=eta,
+            created_at=datetime.now(timezone.utc).isoformat(),
+            cargo_type=cargo_type,
+            origin_port=origin,
+            destination_port=destination,
+            capacity=capacity
+        )
+        self.offers[offer.offer_id] = offer
+
+        lane = lane_key(cargo_type, origin, destination, currency, offer.unit)
+        if self.auto_match:
+            request = self._book(lane).best_request(offer, self.open_requests)
+            if request is not None:
+                self._execute(request, offer)
+                return offer
+
+        seq = next(self._seq)
+        self.open_offers[offer.offer_id] = offer
+        self._book_of[offer.offer_id] = (lane, seq)
+        self._book(lane).add_offer(offer, seq)
+        return offer
+
+    def _place_request(self, request: FreightRequest):
+        lane = lane_key(request.cargo_type, request.origin_port, request.destination_port,
+                        request.currency, request.unit)
+        if self.auto_match:
+            offer = self._book(lane).best_offer(request, self.open_offers)
+            if offer is not None:
+                self._execute(request, offer)
+                return
+
+        seq = next(self._seq)
+        self.open_requests[request.request_id] = request
+        self._book_of[request.request_id] = (lane, seq)
+        self._book(lane).add_request(request, seq)
+
+    def _execute(self, request: FreightRequest, offer: FreightOffer) -> FreightContract:
+        offer.request_id = request.request_id
+        return self.match_and_sign(request.request_id, offer.offer_id)
+
+    def _close(self, order_id: str):
+        """Убрать заявку из книги (запись в куче удаляется лениво)"""
+        self.open_requests.pop(order_id, None)
+        self.open_offers.pop(order_id, None)
+        placed = self._book_of.pop(order_id, None)
+        if placed is not None:
+            self.books[placed[0]].retire(self.open_offers, self.open_requests)
+
+    def cancel_request(self, request_id: str):
+        request = self.open_requests.get(request_id)
+        if request is None:
+            raise ValueError(f"Open request not found: {request_id}")
+        request.status = "cancelled"
+        self._close(request_id)
+
+    def cancel_offer(self, offer_id: str):
+        offer = self.open_offers.get(offer_id)
+        if offer is None:
+            raise ValueError(f"Open offer not found: {offer_id}")
+        offer.status = "cancelled"
+        self._close(offer_id)
+
+    def create_requests(self, specs: List[Dict]) -> List[FreightRequest]:
+        """
+        Пакетное создание запросов (аргументы create_request в словарях).
+
+        Каждый запрос сопоставляется по порядку; статус и contract_id
+        показывают результат.
+        """
+        return [self.create_request(**spec) for spec in specs]
+
+    def match_open(self) -> List[FreightContract]:
+        """
+        Пакетное сопоставление всей книги (для auto_match=False).
+
+        Запросы обрабатываются в порядке поступления, каждый получает
+        лучший оставшийся тоннаж своего направления.
+        """
+        contracts = []
+        for request in list(self.open_requests.values()):
+            if request.status != "open":
+                continue
+            lane, _ = self._book_of[request.request_id]
+            offer = self.books[lane].best_offer(request, self.open_offers)
+            if offer is not None:
+                contracts.append(self._execute(request, offer))
+        return contracts
+
     def get_protocol_stats(self) -> Dict:
         """Статистика протокола."""
         return {
@@ -320,17 +651,69 @@ class SovanaglobusProtocol:
             "participants": len(self.participants),
             "active_requests": len(self.requests),
             "active_offers": len(self.offers),
+            "open_requests": len(self.open_requests),
+            "open_capacity": len(self.open_offers),
+            "lanes": len(self.books),
             "signed_contracts": len(self.contracts),
             "broker_eliminated": True,
             "common_measure": "Time (Ɉ)"
         }
 
 
+# ═══════════════════════════════════════════════════════════════════════════════
+#                         BENCHMARK
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def benchmark(lanes: int = 100, offers: int = 20_000, requests: int = 20_000) -> Dict:
+    """Непрерывное сопоставление: открытый тоннаж, затем поток запросов"""
+    import random
+
+    rng = random.Random(11)
+    ports = [f"port_{i}" for i in range(40)]
+    routes = [(rng.choice(ports), rng.choice(ports), rng.choice(list(CargoType)))
+              for _ in range(lanes)]
+
+    protocol = SovanaglobusProtocol()
+    protocol.register_participant("owner", ParticipantType.SHIP_OWNER, "Fleet", "mt" + "0" * 40)
+    protocol.register_participant("shipper", ParticipantType.CARGO_OWNER, "Cargo", "mt" + "1" * 40)
+
+    started = time.perf_counter()
+    for i in range(offers):
+        origin, destination, cargo_type = rng.choice(routes)
+        protocol.post_capacity("owner", cargo_type, origin, destination,
+                               f"{rng.randrange(5, 80) * 1000} MT", rng.randrange(200, 900) * 1000,
+                               "USD", f"MV {i}", str(9000000 + i), "2026-11-01")
+    post_elapsed = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for _ in range(requests):
+        origin, destination, cargo_type = rng.choice(routes)
+        protocol.create_request("shipper", cargo_type, origin, destination,
+                                f"{rng.randrange(5, 80) * 1000} MT", "01-05 Nov 2026", "USD")
+    match_elapsed = time.perf_counter() - started
+
+    result = {
+        "lanes": lanes,
+        "offers_per_sec": round(offers / post_elapsed),
+        "requests_per_sec": round(requests / match_elapsed),
+        "contracts": len(protocol.contracts),
+        "open_requests": len(protocol.open_requests),
+        "open_capacity": len(protocol.open_offers),
+    }
+    for name, value in result.items():
+        print(f"{name:18} {value}")
+    return result
+
+
 # ═══════════════════════════════════════════════════════════════════════════════
 #                         DEMO
 # ═══════════════════════════════════════════════════════════════════════════════
 
 if __name__ == "__main__":
+    if "--benchmark" in sys.argv:
+        benchmark()
+        sys.exit(0)
+
     protocol = SovanaglobusProtocol()
 
     print("=" * 60)
@@ -12,12 +12,16 @@ Trust Graph отличается от blockchain:
 - Trust Graph: защита очевидностью (невозможность быть другим)
 """
 
+from collections import deque
 from dataclasses import dataclass, field
 from datetime import datetime, timezone
 from typing import Dict, List, Set, Optional, Tuple
 from enum import Enum
 import hashlib
 import json
+import os
+import sys
+import time
 
 
 class RecognitionType(Enum):
@@ -58,8 +62,9 @@ class TrustNode:
     name: str                         # Имя/псевдоним
     cognitive_signature: str          # Hash когнитивной подписи
     created_at: str                   # Дата создания
-    recognitions_given: List[str] = field(default_factory=list)    # Кого узнал
-    recognitions_received: List[str] = field(default_factory=list) # Кто узнал
+    recognitions_given: List[str] = field(default_factory=list)    # Кого узнал (без повторов)
+    recognitions_received: List[str] = field(default_factory=list) # Кто узнал (без повторов)
+    mutual_count: int = 0             # Взаимных признаний (ведёт TrustGraph)
 
     @property
     def trust_score(self) -> float:
@@ -67,7 +72,7 @@ class TrustNode:
         Score доверия на основе взаимных признаний.
         Взаимное признание весит больше одностороннего.
         """
-        mutual = len(set(self.recognitions_given) & set(self.recognitions_received))
+        mutual = self.mutual_count
         one_way = len(self.recognitions_received) - mutual
 
         # Взаимные × 2 + односторонние × 1
@@ -81,13 +86,30 @@ class TrustGraph:
     Книга Монтана:
     > "Blockchain защищает данные математикой.
     > Montana защищает данные очевидностью."
+
+    Внутри узлы — целые числа, связи — множества соседей (входящие
+    и исходящие). Повторное признание обновляет ребро, а не дублирует
+    его. Счётчики взаимных признаний и сумма trust score ведутся при
+    каждом recognize(), поэтому метрики сети считаются за O(1).
     """
 
+    FORMAT = "montana-trust-graph"
+    FORMAT_VERSION = 1
+
     def __init__(self):
         self.nodes: Dict[str, TrustNode] = {}
         self.recognitions: List[Recognition] = []
         self.edges: Dict[Tuple[str, str], Recognition] = {}
 
+        # Целочисленные ID и списки смежности
+        self._index: Dict[str, int] = {}
+        self._node_ids: List[str] = []
+        self._out: List[Set[int]] = []
+        self._in: List[Set[int]] = []
+
+        # Агрегаты
+        self._mutual_pairs = 0
+
     def add_node(
         self,
         node_id: str,
@@ -104,9 +126,16 @@ class TrustGraph:
             cognitive_signature=cognitive_signature,
             created_at=datetime.now(timezone.utc).isoformat()
         )
-        self.nodes[node_id] = node
+        self._register_node(node)
         return node
 
+    def _register_node(self, node: TrustNode):
+        self.nodes[node.node_id] = node
+        self._index[node.node_id] = len(self._node_ids)
+        self._node_ids.append(node.node_id)
+        self._out.append(set())
+        self._in.append(set())
+
     def recognize(
         self,
         from_node_id: str,
@@ -141,15 +170,28 @@ class TrustGraph:
             evidence=evidence,
             confidence=confidence
         )
+        self._apply(recognition)
+        return recognition
 
+    def _apply(self, recognition: Recognition):
+        """Добавить признание в историю и обновить ребро и агрегаты."""
+        from_node_id, to_node_id = recognition.from_node, recognition.to_node
         self.recognitions.append(recognition)
         self.edges[(from_node_id, to_node_id)] = recognition
 
-        # Обновить узлы
+        a, b = self._index[from_node_id], self._index[to_node_id]
+        if b in self._out[a]:
+            return  # Повторное признание — ребро уже есть
+
+        self._out[a].add(b)
+        self._in[b].add(a)
         self.nodes[from_node_id].recognitions_given.append(to_node_id)
         self.nodes[to_node_id].recognitions_received.append(from_node_id)
 
-        return recognition
+        if a != b and a in self._out[b]:
+            self._mutual_pairs += 1
+            self.nodes[from_node_id].mutual_count += 1
+            self.nodes[to_node_id].mutual_count += 1
 
     def is_mutual(self, node_a: str, node_b: str) -> bool:
         """Проверить взаимное признание."""
@@ -158,6 +200,29 @@ class TrustGraph:
             (node_b, node_a) in self.edges
         )
 
+    # ─────────────────────────────────────────────────────────────────────────
+    #                            ОБХОД
+    # ─────────────────────────────────────────────────────────────────────────
+
+    @staticmethod
+    def _expand(
+        frontier: deque,
+        adjacency: List[Set[int]],
+        parents: Dict[int, int],
+        other_parents: Dict[int, int]
+    ) -> Optional[int]:
+        """Раскрыть один уровень BFS; вернуть узел встречи, если он есть."""
+        for _ in range(len(frontier)):
+            current = frontier.popleft()
+            for neighbor in adjacency[current]:
+                if neighbor in parents:
+                    continue
+                parents[neighbor] = current
+                if neighbor in other_parents:
+                    return neighbor
+                frontier.append(neighbor)
+        return None
+
     def get_trust_path(
         self,
         from_node: str,
@@ -167,31 +232,51 @@ class TrustGraph:
         """
         Найти путь доверия между двумя узлами.
 
+        Двунаправленный BFS: вперёд по признаниям from_node, назад по
+        признаниям, полученным to_node; каждый шаг раскрывает меньший фронт.
+        Путь кратчайший и содержит не больше max_depth узлов.
+
         Returns:
             Список узлов от from_node до to_node, или None если пути нет
         """
         if from_node not in self.nodes or to_node not in self.nodes:
             return None
+        if from_node == to_node:
+            return [from_node]
+
+        source, target = self._index[from_node], self._index[to_node]
+        parents_forward = {source: -1}
+        parents_backward = {target: -1}
+        frontier_forward = deque([source])
+        frontier_backward = deque([target])
+        max_edges = max_depth - 1
+        edges = 0
+
+        meet = None
+        while frontier_forward and frontier_backward and edges < max_edges:
+            if len(frontier_forward) <= len(frontier_backward):
+                meet = self._expand(frontier_forward, self._out, parents_forward, parents_backward)
+            else:
+                meet = self._expand(frontier_backward, self._in, parents_backward, parents_forward)
+            edges += 1
+            if meet is not None:
+                break
+
+        if meet is None:
+            return None
 
-        # BFS
-        visited = {from_node}
-        queue = [(from_node, [from_node])]
-
-        while queue:
-            current, path = queue.pop(0)
-
-            if len(path) > max_depth:
-                continue
-
-            if current == to_node:
-                return path
-
-            for neighbor in self.nodes[current].recognitions_given:
-                if neighbor not in visited:
-                    visited.add(neighbor)
-                    queue.append((neighbor, path + [neighbor]))
+        path = []
+        node = meet
+        while node != -1:
+            path.append(node)
+            node = parents_forward[node]
+        path.reverse()
+        node = parents_backward[meet]
+        while node != -1:
+            path.append(node)
+            node = parents_backward[node]
 
-        return None
+        return [self._node_ids[i] for i in path]
 
     def get_web_of_trust(self, node_id: str, depth: int = 2) -> Dict:
         """
@@ -203,65 +288,185 @@ class TrustGraph:
         if node_id not in self.nodes:
             return {"nodes": [], "edges": []}
 
-        visited = {node_id}
-        result_nodes = [node_id]
-        result_edges = []
+        center = self._index[node_id]
+        visited = {center}
+        result_nodes = [center]
+        result_edges: Set[Tuple[int, int]] = set()
 
-        current_level = {node_id}
+        current_level = [center]
 
         for _ in range(depth):
-            next_level = set()
+            next_level = []
 
             for node in current_level:
                 # Исходящие связи
-                for target in self.nodes[node].recognitions_given:
+                for target in self._out[node]:
                     if target not in visited:
                         visited.add(target)
-                        next_level.add(target)
+                        next_level.append(target)
                         result_nodes.append(target)
-                    result_edges.append((node, target))
+                    result_edges.add((node, target))
 
                 # Входящие связи
-                for source in self.nodes[node].recognitions_received:
+                for source in self._in[node]:
                     if source not in visited:
                         visited.add(source)
-                        next_level.add(source)
+                        next_level.append(source)
                         result_nodes.append(source)
-                    result_edges.append((source, node))
+                    result_edges.add((source, node))
 
             current_level = next_level
 
+        names = self._node_ids
         return {
             "center": node_id,
-            "nodes": result_nodes,
-            "edges": list(set(result_edges)),
+            "nodes": [names[i] for i in result_nodes],
+            "edges": [(names[a], names[b]) for a, b in result_edges],
             "depth": depth
         }
 
     def calculate_network_trust(self) -> Dict:
-        """Рассчитать общие метрики доверия сети."""
+        """Рассчитать общие метрики доверия сети (из агрегатов, O(1))."""
         if not self.nodes:
             return {"total_nodes": 0, "total_edges": 0}
 
-        mutual_count = sum(
-            1 for (a, b) in self.edges
-            if (b, a) in self.edges
-        ) // 2
+        node_count = len(self.nodes)
+        edge_count = len(self.edges)
+
+        # Σ trust_score = Σ (2·mutual + received − mutual) = рёбра + 2·взаимные пары
+        score_sum = edge_count + 2 * self._mutual_pairs
 
         return {
-            "total_nodes": len(self.nodes),
+            "total_nodes": node_count,
             "total_recognitions": len(self.recognitions),
-            "mutual_recognitions": mutual_count,
-            "average_trust_score": sum(n.trust_score for n in self.nodes.values()) / len(self.nodes),
-            "network_density": len(self.edges) / (len(self.nodes) * (len(self.nodes) - 1)) if len(self.nodes) > 1 else 0
+            "mutual_recognitions": self._mutual_pairs,
+            "average_trust_score": score_sum / node_count,
+            "network_density": edge_count / (node_count * (node_count - 1)) if node_count > 1 else 0
         }
 
+    # ─────────────────────────────────────────────────────────────────────────
+    #                            ПЕРСИСТЕНТНОСТЬ
+    # ─────────────────────────────────────────────────────────────────────────
+
+    def save(self, path: str):
+        """
+        Сохранить граф в JSON Lines (атомарно).
+
+        Формат: заголовок {"format", "version"}, затем строки узлов
+        {"node": i, "id", "name", "sig", "created"} в порядке целочисленных ID,
+        затем признания {"f": i, "t": j, "type", "ts", "ev", "c"}.
+        """
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"format": self.FORMAT, "version": self.FORMAT_VERSION}) + "\n")
+            for i, node_id in enumerate(self._node_ids):
+                node = self.nodes[node_id]
+                f.write(json.dumps({
+                    "node": i, "id": node_id, "name": node.name,
+                    "sig": node.cognitive_signature, "created": node.created_at
+                }, ensure_ascii=False) + "\n")
+            for rec in self.recognitions:
+                f.write(json.dumps({
+                    "f": self._index[rec.from_node], "t": self._index[rec.to_node],
+                    "type": rec.recognition_type.value, "ts": rec.timestamp,
+                    "ev": rec.evidence, "c": rec.confidence
+                }, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> 'TrustGraph':
+        """Загрузить граф, сохранённый save()."""
+        graph = cls()
+        with open(path, "r", encoding="utf-8") as f:
+            header = json.loads(f.readline())
+            if header.get("format") != cls.FORMAT:
+                raise ValueError(f"Not a trust graph file: {path}")
+            if header.get("version", 0) > cls.FORMAT_VERSION:
+                raise ValueError(f"Unsupported trust graph version: {header.get('version')}")
+
+            for line in f:
+                record = json.loads(line)
+                if "node" in record:
+                    graph._register_node(TrustNode(
+                        node_id=record["id"],
+                        name=record["name"],
+                        cognitive_signature=record["sig"],
+                        created_at=record["created"]
+                    ))
+                else:
+                    names = graph._node_ids
+                    graph._apply(Recognition(
+                        from_node=names[record["f"]],
+                        to_node=names[record["t"]],
+                        recognition_type=RecognitionType(record["type"]),
+                        timestamp=record["ts"],
+                        evidence=record["ev"],
+                        confidence=record["c"]
+                    ))
+        return graph
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+#                         BENCHMARK
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def benchmark(node_count: int = 100_000, recognition_count: int = 1_000_000, queries: int = 1000):
+    """Бенчмарк: построение графа, пути доверия, метрики, сохранение/загрузка"""
+    import random
+    import tempfile
+
+    rng = random.Random(3)
+    graph = TrustGraph()
+
+    print(f"\n🏁 Benchmarking {node_count:,} nodes, {recognition_count:,} recognitions...\n")
+
+    start = time.perf_counter()
+    for i in range(node_count):
+        graph.add_node(f"node{i}", f"Node {i}", f"hash{i}")
+    for _ in range(recognition_count):
+        a, b = rng.randrange(node_count), rng.randrange(node_count)
+        graph.recognize(f"node{a}", f"node{b}", RecognitionType.TRUST, "", 1.0)
+    elapsed = time.perf_counter() - start
+    print(f"⏱️  Build: {elapsed:.2f} s ({recognition_count / elapsed:,.0f} recognitions/s)")
+
+    start = time.perf_counter()
+    found = 0
+    for _ in range(queries):
+        a, b = rng.randrange(node_count), rng.randrange(node_count)
+        if graph.get_trust_path(f"node{a}", f"node{b}", max_depth=6):
+            found += 1
+    elapsed = time.perf_counter() - start
+    print(f"⏱️  Trust path: {elapsed / queries * 1000:.3f} ms/query ({found}/{queries} found)")
+
+    start = time.perf_counter()
+    metrics = graph.calculate_network_trust()
+    print(f"⏱️  Metrics: {(time.perf_counter() - start) * 1e6:.1f} µs — {metrics}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "trust_graph.jsonl")
+        start = time.perf_counter()
+        graph.save(path)
+        saved = time.perf_counter() - start
+        start = time.perf_counter()
+        TrustGraph.load(path)
+        loaded = time.perf_counter() - start
+        size = os.path.getsize(path) / 1024 / 1024
+    print(f"⏱️  Save: {saved:.2f} s, load: {loaded:.2f} s, {size:.1f} MB")
+
+    return metrics
+
 
 # ═══════════════════════════════════════════════════════════════════════════════
 #                         DEMO
 # ═══════════════════════════════════════════════════════════════════════════════
 
 if __name__ == "__main__":
+    if "--benchmark" in sys.argv:
+        benchmark()
+        sys.exit(0)
+
     graph = TrustGraph()
 
     print("=" * 60)
@@ -298,9 +503,8 @@ if __name__ == "__main__":
     # Статистика
     print("\n--- УЗЛЫ ---")
     for node_id, node in graph.nodes.items():
-        mutual = set(node.recognitions_given) & set(node.recognitions_received)
         print(f"{node.name}: trust_score={node.trust_score:.1f}, "
-              f"взаимных={len(mutual)}")
+              f"взаимных={node.mutual_count}")
 
     print("\n--- ВЗАИМНЫЕ ПРИЗНАНИЯ ---")
     for (a, b) in graph.edges:
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+test_ais_oracle.py — Unit tests для ais_oracle.py
+
+Montana Protocol
+Тестирование потокового приёма AIS: NMEA, индекс портов, стоянки
+"""
+
+import sys
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+# Добавляем путь к модулю
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../Сеть'))
+from ais_oracle import (
+    AISMessage,
+    AISOracle,
+    NMEADecoder,
+    OracleSource,
+    Port,
+    PortIndex,
+    RollingHashWindow,
+    VesselStatus,
+    _armor,
+    _checksum,
+    encode_position_report,
+    load_ports
+)
+
+
+T0 = 1_767_225_600  # 2026-01-01T00:00:00Z
+ROTTERDAM = (51.91, 4.31)
+AT_SEA = (50.0, 0.0)
+
+
+def static_sentences(mmsi: str, name: str, imo: int):
+    """Тип 5 (статические данные) двумя фрагментами"""
+    text = [(ord(c) - 64 if c >= "@" else ord(c), 6) for c in name.ljust(20, "@")]
+    payload = _armor(
+        [(5, 6), (0, 2), (int(mmsi), 30), (0, 2), (imo, 30), (0, 42)] + text + [(0, 192)]
+    )
+    parts = [payload[:60], payload[60:]]
+    sentences = []
+    for number, part in enumerate(parts, 1):
+        body = f"AIVDM,2,{number},7,A,{part},{2 if number == 2 else 0}"
+        sentences.append(f"!{body}*{_checksum(body):02X}")
+    return sentences
+
+
+class TestNMEADecoder(unittest.TestCase):
+    """Тесты декодера !AIVDM"""
+
+    def setUp(self):
+        self.decoder = NMEADecoder()
+
+    def test_position_roundtrip(self):
+        """Тип 1: координаты, скорость, статус, время из tag block"""
+        line = encode_position_report("244123456", 51.9, 4.5, 12.3, 270.5, 5, T0)
+        kind, mmsi, lat, lon, sog, cog, status, ts = self.decoder.decode(line, 0)
+
+        self.assertEqual((kind, mmsi, status, ts), ("pos", "244123456", 5, T0))
+        self.assertAlmostEqual(lat, 51.9, places=5)
+        self.assertAlmostEqual(lon, 4.5, places=5)
+        self.assertEqual((sog, cog), (12.3, 270.5))
+
+    def test_negative_coordinates(self):
+        decoded = self.decoder.decode(encode_position_report("1", -33.97, -151.22, 0, 0, 0), 42.0)
+        self.assertAlmostEqual(decoded[2], -33.97, places=5)
+        self.assertAlmostEqual(decoded[3], -151.22, places=5)
+        self.assertEqual(decoded[7], 42.0)
+
+    def test_bad_checksum_rejected(self):
+        line = encode_position_report("244123456", 51.9, 4.5, 0, 0, 5)
+        broken = line[:-2] + ("00" if line[-2:] != "00" else "11")
+        self.assertIsNone(self.decoder.decode(broken, 0))
+        self.assertEqual(self.decoder.errors, 1)
+
+    def test_multipart_static(self):
+        """Тип 5 из двух фрагментов: название и IMO"""
+        first, second = static_sentences("244123456", "BALTIC TRADER", 9123456)
+        self.assertIsNone(self.decoder.decode(first, 0))
+        self.assertEqual(self.decoder.decode(second, 0), ("static", "244123456", "BALTIC TRADER", "9123456"))
+
+
+class TestPortIndex(unittest.TestCase):
+    """Тесты сеточного индекса портов"""
+
+    def test_bundled_dataset(self):
+        index = PortIndex(load_ports())
+        self.assertEqual(index.locate(*ROTTERDAM).name, "Rotterdam")
+        self.assertIsNone(index.locate(*AT_SEA))
+        self.assertGreater(len(index), 40)
+
+    def test_nearest_of_overlapping(self):
+        """Пересекающиеся акватории — ближайший центр"""
+        index = PortIndex(load_ports())
+        self.assertEqual(index.locate(33.74, -118.19).name, "Long Beach")
+        self.assertEqual(index.locate(33.73, -118.27).name, "Los Angeles")
+
+    def test_polygon_and_dateline(self):
+        harbour = Port("Harbour", 10.0, 10.0, polygon=[(9.9, 9.9), (9.9, 10.1), (10.1, 10.0)])
+        dateline = Port("Dateline", 0.0, 179.99, radius_km=5)
+        index = PortIndex([harbour, dateline])
+
+        self.assertEqual(index.locate(10.0, 10.0).name, "Harbour")
+        self.assertIsNone(index.locate(10.09, 10.09))
+        self.assertEqual(index.locate(0.0, -179.99).name, "Dateline")
+
+    def test_csv_loader(self):
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp)
+        path = os.path.join(tmp, "wpi.csv")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("World Port Index Number,Main Port Name,Latitude,Longitude\n")
+            f.write("1,Rotterdam,51.9,4.3\n2,Broken,,\n")
+        self.assertEqual([p.name for p in load_ports(path)], ["Rotterdam"])
+
+
+class TestIngestion(unittest.TestCase):
+    """Тесты конвейера: дедупликация, автомат судна, checkpoint"""
+
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp(prefix="montana_ais_")
+        self.oracle = AISOracle(data_dir=self.data_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.data_dir, ignore_errors=True)
+
+    def voyage(self, mmsi="244123456"):
+        """Стоянка в Роттердаме 3 сообщения, затем отход в море"""
+        lines = [encode_position_report(mmsi, *ROTTERDAM, 0.0, 0, 5, T0 + 60 * i) for i in range(3)]
+        lines.append(encode_position_report(mmsi, *ROTTERDAM, 8.0, 270, 0, T0 + 600))
+        return lines
+
+    def test_arrival_and_departure(self):
+        self.oracle.ingest_nmea(static_sentences("244123456", "BALTIC TRADER", 9123456))
+        self.oracle.ingest_nmea(self.voyage())
+
+        stay = self.oracle.port_stays["244123456:Rotterdam"]
+        self.assertEqual(stay.vessel_name, "BALTIC TRADER")
+        self.assertEqual(stay.duration_seconds, 600)
+        self.assertEqual(stay.message_count, 3)
+        self.assertEqual(len(stay.evidence), 64)
+
+    def test_duplicates_dropped(self):
+        """Одно сообщение от двух приёмников засчитывается один раз"""
+        lines = self.voyage()
+        accepted = self.oracle.ingest_nmea(lines + lines)
+
+        self.assertEqual(accepted, 4)
+        self.assertEqual(self.oracle.duplicates, 4)
+        self.assertEqual(self.oracle.port_stays["244123456:Rotterdam"].message_count, 3)
+
+    def test_window_bounded(self):
+        window = RollingHashWindow(3)
+        for key in range(5):
+            self.assertTrue(window.add(key))
+        self.assertEqual(len(window), 3)
+        self.assertFalse(window.add(4))
+        self.assertTrue(window.add(0))
+
+    def test_moving_to_other_port_closes_stay(self):
+        """Пришвартовался в другом порту — прошлая стоянка закрыта"""
+        self.oracle.ingest_nmea([
+            encode_position_report("1", *ROTTERDAM, 0, 0, 5, T0),
+            encode_position_report("1", 51.26, 4.39, 0, 0, 5, T0 + 3600),
+        ])
+        self.assertIsNotNone(self.oracle.port_stays["000000001:Rotterdam"].departure)
+        self.assertIsNone(self.oracle.port_stays["000000001:Antwerp"].departure)
+
+    def test_checkpoint_and_restore(self):
+        """Завершённые стоянки на диске, активные переживают перезапуск"""
+        self.oracle.ingest_nmea(self.voyage("111111111"))
+        self.oracle.ingest_nmea([encode_position_report("222222222", *ROTTERDAM, 0, 0, 5, T0)])
+        self.oracle.close()
+
+        with open(os.path.join(self.data_dir, "port_stays.jsonl"), encoding="utf-8") as f:
+            completed = [json.loads(line) for line in f]
+        self.assertEqual([s["mmsi"] for s in completed], ["111111111"])
+
+        oracle = AISOracle(data_dir=self.data_dir)
+        oracle.ingest_nmea([encode_position_report("222222222", *AT_SEA, 10, 0, 0, T0 + 7200)])
+        self.assertEqual(oracle.port_stays["222222222:Rotterdam"].duration_seconds, 7200)
+
+    def test_ingest_json(self):
+        records = [
+            {"mmsi": 244123456, "lat": ROTTERDAM[0], "lon": ROTTERDAM[1], "sog": 0,
+             "status": "moored", "timestamp": "2026-01-30T10:00:00+00:00", "name": "BALTIC TRADER"},
+            {"mmsi": 244123456, "latitude": AT_SEA[0], "longitude": AT_SEA[1], "speed": 11,
+             "status": 0, "timestamp": "2026-01-30T12:00:00+00:00"},
+            {"mmsi": "bad"},
+        ]
+        self.assertEqual(self.oracle.ingest_json(records), 2)
+        stay = self.oracle.port_stays["244123456:Rotterdam"]
+        self.assertEqual((stay.vessel_name, stay.duration_seconds), ("BALTIC TRADER", 7200))
+
+    def test_receive_ais_compat(self):
+        """Старый API: receive_ais + finalize_port_stay"""
+        message = AISMessage("244123456", "9123456", "BALTIC TRADER", 51.9, 4.5, 0.0, 0.0,
+                             VesselStatus.MOORED, "2026-01-30T10:00:00+00:00", OracleSource.MARINE_TRAFFIC)
+        self.assertEqual(self.oracle.receive_ais(message), message.to_hash())
+
+        stay = self.oracle.finalize_port_stay("244123456", "Rotterdam", "2026-02-01T10:00:00+00:00")
+        self.assertEqual(stay.messages, [message.to_hash()])
+        self.assertEqual(stay.juno_earned, 172800)
+        self.assertEqual(self.oracle.get_oracle_status()["completed_port_stays"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+"""
+test_auction_store.py — Unit tests для AuctionStore (montana_auction.py)
+
+Montana Protocol
+Тестирование журнала аукциона: replay, компакция, индекс истории,
+агрегированный учёт секунд звонков (CallMeter)
+"""
+
+import sys
+import os
+import json
+import shutil
+import logging
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+
+# Добавляем путь к модулю
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../Бот'))
+import montana_auction
+from montana_auction import (
+    AuctionRegistry,
+    CallMeter,
+    CallPricingService,
+    DomainService,
+    PhoneService,
+    ServiceType,
+    _auction_stores
+)
+from event_ledger import EventLedger, EventType
+
+logging.getLogger("EVENT_LEDGER").setLevel(logging.WARNING)
+
+
+BUYER = "mt" + "0" * 39 + "1"
+
+
+class AuctionStoreTestCase(unittest.TestCase):
+    """Общая временная директория для каждого теста"""
+
+    def setUp(self):
+        # Сервисы покупают через get_auction_registry(data_dir.parent / "data")
+        self.root = Path(tempfile.mkdtemp(prefix="montana_auction_"))
+        self.data_dir = self.root / "data"
+        self.reset_singletons()
+
+    def tearDown(self):
+        self.reset_singletons()
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def reset_singletons(self):
+        if montana_auction._call_meter is not None:
+            montana_auction._call_meter._stop.set()
+        _auction_stores.clear()
+        montana_auction._auction_registry = None
+        montana_auction._call_meter = None
+
+    def reopen(self):
+        """Эмуляция перезапуска процесса без компакции"""
+        self.reset_singletons()
+        return AuctionRegistry(self.data_dir)
+
+
+class TestJournal(AuctionStoreTestCase):
+    """Тесты append-only журнала"""
+
+    def test_fresh_dir_creates_snapshots(self):
+        """Новая директория получает snapshot-файлы старого формата"""
+        AuctionRegistry(self.data_dir)
+        counters = json.loads((self.data_dir / "auction_counters.json").read_text())
+        self.assertEqual(counters[ServiceType.DOMAIN], 0)
+        self.assertTrue((self.data_dir / "domains.json").exists())
+        self.assertTrue((self.data_dir / "phone_numbers.json").exists())
+
+    def test_purchase_appends_one_line(self):
+        """Покупка = одна строка журнала, snapshot не переписывается"""
+        auction = AuctionRegistry(self.data_dir)
+        snapshot_before = (self.data_dir / "auction_purchases.json").read_text()
+
+        auction.purchase(ServiceType.VPN, BUYER, "vpn-1", 1)
+
+        journal = (self.data_dir / "auction_journal.jsonl").read_text().splitlines()
+        self.assertEqual(len(journal), 1)
+        self.assertEqual((self.data_dir / "auction_purchases.json").read_text(), snapshot_before)
+
+    def test_replay_after_restart(self):
+        """Состояние восстанавливается из журнала после перезапуска"""
+        auction = AuctionRegistry(self.data_dir)
+        for i in range(3):
+            auction.purchase(ServiceType.DOMAIN, BUYER, f"d{i}", i + 1)
+
+        auction = self.reopen()
+        self.assertEqual(auction.get_total_sold(ServiceType.DOMAIN), 3)
+        self.assertEqual(auction.get_current_price(ServiceType.DOMAIN), 4)
+        self.assertEqual(len(auction.get_purchase_history(ServiceType.DOMAIN)), 3)
+
+    def test_replay_is_idempotent(self):
+        """Сбой между snapshot и очисткой журнала не дублирует данные"""
+        auction = AuctionRegistry(self.data_dir)
+        phones = PhoneService(self.data_dir)
+        phones.register(1, BUYER, 1)
+        phones.record_call("+montana-000001", "audio", 30, 1)
+
+        journal = (self.data_dir / "auction_journal.jsonl").read_text()
+        auction.store.compact()
+        # Журнал «не успел» очиститься
+        (self.data_dir / "auction_journal.jsonl").write_text(journal)
+
+        auction = self.reopen()
+        phones = PhoneService(self.data_dir)
+        self.assertEqual(auction.get_total_sold(ServiceType.PHONE_NUMBER), 1)
+        self.assertEqual(len(auction.get_purchase_history()), 1)
+        self.assertEqual(phones.lookup(1)["audio_seconds_used"], 30)
+
+    def test_periodic_compaction(self):
+        """После compact_every записей журнал сворачивается"""
+        auction = AuctionRegistry(self.data_dir)
+        auction.store.compact_every = 5
+        for i in range(7):
+            auction.purchase(ServiceType.STORAGE, BUYER, f"s{i}", i + 1)
+        auction.store._compactor.join(5)
+
+        journal = (self.data_dir / "auction_journal.jsonl").read_text().splitlines()
+        purchases = json.loads((self.data_dir / "auction_purchases.json").read_text())
+        self.assertEqual(len(journal), 2)
+        self.assertEqual(len(purchases), 5)
+        self.assertFalse((self.data_dir / "auction_journal.jsonl.1").exists())
+
+    def test_compaction_off_request_path(self):
+        """Запрос на пороге не ждёт записи snapshot; сбой посреди компакции не теряет данных"""
+        auction = AuctionRegistry(self.data_dir)
+        store = auction.store
+        store.compact_every = 3
+        release = threading.Event()
+        write_snapshot = store._write_snapshot
+
+        def stalled_write(files):
+            release.wait(5)
+            raise OSError("disk gone")
+
+        store._write_snapshot = stalled_write
+        for i in range(7):
+            auction.purchase(ServiceType.STORAGE, BUYER, f"s{i}", i + 1)
+        # Порог пройден дважды, пока первая компакция висит
+        self.assertTrue(store._compactor.is_alive())
+        self.assertTrue((self.data_dir / "auction_journal.jsonl.1").exists())
+
+        release.set()
+        store._compactor.join(5)
+        store._write_snapshot = write_snapshot
+
+        auction = self.reopen()
+        self.assertEqual(auction.get_total_sold(ServiceType.STORAGE), 7)
+        self.assertEqual(len(auction.get_purchase_history(ServiceType.STORAGE)), 7)
+        self.assertFalse((self.data_dir / "auction_journal.jsonl.1").exists())
+
+    def test_truncated_last_line_skipped(self):
+        """Оборванная строка журнала (сбой записи) пропускается"""
+        auction = AuctionRegistry(self.data_dir)
+        auction.purchase(ServiceType.VPN, BUYER, "vpn-1", 1)
+        with open(self.data_dir / "auction_journal.jsonl", "a") as f:
+            f.write('{"op": "purchase", "purch')
+
+        auction = self.reopen()
+        self.assertEqual(auction.get_total_sold(ServiceType.VPN), 1)
+
+
+class TestIndexedHistory(AuctionStoreTestCase):
+    """Тесты индекса истории по типу сервиса"""
+
+    def test_history_by_type_newest_first(self):
+        """История фильтруется по типу, последние первыми"""
+        auction = AuctionRegistry(self.data_dir)
+        auction.purchase(ServiceType.DOMAIN, BUYER, "alice", 1)
+        auction.purchase(ServiceType.VPN, BUYER, "vpn-1", 1)
+        auction.purchase(ServiceType.DOMAIN, BUYER, "bob", 2)
+
+        history = auction.get_purchase_history(ServiceType.DOMAIN, limit=10)
+        self.assertEqual([p["service_id"] for p in history], ["bob", "alice"])
+
+        history = auction.get_purchase_history(limit=2)
+        self.assertEqual([p["service_id"] for p in history], ["bob", "vpn-1"])
+
+    def test_stats_from_aggregates(self):
+        """Статистика считается по агрегатам без сканирования истории"""
+        auction = AuctionRegistry(self.data_dir)
+        auction.purchase(ServiceType.DOMAIN, BUYER, "alice", 1)
+        auction.purchase(ServiceType.DOMAIN, BUYER, "bob", 5)
+
+        stats = auction.get_stats()
+        self.assertEqual(stats["total_revenue"], 6)
+        self.assertEqual(stats["services"][ServiceType.DOMAIN]["revenue"], 6)
+        self.assertEqual(stats["services"][ServiceType.DOMAIN]["latest_purchase"]["service_id"], "bob")
+
+
+class TestServices(AuctionStoreTestCase):
+    """DomainService / PhoneService поверх общего хранилища"""
+
+    def test_domain_register_and_lookup(self):
+        domains = DomainService(self.data_dir)
+        AuctionRegistry(self.data_dir)
+        domains.register("alice", BUYER, 1)
+
+        self.assertFalse(domains.is_available("alice"))
+        self.assertEqual(domains.lookup("alice@montana.network")["owner"], BUYER)
+        with self.assertRaises(ValueError):
+            domains.register("alice", BUYER, 2)
+
+    def test_record_call_accumulates(self):
+        AuctionRegistry(self.data_dir)
+        phones = PhoneService(self.data_dir)
+        phones.register(7, BUYER, 1)
+        for _ in range(100):
+            phones.record_call("+montana-000007", "video", 3, 1)
+
+        self.assertEqual(phones.lookup(7)["video_seconds_used"], 300)
+        with self.assertRaises(ValueError):
+            phones.record_call("+montana-999999", "audio", 1, 1)
+
+
+class TestCallMeter(AuctionStoreTestCase):
+    """Тесты конвейера учёта секунд звонков"""
+
+    def setUp(self):
+        super().setUp()
+        self.auction = AuctionRegistry(self.data_dir)
+        self.meter = CallMeter(self.auction, flush_interval=60)
+
+    def tearDown(self):
+        self.meter._stop.set()
+        super().tearDown()
+
+    def test_price_tier_before_flush(self):
+        """Цена учитывает зарезервированные, но не сброшенные секунды"""
+        event = self.meter.record("audio", 10, BUYER, reserve_units=True)
+
+        self.assertEqual(event["first_unit"], 1)
+        self.assertEqual(event["cost"], sum(range(1, 11)))
+        self.assertEqual(self.meter.current_price(ServiceType.AUDIO_SECOND), 11)
+        self.assertEqual(self.auction.get_total_sold(ServiceType.AUDIO_SECOND), 0)
+
+    def test_flush_aggregates_per_caller(self):
+        """Много звонков одного адреса = одна покупка-пакет"""
+        other = "mt" + "0" * 39 + "2"
+        for _ in range(50):
+            self.meter.record("video", 2, BUYER, reserve_units=True)
+        self.meter.record("video", 5, other, reserve_units=True)
+
+        self.assertEqual(self.meter.flush(), 51)
+        self.assertEqual(self.auction.get_total_sold(ServiceType.VIDEO_SECOND), 105)
+        self.assertEqual(self.meter.current_price(ServiceType.VIDEO_SECOND), 106)
+
+        history = self.auction.get_purchase_history(ServiceType.VIDEO_SECOND)
+        self.assertEqual(len(history), 2)
+        self.assertEqual(sum(p["price_paid"] for p in history), sum(range(1, 106)))
+
+    def test_interleaved_callers_keep_history(self):
+        """Чередующиеся диапазоны: покупка на каждый непрерывный отрезок номеров"""
+        other = "mt" + "0" * 39 + "2"
+        self.meter.record("audio", 3, BUYER, reserve_units=True)
+        self.meter.record("audio", 2, BUYER, reserve_units=True)
+        self.meter.record("audio", 3, other, reserve_units=True)
+        self.meter.record("audio", 3, BUYER, reserve_units=True)
+        self.meter.flush()
+
+        history = self.auction.get_purchase_history(ServiceType.AUDIO_SECOND)
+        self.assertEqual([(p["service_id"], p["buyer_address"], p["units"], p["price_paid"])
+                          for p in reversed(history)], [
+            ("audio_second_1-5", BUYER, 5, sum(range(1, 6))),
+            ("audio_second_6-8", other, 3, sum(range(6, 9))),
+            ("audio_second_9-11", BUYER, 3, sum(range(9, 12))),
+        ])
+        self.assertEqual(self.auction.get_total_sold(ServiceType.AUDIO_SECOND), 11)
+
+    def test_phone_usage_and_ledger_batch(self):
+        """Секунды по номеру и ledger сворачиваются за окно"""
+        PhoneService(self.data_dir).register(5, BUYER, 1)
+        batches = []
+        self.meter.ledger_sink = batches.append
+
+        for _ in range(10):
+            self.meter.record("audio", 6, BUYER, callee_address="mt-callee",
+                              phone_number="+montana-000005", cost=6)
+        self.meter.flush()
+
+        self.assertEqual(PhoneService(self.data_dir).lookup(5)["audio_seconds_used"], 60)
+        self.assertEqual(len(batches), 1)
+        self.assertEqual(batches[0], [{
+            "caller": BUYER, "callee": "mt-callee", "call_type": "audio",
+            "calls": 10, "seconds": 60, "cost": 60
+        }])
+
+    def test_flush_into_event_ledger(self):
+        """Агрегаты окна попадают в настоящий EventLedger одной цепочкой"""
+        ledger_dir = self.root / "ledger"
+        ledger_dir.mkdir()
+        (ledger_dir / "node_id.txt").write_text("node-a")
+        ledger = EventLedger(ledger_dir)
+        self.meter.ledger_sink = ledger.record_calls
+
+        for _ in range(3):
+            self.meter.record("audio", 10, BUYER, callee_address="mt-callee", cost=10)
+        self.meter.record("video", 4, BUYER, callee_address="mt-callee", cost=4)
+        self.meter.flush()
+
+        events = ledger.get_events(event_type=EventType.CALL)
+        self.assertEqual(sorted((e.metadata["call_type"], e.metadata["calls"], e.amount)
+                                for e in events), [("audio", 3, 30), ("video", 1, 4)])
+        self.assertEqual(ledger.balance("mt-callee"), 34)
+
+        reloaded = EventLedger(ledger_dir)
+        self.assertEqual(reloaded.balances(), ledger.balances())
+        self.assertTrue(all(reloaded.has_event(e.event_id) for e in events))
+
+    def test_ring_overflow_flushes(self):
+        """Заполненный буфер сбрасывается в потоке записи"""
+        self.meter.ring_size = 4
+        for _ in range(4):
+            self.meter.record("audio", 1, BUYER, reserve_units=True)
+        self.assertEqual(self.auction.get_total_sold(ServiceType.AUDIO_SECOND), 4)
+
+    def test_pricing_service_uses_meter(self):
+        """CallPricingService регистрирует секунды без записи на каждую секунду"""
+        pricing = CallPricingService(self.data_dir)
+        result = pricing.register_audio_seconds(60, BUYER)
+
+        self.assertEqual(result["total_cost"], sum(range(1, 61)))
+        self.assertEqual(pricing.get_current_audio_price(), 61)
+        pricing.meter.flush()
+        self.assertEqual(len(self.auction.get_purchase_history(ServiceType.AUDIO_SECOND)), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
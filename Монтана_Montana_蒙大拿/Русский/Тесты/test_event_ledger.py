@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+test_event_ledger.py — Unit tests для event_ledger.py
+
+Montana Protocol
+Тестирование пакетного перевода: всё или ничего, одна цепочка prev_hash,
+перезагрузка из events.jsonl, дедупликация при мерже на другом узле
+"""
+
+import sys
+import os
+import shutil
+import logging
+import tempfile
+import unittest
+from pathlib import Path
+
+# Добавляем путь к модулю
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../Бот'))
+from event_ledger import EventLedger, EventType
+
+logging.getLogger("EVENT_LEDGER").setLevel(logging.WARNING)
+
+
+SENDER = "mt" + "a" * 40
+RECIPIENTS = ["mt" + f"{i:040x}" for i in range(1, 6)]
+
+
+class TestTransferBatch(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix="montana_ledger_")
+        self.ledger = self.make_ledger("node-a")
+        self.ledger.emit(SENDER, 100)
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def make_ledger(self, node_id, name="a"):
+        path = Path(self.root) / name
+        path.mkdir(exist_ok=True)
+        (path / "node_id.txt").write_text(node_id)
+        return EventLedger(path)
+
+    def rows(self, amounts):
+        return [(to, amount, {"tx_id": str(i)})
+                for i, (to, amount) in enumerate(zip(RECIPIENTS, amounts))]
+
+    def test_batch_applies_all(self):
+        ok, msg, events = self.ledger.transfer_batch(SENDER, self.rows([10, 20, 30]))
+
+        self.assertTrue(ok, msg)
+        self.assertEqual([e.event_type for e in events], [EventType.TRANSFER] * 3)
+        self.assertEqual(self.ledger.balance(SENDER), 40)
+        self.assertEqual([self.ledger.balance(a) for a in RECIPIENTS[:3]], [10, 20, 30])
+        self.assertEqual([e.metadata["tx_id"] for e in events], ["0", "1", "2"])
+
+    def test_insufficient_funds_writes_nothing(self):
+        size = self.ledger.events_file.stat().st_size
+        ok, msg, events = self.ledger.transfer_batch(SENDER, self.rows([60, 50]))
+
+        self.assertFalse(ok)
+        self.assertEqual(events, [])
+        self.assertEqual(self.ledger.balance(SENDER), 100)
+        self.assertEqual(self.ledger.balance(RECIPIENTS[0]), 0)
+        self.assertEqual(self.ledger.events_file.stat().st_size, size)
+
+    def test_chain_and_reload(self):
+        """prev_hash пачки продолжает цепочку; после перезапуска балансы те же"""
+        last = self.ledger._last_hash
+        _, _, events = self.ledger.transfer_batch(SENDER, self.rows([1, 2, 3, 4]))
+
+        self.assertEqual(events[0].prev_hash, last)
+        for prev, event in zip(events, events[1:]):
+            self.assertEqual(event.prev_hash, prev.event_hash)
+        self.assertEqual(self.ledger._last_hash, events[-1].event_hash)
+
+        # Следующий одиночный перевод цепляется за конец пачки
+        _, _, single = self.ledger.transfer(SENDER, RECIPIENTS[4], 5)
+        self.assertEqual(single.prev_hash, events[-1].event_hash)
+
+        reloaded = self.make_ledger("node-a")
+        self.assertEqual(reloaded.balances(), self.ledger.balances())
+        self.assertTrue(all(reloaded.has_event(e.event_id) for e in events))
+
+    def test_merge_batch_on_peer(self):
+        _, _, events = self.ledger.transfer_batch(SENDER, self.rows([10, 20]))
+        emission = self.ledger.get_events(event_type=EventType.EMISSION)[0]
+
+        peer = self.make_ledger("node-b", name="b")
+        batch = [emission.to_dict()] + [e.to_dict() for e in events]
+        self.assertEqual(peer.merge_events(batch), 3)
+        self.assertEqual(peer.merge_events(batch), 0)
+        self.assertEqual(peer.balance(SENDER), 70)
+
+
+if __name__ == "__main__":
+    unittest.main()
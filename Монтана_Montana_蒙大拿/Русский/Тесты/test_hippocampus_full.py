@@ -0,0 +1,492 @@
+#!/usr/bin/env python3
+"""
+test_hippocampus_full.py — Unit tests для hippocampus_full.py
+
+Montana Protocol
+Тестирование индексов, хранилища, векторного и геопоиска Внешнего Гиппокампа
+"""
+
+import sys
+import os
+import random
+import shutil
+import tempfile
+import time
+import unittest
+import zlib
+
+# Добавляем путь к модулю
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../Гиппокамп'))
+from hippocampus_full import (
+    HAS_NUMPY,
+    CoordinateStore,
+    ExternalHippocampus,
+    InvertedIndex,
+    SpatialIndex,
+    TimelineIndex,
+    VectorIndex
+)
+
+if HAS_NUMPY:
+    import numpy as np
+
+
+class HippocampusTestCase(unittest.TestCase):
+    """Гиппокамп во временной директории"""
+
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp(prefix="montana_hippocampus_")
+        self.hip = ExternalHippocampus(data_dir=self.data_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.data_dir, ignore_errors=True)
+
+    def reopen(self) -> ExternalHippocampus:
+        """Перезапуск: индексы строятся заново с диска"""
+        self.hip = ExternalHippocampus(data_dir=self.data_dir)
+        return self.hip
+
+
+class TestInvertedIndex(HippocampusTestCase):
+    """Тесты инвертированного индекса"""
+
+    # ═══════════════════════════════════════════════════════════════════════
+    #                         CROSS-REFERENCE
+    # ═══════════════════════════════════════════════════════════════════════
+
+    def test_terms_normalized(self):
+        """Термы без регистра и пунктуации"""
+        self.assertEqual(InvertedIndex.terms_of("Время, память!"), {"время", "память"})
+
+    def test_reference_by_tag(self):
+        """Общий тег создаёт связь"""
+        first = self.hip.save(1, "alice", "Утро начинается #кофе")
+        second = self.hip.save(1, "alice", "Вечер закончился #кофе")
+        self.assertEqual(second.references, [first.id])
+
+    def test_reference_by_common_terms(self):
+        """Три общих слова создают связь, два — нет"""
+        first = self.hip.save(1, "alice", "красное солнце встаёт над морем", tags=[])
+        second = self.hip.save(2, "bob", "красное солнце садится над горами", tags=[])
+        third = self.hip.save(3, "eve", "красное солнце и ничего больше", tags=[])
+
+        self.assertIn(first.id, second.references)
+        self.assertNotIn(first.id, third.references)
+
+    def test_tag_references_ranked_first(self):
+        """Связи по тегам идут раньше связей по тексту"""
+        by_text = self.hip.save(1, "alice", "один два три четыре", tags=[])
+        by_tag = self.hip.save(1, "alice", "совсем другое", tags=["x"])
+        coord = self.hip.save(1, "alice", "один два три пять", tags=["x"])
+        self.assertEqual(coord.references, [by_tag.id, by_text.id])
+
+    def test_references_capped(self):
+        """Не больше 10 связей"""
+        for i in range(15):
+            self.hip.save(1, "alice", f"мысль номер {i}", tags=["общий"])
+        coord = self.hip.save(1, "alice", "последняя", tags=["общий"])
+        self.assertEqual(len(coord.references), 10)
+
+    # ═══════════════════════════════════════════════════════════════════════
+    #                         ПОИСК
+    # ═══════════════════════════════════════════════════════════════════════
+
+    def test_simple_search_substring(self):
+        """Поиск по подстроке, включая часть слова"""
+        coord = self.hip.save(1, "alice", "Время и память неразделимы")
+        self.hip.save(1, "alice", "Совсем про другое")
+
+        self.assertEqual(self.hip._simple_search("память"), [coord])
+        self.assertEqual(self.hip._simple_search("ремя и па"), [coord])
+        self.assertEqual(self.hip._simple_search("и память не"), [coord])
+        self.assertEqual(self.hip._simple_search("отсутствует"), [])
+
+    def test_simple_search_filters(self):
+        """Фильтры user_id и limit применяются к кандидатам"""
+        for user_id in (1, 2, 2):
+            self.hip.save(user_id, "u", "общая мысль")
+        self.assertEqual(len(self.hip._simple_search("мысль", user_id=2)), 2)
+        self.assertEqual(len(self.hip._simple_search("мысль", limit=1)), 1)
+
+    def test_get_by_music(self):
+        """Поиск по треку через словарь треков"""
+        coord = self.hip.save(1, "alice", "Слушаю саундтрек")
+        self.hip.add_music_anchor(coord.id, "Hans Zimmer - Time")
+
+        self.assertEqual(self.hip.get_by_music("zimmer"), [coord])
+        self.hip.add_music_anchor(coord.id, "Max Richter - On the Nature of Daylight")
+        self.assertEqual(self.hip.get_by_music("zimmer"), [])
+
+    def test_index_rebuilt_on_load(self):
+        """Индекс восстанавливается после перезапуска"""
+        coord = self.hip.save(1, "alice", "Долгая мысль о времени")
+        self.reopen()
+        self.assertEqual(self.hip._simple_search("мысль"), [coord])
+
+
+class TestCoordinateStore(HippocampusTestCase):
+    """Тесты append-only хранилища с индексом смещений"""
+
+    def stream_lines(self):
+        with open(self.hip.stream_file, encoding="utf-8") as f:
+            return f.read().splitlines()
+
+    def test_save_appends_only(self):
+        """Новая мысль дописывает одну строку, старые не переписываются"""
+        self.hip.save(1, "alice", "первая")
+        before = self.stream_lines()
+        self.hip.save(1, "alice", "вторая")
+        after = self.stream_lines()
+
+        self.assertEqual(after[:len(before)], before)
+        self.assertEqual(len(after), len(before) + 1)
+
+    def test_mutation_appends_version(self):
+        """Изменение координаты = новая версия, переживает перезапуск"""
+        coord = self.hip.save(1, "alice", "На берегу")
+        self.hip.add_location(coord.id, 55.75, 37.61, "Москва")
+        self.hip.make_public(coord.id)
+        self.assertEqual(len(self.stream_lines()), 3)
+
+        self.reopen()
+        restored = self.hip.get(coord.id)
+        self.assertEqual(restored.location_name, "Москва")
+        self.assertTrue(restored.is_public)
+        self.assertEqual(len(list(self.hip._coords.values())), 1)
+
+    def test_references_from_index(self):
+        """Граф связей восстанавливается из индекса без чтения stream"""
+        first = self.hip.save(1, "alice", "Утро #кофе")
+        second = self.hip.save(1, "alice", "Вечер #кофе")
+        self.reopen()
+        self.assertIn(second.id, self.hip._references_cache[first.id])
+
+    def test_tail_indexed_after_crash(self):
+        """Строки stream без записи в индексе доиндексируются, обрывок отрезается"""
+        first = self.hip.save(1, "alice", "первая")
+        second = self.hip.save(1, "alice", "вторая")
+        self.hip._coords.close()
+
+        lines = open(self.hip.index_file, encoding="utf-8").read().splitlines()
+        with open(self.hip.index_file, "w", encoding="utf-8") as f:
+            f.write(lines[0] + "\n")
+        with open(self.hip.stream_file, "a", encoding="utf-8") as f:
+            f.write('{"id": "обры')
+
+        self.reopen()
+        self.assertEqual(self.hip.get(second.id).thought, "вторая")
+        self.assertEqual(len(self.hip._coords), 2)
+        self.assertEqual(len(self.stream_lines()), 2)
+        self.assertEqual(self.hip._simple_search("первая"), [first])
+
+    def test_compact_drops_stale_versions(self):
+        """Компакция оставляет по одной версии на координату"""
+        coord = self.hip.save(1, "alice", "Мысль")
+        other = self.hip.save(2, "bob", "Другая")
+        for i in range(5):
+            self.hip.add_music_anchor(coord.id, f"Track {i}")
+
+        self.hip._coords.compact()
+        self.assertEqual(len(self.stream_lines()), 2)
+        self.assertTrue(self.hip.references_file.exists())
+
+        self.reopen()
+        self.assertEqual(self.hip.get(coord.id).music_track, "Track 4")
+        self.assertEqual(self.hip.get(other.id).thought, "Другая")
+
+    def test_background_compaction(self):
+        """Устаревших версий больше порога — компакция в фоне"""
+        store = self.hip._coords
+        store.COMPACT_MIN_STALE = 3
+        coord = self.hip.save(1, "alice", "Мысль")
+        for i in range(4):
+            self.hip.add_music_anchor(coord.id, f"Track {i}")
+
+        store._compactor.join(timeout=5)
+        self.assertLess(len(self.stream_lines()), 5)
+        self.assertEqual(self.hip.get(coord.id).music_track, "Track 3")
+
+    def test_lru_cache_bounded(self):
+        """Кэш прочитанных координат ограничен, чтение идёт по смещению"""
+        ids = [self.hip.save(1, "alice", f"мысль {i}").id for i in range(5)]
+        self.hip._coords.close()
+
+        store = CoordinateStore(self.hip.stream_file, self.hip.index_file, cache_size=2)
+        self.addCleanup(store.close)
+        self.assertEqual([store[cid].thought for cid in ids], [f"мысль {i}" for i in range(5)])
+        self.assertEqual(list(store._cache), ids[-2:])
+
+
+class TestSpatialIndex(HippocampusTestCase):
+    """Тесты сеточного геоиндекса"""
+
+    def test_within_matches_bruteforce(self):
+        """Запрос по радиусу совпадает с полным перебором haversine"""
+        rng = random.Random(7)
+        index = SpatialIndex()
+        points = {}
+        for i in range(2000):
+            lat, lon = 55.0 + rng.uniform(-1, 1), 37.0 + rng.uniform(-1, 1)
+            points[f"c{i}"] = (lat, lon)
+            index.set(f"c{i}", 1, "2026-01-01", f"{lat},{lon}", None)
+
+        for radius in (0.5, 5, 40):
+            expected = {
+                cid for cid, (lat, lon) in points.items()
+                if ExternalHippocampus._haversine(55.3, 37.2, lat, lon) <= radius
+            }
+            hits = index.within(55.3, 37.2, radius)
+            self.assertEqual({cid for cid, _ in hits}, expected)
+            self.assertEqual([d for _, d in hits], sorted(d for _, d in hits))
+
+    def test_dateline_and_pole(self):
+        """Ячейки по обе стороны 180° меридиана и у полюса"""
+        index = SpatialIndex()
+        index.set("east", 1, "t", "0,179.99", None)
+        index.set("west", 1, "t", "0,-179.99", None)
+        index.set("pole", 1, "t", "89.99,10", None)
+
+        self.assertEqual({cid for cid, _ in index.within(0, -179.999, 5)}, {"east", "west"})
+        self.assertEqual([cid for cid, _ in index.within(89.995, -170, 5)], ["pole"])
+
+    def test_nearest_k(self):
+        """Ближайшие K через расширяющийся радиус"""
+        index = SpatialIndex()
+        for i, lat in enumerate((10.0, 10.5, 12.0, 40.0)):
+            index.set(f"c{i}", 1, "t", f"{lat},20", None)
+
+        self.assertEqual([cid for cid, _ in index.nearest(10.1, 20, k=3)], ["c0", "c1", "c2"])
+        self.assertEqual(len(index.nearest(10.1, 20, k=10)), 4)
+
+    def test_location_update_moves_point(self):
+        """add_location переносит точку и место пользователя"""
+        coord = self.hip.save(1, "alice", "Прогулка")
+        self.hip.add_location(coord.id, 55.75, 37.61, "Москва")
+        self.assertEqual(self.hip.get_by_location(55.75, 37.61), [coord])
+
+        self.hip.add_location(coord.id, 59.93, 30.33, "Петербург")
+        self.assertEqual(self.hip.get_by_location(55.75, 37.61), [])
+        self.assertEqual([p["place"] for p in self.hip.get_places(1)], ["Петербург"])
+
+    def test_places_and_rebuild(self):
+        """Места пользователя считаются по индексу и переживают перезапуск"""
+        for name in ("Дом", "Дом", "Работа"):
+            coord = self.hip.save(1, "alice", f"Я в {name}")
+            self.hip.add_location(coord.id, 55.75, 37.61, name)
+        self.hip.save(2, "bob", "Чужое", location="55.75,37.61", location_name="Дом")
+
+        self.reopen()
+        places = self.hip.get_places(1)
+        self.assertEqual([(p["place"], p["count"]) for p in places], [("Дом", 2), ("Работа", 1)])
+        self.assertEqual(len(self.hip.get_nearest(55.75, 37.61, k=10)), 4)
+
+
+class TestTimelineIndex(HippocampusTestCase):
+    """Тесты временных индексов и счётчиков"""
+
+    def save_at(self, user_id: int, timestamp: str, thought: str, tags=None):
+        """Координата с заданным временем (минуя utcnow)"""
+        coord = self.hip.save(user_id, f"user{user_id}", thought, tags=tags or [])
+        coord.timestamp = timestamp
+        self.hip._coords.put(coord)
+        return coord
+
+    def test_ids_ordered_and_filtered(self):
+        """Выборка по пользователю и датам — bisect по отсортированному списку"""
+        index = TimelineIndex()
+        for coord_id, user_id, ts in (("b", 1, "2026-01-02T10:00:00Z"), ("a", 1, "2026-01-01T09:00:00Z"),
+                                      ("c", 2, "2026-01-02T23:59:59Z"), ("d", 1, "2026-01-03T00:00:00Z")):
+            index.add(coord_id, {"u": user_id, "un": "x", "t": ts, "g": [], "s": [], "pub": False})
+
+        self.assertEqual(index.ids(), ["a", "b", "c", "d"])
+        self.assertEqual(index.ids(user_id=1), ["a", "b", "d"])
+        self.assertEqual(index.ids(from_date="2026-01-02", to_date="2026-01-02"), ["b", "c"])
+        self.assertEqual(index.latest(1, 2), ["b", "d"])
+        self.assertEqual(index.daily(1), {"2026-01-01": 1, "2026-01-02": 1, "2026-01-03": 1})
+
+    def test_user_stream_and_filters(self):
+        """get_user_stream / export по индексу, по возрастанию времени"""
+        coords = [self.hip.save(1, "alice", f"мысль {i}") for i in range(5)]
+        self.hip.save(2, "bob", "чужая")
+
+        self.assertEqual(self.hip.get_user_stream(1, limit=3), coords[-3:])
+        self.assertEqual(len(self.hip._filter_coords()), 6)
+        self.assertEqual(self.hip._filter_coords(from_date="2999-01-01"), [])
+
+    def test_shared_and_public_incremental(self):
+        """share/make_public обновляют счётчики без пересчёта"""
+        first = self.hip.save(1, "alice", "первая #море")
+        second = self.hip.save(1, "alice", "вторая #море")
+        self.hip.get_global_stats()  # индекс построен
+
+        self.hip.share(first.id, 2)
+        self.hip.share(first.id, 3)
+        self.hip.make_public(first.id)
+        self.hip.make_public(second.id)
+        self.hip.make_public(second.id)
+
+        stats = self.hip.get_global_stats()
+        self.assertEqual(stats["total_shared"], 1)
+        self.assertEqual(stats["total_public"], 2)
+        self.assertEqual(stats["top_tags"], [("море", 2)])
+        self.assertEqual(self.hip.get_public_stream(), [second, first])
+        self.assertEqual(self.hip.get_shared_with_me(3), [first])
+        self.assertEqual(self.hip.get_all_users()[0].connected_users, [2, 3])
+
+    def test_profiles_rebuilt_after_restart(self):
+        """Профили и статистика после перезапуска совпадают"""
+        self.save_at(1, "2026-01-01T10:00:00Z", "раз", tags=["a"])
+        self.save_at(1, "2026-01-11T10:00:00Z", "два", tags=["a", "b"])
+        self.save_at(2, "2026-01-05T10:00:00Z", "три")
+        before = (self.hip.get_all_users(), self.hip.get_global_stats())
+
+        self.reopen()
+        users, stats = self.hip.get_all_users(), self.hip.get_global_stats()
+        self.assertEqual((users, stats), before)
+
+        alice = next(u for u in users if u.user_id == 1)
+        self.assertEqual(alice.total_thoughts, 2)
+        self.assertEqual(alice.density_per_day, 0.2)
+        self.assertEqual(alice.top_tags, ["a", "b"])
+        self.assertEqual(stats["first_memory"], "2026-01-01T10:00:00Z")
+        self.assertEqual(stats["last_memory"], "2026-01-11T10:00:00Z")
+
+
+class BagOfWordsEncoder:
+    """Детерминированный encoder: хэши слов → вектор; пишет размеры пакетов"""
+
+    DIM = 64
+
+    def __init__(self):
+        self.batches = []
+
+    def __call__(self, texts):
+        self.batches.append(len(texts))
+        vectors = np.zeros((len(texts), self.DIM), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for term in InvertedIndex.terms_of(text):
+                vectors[row, zlib.crc32(term.encode("utf-8")) % self.DIM] += 1.0
+        return vectors
+
+
+@unittest.skipUnless(HAS_NUMPY, "numpy не установлен")
+class TestVectorIndex(HippocampusTestCase):
+    """Тесты локального векторного индекса"""
+
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp(prefix="montana_hippocampus_")
+        self.encoder = BagOfWordsEncoder()
+        self.hip = ExternalHippocampus(data_dir=self.data_dir, encoder=self.encoder)
+
+    def tearDown(self):
+        self.hip.close()
+        super().tearDown()
+
+    def reopen(self) -> ExternalHippocampus:
+        self.hip.close()
+        self.encoder = BagOfWordsEncoder()
+        self.hip = ExternalHippocampus(data_dir=self.data_dir, encoder=self.encoder)
+        return self.hip
+
+    def test_embedding_batched(self):
+        """Сохранения embedding-уются одним пакетом, а не по одному"""
+        for i in range(20):
+            self.hip.save(1, "alice", f"мысль номер {i}")
+        self.hip.vectors.flush()
+
+        self.assertEqual(len(self.hip.vectors), 20)
+        self.assertLess(len(self.encoder.batches), 20)
+        self.assertEqual(sum(self.encoder.batches), 20)
+
+    def test_search_ranks_by_similarity(self):
+        """Ближайшая по смыслу мысль — первая"""
+        self.hip.save(1, "alice", "море волны берег песок")
+        target = self.hip.save(1, "alice", "горы снег вершина ледник")
+        self.hip.save(1, "alice", "город улицы машины шум")
+        self.hip.vectors.flush()
+
+        self.assertEqual(self.hip.search("снег на вершине горы ледник", limit=1), [target])
+
+    def test_prefilters(self):
+        """Фильтры user/дата/теги применяются до ранжирования"""
+        alice = self.hip.save(1, "alice", "утренний кофе #кофе")
+        bob = self.hip.save(2, "bob", "утренний кофе")
+        self.hip.vectors.flush()
+        vectors = self.hip.vectors
+
+        self.assertEqual([cid for cid, _ in vectors.search("кофе", user_id=2)], [bob.id])
+        self.assertEqual([cid for cid, _ in vectors.search("кофе", tags=["кофе"])], [alice.id])
+        self.assertEqual(vectors.search("кофе", from_date="2999-01-01"), [])
+
+    def test_persisted_without_reembedding(self):
+        """После перезапуска матрица читается с диска, embedding не повторяется"""
+        coord = self.hip.save(1, "alice", "долгая мысль о времени")
+        self.hip.vectors.flush()
+
+        self.reopen()
+        self.hip.vectors.flush()
+        self.assertEqual(self.encoder.batches, [])
+        self.assertEqual(self.hip.vectors.search("мысль о времени")[0][0], coord.id)
+
+    def test_backfill_missing(self):
+        """Координаты без вектора доиндексируются при запуске"""
+        coord = self.hip.save(1, "alice", "записано без индекса")
+        self.hip.vectors.flush()
+        for name in ("vectors.json", "vectors.bin", "vectors.jsonl"):
+            os.remove(os.path.join(self.data_dir, name))
+
+        self.reopen()
+        deadline = time.time() + 5
+        while coord.id not in self.hip.vectors and time.time() < deadline:
+            time.sleep(0.05)
+            self.hip.vectors.flush()
+        self.assertIn(coord.id, self.hip.vectors)
+
+    def test_torn_write_recovered(self):
+        """Строка матрицы без записи в карте ID отрезается"""
+        self.hip.save(1, "alice", "первая мысль")
+        self.hip.vectors.flush()
+        with open(self.hip.vectors.matrix_file, "ab") as f:
+            f.write(b"\x00" * 10)
+        with open(self.hip.vectors.ids_file, "a", encoding="utf-8") as f:
+            f.write('{"id": "обры')
+
+        self.reopen()
+        self.assertEqual(len(self.hip.vectors), 1)
+        row_bytes = self.hip.vectors.dim * 4
+        self.assertEqual(os.path.getsize(self.hip.vectors.matrix_file), row_bytes)
+
+    def test_int8_quantization(self):
+        """int8 матрица в 4 раза меньше и ранжирует так же"""
+        quantized_dir = self.hip.data_dir / "int8"
+        quantized_dir.mkdir()
+        index = VectorIndex(quantized_dir, self.encoder, quantize=True)
+        self.addCleanup(index.close)
+
+        coords = [self.hip.save(1, "a", text) for text in ("красное солнце", "синее море", "зелёный лес")]
+        for coord in coords:
+            index.add(coord)
+        index.flush()
+
+        self.assertEqual(index.search("синее море", limit=1)[0][0], coords[1].id)
+        self.assertEqual(os.path.getsize(index.matrix_file), 3 * BagOfWordsEncoder.DIM)
+
+    def test_ivf_partitioning(self):
+        """IVF просматривает ближайшие кластеры и находит ту же мысль"""
+        vectors = self.hip.vectors
+        words = ["альфа", "бета", "гамма", "дельта", "эпсилон", "дзета", "эта", "тета"]
+        for i in range(200):
+            self.hip.save(1, "a", f"{words[i % 8]} {words[(i // 8) % 8]} {i}", tags=[])
+        vectors.flush()
+
+        vectors.build_ivf(nlist=8)
+        vectors.IVF_SCAN_ROWS = 0
+        vectors.IVF_NPROBE = 2
+        hits = vectors.search("гамма дельта", limit=5)
+        self.assertEqual(len(hits), 5)
+        self.assertTrue(self.hip.vectors.ivf_file.exists())
+        self.assertGreater(hits[0][1], 0.5)
+
+
+if __name__ == "__main__":
+    unittest.main()
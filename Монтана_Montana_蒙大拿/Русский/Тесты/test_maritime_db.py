@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+test_maritime_db.py — Unit tests для maritime_db.py
+
+Montana Protocol
+Тестирование пакетной записи позиций, помесячных партиций,
+таблицы последних позиций и полнотекстового поиска
+"""
+
+import sys
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# Добавляем путь к модулю
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../Логистика'))
+import maritime_db as db
+
+
+MMSI = "273456780"
+
+
+class MaritimeDBTestCase(unittest.TestCase):
+    """Временная база для каждого теста"""
+
+    def setUp(self):
+        self.tmp = Path(tempfile.mkdtemp(prefix="maritime_db_"))
+        self.saved_path = db.DB_PATH
+        db.DB_PATH = self.tmp / "maritime.db"
+        db.close_pool()
+
+    def tearDown(self):
+        db.close_pool()
+        db.DB_PATH = self.saved_path
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def init(self):
+        with open(os.devnull, "w") as devnull:
+            stdout, sys.stdout = sys.stdout, devnull
+            try:
+                db.init_db()
+            finally:
+                sys.stdout = stdout
+
+
+class TestBulkIngestion(MaritimeDBTestCase):
+    """Тесты пакетной записи"""
+
+    def setUp(self):
+        super().setUp()
+        self.init()
+
+    def test_bulk_insert_skips_duplicates(self):
+        """Повтор (mmsi, timestamp) не создаёт вторую строку"""
+        records = [{"mmsi": MMSI, "lat": 59.9, "lon": 30.2, "timestamp": 1760000000 + i}
+                   for i in range(100)]
+        self.assertEqual(db.add_positions(records), 100)
+        self.assertEqual(db.add_positions(records[:10]), 0)
+        self.assertEqual(db.get_stats()["positions"], 100)
+
+    def test_latest_keeps_newest(self):
+        """Запоздавшая старая позиция не перезаписывает последнюю"""
+        db.add_positions([{"mmsi": MMSI, "lat": 1.0, "lon": 1.0, "timestamp": "2026-10-01T12:00:00"}])
+        db.add_positions([{"mmsi": MMSI, "lat": 2.0, "lon": 2.0, "timestamp": "2026-10-01T11:00:00Z"}])
+
+        last = db.get_last_position(MMSI)
+        self.assertEqual(last["latitude"], 1.0)
+        self.assertEqual(last["timestamp"], "2026-10-01T12:00:00")
+        self.assertIsNone(db.get_last_position("000000000"))
+
+    def test_add_position_compatible(self):
+        """add_position пишет текущее время, received_at читается fromisoformat"""
+        db.add_position(MMSI, 51.9, 4.3, speed=0.1, destination="NLRTM")
+
+        last = db.get_last_position(MMSI)
+        self.assertEqual(last["destination"], "NLRTM")
+        received = datetime.fromisoformat(last["received_at"])
+        self.assertLess(datetime.utcnow() - received, timedelta(minutes=1))
+        self.assertEqual(len(db.get_position_history(MMSI, hours=1)), 1)
+
+
+class TestPartitions(MaritimeDBTestCase):
+    """Тесты помесячных партиций"""
+
+    def setUp(self):
+        super().setUp()
+        self.init()
+
+    def test_range_across_months(self):
+        """Диапазон на стыке месяцев читает обе партиции, новые первыми"""
+        db.add_positions([
+            {"mmsi": MMSI, "lat": 1, "lon": 1, "timestamp": "2026-08-31T23:00:00"},
+            {"mmsi": MMSI, "lat": 2, "lon": 2, "timestamp": "2026-09-01T01:00:00"},
+            {"mmsi": "111111111", "lat": 3, "lon": 3, "timestamp": "2026-09-01T02:00:00"},
+        ])
+
+        track = db.get_position_range(MMSI, "2026-08-31T00:00:00", "2026-09-02T00:00:00")
+        self.assertEqual([p["latitude"] for p in track], [2, 1])
+        self.assertEqual(db.get_stats()["position_partitions"], 2)
+
+    def test_positions_view(self):
+        """VIEW positions объединяет партиции"""
+        db.add_positions([
+            {"mmsi": MMSI, "lat": 1, "lon": 1, "timestamp": "2026-07-15T00:00:00"},
+            {"mmsi": MMSI, "lat": 2, "lon": 2, "timestamp": "2026-08-15T00:00:00"},
+        ])
+        with db.get_pool().connection() as conn:
+            self.assertEqual(conn.execute("SELECT COUNT(*) FROM positions").fetchone()[0], 2)
+
+    def test_drop_old_partitions(self):
+        """Retention удаляет целые месяцы"""
+        db.add_positions([
+            {"mmsi": MMSI, "lat": 1, "lon": 1, "timestamp": "2026-07-15T00:00:00"},
+            {"mmsi": MMSI, "lat": 2, "lon": 2, "timestamp": "2026-08-15T00:00:00"},
+        ])
+        self.assertEqual(db.drop_positions_before("2026-08-01T00:00:00"), ["positions_202607"])
+        self.assertEqual(db.get_stats()["positions"], 1)
+
+    def test_failed_batch_rolls_back(self):
+        """Ошибка в пакете откатывает и строки, и созданную партицию"""
+        with self.assertRaises(TypeError):
+            db.add_positions([
+                {"mmsi": MMSI, "lat": 1, "lon": 1, "timestamp": "2026-05-01T00:00:00"},
+                {"mmsi": MMSI, "lat": None, "lon": 1},
+            ])
+        self.assertEqual(db.get_stats()["position_partitions"], 0)
+
+    def test_uncommitted_partition_not_shared(self):
+        """Партиция из незакоммиченной транзакции не видна читателям через кэш"""
+        pool = db.get_pool()
+        with pool.connection() as conn:
+            pool.partitions(conn).add("positions_209901")  # копия, кэш не меняется
+
+        with pool.connection(write=True) as writer:
+            pool.ensure_partition(writer, "positions_202609")
+            self.assertIn("positions_202609", pool.partitions(writer))
+
+            self.assertEqual(db.get_position_range(MMSI, "2026-09-01T00:00:00",
+                                                   "2026-09-30T00:00:00"), [])
+            self.assertEqual(db.get_stats()["position_partitions"], 0)
+
+        with pool.connection() as conn:
+            self.assertEqual(pool.partitions(conn), {"positions_202609"})
+
+
+class TestSearch(MaritimeDBTestCase):
+    """Тесты полнотекстового поиска"""
+
+    def setUp(self):
+        super().setUp()
+        self.init()
+        db.upsert_vessel({"mmsi": "219000001", "imo": "9321483", "name": "MAERSK ESSEX", "owner": "A.P. Moller"})
+        db.upsert_vessel({"mmsi": "219000002", "imo": "9321484", "name": "NORDIC STAR", "owner": "Maersk Tankers"})
+        db.upsert_vessel({"mmsi": "636000003", "imo": "9400001", "name": "EVER GIVEN", "owner": "Shoei Kisen"})
+
+    def test_prefix_and_ranking(self):
+        """Префикс находит судно; совпадение в имени выше, чем во владельце"""
+        results = db.search_vessels("maers")
+        self.assertEqual([v["name"] for v in results], ["MAERSK ESSEX", "NORDIC STAR"])
+        self.assertEqual(db.search_vessels("6360")[0]["name"], "EVER GIVEN")
+
+    def test_typo_tolerance(self):
+        """Опечатка исправляется по словарю индекса"""
+        self.assertEqual([v["name"] for v in db.search_vessels("ever givn")], ["EVER GIVEN"])
+        self.assertEqual(db.search_vessels("maersk esex")[0]["name"], "MAERSK ESSEX")
+        self.assertEqual(db.search_vessels("zzzz"), [])
+
+    def test_upsert_keeps_index_in_sync(self):
+        """Переименование через upsert обновляет индекс"""
+        db.upsert_vessel({"mmsi": "636000003", "name": "EVER GLORY"})
+        self.assertEqual(db.search_vessels("given"), [])
+        self.assertEqual(db.get_vessel(name="glory")["mmsi"], "636000003")
+
+    def test_contacts_with_type(self):
+        """Поиск контактов учитывает тип"""
+        db.add_contact("owner", "Maersk Line", city="Copenhagen")
+        db.add_contact("agent", "Maersk Agency", city="Rotterdam")
+
+        results = db.search_contacts(query="maersk", contact_type="agent")
+        self.assertEqual([c["company_name"] for c in results], ["Maersk Agency"])
+        self.assertEqual(len(db.search_contacts(query="copenhagen")), 1)
+
+
+class TestMigration(MaritimeDBTestCase):
+    """Перенос старой таблицы positions"""
+
+    def test_legacy_rows_migrated(self):
+        db.DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(db.DB_PATH))
+        conn.execute("""
+            CREATE TABLE positions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, mmsi TEXT NOT NULL,
+                latitude REAL NOT NULL, longitude REAL NOT NULL, speed REAL,
+                course REAL, heading REAL, status TEXT, destination TEXT, eta TEXT,
+                timestamp TIMESTAMP NOT NULL, received_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        conn.executemany(
+            "INSERT INTO positions (mmsi, latitude, longitude, timestamp) VALUES (?, ?, ?, ?)",
+            [(MMSI, 10.0, 20.0, "2026-09-01T00:00:00"), (MMSI, 11.0, 21.0, "2026-09-02T00:00:00")]
+        )
+        conn.commit()
+        conn.close()
+
+        self.init()
+
+        self.assertEqual(db.get_stats()["positions"], 2)
+        self.assertEqual(db.get_last_position(MMSI)["latitude"], 11.0)
+        with db.get_pool().connection() as conn:
+            kind = conn.execute("SELECT type FROM sqlite_master WHERE name='positions'").fetchone()[0]
+        self.assertEqual(kind, "view")
+
+    def test_existing_vessels_indexed(self):
+        """Строки, записанные до создания индекса, попадают в поиск"""
+        db.DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(db.DB_PATH))
+        conn.execute("CREATE TABLE vessels (id INTEGER PRIMARY KEY AUTOINCREMENT, mmsi TEXT UNIQUE NOT NULL, "
+                     "imo TEXT, name TEXT, callsign TEXT, owner TEXT, operator TEXT, "
+                     "updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)")
+        conn.execute("INSERT INTO vessels (mmsi, name) VALUES ('219000001', 'MAERSK ESSEX')")
+        conn.commit()
+        conn.close()
+
+        self.init()
+        self.assertEqual(db.search_vessels("essex")[0]["mmsi"], "219000001")
+
+
+if __name__ == "__main__":
+    unittest.main()
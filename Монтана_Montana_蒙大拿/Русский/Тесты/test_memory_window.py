@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+test_memory_window.py — Unit tests для memory_window.py
+
+Montana Protocol
+Тестирование уровней хранения: LRU в RAM, сегменты warm-уровня,
+контентно-адресуемые cold-блобы и миграция по очередям возраста
+"""
+
+import sys
+import os
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+# Добавляем путь к модулю
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../Сеть'))
+from memory_window import (
+    COLD_PLACEHOLDER,
+    DistributedMemoryNetwork,
+    MemoryWindow,
+    StorageTier,
+    SyncStatus,
+    WindowConfig
+)
+
+
+DAY = 86400
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_760_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+class WindowTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = Path(tempfile.mkdtemp(prefix="montana_window_test_"))
+        self.clock = Clock()
+        self.windows = []
+
+    def tearDown(self):
+        for window in self.windows:
+            window.close()
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def open(self, node_id="node_a", **config):
+        window = MemoryWindow(node_id, WindowConfig(**config), data_dir=str(self.tmp / node_id),
+                              clock=self.clock)
+        self.windows.append(window)
+        return window
+
+
+class TestTiers(WindowTestCase):
+    """Тесты миграции между уровнями"""
+
+    def test_migration_by_age(self):
+        """Записи переходят HOT → WARM → COLD и остаются читаемыми"""
+        window = self.open()
+        old = window.write("старая мысль")
+        self.clock.now += 2 * DAY
+        middle = window.write("вчерашняя")
+        self.clock.now += 6 * DAY
+        fresh = window.write("свежая")
+
+        self.assertEqual(window.migrate(), {"hot_to_warm": 2, "warm_to_cold": 1})
+        self.assertEqual(window.read(fresh.record_id).tier, StorageTier.HOT)
+        self.assertEqual(window.read(middle.record_id).tier, StorageTier.WARM)
+
+        cold = window.read(old.record_id)
+        self.assertEqual(cold.tier, StorageTier.COLD)
+        self.assertEqual(cold.content, "старая мысль")
+
+    def test_migrate_is_incremental(self):
+        """Повторная миграция без новых пересечений границы ничего не делает"""
+        window = self.open()
+        for i in range(50):
+            window.write(f"m{i}")
+        self.clock.now += 3600
+        self.assertEqual(window.migrate()["hot_to_warm"], 50)
+        self.assertEqual(window.migrate(), {"hot_to_warm": 0, "warm_to_cold": 0})
+
+    def test_ram_bounded(self):
+        """LRU в RAM не превышает hot_max_records, остальное читается с диска"""
+        window = self.open(hot_max_records=10)
+        ids = [window.write(f"мысль {i}").record_id for i in range(100)]
+
+        self.assertEqual(window.get_window_status()["cached_records"], 10)
+        self.assertEqual(window.read(ids[0]).content, "мысль 0")
+        self.assertEqual([r.content for r in window.get_recent(3)],
+                         ["мысль 99", "мысль 98", "мысль 97"])
+
+    def test_segments_dropped_when_cold(self):
+        """Сегмент, все записи которого ушли в COLD, удаляется"""
+        window = self.open(segment_max_bytes=300)
+        for i in range(20):
+            window.write(f"мысль {i}")
+        segments_before = len(list((self.tmp / "node_a" / "warm").glob("*.log")))
+
+        self.clock.now += 8 * DAY
+        window.write("новая")
+        window.migrate()
+
+        segments_after = len(list((self.tmp / "node_a" / "warm").glob("*.log")))
+        self.assertGreater(segments_before, 2)
+        self.assertEqual(segments_after, 1)
+
+
+class TestRestart(WindowTestCase):
+    """Восстановление после перезапуска"""
+
+    def test_restore_window(self):
+        window = self.open()
+        old = window.write("архив")
+        self.clock.now += 8 * DAY
+        window.migrate()
+        recent = window.write("окно")
+        window.close()
+        self.windows.remove(window)
+
+        window = self.open()
+        status = window.get_window_status()
+        self.assertEqual((status["hot_records"], status["cold_records"]), (1, 1))
+        self.assertEqual(window.read(recent.record_id).sync_status, SyncStatus.PENDING)
+        self.assertEqual(window.read(old.record_id).content, "архив")
+
+    def test_torn_tail_truncated(self):
+        """Оборванная последняя строка сегмента отбрасывается"""
+        window = self.open()
+        kept = window.write("целая")
+        window.close()
+        self.windows.remove(window)
+        segment = next((self.tmp / "node_a" / "warm").glob("*.log"))
+        with open(segment, "ab") as f:
+            f.write(b'{"id":"torn","cont')
+
+        window = self.open()
+        self.assertEqual(window.get_window_status()["hot_records"], 1)
+        self.assertEqual(window.read(kept.record_id).content, "целая")
+        window.write("после")
+        self.assertTrue(segment.read_bytes().endswith(b"\n"))
+
+
+class TestEphemeralDir(unittest.TestCase):
+    """Узел без data_dir не оставляет файлов после close()"""
+
+    def test_close_removes_temp_dir(self):
+        network = DistributedMemoryNetwork()
+        dirs = [network.add_node(node_id).data_dir for node_id in ("a", "b")]
+        network.write_to_network("a", "мысль")
+        self.assertTrue(all(d.exists() for d in dirs))
+
+        network.close()
+        self.assertFalse(any(d.exists() for d in dirs))
+        self.assertEqual(network.nodes, {})
+
+
+class TestColdFetch(unittest.TestCase):
+    """Ленивое чтение cold-блобов с реплик"""
+
+    def setUp(self):
+        self.tmp = Path(tempfile.mkdtemp(prefix="montana_network_test_"))
+        self.network = DistributedMemoryNetwork(data_dir=str(self.tmp))
+        self.clock = Clock()
+        for node_id in ("a", "b", "c"):
+            self.network.add_node(node_id).clock = self.clock
+
+    def tearDown(self):
+        self.network.close()
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def test_fetch_from_replica(self):
+        """Потерянный локально блоб читается с реплики и проверяется по хешу"""
+        record, _ = self.network.write_to_network("a", "Время — единственная валюта")
+        node = self.network.nodes["a"]
+        self.clock.now += 8 * DAY
+        node.migrate()
+
+        digest, replicas = node.cold_index.get(record.record_id)
+        self.assertEqual(replicas, ["a", "b", "c"])
+        node.blobs._path(digest).unlink()
+        node._cache.clear()
+
+        self.assertEqual(node.read(record.record_id).content, "Время — единственная валюта")
+        self.assertEqual(node.stats["cold_fetches"], 1)
+        self.assertIn(digest, node.blobs)
+
+    def test_unreachable_placeholder(self):
+        """Без реплик cold-запись возвращается заглушкой"""
+        record, _ = self.network.write_to_network("a", "мысль")
+        self.clock.now += 8 * DAY
+        for window in self.network.nodes.values():
+            window.migrate()
+        digest, _ = self.network.nodes["a"].cold_index.get(record.record_id)
+        for window in self.network.nodes.values():
+            window.blobs._path(digest).unlink(missing_ok=True)
+        self.network.nodes["a"]._cache.clear()
+
+        self.assertEqual(self.network.nodes["a"].read(record.record_id).content, COLD_PLACEHOLDER)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+test_message_store.py — Unit tests для message_store.py
+
+Montana Protocol
+Тестирование хранилища P2P сообщений: канонический диалог, keyset-страницы,
+счётчики непрочитанных, список диалогов, перенос старой таблицы messages,
+уведомление подписчиков после коммита
+"""
+
+import sys
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import unittest
+
+# Добавляем путь к модулю
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../Сайт'))
+from message_store import MessageStore, conversation_id
+
+
+ALICE = "+79000000001"
+BOB = "+79000000002"
+CAROL = "+79000000003"
+
+
+class StoreTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix="montana_messages_")
+        self.db_path = os.path.join(self.root, "montana.db")
+        db = sqlite3.connect(self.db_path)
+        db.executescript('''
+            CREATE TABLE users (id INTEGER PRIMARY KEY, device_id TEXT UNIQUE NOT NULL, phone TEXT UNIQUE);
+            CREATE TABLE contacts (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, name TEXT NOT NULL, phone TEXT);
+        ''')
+        db.executemany("INSERT INTO users (id, device_id, phone) VALUES (?, ?, ?)",
+                       [(1, "dev-alice", ALICE), (2, "dev-bob", BOB), (3, "dev-carol", CAROL)])
+        db.execute("INSERT INTO contacts (user_id, name, phone) VALUES (1, 'Боб', ?)", (BOB,))
+        db.commit()
+        db.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def store(self):
+        return MessageStore(self.db_path, pool_size=2)
+
+
+class TestConversation(StoreTestCase):
+
+    def test_canonical_id(self):
+        self.assertEqual(conversation_id(ALICE, BOB), conversation_id(BOB, ALICE))
+
+    def test_send_and_read_both_sides(self):
+        store = self.store()
+        sent = store.send(ALICE, BOB, "привет")
+        store.send(BOB, ALICE, "здравствуй")
+
+        for me, other in [(ALICE, BOB), (BOB, ALICE)]:
+            messages, cursor = store.messages(me, other, mark_read=False)
+            self.assertEqual([m["content"] for m in messages], ["привет", "здравствуй"])
+            self.assertIsNone(cursor)
+        self.assertEqual(messages[0]["id"], sent["id"])
+
+    def test_user_lookup(self):
+        store = self.store()
+        self.assertEqual(store.user("dev-bob"), (2, BOB))
+        self.assertIsNone(store.user("unknown"))
+
+
+class TestPagination(StoreTestCase):
+
+    def test_keyset_pages(self):
+        store = self.store()
+        for n in range(25):
+            store.send(ALICE if n % 2 else BOB, BOB if n % 2 else ALICE, f"m{n}")
+
+        page, cursor = store.messages(ALICE, BOB, limit=10)
+        self.assertEqual([m["content"] for m in page], [f"m{n}" for n in range(15, 25)])
+
+        older, cursor = store.messages(ALICE, BOB, limit=10, before=cursor)
+        self.assertEqual([m["content"] for m in older], [f"m{n}" for n in range(5, 15)])
+
+        oldest, cursor = store.messages(ALICE, BOB, limit=10, before=cursor)
+        self.assertEqual([m["content"] for m in oldest], [f"m{n}" for n in range(5)])
+        self.assertIsNone(cursor)
+
+    def test_after_cursor(self):
+        store = self.store()
+        first = store.send(ALICE, BOB, "a")
+        store.send(ALICE, CAROL, "не из этого диалога")
+        store.send(BOB, ALICE, "b")
+        store.send(ALICE, BOB, "c")
+
+        newer, cursor = store.messages(ALICE, BOB, limit=1, after=first["cursor"])
+        self.assertEqual([m["content"] for m in newer], ["b"])
+        newer, cursor = store.messages(ALICE, BOB, limit=1, after=cursor)
+        self.assertEqual([m["content"] for m in newer], ["c"])
+        self.assertIsNone(cursor)
+
+    def test_cursor_from_other_conversation_matches_nothing(self):
+        store = self.store()
+        foreign = store.send(ALICE, CAROL, "x")
+        store.send(ALICE, BOB, "y")
+        self.assertEqual(store.messages(ALICE, BOB, before=foreign["cursor"])[0], [])
+
+
+class TestInbox(StoreTestCase):
+
+    def test_unread_counters(self):
+        store = self.store()
+        for n in range(3):
+            store.send(BOB, ALICE, f"b{n}")
+        store.send(CAROL, ALICE, "c")
+
+        conversations = {c["contact_phone"]: c for c in store.conversations(ALICE, 1)}
+        self.assertEqual(conversations[BOB]["unread_count"], 3)
+        self.assertEqual(conversations[BOB]["contact_name"], "Боб")
+        self.assertEqual(conversations[CAROL]["contact_name"], CAROL)
+        self.assertEqual(store.conversations(BOB, 2)[0]["unread_count"], 0)
+
+        store.messages(ALICE, BOB)
+        conversations = {c["contact_phone"]: c for c in store.conversations(ALICE, 1)}
+        self.assertEqual(conversations[BOB]["unread_count"], 0)
+        self.assertEqual(conversations[CAROL]["unread_count"], 1)
+        self.assertTrue(all(m["is_read"] for m in store.messages(ALICE, BOB)[0]))
+
+    def test_read_without_unread_writes_nothing(self):
+        store = self.store()
+        store.send(ALICE, BOB, "a")
+        store.messages(ALICE, BOB)
+        self.assertEqual(store.stats["marked_read"], 0)
+        store.messages(BOB, ALICE)
+        store.messages(BOB, ALICE)
+        self.assertEqual(store.stats["marked_read"], 1)
+
+    def test_conversations_most_recent_first(self):
+        store = self.store()
+        store.send(ALICE, BOB, "1")
+        store.send(ALICE, CAROL, "2")
+        store.send(BOB, ALICE, "3")
+
+        conversations = store.conversations(ALICE, 1)
+        self.assertEqual([c["contact_phone"] for c in conversations], [BOB, CAROL])
+        self.assertEqual(conversations[0]["last_message"], "3")
+
+    def test_listener_after_commit(self):
+        store = self.store()
+        seen = []
+        store.add_listener(lambda m: seen.append((m, store.conversations(BOB, 2)[0]["unread_count"])))
+        store.add_listener(lambda m: 1 / 0)
+
+        sent = store.send(ALICE, BOB, "a")
+        self.assertEqual(seen, [(sent, 1)])
+
+    def test_concurrent_sends(self):
+        store = self.store()
+
+        def send(n):
+            for i in range(50):
+                store.send(BOB, ALICE, f"{n}-{i}")
+
+        threads = [threading.Thread(target=send, args=(n,)) for n in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(store.conversations(ALICE, 1)[0]["unread_count"], 200)
+        self.assertEqual(len(store.messages(ALICE, BOB, limit=200)[0]), 200)
+
+
+class TestMigration(StoreTestCase):
+
+    def test_legacy_messages_migrated(self):
+        db = sqlite3.connect(self.db_path)
+        db.execute('''CREATE TABLE messages (id TEXT PRIMARY KEY, from_phone TEXT NOT NULL,
+                      to_phone TEXT NOT NULL, content TEXT NOT NULL, timestamp TEXT NOT NULL,
+                      is_read INTEGER DEFAULT 0)''')
+        db.executemany("INSERT INTO messages VALUES (?, ?, ?, ?, ?, ?)", [
+            ("m1", ALICE, BOB, "old 1", "2026-01-10T10:00:00.000000Z", 1),
+            ("m2", BOB, ALICE, "old 2", "2026-01-10T10:01:00.000000Z", 0),
+            ("m3", BOB, ALICE, "old 3", "2026-01-10T10:02:00.000000Z", 0),
+        ])
+        db.commit()
+        db.close()
+
+        store = self.store()
+        self.assertEqual([m["content"] for m in store.messages(ALICE, BOB, mark_read=False)[0]],
+                         ["old 1", "old 2", "old 3"])
+        self.assertEqual(store.conversations(ALICE, 1)[0]["unread_count"], 2)
+        self.assertEqual(store.conversations(BOB, 2)[0]["unread_count"], 0)
+
+        # Повторный старт не переносит второй раз
+        self.assertEqual(len(self.store().messages(ALICE, BOB)[0]), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+test_montana_agent.py — Unit tests для montana_agent.py
+
+Montana Protocol
+Тестирование агента ключей: подпись по сокету, фоновая разблокировка,
+TTL, lock, чужой адрес, запуск serve(), кэш ML-KEM пары в mlkem768
+"""
+
+import sys
+import os
+import hashlib
+import hmac
+import shutil
+import stat
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+
+# Добавляем путь к модулю
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../CLI'))
+import mlkem768
+import montana_agent
+from montana_agent import (
+    STATE_FAILED,
+    STATE_READY,
+    STATE_UNLOCKING,
+    AgentClient,
+    AgentError,
+    AgentServer,
+    KeyAgent,
+    connect_agent,
+    serve
+)
+
+
+ADDRESS = "mt" + "a" * 40
+KEY = b"\x07" * 32
+
+
+def hmac_sign(key, data):
+    return hmac.new(key, data, hashlib.sha256).digest()
+
+
+class Clock:
+    def __init__(self, now=1_767_225_600.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class AgentTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix="montana_agent_")
+        self.path = Path(self.root) / "agent.sock"
+        self.clock = Clock()
+        self.agent = KeyAgent(ADDRESS, ttl=60, sign=hmac_sign, clock=self.clock)
+        self.server = AgentServer(self.path, self.agent)
+        self.thread = threading.Thread(
+            target=self.server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True
+        )
+        self.thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.root, ignore_errors=True)
+
+
+class TestSigning(AgentTestCase):
+
+    def test_sign_over_socket(self):
+        self.agent.unlock(lambda: KEY)
+        client = AgentClient(self.path)
+        try:
+            for n in range(20):
+                data = b"TRANSFER:%d" % n
+                self.assertEqual(client.sign(data), hmac_sign(KEY, data))
+        finally:
+            client.close()
+        self.assertEqual(self.agent.stats["signatures"], 20)
+
+    def test_socket_private(self):
+        self.assertEqual(stat.S_IMODE(os.stat(self.path).st_mode) & 0o077, 0)
+
+    def test_async_unlock(self):
+        """Сокет отвечает, пока идёт KDF; подпись дожидается ключа"""
+        release = threading.Event()
+
+        def loader():
+            release.wait(5)
+            return KEY
+
+        self.agent.unlock_async(loader)
+        client = AgentClient(self.path)
+        try:
+            self.assertEqual(client.status()["state"], STATE_UNLOCKING)
+            release.set()
+            self.assertEqual(client.sign(b"x"), hmac_sign(KEY, b"x"))
+            self.assertEqual(client.status()["state"], STATE_READY)
+        finally:
+            client.close()
+
+    def test_failed_unlock(self):
+        self.agent.unlock(lambda: None)
+        client = AgentClient(self.path)
+        try:
+            status = client.status(wait=True)
+            self.assertEqual(status["state"], STATE_FAILED)
+            self.assertEqual(status["error"], "wrong cognitive key")
+            with self.assertRaises(AgentError):
+                client.sign(b"x")
+        finally:
+            client.close()
+
+    def test_ttl_expiry(self):
+        self.agent.unlock(lambda: KEY)
+        self.clock.now += 30
+        self.assertEqual(self.agent.status()["expires_in"], 30)
+
+        self.clock.now += 31
+        with self.assertRaises(AgentError) as ctx:
+            self.agent.sign(b"x")
+        self.assertIn("expired", str(ctx.exception))
+        self.assertEqual(self.agent.state, STATE_FAILED)
+
+    def test_lock(self):
+        self.agent.unlock(lambda: KEY)
+        client = AgentClient(self.path)
+        try:
+            client.lock()
+            with self.assertRaises(AgentError):
+                client.sign(b"x")
+        finally:
+            client.close()
+
+    def test_bad_request(self):
+        self.agent.unlock(lambda: KEY)
+        client = AgentClient(self.path)
+        try:
+            with self.assertRaises(AgentError):
+                client.call({"op": "export"})
+            with self.assertRaises(AgentError):
+                client.call({"op": "sign", "data": "zz"})
+            # Соединение живо после ошибок
+            self.assertEqual(client.sign(b"y"), hmac_sign(KEY, b"y"))
+        finally:
+            client.close()
+
+
+class TestConnect(AgentTestCase):
+
+    def test_connect_matching_address(self):
+        self.agent.unlock(lambda: KEY)
+        client = connect_agent(ADDRESS, self.path)
+        self.assertIsNotNone(client)
+        client.close()
+
+    def test_other_wallet_or_failed_ignored(self):
+        self.assertIsNone(connect_agent("mt" + "b" * 40, self.path))
+        self.agent.unlock(lambda: None)
+        self.assertIsNone(connect_agent(ADDRESS, self.path))
+        self.assertIsNone(connect_agent(ADDRESS, Path(self.root) / "missing.sock"))
+
+    def test_server_exits_after_lock(self):
+        original = montana_agent.CLOSE_GRACE
+        montana_agent.CLOSE_GRACE = 0
+        try:
+            self.agent.unlock(lambda: KEY)
+            self.agent.lock()
+            self.thread.join(5)
+        finally:
+            montana_agent.CLOSE_GRACE = original
+        self.assertFalse(self.thread.is_alive())
+
+
+class TestServe(unittest.TestCase):
+    """serve(): сокет сразу, ключ из keys_dir в фоне, выход после lock"""
+
+    def setUp(self):
+        self.root = Path(tempfile.mkdtemp(prefix="montana_agent_"))
+        (self.root / "private.key").write_bytes(KEY)
+        self.path = self.root / "agent.sock"
+        self.original = montana_agent.load_key, montana_agent.CLOSE_GRACE, KeyAgent.unlock
+
+    def tearDown(self):
+        montana_agent.load_key, montana_agent.CLOSE_GRACE, KeyAgent.unlock = self.original
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def test_serve_unlocks_and_exits(self):
+        calls = []
+        load_key, unlock = montana_agent.load_key, KeyAgent.unlock
+
+        def recording_load_key(keys_dir, cognitive_key):
+            calls.append(cognitive_key)
+            return load_key(keys_dir, cognitive_key)
+
+        def slow_unlock(agent, loader):
+            # Фоновый поток берёт ключ уже после того, как serve() забыл локальную
+            time.sleep(0.2)
+            unlock(agent, loader)
+
+        montana_agent.load_key = recording_load_key
+        KeyAgent.unlock = slow_unlock
+        montana_agent.CLOSE_GRACE = 0
+        thread = threading.Thread(target=serve, args=(ADDRESS, self.root, "ключ"),
+                                  kwargs={"path": self.path}, daemon=True)
+        thread.start()
+
+        for _ in range(100):
+            if self.path.exists():
+                break
+            time.sleep(0.02)
+        client = AgentClient(self.path)
+        try:
+            status = client.status(wait=True)
+            self.assertEqual(status["state"], STATE_READY, status["error"])
+            self.assertEqual(status["address"], ADDRESS)
+            self.assertEqual(calls, ["ключ"])
+            client.lock()
+        finally:
+            client.close()
+
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+        self.assertFalse(self.path.exists())
+
+
+class TestKeypairCache(unittest.TestCase):
+    """Одна и та же ML-KEM пара не выводится дважды за процесс"""
+
+    def setUp(self):
+        self.calls = []
+        self.original = mlkem768.pbkdf2_derive, mlkem768.keypair_from_seed
+        mlkem768.pbkdf2_derive = lambda *args: self.calls.append(args) or b"\x00" * 48
+        mlkem768.keypair_from_seed = lambda seed: (b"sk", b"pk")
+        mlkem768.forget_keypairs()
+
+    def tearDown(self):
+        mlkem768.pbkdf2_derive, mlkem768.keypair_from_seed = self.original
+        mlkem768.forget_keypairs()
+
+    def test_cached_by_normalized_key(self):
+        self.assertEqual(mlkem768.derive_keypair("Мой  Ключ"), (b"sk", b"pk"))
+        self.assertEqual(mlkem768.derive_keypair("мой ключ"), (b"sk", b"pk"))
+        self.assertEqual(len(self.calls), 1)
+
+        mlkem768.derive_keypair("другой ключ")
+        self.assertEqual(len(self.calls), 2)
+
+        mlkem768.forget_keypairs()
+        mlkem768.derive_keypair("мой ключ")
+        self.assertEqual(len(self.calls), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
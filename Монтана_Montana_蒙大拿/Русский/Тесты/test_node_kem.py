@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+test_node_kem.py — Unit tests для node_kem.py
+
+Montana Protocol
+Тестирование потокового режима канала: HKDF, счётчиковые nonce,
+смена ключа по сообщениям и байтам, пакетное шифрование, replay
+"""
+
+import sys
+import os
+import unittest
+from datetime import datetime, timezone
+
+# Добавляем путь к модулю
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../Бот'))
+from node_kem import (
+    HAS_CRYPTO,
+    MODE_MESSAGE,
+    MODE_STREAM,
+    STREAM_HEADER,
+    TAG_SIZE,
+    SecureChannel,
+    choose_cipher_mode,
+    hkdf_sha256
+)
+
+
+ALICE = "mt" + "a" * 40
+BOB = "mt" + "b" * 40
+
+
+def channel_pair(mode=MODE_STREAM, **kwargs):
+    """Два конца одного канала с общим секретом"""
+    secret = bytes(range(32))
+    now = datetime.now(timezone.utc)
+    return (SecureChannel(ALICE, BOB, secret, now, mode=mode, **kwargs),
+            SecureChannel(BOB, ALICE, secret, now, mode=mode, **kwargs))
+
+
+class TestKeyDerivation(unittest.TestCase):
+
+    def test_hkdf_rfc5869_vector(self):
+        """RFC 5869, тестовый вектор 1"""
+        okm = hkdf_sha256(
+            bytes([0x0b] * 22),
+            bytes(range(0x0d)),
+            bytes(range(0xf0, 0xfa)),
+            42
+        )
+        self.assertEqual(okm.hex(), (
+            "3cb25f25faacd57a90434f64d0362f2a2d2d0a90cf1a5a4c5db0"
+            "2d56ecc4c5bf34007208d5b887185865"
+        ))
+
+    def test_choose_cipher_mode(self):
+        self.assertEqual(choose_cipher_mode([MODE_MESSAGE, MODE_STREAM]), MODE_STREAM)
+        self.assertEqual(choose_cipher_mode([MODE_MESSAGE]), MODE_MESSAGE)
+        self.assertEqual(choose_cipher_mode(None), MODE_MESSAGE)
+        self.assertEqual(choose_cipher_mode([None]), MODE_MESSAGE)
+
+
+@unittest.skipUnless(HAS_CRYPTO, "cryptography not installed")
+class TestStreamChannel(unittest.TestCase):
+
+    def test_round_trip_both_directions(self):
+        alice, bob = channel_pair()
+        for n in range(5):
+            self.assertEqual(bob.decrypt(alice.encrypt(b"ping %d" % n)), b"ping %d" % n)
+            self.assertEqual(alice.decrypt(bob.encrypt(b"pong %d" % n)), b"pong %d" % n)
+
+    def test_frame_overhead(self):
+        """Заголовок 12 байт служит nonce: накладные расходы 28 байт"""
+        alice, _ = channel_pair()
+        frame = alice.encrypt(b"x" * 100)
+        self.assertEqual(len(frame), 100 + STREAM_HEADER.size + TAG_SIZE)
+        self.assertEqual(STREAM_HEADER.unpack_from(frame), (0, 1))
+
+    def test_replay_and_reorder_rejected(self):
+        alice, bob = channel_pair()
+        first, second = alice.encrypt(b"1"), alice.encrypt(b"2")
+
+        self.assertEqual(bob.decrypt(second), b"2")
+        self.assertIsNone(bob.decrypt(first))
+        self.assertIsNone(bob.decrypt(second))
+
+    def test_tampered_frame_keeps_state(self):
+        alice, bob = channel_pair()
+        frame = alice.encrypt(b"payload")
+        forged = frame[:-1] + bytes([frame[-1] ^ 1])
+
+        self.assertIsNone(bob.decrypt(forged))
+        self.assertEqual(bob.decrypt(frame), b"payload")
+
+    def test_wrong_direction_rejected(self):
+        """Ключи направлений различаются: свой фрейм не расшифровать"""
+        alice, _ = channel_pair()
+        self.assertIsNone(alice.decrypt(alice.encrypt(b"echo")))
+
+    def test_rekey_by_messages(self):
+        alice, bob = channel_pair(rekey_messages=3)
+        frames = [alice.encrypt(b"m%d" % n) for n in range(10)]
+
+        self.assertEqual([bob.decrypt(f) for f in frames], [b"m%d" % n for n in range(10)])
+        self.assertEqual([STREAM_HEADER.unpack_from(f)[0] for f in frames],
+                         [0, 0, 0, 1, 1, 1, 2, 2, 2, 3])
+        self.assertEqual(alice._tx.stats["rekeys"], 3)
+        self.assertEqual(bob._rx.stats["rekeys"], 3)
+        # Фрейм прошлой эпохи после смены ключа не принимается
+        self.assertIsNone(bob.decrypt(frames[5]))
+
+    def test_rekey_by_bytes(self):
+        alice, bob = channel_pair(rekey_bytes=1000)
+        frames = alice.encrypt_batch([b"x" * 400] * 6)
+
+        self.assertEqual([STREAM_HEADER.unpack_from(f)[0] for f in frames], [0, 0, 0, 1, 1, 1])
+        self.assertEqual(bob.decrypt_batch(frames), [b"x" * 400] * 6)
+
+    def test_forged_future_epoch_ignored(self):
+        """Мусор с большим номером эпохи не сдвигает ключ получателя"""
+        alice, bob = channel_pair()
+        forged = STREAM_HEADER.pack(7, 1) + os.urandom(40)
+
+        self.assertIsNone(bob.decrypt(forged))
+        self.assertEqual(bob.decrypt(alice.encrypt(b"ok")), b"ok")
+
+    def test_batch_matches_single(self):
+        alice, bob = channel_pair()
+        messages = [os.urandom(n) for n in range(0, 300, 7)]
+        frames = alice.encrypt_batch(messages)
+        frames.append(alice.encrypt(b"tail"))
+
+        opened = bob.decrypt_batch(frames[:10] + [frames[3]] + frames[10:])
+        self.assertEqual(opened[:10], messages[:10])
+        self.assertIsNone(opened[10])
+        self.assertEqual(opened[11:], messages[10:] + [b"tail"])
+
+    def test_per_message_mode_unchanged(self):
+        """Старый формат: счётчик (8) + nonce (12) + ciphertext + tag"""
+        alice, bob = channel_pair(MODE_MESSAGE)
+        frames = alice.encrypt_batch([b"a", b"b"])
+
+        self.assertEqual(int.from_bytes(frames[1][:8], 'big'), 2)
+        self.assertEqual(len(frames[0]), 1 + 8 + 12 + TAG_SIZE)
+        self.assertEqual(bob.decrypt_batch(frames), [b"a", b"b"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,365 @@
+#!/usr/bin/env python3
+"""
+test_node_tls.py — Unit tests для node_tls.py
+
+Montana Protocol
+Тестирование постоянных каналов: мультиплексирование запросов,
+переподключение с задержкой, keepalive, сервер без номеров потоков,
+возобновление PQ канала с подтверждением ключа
+"""
+
+import sys
+import os
+import json
+import shutil
+import asyncio
+import tempfile
+import unittest
+from datetime import datetime, timezone
+from pathlib import Path
+
+# Добавляем путь к модулю
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../Бот'))
+from node_kem import MODE_STREAM, SecureChannel
+from node_tls import (
+    CertificateManager,
+    ChannelManager,
+    HybridSecureServer,
+    PeerChannel,
+    SecureContext,
+    SecureNodeClient,
+    SecureNodeServer,
+    TLSConfig,
+    STREAM_FIELD,
+    read_frame,
+    write_frame
+)
+
+
+NODE_ADDRESS = "mt" + "0" * 40
+CLIENT_ADDRESS = "mt" + "c" * 40
+
+
+class FakeKEM:
+    """
+    Обмен ключами без ML-KEM/ML-DSA (kyber-py и dilithium-py не нужны):
+    секрет передаётся открыто, каналы — настоящие SecureChannel
+    """
+
+    def __init__(self, node_address):
+        self.node_address = node_address
+
+    def get_handshake_request(self):
+        return {"type": "kem_handshake", "node_address": self.node_address}
+
+    def process_handshake_request(self, request):
+        secret = os.urandom(32)
+        channel = SecureChannel(self.node_address, request["node_address"], secret,
+                                datetime.now(timezone.utc), mode=MODE_STREAM)
+        return {"type": "kem_response", "node_address": self.node_address,
+                "secret": secret.hex()}, channel
+
+    def process_handshake_response(self, response):
+        return SecureChannel(self.node_address, response["node_address"],
+                             bytes.fromhex(response["secret"]),
+                             datetime.now(timezone.utc), mode=MODE_STREAM)
+
+
+class ChannelTestCase(unittest.IsolatedAsyncioTestCase):
+    """TLS сервер на свободном порту localhost"""
+
+    @classmethod
+    def setUpClass(cls):
+        # Сертификат генерируется один раз на все тесты
+        cls.root = Path(tempfile.mkdtemp(prefix="montana_tls_"))
+        cls.cert_manager = CertificateManager(cls.root)
+        cls.cert_manager.generate_self_signed_cert(NODE_ADDRESS, "test", days_valid=1)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.root, ignore_errors=True)
+
+    async def asyncSetUp(self):
+        self.connections = 0
+        self.server = SecureNodeServer("test", NODE_ADDRESS, self.cert_manager)
+
+        handle_client = self.server._handle_client
+
+        async def counting(reader, writer):
+            self.connections += 1
+            await handle_client(reader, writer)
+
+        self.server._handle_client = counting
+
+        async def echo(message, peer):
+            await asyncio.sleep(message.get("delay", 0))
+            return {"type": "echo", "n": message["n"]}
+
+        self.server.register_handler("echo", echo)
+        listener = await self.server.listen("127.0.0.1", 0)
+        self.port = listener.sockets[0].getsockname()[1]
+        self.manager = ChannelManager()
+
+    async def asyncTearDown(self):
+        await self.manager.close()
+        self.server.stop()
+
+
+class TestMultiplexing(ChannelTestCase):
+    """Один канал на узел, параллельные запросы"""
+
+    async def test_concurrent_requests_share_connection(self):
+        """Ответы приходят не по порядку, но каждому запросу — свой"""
+        channel = self.manager.get_channel("127.0.0.1", self.port)
+        responses = await asyncio.gather(*(
+            channel.request({"type": "echo", "n": n, "delay": (20 - n) * 0.005})
+            for n in range(20)
+        ))
+
+        self.assertEqual([r["n"] for r in responses], list(range(20)))
+        self.assertNotIn(STREAM_FIELD, responses[0])
+        self.assertEqual(self.connections, 1)
+        self.assertEqual(channel.stats["connects"], 1)
+
+    async def test_binary_format_negotiated(self):
+        """Новый сервер согласует mw1; hex-поля доходят без изменений"""
+        signature = os.urandom(3309).hex()
+        async def store(message, peer):
+            return {"type": "stored", "signature": message["signature"]}
+
+        self.server.register_handler("store", store)
+        channel = self.manager.get_channel("127.0.0.1", self.port)
+        response = await channel.request({"type": "store", "signature": signature})
+
+        self.assertTrue(channel.binary)
+        self.assertEqual(response["signature"], signature)
+        self.assertLess(channel.stats["bytes_sent"], len(signature))
+
+    async def test_send_message_reuses_connection(self):
+        """SecureNodeClient.send_message больше не открывает соединение на сообщение"""
+        client = SecureNodeClient(self.cert_manager)
+        for _ in range(5):
+            response = await client.send_message("127.0.0.1", {"type": "ping"}, self.port)
+            self.assertEqual(response["type"], "ack")
+        await client.close()
+
+        self.assertEqual(self.connections, 1)
+
+    async def test_handler_error_answers_stream(self):
+        """Ошибка обработчика не рвёт соединение и не вешает запрос"""
+        async def broken(message, peer):
+            raise RuntimeError("boom")
+
+        self.server.register_handler("broken", broken)
+        channel = self.manager.get_channel("127.0.0.1", self.port)
+
+        response = await channel.request({"type": "broken"}, timeout=5)
+        self.assertEqual(response["type"], "error")
+        self.assertEqual((await channel.request({"type": "echo", "n": 1}))["n"], 1)
+
+
+class TestReconnect(ChannelTestCase):
+    """Обрыв соединения и задержка переподключения"""
+
+    async def test_reconnect_after_drop(self):
+        channel = self.manager.get_channel("127.0.0.1", self.port)
+        await channel.request({"type": "echo", "n": 1})
+
+        channel._writer.transport.abort()
+        await asyncio.sleep(0.05)
+        self.assertFalse(channel.connected)
+
+        response = await channel.request({"type": "echo", "n": 2})
+        self.assertEqual(response["n"], 2)
+        self.assertEqual(channel.stats["reconnects"], 1)
+
+    async def test_backoff_on_unreachable_peer(self):
+        """После неудачи запросы сразу отклоняются до конца окна задержки"""
+        self.server.stop()
+        await self.server._server.wait_closed()
+        channel = self.manager.get_channel("127.0.0.1", self.port)
+
+        with self.assertRaises(ConnectionError):
+            await channel.request({"type": "ping"})
+        with self.assertRaises(ConnectionError):
+            await channel.request({"type": "ping"})
+
+        self.assertEqual(channel.stats["connect_failures"], 1)
+        self.assertEqual(channel._backoff, TLSConfig.RECONNECT_BASE * 2)
+
+    async def test_keepalive_on_idle_channel(self):
+        manager = ChannelManager(keepalive_interval=0.1)
+        channel = manager.get_channel("127.0.0.1", self.port)
+        await channel.request({"type": "ping"})
+
+        await asyncio.sleep(0.5)
+        self.assertGreaterEqual(channel.stats["keepalives"], 2)
+        self.assertTrue(channel.connected)
+        self.assertEqual(self.connections, 1)
+        await manager.close()
+
+
+class TestPQResume(ChannelTestCase):
+    """kem_resume: тот же ключ после переподключения, только с доказательством владения"""
+
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        self.server.stop()
+        self.server = HybridSecureServer("test", NODE_ADDRESS, FakeKEM(NODE_ADDRESS), self.cert_manager)
+
+        async def echo(message, peer):
+            return {"type": "echo", "n": message["n"]}
+
+        self.server.register_handler("echo", echo)
+        listener = await self.server.listen("127.0.0.1", 0)
+        self.port = listener.sockets[0].getsockname()[1]
+        self.manager = ChannelManager(kem=FakeKEM(CLIENT_ADDRESS))
+
+    async def raw_connection(self):
+        reader, writer = await asyncio.open_connection(
+            "127.0.0.1", self.port, ssl=SecureContext.create_client_context(verify=False))
+        self.addCleanup(writer.close)
+        return reader, writer
+
+    async def exchange(self, reader, writer, message):
+        write_frame(writer, json.dumps(message).encode())
+        await writer.drain()
+        return json.loads(await read_frame(reader, 5))
+
+    async def test_reconnect_resumes_channel(self):
+        channel = self.manager.get_channel("127.0.0.1", self.port)
+        await channel.request({"type": "echo", "n": 1})
+
+        channel._writer.transport.abort()
+        await asyncio.sleep(0.05)
+        response = await channel.request({"type": "echo", "n": 2})
+
+        self.assertEqual(response["n"], 2)
+        self.assertEqual(channel.stats["pq_handshakes"], 1)
+        self.assertEqual(channel.stats["pq_resumed"], 1)
+
+    async def test_resume_without_key_rejected(self):
+        """Узел с живым каналом и без него отвечают одинаково, без ключа — kem_unknown"""
+        channel = self.manager.get_channel("127.0.0.1", self.port)
+        await channel.request({"type": "echo", "n": 1})
+
+        for address in (CLIENT_ADDRESS, "mt" + "d" * 40):
+            reader, writer = await self.raw_connection()
+            challenge = await self.exchange(reader, writer, {"type": "kem_resume", "node_address": address})
+            self.assertEqual(challenge["type"], "kem_challenge")
+            response = await self.exchange(reader, writer, {"type": "kem_resume_proof", "proof": "00" * 32})
+            self.assertEqual(response["type"], "kem_unknown")
+
+    async def test_replaced_channel_falls_back_to_handshake(self):
+        """Канал заменён новым handshake того же узла: старый ключ не возобновляется"""
+        channel = self.manager.get_channel("127.0.0.1", self.port)
+        await channel.request({"type": "echo", "n": 1})
+
+        other = ChannelManager(kem=FakeKEM(CLIENT_ADDRESS))
+        self.addAsyncCleanup(other.close)
+        await other.get_channel("127.0.0.1", self.port).request({"type": "echo", "n": 2})
+
+        channel._writer.transport.abort()
+        await asyncio.sleep(0.05)
+        response = await channel.request({"type": "echo", "n": 3})
+
+        self.assertEqual(response["n"], 3)
+        self.assertEqual(channel.stats["pq_resumed"], 0)
+        self.assertEqual(channel.stats["pq_handshakes"], 2)
+
+    async def test_unconfirmed_resume_ignored(self):
+        """kem_resumed без kem_challenge не принимается: ключ мог устареть"""
+        async def no_challenge(reader, writer):
+            try:
+                while True:
+                    message = json.loads(await read_frame(reader))
+                    if message["type"] == "kem_resume":
+                        response = {"type": "kem_resumed"}
+                    else:
+                        response, _ = FakeKEM(NODE_ADDRESS).process_handshake_request(message)
+                    write_frame(writer, json.dumps(response).encode())
+                    await writer.drain()
+            except asyncio.IncompleteReadError:
+                writer.close()
+
+        server = await asyncio.start_server(
+            no_challenge, "127.0.0.1", 0,
+            ssl=SecureContext.create_server_context(*self.cert_manager.get_cert_paths("test"))
+        )
+        self.addAsyncCleanup(server.wait_closed)
+        self.addCleanup(server.close)
+        self.port = server.sockets[0].getsockname()[1]
+
+        channel = PeerChannel("127.0.0.1", self.port, kem=FakeKEM(CLIENT_ADDRESS))
+        stale = SecureChannel(CLIENT_ADDRESS, NODE_ADDRESS, os.urandom(32),
+                              datetime.now(timezone.utc), mode=MODE_STREAM)
+        channel.pq_channel = stale
+        reader, writer = await self.raw_connection()
+
+        fresh = await channel._pq_handshake(reader, writer)
+        self.assertIsNot(fresh, stale)
+        self.assertEqual(channel.stats["pq_resumed"], 0)
+        self.assertEqual(channel.stats["pq_handshakes"], 1)
+
+
+class TestLegacyServer(unittest.IsolatedAsyncioTestCase):
+    """Сервер без номеров потоков отвечает строго по порядку"""
+
+    async def test_responses_without_stream_fifo(self):
+        async def legacy(reader, writer):
+            try:
+                while True:
+                    message = json.loads(await read_frame(reader))
+                    write_frame(writer, json.dumps({"n": message.get("n")}).encode())
+                    await writer.drain()
+            except asyncio.IncompleteReadError:
+                writer.close()
+
+        root = Path(tempfile.mkdtemp(prefix="montana_tls_"))
+        self.addCleanup(shutil.rmtree, root, True)
+        cert, key = CertificateManager(root).generate_self_signed_cert(NODE_ADDRESS, "legacy", 1)
+        server = await asyncio.start_server(
+            legacy, "127.0.0.1", 0,
+            ssl=SecureContext.create_server_context(cert, key)
+        )
+        port = server.sockets[0].getsockname()[1]
+
+        channel = PeerChannel("127.0.0.1", port)
+        responses = await asyncio.gather(*(
+            channel.request({"type": "echo", "n": n}) for n in range(5)
+        ))
+        self.assertEqual([r["n"] for r in responses], list(range(5)))
+        self.assertFalse(channel.binary)
+
+        await channel.close()
+        server.close()
+
+
+class TestFraming(unittest.IsolatedAsyncioTestCase):
+
+    async def test_frame_split_across_reads(self):
+        """Фрейм, пришедший частями, читается целиком"""
+        reader = asyncio.StreamReader()
+        data = b"x" * 1000
+        frame = len(data).to_bytes(4, 'big') + data
+        reader.feed_data(frame[:3])
+
+        async def feed():
+            await asyncio.sleep(0.01)
+            reader.feed_data(frame[3:500])
+            await asyncio.sleep(0.01)
+            reader.feed_data(frame[500:])
+
+        task = asyncio.create_task(feed())
+        self.assertEqual(await read_frame(reader, 1), data)
+        await task
+
+    async def test_oversized_frame_rejected(self):
+        reader = asyncio.StreamReader()
+        reader.feed_data((TLSConfig.MAX_FRAME_SIZE + 1).to_bytes(4, 'big'))
+        with self.assertRaises(ValueError):
+            await read_frame(reader)
+
+
+if __name__ == "__main__":
+    unittest.main()
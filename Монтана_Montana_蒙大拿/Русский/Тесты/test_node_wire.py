@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+test_node_wire.py — Unit tests для node_wire.py
+
+Montana Protocol
+Тестирование бинарного формата mw1: точный round-trip, hex-поля как
+сырые байты, таблицы событий (словари, разности), сжатие тела,
+согласование и запасной JSON
+"""
+
+import sys
+import os
+import json
+import unittest
+
+# Добавляем путь к модулю
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../Бот'))
+import node_wire
+from node_wire import (
+    HAS_ZSTD,
+    WIRE_FORMAT,
+    WIRE_MAGIC,
+    WireError,
+    accepts_wire,
+    choose_encoding,
+    compress,
+    decode,
+    decompress,
+    dumps,
+    encode,
+    loads,
+    negotiate,
+    pack_body,
+    _sample_events,
+    _sample_transactions
+)
+
+
+class TestRoundTrip(unittest.TestCase):
+    """decode(encode(x)) == x для JSON-совместимых значений"""
+
+    def assertRoundTrip(self, value):
+        self.assertEqual(decode(encode(value)), value)
+
+    def test_scalars(self):
+        for value in [None, True, False, 0, -1, 2 ** 70, -(2 ** 70), 1.5, -0.0, "", "Ɉ montana"]:
+            self.assertRoundTrip(value)
+
+    def test_hex_strings_preserved(self):
+        """Hex-строки идут байтами, но возвращаются той же строкой"""
+        for value in ["ab" * 32, "mt" + "0f" * 20, "AB" * 32, "abc", "mt" + "a" * 41, "0x" + "ab" * 16]:
+            self.assertRoundTrip(value)
+
+    def test_signature_halved(self):
+        signature = os.urandom(3309).hex()
+        data = encode({"signature": signature})
+        self.assertLess(len(data), 3309 + 32)
+        self.assertEqual(decode(data)["signature"], signature)
+
+    def test_nested(self):
+        self.assertRoundTrip({"a": [1, "x", {"b": None}], "c": [], "d": {}})
+
+    def test_events_table(self):
+        """Пачка событий: таблица с колонками, больше чем вдвое меньше JSON"""
+        payload = {"events": _sample_events(300), "node_id": "amsterdam"}
+        data = encode(payload)
+
+        self.assertEqual(decode(data), payload)
+        self.assertGreater(len(json.dumps(payload)) / len(data), 2)
+
+    def test_transactions_table(self):
+        payload = {"transactions": _sample_transactions(20)}
+        self.assertRoundTrip(payload)
+
+    def test_mixed_columns(self):
+        """Колонки с разными типами и не-hex значениями не теряют данные"""
+        rows = [
+            {"addr": "mt" + "ab" * 20, "v": 1, "note": "x\x00y", "m": {"k": 1}},
+            {"addr": "", "v": 2.5, "note": "z", "m": None},
+            {"addr": "TIME_BANK", "v": 2 ** 64, "note": "", "m": [1]},
+            {"addr": "mt" + "cd" * 20, "v": True, "note": "q", "m": {}},
+        ]
+        self.assertRoundTrip(rows)
+        self.assertRoundTrip([dict(r, addr="mt" + "ef" * 20) for r in rows])
+
+    def test_mixed_prefix_same_length(self):
+        """Значение той же длины с другим разбиением prefix/hex идёт строкой"""
+        self.assertRoundTrip({"x": [{"a": "aa" * 20}, {"a": "mt" + "bb" * 19}, {"a": "cc" * 20}]})
+        self.assertRoundTrip([{"a": "mt" + "ab" * 20}, {"a": "zz" + "cd" * 20},
+                              {"a": "mt" + "ef" * 20}, {"a": "01" * 21}])
+
+    def test_dictionary_column(self):
+        """Повторяющиеся адреса и node_id кодируются словарём"""
+        addresses = ["mt" + os.urandom(20).hex() for _ in range(10)]
+        rows = [{"to_addr": addresses[i % 10], "node_id": "amsterdam"} for i in range(300)]
+        data = encode(rows)
+
+        self.assertEqual(decode(data), rows)
+        # 10 адресов по 20 байт + индексы по байту, а не 300 адресов
+        self.assertLess(len(data), 300 * 2 + 10 * 21 + 100)
+
+    def test_wide_dictionary(self):
+        """Словарь больше 256 значений — двухбайтовые индексы"""
+        rows = [{"k": f"v{i % 1000}"} for i in range(2500)]
+        self.assertRoundTrip(rows)
+
+    def test_delta_column(self):
+        """Монотонные числа — узкие разности; большие скачки — int64"""
+        base = 1767225600_000_000_000
+        self.assertRoundTrip([{"ts": base + i * 1000} for i in range(50)])
+        self.assertRoundTrip([{"ts": v} for v in [0, 2 ** 62, -(2 ** 62), 5, 7]])
+        self.assertRoundTrip([{"ts": v} for v in [3, 1, 4, 1, 5, 9, 2, 6]])
+
+
+class TestErrors(unittest.TestCase):
+
+    def test_truncated(self):
+        data = encode({"events": _sample_events(5)})
+        with self.assertRaises(WireError):
+            decode(data[:-3])
+
+    def test_unknown_version(self):
+        with self.assertRaises(WireError):
+            decode(WIRE_MAGIC + b"\x63\x00")
+
+    def test_trailing_bytes(self):
+        with self.assertRaises(WireError):
+            decode(encode(1) + b"\x00")
+
+    def test_unsupported_type(self):
+        with self.assertRaises(TypeError):
+            encode({"x": object()})
+
+
+class TestCompression(unittest.TestCase):
+
+    def test_round_trip(self):
+        data = encode({"events": _sample_events(100)})
+        for encoding in ["deflate", None, "identity"]:
+            self.assertEqual(decompress(compress(data, encoding), encoding), data)
+
+    def test_choose_encoding(self):
+        self.assertEqual(choose_encoding("gzip, deflate;q=0.5"), "deflate")
+        self.assertIsNone(choose_encoding("gzip, br"))
+        self.assertIsNone(choose_encoding(None))
+
+    def test_decompression_limit(self):
+        bomb = compress(b"\x00" * 100000, "deflate")
+        with self.assertRaises(WireError):
+            decompress(bomb, "deflate", limit=1000)
+        with self.assertRaises(WireError):
+            decompress(b"not deflate", "deflate")
+        with self.assertRaises(WireError):
+            decompress(b"x", "br")
+
+    @unittest.skipUnless(HAS_ZSTD, "zstandard не установлен")
+    def test_zstd_limit_and_errors(self):
+        """Повреждённый или слишком большой zstd — WireError, а не ZstdError"""
+        zstandard = node_wire.zstandard
+        data = encode({"events": _sample_events(100)})
+        self.assertEqual(decompress(compress(data, "zstd"), "zstd"), data)
+
+        # Потоковый кадр без размера содержимого в заголовке
+        streamed = zstandard.ZstdCompressor(write_content_size=False).compress(data)
+        self.assertEqual(decompress(streamed, "zstd"), data)
+
+        bomb = compress(b"\x00" * 100000, "zstd")
+        with self.assertRaises(WireError):
+            decompress(bomb, "zstd", limit=1000)
+        unsized = zstandard.ZstdCompressor(write_content_size=False).compress(b"\x00" * 100000)
+        with self.assertRaises(WireError):
+            decompress(unsized, "zstd", limit=1000)
+        with self.assertRaises(WireError):
+            decompress(b"not zstd", "zstd")
+
+    def test_pack_body(self):
+        """Мелкие тела не сжимаются; пачка событий — сжимается"""
+        body, encoding = pack_body({"type": "ping"}, True, "deflate")
+        self.assertIsNone(encoding)
+
+        payload = {"events": _sample_events(200)}
+        body, encoding = pack_body(payload, True, "deflate")
+        self.assertEqual(encoding, "deflate")
+        self.assertEqual(loads(decompress(body, encoding)), payload)
+        self.assertGreater(len(json.dumps(payload)) / len(body), 5)
+
+
+class TestNegotiation(unittest.TestCase):
+
+    def test_loads_detects_format(self):
+        payload = {"type": "ping", "hash": "ab" * 32}
+        self.assertEqual(loads(dumps(payload)), payload)
+        self.assertEqual(loads(dumps(payload, binary=True)), payload)
+        self.assertTrue(dumps(payload, binary=True).startswith(WIRE_MAGIC))
+
+    def test_negotiate(self):
+        self.assertEqual(negotiate([WIRE_FORMAT, "json"]), WIRE_FORMAT)
+        self.assertEqual(negotiate(["json"]), "json")
+        self.assertEqual(negotiate(None), "json")
+
+    def test_accept_header(self):
+        self.assertTrue(accepts_wire("application/x-montana-wire, application/json"))
+        self.assertFalse(accepts_wire("application/json"))
+        self.assertFalse(accepts_wire(None))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+test_nts_sync.py — Unit tests для nts_sync.py
+
+Montana Protocol
+Тестирование параллельного опроса NTS/NTP серверов и кворума
+"""
+
+import sys
+import os
+import time
+import unittest
+from unittest.mock import patch
+
+# Без сетевой синхронизации при импорте
+os.environ['NTS_AUTO_INIT'] = 'false'
+
+# Добавляем путь к модулю
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../Бот'))
+import nts_sync
+from nts_sync import (
+    NTSConfig,
+    _poll_servers,
+    _reject_outliers,
+    set_config
+)
+
+
+SERVERS = [(f"lab{i}.example", 4460) for i in range(12)]
+
+
+class TestRejectOutliers(unittest.TestCase):
+    """Тесты отбрасывания выбросов"""
+
+    def test_keeps_small_sets(self):
+        """Меньше трёх ответов — медиану не с чем сравнивать"""
+        samples = [("a", 0.01), ("b", 5.0)]
+        self.assertEqual(_reject_outliers(samples, 0.25), samples)
+
+    def test_drops_far_offset(self):
+        """Сервер со сдвигом в секунды отбрасывается"""
+        samples = [("a", 0.010), ("b", 0.012), ("c", 0.011), ("mitm", 3.0)]
+        kept = [server for server, _ in _reject_outliers(samples, 0.25)]
+        self.assertEqual(kept, ["a", "b", "c"])
+
+
+class TestPollServers(unittest.TestCase):
+    """Тесты параллельного опроса с ранним выходом"""
+
+    # ═══════════════════════════════════════════════════════════════════════
+    #                         QUORUM
+    # ═══════════════════════════════════════════════════════════════════════
+
+    def setUp(self):
+        set_config(NTSConfig(timeout=1.0, min_consensus=3, max_workers=12))
+
+    def tearDown(self):
+        set_config(None)
+
+    def test_parallel_not_sequential(self):
+        """12 серверов по 0.2с опрашиваются за ~один RTT, а не 2.4с"""
+        def probe(server, port):
+            time.sleep(0.2)
+            return 0.01
+
+        started = time.time()
+        samples = _poll_servers(probe, SERVERS, quorum=3, deadline=2.0)
+        elapsed = time.time() - started
+
+        self.assertGreaterEqual(len(samples), 3)
+        self.assertLess(elapsed, 1.0)
+
+    def test_early_exit_on_quorum(self):
+        """Медленные серверы не задерживают результат после кворума"""
+        fast = {"lab0.example", "lab1.example", "lab2.example"}
+
+        def probe(server, port):
+            if server not in fast:
+                time.sleep(1.5)
+            return 0.02
+
+        started = time.time()
+        samples = _poll_servers(probe, SERVERS, quorum=3, deadline=3.0)
+        elapsed = time.time() - started
+
+        self.assertEqual({server for server, _ in samples}, fast)
+        self.assertLess(elapsed, 1.0)
+
+    def test_failed_servers_skipped(self):
+        """None (ошибка/timeout) не входит в выборку"""
+        def probe(server, port):
+            return None if server.startswith("lab1") else 0.03
+
+        samples = _poll_servers(probe, SERVERS, quorum=20, deadline=2.0)
+        self.assertTrue(all(not s.startswith("lab1") for s, _ in samples))
+        self.assertEqual(len(samples), 9)
+
+    def test_outlier_does_not_count_toward_quorum(self):
+        """Несогласованный offset не засчитывается в кворум"""
+        def probe(server, port):
+            return 5.0 if server == "lab0.example" else 0.01
+
+        samples = _poll_servers(probe, SERVERS, quorum=3, deadline=2.0)
+        self.assertNotIn("lab0.example", [server for server, _ in samples])
+
+    def test_deadline(self):
+        """Общий лимит ожидания соблюдается"""
+        def probe(server, port):
+            time.sleep(2.0)
+            return 0.01
+
+        started = time.time()
+        samples = _poll_servers(probe, SERVERS, quorum=3, deadline=0.3)
+        self.assertEqual(samples, [])
+        self.assertLess(time.time() - started, 1.0)
+
+
+class TestSyncNTS(unittest.TestCase):
+    """Тесты консенсуса NTS поверх параллельного опроса"""
+
+    def setUp(self):
+        set_config(NTSConfig(timeout=1.0, min_consensus=3))
+
+    def tearDown(self):
+        set_config(None)
+
+    def test_consensus_sets_median(self):
+        """Медиана согласованных offsets записывается в состояние"""
+        offsets = {"ptbtime1.ptb.de": 0.010, "nts.netnod.se": 0.020, "time.nist.gov": 0.030}
+
+        def probe(server, port, ctx, timeout):
+            return offsets.get(server)
+
+        with patch.object(nts_sync, '_probe_nts_server', side_effect=probe):
+            self.assertTrue(nts_sync._sync_nts_encrypted())
+
+        self.assertAlmostEqual(nts_sync._state.offset, 0.020)
+        self.assertTrue(nts_sync._state.encrypted)
+        self.assertEqual(sorted(nts_sync._state.successful_servers), sorted(offsets))
+
+    def test_consensus_fails_below_quorum(self):
+        """Меньше MIN_NTS_CONSENSUS ответов — синхронизация не удалась"""
+        def probe(server, port, ctx, timeout):
+            return 0.01 if server == "ptbtime1.ptb.de" else None
+
+        with patch.object(nts_sync, '_probe_nts_server', side_effect=probe):
+            self.assertFalse(nts_sync._sync_nts_encrypted())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""
+test_presence_aggregator.py — Unit tests для presence_aggregator.py
+
+Montana Protocol
+Тестирование пакетного присутствия: открытие сессии, подписанные
+пачки, повторы, отложенная запись одной транзакцией, перезапуск
+"""
+
+import sys
+import os
+import json
+import shutil
+import sqlite3
+import hashlib
+import tempfile
+import threading
+import time
+import unittest
+
+# Добавляем путь к модулю
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../Сайт'))
+from presence_aggregator import (
+    CLOCK_SLACK,
+    SESSION_TTL,
+    PresenceAggregator,
+    PresenceError,
+    bundle_mac,
+    session_message
+)
+
+
+PUBLIC_KEY = b"\x01" * 32
+ADDRESS = "mt" + hashlib.sha256(PUBLIC_KEY).hexdigest()[:40]
+SIGNATURE = "ab" * 16
+
+
+class Clock:
+    def __init__(self, now=1_767_225_600.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class AggregatorTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix="montana_presence_")
+        self.db_path = os.path.join(self.root, "montana.db")
+        db = sqlite3.connect(self.db_path)
+        db.execute("""
+            CREATE TABLE users (id INTEGER PRIMARY KEY, device_id TEXT UNIQUE NOT NULL,
+                                balance INTEGER DEFAULT 0, presence_seconds INTEGER DEFAULT 0,
+                                last_seen TEXT DEFAULT CURRENT_TIMESTAMP)
+        """)
+        db.execute("INSERT INTO users (device_id, balance) VALUES (?, 100)", (ADDRESS,))
+        db.commit()
+        db.close()
+
+        self.clock = Clock()
+        self.signed = []
+        self.aggregator = self.make_aggregator()
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def make_aggregator(self, **kwargs):
+        def verify(public_key, message, signature):
+            self.signed.append(message)
+            return signature.startswith(bytes.fromhex(SIGNATURE))
+
+        return PresenceAggregator(self.db_path, verify=verify, clock=self.clock, **kwargs)
+
+    def open(self, signature=SIGNATURE, aggregator=None):
+        return (aggregator or self.aggregator).open_session(
+            ADDRESS, PUBLIC_KEY.hex(), int(self.clock.now), signature
+        )
+
+    def bundle(self, session, seq, seconds, aggregator=None, mac=None):
+        session_id, key = session
+        body = json.dumps({"seq": seq, "seconds": seconds, "ts": self.clock.now}).encode()
+        return (aggregator or self.aggregator).submit_bundle(
+            session_id, body, mac or bundle_mac(key, body)
+        )
+
+    def balance(self):
+        db = sqlite3.connect(self.db_path)
+        row = db.execute("SELECT balance, presence_seconds FROM users WHERE device_id = ?",
+                         (ADDRESS,)).fetchone()
+        db.close()
+        return row
+
+
+class TestSessions(AggregatorTestCase):
+
+    def test_open_session(self):
+        session_id, key = self.open()
+        self.assertEqual(len(key), 32)
+        self.assertEqual(self.signed, [session_message(ADDRESS, int(self.clock.now))])
+
+    def test_rejected_requests(self):
+        cases = [
+            ((ADDRESS, PUBLIC_KEY.hex(), int(self.clock.now), "00" * 16), 401),
+            (("mt" + "0" * 40, PUBLIC_KEY.hex(), int(self.clock.now), SIGNATURE), 401),
+            ((ADDRESS, PUBLIC_KEY.hex(), int(self.clock.now) - 3600, SIGNATURE), 400),
+            ((ADDRESS, "zz", int(self.clock.now), SIGNATURE), 400),
+        ]
+        for args, status in cases:
+            with self.assertRaises(PresenceError) as ctx:
+                self.aggregator.open_session(*args)
+            self.assertEqual(ctx.exception.status, status)
+
+    def test_unknown_user(self):
+        other = b"\x02" * 32
+        with self.assertRaises(PresenceError) as ctx:
+            self.aggregator.open_session(
+                "mt" + hashlib.sha256(other).hexdigest()[:40], other.hex(),
+                int(self.clock.now), SIGNATURE
+            )
+        self.assertEqual(ctx.exception.status, 404)
+
+    def test_replayed_open(self):
+        self.open()
+        with self.assertRaises(PresenceError) as ctx:
+            self.open()
+        self.assertEqual(ctx.exception.status, 409)
+
+    def test_concurrent_replay_opens_once(self):
+        """Два одновременных одинаковых запроса — одна сессия"""
+        def slow_verify(public_key, message, signature):
+            time.sleep(0.1)
+            return True
+
+        aggregator = PresenceAggregator(self.db_path, verify=slow_verify, clock=self.clock)
+        results = []
+
+        def attempt():
+            try:
+                results.append(self.open(aggregator=aggregator)[0])
+            except PresenceError as e:
+                results.append(e.status)
+
+        threads = [threading.Thread(target=attempt) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sorted(r == 409 for r in results), [False, True])
+
+    def test_failed_open_releases_signature(self):
+        """Непрошедшая проверка не блокирует ту же подпись"""
+        answers = [False, True]
+        aggregator = PresenceAggregator(self.db_path, verify=lambda *args: answers.pop(0),
+                                        clock=self.clock)
+        with self.assertRaises(PresenceError) as ctx:
+            self.open(aggregator=aggregator)
+        self.assertEqual(ctx.exception.status, 401)
+        self.assertEqual(len(self.open(aggregator=aggregator)[1]), 32)
+
+    def test_new_session_replaces_old(self):
+        """Второй демон того же устройства не удваивает присутствие"""
+        old = self.open()
+        self.clock.now += 1
+        new = self.open(signature=SIGNATURE + "00")
+        self.clock.now += 60
+
+        with self.assertRaises(PresenceError) as ctx:
+            self.bundle(old, 1, 60)
+        self.assertEqual(ctx.exception.status, 401)
+        self.assertEqual(self.bundle(new, 1, 60)["accepted"], 60)
+
+
+class TestBundles(AggregatorTestCase):
+
+    def test_bundle_then_flush(self):
+        session = self.open()
+        self.clock.now += 300
+        self.assertEqual(self.bundle(session, 1, 300), {"accepted": 300, "pending": 300})
+        self.assertEqual(self.aggregator.pending(ADDRESS), 300)
+        self.assertEqual(self.balance(), (100, 0))
+
+        self.assertEqual(self.aggregator.flush(), 1)
+        self.assertEqual(self.balance(), (400, 300))
+        self.assertEqual(self.aggregator.pending(ADDRESS), 0)
+
+    def test_replay_and_forgery(self):
+        session = self.open()
+        self.clock.now += 100
+        self.bundle(session, 1, 50)
+
+        with self.assertRaises(PresenceError) as ctx:
+            self.bundle(session, 1, 50)
+        self.assertEqual(ctx.exception.status, 409)
+
+        with self.assertRaises(PresenceError) as ctx:
+            self.bundle(session, 2, 50, mac="00" * 32)
+        self.assertEqual(ctx.exception.status, 401)
+
+        with self.assertRaises(PresenceError) as ctx:
+            self.bundle(("unknown", b"k"), 1, 10)
+        self.assertEqual(ctx.exception.status, 401)
+
+    def test_presence_bounded_by_session_time(self):
+        session = self.open()
+        self.clock.now += 100
+        self.bundle(session, 1, 100 + CLOCK_SLACK)
+
+        with self.assertRaises(PresenceError) as ctx:
+            self.bundle(session, 2, 1)
+        self.assertEqual(ctx.exception.status, 409)
+
+    def test_expired_session(self):
+        session = self.open()
+        self.clock.now += SESSION_TTL + 1
+        with self.assertRaises(PresenceError) as ctx:
+            self.bundle(session, 1, 10)
+        self.assertEqual(ctx.exception.status, 401)
+
+    def test_session_state_survives_restart(self):
+        """После перезапуска сессия читается из SQLite; принятая пачка не повторяется"""
+        session = self.open()
+        self.clock.now += 100
+        self.bundle(session, 1, 100)
+        self.aggregator.flush()
+
+        restarted = self.make_aggregator()
+        self.clock.now += 50
+        with self.assertRaises(PresenceError):
+            self.bundle(session, 1, 50, aggregator=restarted)
+        self.bundle(session, 2, 50, aggregator=restarted)
+        restarted.flush()
+
+        self.assertEqual(self.balance(), (250, 150))
+
+
+class TestFlush(AggregatorTestCase):
+
+    def test_failed_flush_keeps_credits(self):
+        self.aggregator.add(ADDRESS, 30)
+        db = sqlite3.connect(self.db_path)
+        db.execute("ALTER TABLE users RENAME TO users_moved")
+        db.commit()
+
+        self.assertEqual(self.aggregator.flush(), 0)
+        self.assertEqual(self.aggregator.pending(ADDRESS), 30)
+
+        db.execute("ALTER TABLE users_moved RENAME TO users")
+        db.commit()
+        db.close()
+        self.assertEqual(self.aggregator.flush(), 1)
+        self.assertEqual(self.balance(), (130, 30))
+
+    def test_many_devices_one_transaction(self):
+        db = sqlite3.connect(self.db_path)
+        db.executemany("INSERT INTO users (device_id) VALUES (?)",
+                       ((f"device-{i}",) for i in range(1000)))
+        db.commit()
+        db.close()
+
+        for i in range(1000):
+            self.aggregator.add(f"device-{i}", 30)
+            self.aggregator.add(f"device-{i}", 30)
+
+        self.assertEqual(self.aggregator.flush(), 1000)
+        self.assertEqual(self.aggregator.stats["flushes"], 1)
+        db = sqlite3.connect(self.db_path)
+        total = db.execute("SELECT SUM(balance) FROM users WHERE device_id LIKE 'device-%'").fetchone()[0]
+        db.close()
+        self.assertEqual(total, 60_000)
+
+    def test_background_flush_on_overflow(self):
+        aggregator = self.make_aggregator(flush_interval=60, max_devices=1)
+        aggregator.start()
+        try:
+            aggregator.add(ADDRESS, 10)
+            for _ in range(100):
+                if aggregator.stats["flushes"]:
+                    break
+                self.clock_sleep()
+        finally:
+            aggregator.stop()
+        self.assertEqual(self.balance(), (110, 10))
+        self.assertGreaterEqual(aggregator.stats["flushes"], 1)
+
+    @staticmethod
+    def clock_sleep():
+        import time
+        time.sleep(0.01)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+test_push_hub.py — Unit tests для push_hub.py
+
+Montana Protocol
+Тестирование push-канала: доставка по ключу фильтра, переподключение
+с Last-Event-ID, resync при переполнении и старом курсоре, SSE и long-poll,
+подача событий из EventLedger
+"""
+
+import sys
+import os
+import shutil
+import logging
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+
+# Добавляем путь к модулю
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../Бот'))
+import push_hub
+from push_hub import ALL, RESYNC, HubFull, PushHub, long_poll, sse_stream
+from event_ledger import EventLedger
+
+logging.getLogger("EVENT_LEDGER").setLevel(logging.WARNING)
+
+
+ALICE = "address:mt" + "a" * 40
+BOB = "address:mt" + "b" * 40
+
+
+class TestDelivery(unittest.TestCase):
+
+    def test_only_matching_subscribers(self):
+        hub = PushHub()
+        alice = hub.subscribe([ALICE])
+        bob = hub.subscribe([BOB])
+        everyone = hub.subscribe([ALL])
+
+        seq = hub.publish([ALICE], "TRANSFER", {"amount": 5})
+
+        self.assertEqual(alice.wait(0), [(seq, "TRANSFER", {"amount": 5})])
+        self.assertEqual(bob.wait(0), [])
+        self.assertEqual(len(everyone.wait(0)), 1)
+
+    def test_wait_wakes_on_publish(self):
+        hub = PushHub()
+        sub = hub.subscribe([ALICE])
+        timer = threading.Timer(0.05, hub.publish, args=([ALICE], "TRANSFER", {}))
+        timer.start()
+
+        start = time.monotonic()
+        messages = sub.wait(5)
+        self.assertEqual(len(messages), 1)
+        self.assertLess(time.monotonic() - start, 2)
+        timer.join()
+
+    def test_unsubscribe_frees_slot(self):
+        hub = PushHub(max_subscribers=1)
+        sub = hub.subscribe([ALICE, BOB])
+        with self.assertRaises(HubFull):
+            hub.subscribe([ALICE])
+
+        sub.close()
+        sub.close()
+        self.assertEqual(hub.subscribers(), 0)
+        hub.subscribe([ALICE])
+
+    def test_keyless_subscription_frees_slot(self):
+        hub = PushHub(max_subscribers=1)
+        hub.subscribe([]).close()
+        self.assertEqual(hub.subscribers(), 0)
+        hub.subscribe([ALICE])
+
+    def test_concurrent_publish_keeps_order(self):
+        """Медленная доставка seq 1 не пропускает вперёд seq 2"""
+        hub = PushHub()
+        sub = hub.subscribe([ALICE])
+        push = sub._push
+
+        def slow_push(message):
+            if message[0] == 1:
+                time.sleep(0.1)
+            push(message)
+
+        sub._push = slow_push
+        first = threading.Thread(target=hub.publish, args=([ALICE], "TRANSFER", {"n": 1}))
+        first.start()
+        time.sleep(0.02)
+        hub.publish([ALICE], "TRANSFER", {"n": 2})
+        first.join()
+
+        self.assertEqual([m[0] for m in sub.wait(0)], [1, 2])
+
+    def test_overflow_turns_into_resync(self):
+        hub = PushHub()
+        sub = hub.subscribe([ALICE])
+        for n in range(push_hub.MAX_PENDING + 10):
+            hub.publish([ALICE], "TRANSFER", {"n": n})
+
+        messages = sub.wait(0)
+        self.assertEqual([m[1] for m in messages], [RESYNC])
+        self.assertEqual(messages[0][0], hub.last_seq)
+
+        hub.publish([ALICE], "TRANSFER", {"n": "next"})
+        self.assertEqual(sub.wait(0)[0][2], {"n": "next"})
+
+
+class TestReplay(unittest.TestCase):
+
+    def test_last_event_id_replays_missed(self):
+        hub = PushHub()
+        first = hub.publish([ALICE], "TRANSFER", {"n": 1})
+        hub.publish([BOB], "TRANSFER", {"n": 2})
+        hub.publish([ALICE], "TRANSFER", {"n": 3})
+
+        sub = hub.subscribe([ALICE], last_id=first)
+        self.assertEqual([m[2] for m in sub.wait(0)], [{"n": 3}])
+
+    def test_up_to_date_cursor_replays_nothing(self):
+        hub = PushHub()
+        seq = hub.publish([ALICE], "TRANSFER", {})
+        self.assertEqual(hub.subscribe([ALICE], last_id=seq).wait(0), [])
+
+    def test_stale_or_foreign_cursor_resyncs(self):
+        hub = PushHub(history=2)
+        for n in range(5):
+            hub.publish([ALICE], "TRANSFER", {"n": n})
+
+        # Старше истории
+        self.assertEqual(hub.subscribe([ALICE], last_id=1).wait(0)[0][1], RESYNC)
+        # Из прошлого запуска процесса
+        self.assertEqual(hub.subscribe([ALICE], last_id=100).wait(0)[0][1], RESYNC)
+        # Граница истории — ещё без resync
+        self.assertEqual([m[0] for m in hub.subscribe([ALICE], last_id=3).wait(0)], [4, 5])
+
+
+class TestTransport(unittest.TestCase):
+
+    def test_sse_format_and_close(self):
+        hub = PushHub()
+        sub = hub.subscribe([ALICE])
+        hub.publish([ALICE], "TRANSFER", {"amount": 7})
+
+        stream = sse_stream(sub, heartbeat=0.01, max_seconds=5,
+                            transform=lambda ms: [(s, t, {**d, "alias": "Ɉ-1"}) for s, t, d in ms])
+        self.assertTrue(next(stream).startswith("retry:"))
+        chunk = next(stream)
+        self.assertIn("id: 1\nevent: TRANSFER\n", chunk)
+        self.assertIn('"alias": "Ɉ-1"', chunk)
+        self.assertEqual(next(stream), ": keepalive\n\n")
+
+        stream.close()
+        self.assertEqual(hub.subscribers(), 0)
+
+    def test_long_poll(self):
+        hub = PushHub()
+        hub.publish([ALICE], "TRANSFER", {"n": 1})
+        result = long_poll(hub.subscribe([ALICE], last_id=0), timeout=1)
+
+        self.assertEqual(result["events"], [{"id": 1, "type": "TRANSFER", "data": {"n": 1}}])
+        self.assertEqual(result["last_id"], 1)
+        self.assertEqual(long_poll(hub.subscribe([ALICE], last_id=1), timeout=0)["events"], [])
+        self.assertEqual(hub.subscribers(), 0)
+
+
+class TestLedgerFeed(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix="montana_push_")
+        (Path(self.root) / "node_id.txt").write_text("node-a")
+        self.ledger = EventLedger(Path(self.root))
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def test_listener_sees_all_writes(self):
+        seen = []
+        self.ledger.add_listener(lambda events: seen.extend(e.event_type for e in events))
+        self.ledger.add_listener(lambda events: 1 / 0)
+
+        sender, to = "mt" + "a" * 40, "mt" + "b" * 40
+        self.ledger.emit(sender, 100)
+        self.ledger.transfer(sender, to, 10)
+        self.ledger.transfer_batch(sender, [(to, 1, None), (to, 2, None)])
+        self.ledger.transfer(sender, to, 10_000)
+
+        self.assertEqual(seen, ["EMISSION", "TRANSFER", "TRANSFER", "TRANSFER"])
+        self.assertEqual(self.ledger.balance(to), 13)
+
+    def test_merged_events_notified_once(self):
+        source = tempfile.mkdtemp(prefix="montana_push_")
+        try:
+            (Path(source) / "node_id.txt").write_text("node-b")
+            peer = EventLedger(Path(source))
+            events = [peer.emit("mt" + "c" * 40, 5).to_dict()]
+        finally:
+            shutil.rmtree(source, ignore_errors=True)
+
+        batches = []
+        self.ledger.add_listener(batches.append)
+        self.ledger.merge_events(events)
+        self.ledger.merge_events(events)
+        self.assertEqual([len(b) for b in batches], [1])
+
+
+if __name__ == "__main__":
+    unittest.main()
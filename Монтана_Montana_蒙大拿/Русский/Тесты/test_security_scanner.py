@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+test_security_scanner.py — Unit tests для security_scanner.py
+
+Montana Protocol
+Тестирование движка правил: совпадение с построчной проверкой каждого
+правила, ключевые слова префильтра, границы строк, пакетный скан файлов
+"""
+
+import sys
+import os
+import re
+import random
+import unittest
+
+# Добавляем путь к модулю
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../Юнона'))
+import security_scanner as scanner
+from security_scanner import (
+    ENGINE,
+    MAX_LINE_LENGTH,
+    UNIVERSAL_RULES,
+    _leading_keywords,
+    _sample_repository,
+    scan_code,
+    scan_files
+)
+
+
+def reference_matches(code):
+    """Старый путь: каждое правило на каждой строке"""
+    compiled = [re.compile(pattern, re.IGNORECASE) for pattern, *_ in UNIVERSAL_RULES]
+    hits = []
+    for index, line in enumerate(code.split("\n")):
+        stripped = line.strip()
+        if len(line) > MAX_LINE_LENGTH or stripped.startswith("#") or stripped.startswith("//"):
+            continue
+        hits.extend((index + 1, UNIVERSAL_RULES[rule][3])
+                    for rule, c in enumerate(compiled) if c.search(line))
+    return hits
+
+
+class TestEngineEquivalence(unittest.TestCase):
+    """Движок находит ровно то же, что построчный перебор"""
+
+    def assertSameHits(self, code):
+        found = [(v.line, v.title) for v in scan_code(code, "python").vulnerabilities if v.line]
+        self.assertEqual(found, reference_matches(code), code[:200])
+
+    def test_self_test_snippet(self):
+        code = '\n'.join([
+            'password = "SuperSecret123!"',
+            'cursor.execute(f"SELECT * FROM users WHERE name = \'{name}\'")',
+            'os.system("rm -rf " + user_input)',
+            'data = pickle.loads(untrusted_data)',
+            'requests.get(url, verify=False)',
+        ])
+        self.assertSameHits(code)
+        self.assertEqual(len(reference_matches(code)), 5)
+
+    def test_no_match_across_lines(self):
+        """\\s и [^...] в правилах не захватывают перевод строки"""
+        self.assertSameHits('password =\n"abcdefghijk"')
+        self.assertSameHits('token = "abc\ndefghijklm"')
+        self.assertSameHits("el.innerHTML = '\n';")
+        self.assertSameHits("yaml.load(data,\nLoader=yaml.SafeLoader)")
+
+    def test_skipped_lines(self):
+        self.assertSameHits("# eval(x)\n  // eval(y)\n" + "eval(" * 500 + "\neval(z)")
+
+    def test_case_fold_fallback(self):
+        """Символы, которые IGNORECASE сводит к ASCII иначе, чем lower()"""
+        self.assertSameHits('ſecret = "abcdefghij"\nİ')
+        self.assertSameHits('API_KEY = "abcdefghij"')
+
+    def test_random_fragments(self):
+        rng = random.Random(5)
+        tokens = ['password = "abcdefghij"', 'eval(', 'DES', '\n', ' ', 'innerHTML =', "''",
+                  ';', 'yaml.load(', 'Loader=yaml.SafeLoader', 'http://', '#', '//',
+                  'open(request', ')', 'TODO fix', '"', "'", 'secret:', '\t', 'ſ', 'İ', 'K']
+        for _ in range(500):
+            self.assertSameHits("".join(rng.choice(tokens) for _ in range(rng.randint(1, 60))))
+
+    def test_sample_repository(self):
+        for _, code in _sample_repository(files=5, lines=300):
+            self.assertSameHits(code)
+
+
+class TestKeywords(unittest.TestCase):
+
+    def test_leading_keywords(self):
+        self.assertEqual(_leading_keywords(r'pickle\.loads?\s*\('), ("pickle.load",))
+        self.assertEqual(_leading_keywords(r'\b(?:md5|MD5)\s*\('), ("md5",))
+        self.assertEqual(_leading_keywords(r'(?:api_?key|auth)\s*='), ("api", "auth"))
+        self.assertIsNone(_leading_keywords(r'(?:ab|cd)?x'))
+        self.assertIsNone(_leading_keywords(r'[a-z]+\('))
+
+    def test_every_rule_has_keywords(self):
+        self.assertEqual(len(ENGINE.keywords), len(UNIVERSAL_RULES))
+        self.assertNotIn(None, ENGINE.keywords)
+
+
+class TestScanFiles(unittest.TestCase):
+
+    def test_process_pool_matches_serial(self):
+        repo = _sample_repository(files=6, lines=100)
+        serial = scan_files(repo, "python", workers=1)
+
+        original = scanner.PARALLEL_MIN_BYTES
+        scanner.PARALLEL_MIN_BYTES = 0
+        try:
+            pooled = scan_files(repo, "python", workers=2)
+        finally:
+            scanner.PARALLEL_MIN_BYTES = original
+
+        self.assertEqual(list(pooled), [path for path, _ in repo])
+        self.assertEqual({p: r.to_dict() for p, r in pooled.items()},
+                         {p: r.to_dict() for p, r in serial.items()})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+test_sovanaglobus.py — Unit tests для sovanaglobus.py
+
+Montana Protocol
+Тестирование книги заявок: лучшая ставка, вместимость,
+непрерывное и пакетное сопоставление
+"""
+
+import sys
+import os
+import unittest
+from decimal import Decimal
+
+# Добавляем путь к модулю
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../Сеть'))
+from sovanaglobus import (
+    CargoType,
+    ParticipantType,
+    SovanaglobusProtocol,
+    parse_volume
+)
+
+
+class MarketTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.protocol = self.make()
+
+    def make(self, auto_match=True):
+        protocol = SovanaglobusProtocol(auto_match=auto_match)
+        protocol.register_participant("shipper", ParticipantType.CARGO_OWNER, "Grain LLC", "mt" + "1" * 40)
+        protocol.register_participant("owner", ParticipantType.SHIP_OWNER, "Baltic Co", "mt" + "2" * 40)
+        return protocol
+
+    def capacity(self, rate, capacity="60,000 MT", origin="Novorossiysk", destination="Rotterdam",
+                 cargo_type=CargoType.BULK, protocol=None):
+        return (protocol or self.protocol).post_capacity(
+            "owner", cargo_type, origin, destination, capacity, rate, "USD",
+            f"MV {rate}", "9876543", "2026-11-01")
+
+    def request(self, volume="50,000 MT", max_rate=None, origin="Novorossiysk", protocol=None):
+        return (protocol or self.protocol).create_request(
+            "shipper", CargoType.BULK, origin, "Rotterdam", volume, "01-05 Nov 2026",
+            "USD", max_rate=max_rate)
+
+
+class TestParseVolume(unittest.TestCase):
+
+    def test_units(self):
+        self.assertEqual(parse_volume("50,000 MT"), (Decimal(50000), "MT"))
+        self.assertEqual(parse_volume("500 teu"), (Decimal(500), "TEU"))
+        self.assertEqual(parse_volume("full cargo"), (Decimal(0), ""))
+
+
+class TestContinuousMatching(MarketTestCase):
+    """Сопоставление при поступлении заявок"""
+
+    def test_cheapest_sufficient_offer(self):
+        """Запрос получает самую дешёвую ставку среди судов нужной вместимости"""
+        self.capacity(300000, capacity="40,000 MT")   # мало места
+        best = self.capacity(450000)
+        self.capacity(500000, capacity="100,000 MT")
+
+        request = self.request()
+        self.assertEqual(request.status, "matched")
+        contract = self.protocol.contracts[request.contract_id]
+        self.assertEqual(contract.offer_id, best.offer_id)
+        self.assertEqual(best.status, "matched")
+
+    def test_resting_request_matched_by_new_offer(self):
+        """Ранний запрос ждёт в книге и исполняется первым"""
+        first = self.request()
+        second = self.request()
+        self.assertEqual(first.status, "open")
+
+        offer = self.capacity(400000)
+        self.assertEqual(offer.contract_id, first.contract_id)
+        self.assertEqual(second.status, "open")
+
+    def test_limit_rate_and_lanes(self):
+        """Предельная ставка и направление ограничивают сопоставление"""
+        self.capacity(600000)
+        self.capacity(300000, origin="Odesa")
+        self.capacity(300000, capacity="800 TEU")
+
+        request = self.request(max_rate=500000)
+        self.assertEqual(request.status, "open")
+        self.assertEqual(self.protocol.get_protocol_stats()["lanes"], 3)
+
+    def test_cancel(self):
+        """Отменённый тоннаж не исполняется"""
+        offer = self.capacity(400000)
+        self.protocol.cancel_offer(offer.offer_id)
+        self.assertEqual(self.request().status, "open")
+        with self.assertRaises(ValueError):
+            self.protocol.cancel_offer(offer.offer_id)
+
+    def test_many_matches_after_compaction(self):
+        """После компакции куч книга сопоставляет по-прежнему по цене"""
+        for rate in range(1000, 1300):
+            self.capacity(rate)
+        matched = [self.protocol.contracts[self.request().contract_id].rate for _ in range(250)]
+
+        self.assertEqual(matched, [Decimal(rate) for rate in range(1000, 1250)])
+        self.assertEqual(len(self.protocol.open_offers), 50)
+
+
+class TestBatchAndManual(MarketTestCase):
+
+    def test_match_open(self):
+        """Без auto_match книга копится и сводится одним вызовом"""
+        protocol = self.make(auto_match=False)
+        for rate in (500000, 450000):
+            self.capacity(rate, protocol=protocol)
+        requests = protocol.create_requests([
+            {"cargo_owner_id": "shipper", "cargo_type": CargoType.BULK, "origin": "Novorossiysk",
+             "destination": "Rotterdam", "volume": f"{v} MT", "laydays": "Nov"} for v in (50000, 20000, 10000)
+        ])
+        self.assertTrue(all(r.status == "open" for r in requests))
+
+        contracts = protocol.match_open()
+        self.assertEqual([c.rate for c in contracts], [Decimal(450000), Decimal(500000)])
+        self.assertEqual(requests[2].status, "open")
+
+    def test_manual_pair_still_supported(self):
+        """Адресное предложение и match_and_sign работают как раньше"""
+        request = self.request()
+        offer = self.protocol.submit_offer("owner", request.request_id, "MV BALTIC PRIDE",
+                                           "9876543", 450000, "USD", "2026-02-01")
+        contract = self.protocol.match_and_sign(request.request_id, offer.offer_id)
+
+        self.assertEqual(contract.rate, Decimal(450000))
+        self.assertNotIn(request.request_id, self.protocol.open_requests)
+        with self.assertRaises(ValueError):
+            self.protocol.match_and_sign(request.request_id, offer.offer_id)
+
+
+if __name__ == "__main__":
+    unittest.main()
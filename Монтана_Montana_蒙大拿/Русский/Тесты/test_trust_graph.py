@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+test_trust_graph.py — Unit tests для trust_graph.py
+
+Montana Protocol
+Тестирование графа доверия: пути, агрегаты, сохранение
+"""
+
+import sys
+import os
+import random
+import shutil
+import tempfile
+import unittest
+from collections import deque
+
+# Добавляем путь к модулю
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../Сеть'))
+from trust_graph import (
+    RecognitionType,
+    TrustGraph
+)
+
+
+def random_graph(nodes: int, edges: int, seed: int = 1) -> TrustGraph:
+    rng = random.Random(seed)
+    graph = TrustGraph()
+    for i in range(nodes):
+        graph.add_node(f"n{i}", f"Node {i}", f"hash{i}")
+    for _ in range(edges):
+        graph.recognize(f"n{rng.randrange(nodes)}", f"n{rng.randrange(nodes)}",
+                        RecognitionType.TRUST, "evidence")
+    return graph
+
+
+def shortest_path_length(graph: TrustGraph, source: str, target: str) -> int:
+    """Эталон: однонаправленный BFS по recognitions_given (число узлов в пути)"""
+    distance = {source: 1}
+    queue = deque([source])
+    while queue:
+        current = queue.popleft()
+        if current == target:
+            return distance[current]
+        for neighbor in graph.nodes[current].recognitions_given:
+            if neighbor not in distance:
+                distance[neighbor] = distance[current] + 1
+                queue.append(neighbor)
+    return 0
+
+
+class TestTrustPath(unittest.TestCase):
+    """Тесты двунаправленного BFS"""
+
+    def test_matches_reference_bfs(self):
+        """Длина пути совпадает с эталонным BFS, путь идёт по рёбрам"""
+        graph = random_graph(300, 700)
+        rng = random.Random(2)
+
+        for _ in range(200):
+            a, b = f"n{rng.randrange(300)}", f"n{rng.randrange(300)}"
+            expected = shortest_path_length(graph, a, b)
+            path = graph.get_trust_path(a, b, max_depth=50)
+
+            if not expected:
+                self.assertIsNone(path)
+                continue
+            self.assertEqual(len(path), expected)
+            self.assertEqual((path[0], path[-1]), (a, b))
+            for x, y in zip(path, path[1:]):
+                self.assertIn((x, y), graph.edges)
+
+    def test_max_depth(self):
+        """Путь длиннее max_depth узлов не возвращается"""
+        graph = TrustGraph()
+        for name in "abcd":
+            graph.add_node(name, name, name)
+        for x, y in ("ab", "bc", "cd"):
+            graph.recognize(x, y, RecognitionType.STYLE, "")
+
+        self.assertEqual(graph.get_trust_path("a", "d", max_depth=4), ["a", "b", "c", "d"])
+        self.assertIsNone(graph.get_trust_path("a", "d", max_depth=3))
+        self.assertIsNone(graph.get_trust_path("d", "a"))
+        self.assertEqual(graph.get_trust_path("a", "a"), ["a"])
+
+
+class TestAggregates(unittest.TestCase):
+    """Тесты инкрементальных агрегатов"""
+
+    def test_duplicate_recognition_is_one_edge(self):
+        """Повторное признание обновляет ребро, но не удваивает score"""
+        graph = TrustGraph()
+        graph.add_node("a", "A", "ha")
+        graph.add_node("b", "B", "hb")
+        for _ in range(3):
+            graph.recognize("a", "b", RecognitionType.VOICE, "снова")
+        graph.recognize("b", "a", RecognitionType.VOICE, "взаимно")
+
+        self.assertEqual(graph.nodes["b"].recognitions_received, ["a"])
+        self.assertEqual(graph.nodes["a"].trust_score, 2.0)
+        self.assertEqual(graph.calculate_network_trust()["mutual_recognitions"], 1)
+        self.assertEqual(graph.calculate_network_trust()["total_recognitions"], 4)
+
+    def test_metrics_match_full_recount(self):
+        """Агрегаты совпадают с полным пересчётом по рёбрам"""
+        graph = random_graph(50, 600)
+        metrics = graph.calculate_network_trust()
+
+        mutual = sum(1 for (a, b) in graph.edges if a != b and (b, a) in graph.edges) // 2
+        scores = []
+        for node_id, node in graph.nodes.items():
+            given = {b for (a, b) in graph.edges if a == node_id}
+            received = {a for (a, b) in graph.edges if b == node_id}
+            both = len((given & received) - {node_id})
+            scores.append(both * 2.0 + len(received) - both)
+
+        self.assertEqual(metrics["mutual_recognitions"], mutual)
+        self.assertAlmostEqual(metrics["average_trust_score"], sum(scores) / len(scores))
+
+    def test_web_of_trust(self):
+        """Паутина доверия по обоим направлениям"""
+        graph = TrustGraph()
+        for name in "abc":
+            graph.add_node(name, name, name)
+        graph.recognize("a", "b", RecognitionType.FAMILY, "")
+        graph.recognize("c", "a", RecognitionType.FAMILY, "")
+
+        web = graph.get_web_of_trust("a", depth=1)
+        self.assertEqual(set(web["nodes"]), {"a", "b", "c"})
+        self.assertEqual(set(web["edges"]), {("a", "b"), ("c", "a")})
+
+
+class TestPersistence(unittest.TestCase):
+    """Тесты формата сохранения"""
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp(prefix="montana_trust_")
+        self.path = os.path.join(self.tmp, "trust_graph.jsonl")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def test_roundtrip(self):
+        """save/load восстанавливает узлы, историю и агрегаты"""
+        graph = random_graph(40, 200)
+        graph.save(self.path)
+        loaded = TrustGraph.load(self.path)
+
+        self.assertEqual(loaded.calculate_network_trust(), graph.calculate_network_trust())
+        self.assertEqual([r.to_dict() for r in loaded.recognitions], [r.to_dict() for r in graph.recognitions])
+        self.assertEqual(loaded.nodes["n7"], graph.nodes["n7"])
+        self.assertEqual(loaded.get_trust_path("n1", "n2"), graph.get_trust_path("n1", "n2"))
+
+    def test_rejects_foreign_file(self):
+        with open(self.path, "w") as f:
+            f.write('{"format": "other"}\n')
+        with self.assertRaises(ValueError):
+            TrustGraph.load(self.path)
+
+
+if __name__ == "__main__":
+    unittest.main()
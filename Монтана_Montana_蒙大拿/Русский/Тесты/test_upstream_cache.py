@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+test_upstream_cache.py — Unit tests для upstream_cache.py
+
+Montana Protocol
+Тестирование single-flight, LRU, stale-while-revalidate
+и ограниченного пула запросов к upstream
+"""
+
+import sys
+import os
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+# Добавляем путь к модулю
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../Логистика'))
+from upstream_cache import TieredCache, SOURCE_CACHE, SOURCE_STALE, SOURCE_UPSTREAM
+
+
+class FakeUpstream:
+    """Локальная заглушка MarineTraffic: считает вызовы и параллельность"""
+
+    def __init__(self, latency=0.0, empty=()):
+        self.latency = latency
+        self.empty = set(empty)
+        self.calls = []
+        self.active = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, key):
+        with self.lock:
+            self.calls.append(key)
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        time.sleep(self.latency)
+        with self.lock:
+            self.active -= 1
+        return None if key in self.empty else {"mmsi": key, "version": len(self.calls)}
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestTieredCache(unittest.TestCase):
+
+    def setUp(self):
+        self.executor = ThreadPoolExecutor(max_workers=4)
+        self.clock = Clock()
+
+    def tearDown(self):
+        self.executor.shutdown(wait=True)
+
+    def make(self, upstream, **kwargs):
+        options = dict(ttl=300, stale_ttl=3600, executor=self.executor, clock=self.clock)
+        options.update(kwargs)
+        return TieredCache("test", upstream, **options)
+
+    def test_single_flight(self):
+        """Параллельные промахи по одному ключу = один запрос к upstream"""
+        upstream = FakeUpstream(latency=0.2)
+        cache = self.make(upstream)
+        results = []
+
+        def request():
+            results.append(cache.get("219000001"))
+
+        threads = [threading.Thread(target=request) for _ in range(20)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(upstream.calls, ["219000001"])
+        self.assertTrue(all(source == SOURCE_UPSTREAM for _, source in results))
+        self.assertEqual(cache.get("219000001")[1], SOURCE_CACHE)
+
+    def test_stale_while_revalidate(self):
+        """После TTL старое значение отдаётся сразу, обновление — в фоне"""
+        upstream = FakeUpstream()
+        cache = self.make(upstream)
+        first, _ = cache.get("k")
+
+        self.clock.now += 301
+        value, source = cache.get("k")
+        self.assertEqual((value, source), (first, SOURCE_STALE))
+
+        deadline = time.time() + 2  # дождаться фонового обновления
+        while cache._inflight and time.time() < deadline:
+            time.sleep(0.01)
+        value, source = cache.get("k")
+        self.assertEqual(source, SOURCE_CACHE)
+        self.assertEqual(value["version"], 2)
+
+    def test_too_stale_blocks(self):
+        """За окном stale_ttl запрос ждёт upstream"""
+        upstream = FakeUpstream()
+        cache = self.make(upstream)
+        cache.get("k")
+        self.clock.now += 300 + 3600 + 1
+        self.assertEqual(cache.get("k")[1], SOURCE_UPSTREAM)
+
+    def test_database_tier(self):
+        """Свежая запись из SQLite не вызывает upstream и попадает в память"""
+        upstream = FakeUpstream()
+        loads = []
+
+        def load(key):
+            loads.append(key)
+            return {"mmsi": key}, self.clock.now - 10
+
+        cache = self.make(upstream, load=load)
+        self.assertEqual(cache.get("k")[1], SOURCE_CACHE)
+        self.assertEqual(cache.get("k")[1], SOURCE_CACHE)
+        self.assertEqual(loads, ["k"])
+        self.assertEqual(upstream.calls, [])
+
+    def test_negative_cache(self):
+        """Пустой ответ upstream не повторяется до NEGATIVE_TTL"""
+        upstream = FakeUpstream(empty={"missing"})
+        cache = self.make(upstream)
+        self.assertEqual(cache.get("missing"), (None, None))
+        self.assertEqual(cache.get("missing"), (None, None))
+        self.assertEqual(len(upstream.calls), 1)
+
+        self.clock.now += 61
+        cache.get("missing")
+        self.assertEqual(len(upstream.calls), 2)
+
+    def test_lru_eviction(self):
+        """Память ограничена max_entries, вытесняется давно не читанный ключ"""
+        upstream = FakeUpstream()
+        cache = self.make(upstream, max_entries=2)
+        cache.get("a")
+        cache.get("b")
+        cache.get("a")
+        cache.get("c")
+
+        cache.get("a")
+        cache.get("b")
+        self.assertEqual(upstream.calls, ["a", "b", "c", "b"])
+
+    def test_bounded_concurrency(self):
+        """Разные ключи упираются в размер пула"""
+        upstream = FakeUpstream(latency=0.05)
+        cache = self.make(upstream)
+        threads = [threading.Thread(target=cache.get, args=(f"k{i}",)) for i in range(16)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(len(upstream.calls), 16)
+        self.assertLessEqual(upstream.peak, 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -14,20 +14,31 @@ Detects OWASP Top 10 and common vulnerabilities in any code:
   - Open Redirects
   - Missing Auth
 
+Rules are compiled once at import. A rule's regex runs only on lines
+containing one of its literal keywords (found with str.find over the
+whole file), instead of every rule on every line. scan_files() spreads
+many files over a process pool.
+
 Ɉ MONTANA PROTOCOL — ML-DSA-65 (FIPS 204)
 """
 
 import re
+import os
 import hashlib
 import signal
+from bisect import bisect_right
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass, field, asdict
-from typing import Optional
+from typing import Dict, Iterable, List, Optional, Tuple
 
 # Limits to prevent DoS
 MAX_CODE_SIZE = 512_000  # 500KB
 MAX_LINES = 10_000
 MAX_LINE_LENGTH = 2_000
 
+# scan_files: below this total size a process pool costs more than it saves
+PARALLEL_MIN_BYTES = 256_000
+
 
 class ScanTimeout(Exception):
     pass
@@ -98,38 +109,44 @@ class ScanResult:
 
 # ─── Language Detection ──────────────────────────────────────────────────────
 
+LANGUAGE_INDICATORS = {
+    "python": [r'\bdef\s+\w+\s*\(', r'\bimport\s+\w+', r'\bclass\s+\w+:',
+               r'print\s*\(', r'self\.'],
+    "javascript": [r'\bfunction\s+\w+', r'\bconst\s+\w+', r'\blet\s+\w+',
+                   r'=>', r'console\.log', r'require\('],
+    "typescript": [r'\binterface\s+\w+', r':\s*string', r':\s*number',
+                   r'<\w+>', r'import.*from'],
+    "go": [r'\bfunc\s+\w+', r'\bpackage\s+\w+', r':=',
+           r'fmt\.', r'\bgo\s+\w+'],
+    "rust": [r'\bfn\s+\w+', r'\blet\s+mut\b', r'\bimpl\s+',
+             r'->.*\{', r'println!'],
+    "java": [r'\bpublic\s+class', r'\bprivate\s+', r'\bprotected\s+',
+             r'System\.out', r'\bvoid\s+\w+'],
+    "swift": [r'\bfunc\s+\w+', r'\bvar\s+\w+:', r'\blet\s+\w+:',
+              r'\bguard\s+', r'\bstruct\s+\w+'],
+    "php": [r'<\?php', r'\$\w+\s*=', r'\bfunction\s+\w+',
+            r'->', r'echo\s+'],
+    "ruby": [r'\bdef\s+\w+', r'\bend\b', r'\bclass\s+\w+',
+             r'puts\s+', r'\brequire\s+'],
+    "c": [r'#include\s+<', r'\bint\s+main', r'printf\s*\(',
+          r'\bmalloc\s*\(', r'\bfree\s*\('],
+    "sql": [r'\bSELECT\b', r'\bINSERT\b', r'\bUPDATE\b',
+            r'\bDELETE\b', r'\bCREATE TABLE\b'],
+    "solidity": [r'\bpragma\s+solidity', r'\bcontract\s+\w+',
+                 r'\bmapping\s*\(', r'\bpayable\b'],
+}
+
+_LANGUAGE_PATTERNS = {
+    lang: [re.compile(p, re.IGNORECASE) for p in patterns]
+    for lang, patterns in LANGUAGE_INDICATORS.items()
+}
+
+
 def detect_language(code: str) -> str:
     """Detect programming language from code content"""
-    indicators = {
-        "python": [r'\bdef\s+\w+\s*\(', r'\bimport\s+\w+', r'\bclass\s+\w+:',
-                   r'print\s*\(', r'self\.'],
-        "javascript": [r'\bfunction\s+\w+', r'\bconst\s+\w+', r'\blet\s+\w+',
-                       r'=>', r'console\.log', r'require\('],
-        "typescript": [r'\binterface\s+\w+', r':\s*string', r':\s*number',
-                       r'<\w+>', r'import.*from'],
-        "go": [r'\bfunc\s+\w+', r'\bpackage\s+\w+', r':=',
-               r'fmt\.', r'\bgo\s+\w+'],
-        "rust": [r'\bfn\s+\w+', r'\blet\s+mut\b', r'\bimpl\s+',
-                 r'->.*\{', r'println!'],
-        "java": [r'\bpublic\s+class', r'\bprivate\s+', r'\bprotected\s+',
-                 r'System\.out', r'\bvoid\s+\w+'],
-        "swift": [r'\bfunc\s+\w+', r'\bvar\s+\w+:', r'\blet\s+\w+:',
-                  r'\bguard\s+', r'\bstruct\s+\w+'],
-        "php": [r'<\?php', r'\$\w+\s*=', r'\bfunction\s+\w+',
-                r'->', r'echo\s+'],
-        "ruby": [r'\bdef\s+\w+', r'\bend\b', r'\bclass\s+\w+',
-                 r'puts\s+', r'\brequire\s+'],
-        "c": [r'#include\s+<', r'\bint\s+main', r'printf\s*\(',
-              r'\bmalloc\s*\(', r'\bfree\s*\('],
-        "sql": [r'\bSELECT\b', r'\bINSERT\b', r'\bUPDATE\b',
-                r'\bDELETE\b', r'\bCREATE TABLE\b'],
-        "solidity": [r'\bpragma\s+solidity', r'\bcontract\s+\w+',
-                     r'\bmapping\s*\(', r'\bpayable\b'],
-    }
-
     scores = {}
-    for lang, patterns in indicators.items():
-        score = sum(1 for p in patterns if re.search(p, code, re.IGNORECASE))
+    for lang, patterns in _LANGUAGE_PATTERNS.items():
+        score = sum(1 for p in patterns if p.search(code))
         if score > 0:
             scores[lang] = score
 
@@ -354,6 +371,136 @@ UNIVERSAL_RULES = [
 ]
 
 
+# ─── Rule Engine ─────────────────────────────────────────────────────────────
+
+# Characters that IGNORECASE matches to ASCII letters but str.lower() does not
+# map onto them (ſ, K, İ, ı): text containing them skips the keyword prefilter
+_CASE_FOLD_ODDITIES = frozenset("\u017f\u212a\u0130\u0131")
+_REGEX_META = set(".^$*+?{}[]()|\\")
+
+
+def _line_local(pattern: str) -> str:
+    r"""
+    Rewrite a rule so it cannot match across a newline.
+
+    \s and negated classes are the only constructs in the rules that can
+    consume '\n' ('.' already cannot). On a single line the rewritten
+    pattern is equivalent to the original.
+    """
+    return pattern.replace('[^', '[^\n').replace(r'\s', r'[^\S\n]')
+
+
+def _literal_run(pattern: str) -> str:
+    """Leading literal text of a regex fragment (stops at the first metachar)"""
+    run = []
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if char == "\\" and i + 1 < len(pattern) and pattern[i + 1] in _REGEX_META:
+            run.append(pattern[i + 1])
+            i += 2
+            continue
+        if char in _REGEX_META:
+            # A quantifier makes the previous character optional
+            if char in "?*{" and run:
+                run.pop()
+            break
+        run.append(char)
+        i += 1
+    return "".join(run)
+
+
+def _leading_keywords(pattern: str) -> Optional[Tuple[str, ...]]:
+    r"""
+    Lowercase literals one of which starts every match of the rule.
+
+    Handles the forms used in the rules: an optional leading \b, then
+    a literal or a (?:a|b|c) group of literals. None — no usable
+    keyword, the rule is scanned without prefilter.
+    """
+    if pattern.startswith(r"\b"):
+        pattern = pattern[2:]
+    if pattern.startswith("(?:"):
+        end = pattern.find(")")
+        group = pattern[3:end]
+        # An optional group does not start every match
+        if "(" in group or pattern[end + 1:end + 2] in ("?", "*", "{"):
+            return None
+        keywords = [_literal_run(alt) for alt in group.split("|")]
+    else:
+        keywords = [_literal_run(pattern)]
+    if min(map(len, keywords)) < 3:
+        return None
+    return tuple(sorted({k.lower() for k in keywords}))
+
+
+class RuleEngine:
+    """
+    Rule set compiled once, scanning a whole file at a time.
+
+    Each rule carries the literal keywords its matches start with. Lines
+    containing a keyword are found with str.find over the lowercased
+    file; the regex runs only on those lines. Rules without a keyword
+    scan the whole file in one search() pass, jumping to the next line
+    after each hit. Either way a rule reports a line at most once, like
+    the old line × rule loop.
+    """
+
+    def __init__(self, rules: List[tuple]):
+        self.rules = []
+        self.keywords = []
+        for pattern, *rest in rules:
+            try:
+                self.rules.append((re.compile(_line_local(pattern), re.IGNORECASE), *rest))
+            except re.error:
+                continue
+            self.keywords.append(_leading_keywords(pattern))
+
+    def matches(self, text: str) -> List[Tuple[int, int]]:
+        """(line index, rule index) pairs in line order, then rule order"""
+        starts = [0]
+        find = text.find
+        pos = find("\n")
+        while pos != -1:
+            starts.append(pos + 1)
+            pos = find("\n", pos + 1)
+        ends = [start - 1 for start in starts[1:]] + [len(text)]
+
+        lowered = text.lower()
+        prefilter = len(lowered) == len(text) and _CASE_FOLD_ODDITIES.isdisjoint(text)
+
+        hits = []
+        for rule_index, (compiled, *_) in enumerate(self.rules):
+            search = compiled.search
+            keywords = self.keywords[rule_index] if prefilter else None
+
+            if keywords is None:
+                m = search(text)
+                while m:
+                    line = bisect_right(starts, m.start()) - 1
+                    hits.append((line, rule_index))
+                    if line + 1 >= len(starts):
+                        break
+                    m = search(text, starts[line + 1])
+                continue
+
+            candidates = set()
+            for keyword in keywords:
+                pos = lowered.find(keyword)
+                while pos != -1:
+                    line = bisect_right(starts, pos) - 1
+                    candidates.add(line)
+                    pos = lowered.find(keyword, ends[line] + 1)
+            for line in candidates:
+                if search(text, starts[line], ends[line]):
+                    hits.append((line, rule_index))
+        hits.sort()
+        return hits
+
+
+ENGINE = RuleEngine(UNIVERSAL_RULES)
+
+
 # ─── Scanner ─────────────────────────────────────────────────────────────────
 
 def scan_code(code: str, language: str = None) -> ScanResult:
@@ -377,40 +524,28 @@ def scan_code(code: str, language: str = None) -> ScanResult:
         lines_scanned=len(lines),
     )
 
-    # Pre-compile patterns (S-01 fix: avoid repeated compilation)
-    compiled_rules = []
-    for pattern, *rest in UNIVERSAL_RULES:
-        try:
-            compiled_rules.append((re.compile(pattern, re.IGNORECASE), *rest))
-        except re.error:
-            continue
+    # Long lines (ReDoS, S-01 fix) and comments are blanked, keeping line numbers
+    text = "\n".join(
+        "" if len(line) > MAX_LINE_LENGTH or line.lstrip().startswith(("#", "//")) else line
+        for line in lines
+    )
 
     vuln_id = 0
-    for i, line in enumerate(lines, 1):
-        # Skip long lines to prevent ReDoS (S-01 fix)
-        if len(line) > MAX_LINE_LENGTH:
-            continue
-
-        stripped = line.strip()
-        # Skip comments
-        if stripped.startswith("#") or stripped.startswith("//"):
-            continue
-
-        for compiled, severity, category, title, desc, cwe, owasp, rec in compiled_rules:
-            if compiled.search(line):
-                vuln_id += 1
-                result.add(Vulnerability(
-                    id=f"VULN-{code_hash[:8]}-{vuln_id:03d}",
-                    severity=severity,
-                    category=category,
-                    title=title,
-                    description=desc,
-                    line=i,
-                    code_snippet=stripped[:200],
-                    recommendation=rec,
-                    cwe=cwe,
-                    owasp=owasp,
-                ))
+    for index, rule_index in ENGINE.matches(text):
+        _, severity, category, title, desc, cwe, owasp, rec = ENGINE.rules[rule_index]
+        vuln_id += 1
+        result.add(Vulnerability(
+            id=f"VULN-{code_hash[:8]}-{vuln_id:03d}",
+            severity=severity,
+            category=category,
+            title=title,
+            description=desc,
+            line=index + 1,
+            code_snippet=lines[index].strip()[:200],
+            recommendation=rec,
+            cwe=cwe,
+            owasp=owasp,
+        ))
 
     # Add disclaimer about static analysis limitations
     if result.vulnerabilities:
@@ -428,6 +563,31 @@ def scan_code(code: str, language: str = None) -> ScanResult:
     return result
 
 
+def _scan_file(item: Tuple[str, str, Optional[str]]) -> Tuple[str, ScanResult]:
+    path, code, language = item
+    return path, scan_code(code, language)
+
+
+def scan_files(files: Iterable[Tuple[str, str]], language: str = None,
+               workers: int = None) -> Dict[str, ScanResult]:
+    """
+    Scan many files: (path, code) pairs -> {path: ScanResult}
+
+    Large batches are spread over a process pool (regex matching holds
+    the GIL, so threads would not help); small ones run inline.
+    """
+    items = [(path, code, language) for path, code in files]
+    total = sum(len(code) for _, code, _ in items)
+    workers = workers or os.cpu_count() or 1
+
+    if workers < 2 or len(items) < 2 or total < PARALLEL_MIN_BYTES:
+        return dict(map(_scan_file, items))
+
+    chunksize = max(1, len(items) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=min(workers, len(items))) as pool:
+        return dict(pool.map(_scan_file, items, chunksize=chunksize))
+
+
 def format_report(result: ScanResult) -> str:
     """Format scan result as a readable markdown report"""
     r = result.to_dict()
@@ -465,7 +625,79 @@ def format_report(result: ScanResult) -> str:
     return "\n".join(lines)
 
 
+# ─── Benchmark ───────────────────────────────────────────────────────────────
+
+def _sample_repository(files: int = 400, lines: int = 400) -> List[Tuple[str, str]]:
+    """Synthetic repository: ordinary code with a few findings per file"""
+    import random
+
+    rng = random.Random(7)
+    ordinary = [
+        "def handle_{n}(self, request, user_id):",
+        "    value = self.cache.get(key_{n}) or compute(user_id, {n})",
+        "    for item in items: total += item.amount * rate_{n}",
+        "    logger.info('processed %s records', len(batch_{n}))",
+        "const result{n} = await fetch(`${{base}}/api/items/{n}`);",
+        "    return {{'status': 'ok', 'count': {n}, 'items': rows}}",
+        "    if not description_{n}: raise ValueError('empty codes')",
+        "",
+    ]
+    findings = [
+        'password = "hunter2hunter2"',
+        'cursor.execute(f"SELECT * FROM t WHERE id = {user_id}")',
+        "data = pickle.loads(payload)",
+        "requests.get(url, verify=False)",
+        'endpoint = "http://internal.local/api"',
+    ]
+    repo = []
+    for f in range(files):
+        body = [rng.choice(ordinary).format(n=rng.randrange(1000)) for _ in range(lines)]
+        for _ in range(3):
+            body[rng.randrange(lines)] = rng.choice(findings)
+        repo.append((f"src/module_{f}.py", "\n".join(body)))
+    return repo
+
+
+def benchmark(files: int = 400, lines: int = 400) -> dict:
+    """Per-line baseline vs rule engine vs process pool on a synthetic repository"""
+    import time
+
+    repo = _sample_repository(files, lines)
+    size = sum(len(code) for _, code in repo)
+    compiled = [re.compile(pattern, re.IGNORECASE) for pattern, *_ in UNIVERSAL_RULES]
+
+    def baseline():
+        # The old path: every rule against every line
+        for _, code in repo:
+            for line in code.split("\n"):
+                if len(line) <= MAX_LINE_LENGTH and not line.lstrip().startswith(("#", "//")):
+                    for rule in compiled:
+                        rule.search(line)
+
+    runs = [
+        ("line x rule", baseline),
+        ("engine", lambda: scan_files(repo, "python", workers=1)),
+        (f"engine x{os.cpu_count()} procs", lambda: scan_files(repo, "python")),
+    ]
+
+    results = {}
+    print(f"{files} files, {files * lines} lines, {size / 1e6:.1f} MB")
+    for name, run in runs:
+        started = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - started
+        results[name] = {"seconds": round(elapsed, 3), "mb_s": round(size / elapsed / 1e6, 1)}
+        print(f"{name:24} {elapsed:7.3f} s {size / elapsed / 1e6:8.1f} MB/s")
+    return results
+
+
 if __name__ == "__main__":
+    import sys
+
+    if "--benchmark" in sys.argv:
+        benchmark()
+        sys.exit(0)
+
     # Quick self-test
     test_code = '''
 import os